@@ -5,6 +5,11 @@ import os
 class Settings(BaseSettings):
     app_name: str = "YeePay Admin"
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./admin.db")
+    # 异步引擎连接池（config-sync、LoRA、基础模型、工作流路由）
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
     SECRET_KEY: str = os.getenv("SECRET_KEY", "a_very_secret_key")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
@@ -14,6 +19,10 @@ class Settings(BaseSettings):
     HOST: str = os.getenv("HOST", "127.0.0.1")
     PORT: int = int(os.getenv("PORT", "8888"))
     BACKEND_URL: str = os.getenv("BACKEND_URL", "http://127.0.0.1:9000")
+    # 定时备份使用增量模式（块存储去重，只保存变化的内容）
+    BACKUP_SCHEDULED_INCREMENTAL: bool = os.getenv("BACKUP_SCHEDULED_INCREMENTAL", "true").lower() == "true"
+    # ZIP备份并行压缩的线程数
+    BACKUP_COMPRESS_WORKERS: int = int(os.getenv("BACKUP_COMPRESS_WORKERS", str(min(4, os.cpu_count() or 1))))
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式备份归档
+直接从源文件写ZIP，不再先复制到临时目录：多个工作线程并行压缩各个文件（zlib压缩时释放GIL），
+写入线程按顺序把压缩好的数据写进归档，写入的同时计算整个归档的sha256，不需要再读一遍。
+大文件不在内存中预压缩，轮到时由写入线程边读边压缩；图片、视频等已压缩格式直接存储，不再压缩。
+"""
+
+import hashlib
+import io
+import json
+import os
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+READ_BLOCK_SIZE = 1024 * 1024
+# 超过该大小的文件由写入线程流式压缩，避免在内存中保留整个压缩结果
+PRECOMPRESS_MAX_SIZE = 16 * 1024 * 1024
+# 已压缩的格式再压缩几乎没有收益，直接存储
+STORED_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".mp4", ".webm", ".mov", ".mkv",
+                   ".zip", ".gz", ".7z", ".rar"}
+
+
+class _HashingWriter(io.RawIOBase):
+    """写入文件的同时计算sha256；不支持tell/seek，zipfile 会按流式模式写入"""
+
+    def __init__(self, fp):
+        self._fp = fp
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._fp.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        self._fp.flush()
+
+
+def _compress_file(path: Path, compress_type: int, compression_level: int) -> Tuple[int, int, List[bytes]]:
+    """在工作线程中读取并压缩整个文件，返回 (CRC, 原始大小, 压缩后的数据块)"""
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -15) \
+        if compress_type == zipfile.ZIP_DEFLATED else None
+    crc, size, blocks = 0, 0, []
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(READ_BLOCK_SIZE)
+            if not data:
+                break
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            block = compressor.compress(data) if compressor else data
+            if block:
+                blocks.append(block)
+    if compressor:
+        blocks.append(compressor.flush())
+    return crc, size, blocks
+
+
+def _write_precompressed(zipf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, crc: int, file_size: int,
+                         blocks: List[bytes]):
+    """
+    写入已压缩好的条目（与 ZipFile.open(..., 'w') 写入的结构相同，只是CRC和大小已知，不需要数据描述符）
+
+    zipfile 没有写入预压缩数据的公开接口，这里沿用 ZipFile._open_to_write 的步骤；
+    tests/test_backup_archive.py 用 ZipFile.testzip() 校验输出，升级Python版本时需要运行。
+    """
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+    zinfo.compress_size = sum(len(block) for block in blocks)
+    zinfo.flag_bits = 0
+    if not zinfo.external_attr:
+        zinfo.external_attr = 0o600 << 16
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    zinfo.header_offset = zipf.fp.tell()
+    zipf._writecheck(zinfo)
+    zipf._didModify = True
+    zipf.fp.write(zinfo.FileHeader(zip64))
+    for block in blocks:
+        zipf.fp.write(block)
+    zipf.start_dir = zipf.fp.tell()
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+
+
+def iter_source_files(sources: Iterable[Tuple[str, Path]]) -> Iterator[Tuple[str, Path]]:
+    """展开 (归档路径, 源文件或目录) 为逐个文件"""
+    for arc_prefix, source in sources:
+        if source.is_file():
+            yield arc_prefix, source
+            continue
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                file_path = Path(dirpath) / filename
+                yield f"{arc_prefix}/{file_path.relative_to(source).as_posix()}", file_path
+
+
+def write_archive(archive_path: Path, sources: Iterable[Tuple[str, Path]], metadata: Dict[str, Any],
+                  compression_level: int = 6, workers: int = 4) -> Dict[str, Any]:
+    """
+    把源文件流式写入ZIP归档（在线程中调用）
+
+    Args:
+        archive_path: 归档路径；写入过程中使用 .partial 后缀，完成后改名
+        sources: (归档路径, 源文件或目录)
+        metadata: 写入 backup_metadata.json 的备份元数据
+
+    Returns:
+        {"checksum", "size", "files", "total_size"}
+    """
+    workers = max(1, workers)
+    partial_path = archive_path.with_name(archive_path.name + ".partial")
+    stats = {"files": 0, "total_size": 0}
+    try:
+        with open(partial_path, "wb") as raw, ThreadPoolExecutor(max_workers=workers,
+                                                                 thread_name_prefix="backup-compress") as pool:
+            writer = _HashingWriter(raw)
+            # 在源文件关闭前关闭writer，否则回收时 flush 已关闭的文件
+            with writer, zipfile.ZipFile(writer, "w", zipfile.ZIP_DEFLATED, compresslevel=compression_level) as zipf:
+                zipf.writestr("backup_metadata.json", json.dumps(metadata, indent=2, ensure_ascii=False))
+
+                # 预压缩的窗口：最多同时在内存中保留 workers*2 个文件的压缩结果
+                pending: deque = deque()
+
+                def flush_one():
+                    zinfo, path, future = pending.popleft()
+                    # 列出之后被删除或无法读取的文件跳过，不影响整个备份
+                    if future is None:
+                        # 大文件：写入线程流式压缩（先打开源文件，打不开时还没有写入任何数据）
+                        try:
+                            src = open(path, "rb")
+                        except OSError as e:
+                            print(f"  ⚠️ 无法读取，跳过: {path} ({e})")
+                            return
+                        with src, zipf.open(zinfo, "w", force_zip64=True) as dest:
+                            while True:
+                                data = src.read(READ_BLOCK_SIZE)
+                                if not data:
+                                    break
+                                dest.write(data)
+                    else:
+                        try:
+                            crc, file_size, blocks = future.result()
+                        except OSError as e:
+                            print(f"  ⚠️ 无法读取，跳过: {path} ({e})")
+                            return
+                        _write_precompressed(zipf, zinfo, crc, file_size, blocks)
+                    stats["files"] += 1
+                    stats["total_size"] += zinfo.file_size
+
+                for arcname, path in iter_source_files(sources):
+                    try:
+                        zinfo = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+                    except OSError as e:
+                        print(f"  ⚠️ 无法读取，跳过: {path} ({e})")
+                        continue
+                    zinfo.compress_type = zipfile.ZIP_STORED if path.suffix.lower() in STORED_SUFFIXES \
+                        else zipfile.ZIP_DEFLATED
+                    # 流式压缩大文件时使用（Python 3.13 起为公开属性 compress_level）
+                    if hasattr(zinfo, "compress_level"):
+                        zinfo.compress_level = compression_level
+                    else:
+                        zinfo._compresslevel = compression_level
+                    future: Optional[Any] = None
+                    if zinfo.file_size <= PRECOMPRESS_MAX_SIZE:
+                        future = pool.submit(_compress_file, path, zinfo.compress_type, compression_level)
+                    pending.append((zinfo, path, future))
+                    while len(pending) > workers * 2 or (pending and pending[0][2] is None):
+                        flush_one()
+                while pending:
+                    flush_one()
+        os.replace(partial_path, archive_path)
+    except BaseException:
+        partial_path.unlink(missing_ok=True)
+        raise
+
+    return {"checksum": writer.sha256.hexdigest(), "size": writer.size, **stats}
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量备份块存储
+文件按内容切分成块（gear滚动哈希，用numpy向量化计算），每个块以sha256命名只保存一次；每次备份只写一个清单，
+记录各文件由哪些块组成。(大小, 修改时间, inode) 未变化的文件直接沿用上次的块列表，不重新读取，
+因此每次备份的耗时和新增空间只与变化的内容成正比。恢复时按清单把块重新拼回文件。
+
+    backups/chunks/ab/abcdef...     块（首字节 Z=zlib压缩，R=原样）
+    backups/manifests/backup_<id>.json
+    backups/file_state.json         源文件 -> (大小, 修改时间, inode, 块列表)，用于跳过未变化的文件
+"""
+
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from core.backup_archive import iter_source_files
+
+try:
+    import numpy as np
+except ImportError:
+    # 没有numpy时逐字节计算（切点相同，约慢两个数量级）
+    np = None
+
+# 内容定义分块参数：小于 SINGLE_CHUNK_SIZE 的文件（图片、配置等）整个作为一个块，
+# 只有大文件（数据库、视频）才按内容切分，修改一部分时只产生少量新块
+MIN_CHUNK_SIZE = 256 * 1024
+AVG_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+SINGLE_CHUNK_SIZE = MAX_CHUNK_SIZE
+
+_MASK64 = (1 << 64) - 1
+# gear表：每个字节值对应一个固定的64位随机数
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "little") for i in range(256)]
+# 取哈希高位判断切点，期望在 MIN_CHUNK_SIZE 之后约 (AVG - MIN) 字节处切分
+_CUT_BITS = (AVG_CHUNK_SIZE - MIN_CHUNK_SIZE).bit_length() - 1
+_CUT_MASK = ((1 << _CUT_BITS) - 1) << (64 - _CUT_BITS)
+# 每个位置的哈希只取决于到它为止的64个字节（更早的字节已移出64位）
+_WINDOW = 64
+# 向量化计算哈希时每次处理的字节数（中间数组留在CPU缓存中，比整块计算快数倍）
+_HASH_BLOCK_SIZE = 64 * 1024
+
+MANIFEST_VERSION = 1
+
+
+def _cut_candidates(data, mask: int) -> List[int]:
+    """全部候选切点（哈希满足 mask 的位置），按块向量化计算
+
+    位置 i 的哈希 H(i) = Σ gear[data[i-j]] << j (j < 64)，用倍增计算：
+    H_2w(i) = H_w(i) + (H_w(i-w) << w)，每块只需 log2(64) 轮数组运算。
+    """
+    gear = np.array(_GEAR, dtype=np.uint64)
+    mask = np.uint64(mask)
+    view = np.frombuffer(data, dtype=np.uint8)
+    candidates = []
+    for offset in range(0, len(view), _HASH_BLOCK_SIZE):
+        # 向前多取 _WINDOW-1 个字节，块内第一个位置的哈希也是完整的
+        base = max(0, offset - (_WINDOW - 1))
+        h = gear[view[base:offset + _HASH_BLOCK_SIZE]]
+        width = 1
+        while width < _WINDOW:
+            h[width:] += h[:-width] << np.uint64(width)
+            width *= 2
+        hits = np.flatnonzero((h[offset - base:] & mask) == 0)
+        candidates.extend((hits + offset).tolist())
+    return candidates
+
+
+def _next_cut(data, start: int, end: int, mask: int) -> int:
+    """逐字节查找 [start, end) 中第一个候选切点（没有numpy时使用）"""
+    gear = _GEAR
+    h = 0
+    for i in range(max(0, start - (_WINDOW - 1)), end):
+        h = ((h << 1) + gear[data[i]]) & _MASK64
+        if i >= start and not h & mask:
+            return i
+    return -1
+
+
+def chunk_boundaries(data, min_size: int = MIN_CHUNK_SIZE, max_size: int = MAX_CHUNK_SIZE,
+                     mask: int = _CUT_MASK) -> Iterator[Tuple[int, int]]:
+    """按内容切分，返回 (起始, 结束) 区间；切点只取决于附近64字节的内容，插入数据不影响后面的切点"""
+    length = len(data)
+    candidates = _cut_candidates(data, mask) if np is not None and length > min_size else None
+    start = 0
+    while start < length:
+        end = min(start + max_size, length)
+        cut = end
+        if end - start > min_size:
+            if candidates is not None:
+                index = bisect.bisect_left(candidates, start + min_size)
+                position = candidates[index] if index < len(candidates) and candidates[index] < end else -1
+            else:
+                position = _next_cut(data, start + min_size, end, mask)
+            if position >= 0:
+                cut = position + 1
+        yield start, cut
+        start = cut
+
+
+class ChunkStoreError(Exception):
+    """块缺失或校验失败"""
+
+
+class ChunkStore:
+    """内容寻址的块存储和备份清单"""
+
+    def __init__(self, root: Path, compression_level: int = 6):
+        self.root = Path(root)
+        self.chunks_dir = self.root / "chunks"
+        self.manifests_dir = self.root / "manifests"
+        self.state_path = self.root / "file_state.json"
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._known: Optional[Set[str]] = None
+
+    # ---------- 块 ----------
+
+    def _chunk_path(self, digest: str) -> Path:
+        return self.chunks_dir / digest[:2] / digest
+
+    def _known_chunks(self) -> Set[str]:
+        """已有块的集合（首次使用时扫描一次块目录）"""
+        if self._known is None:
+            known = set()
+            if self.chunks_dir.is_dir():
+                for subdir in os.scandir(self.chunks_dir):
+                    if subdir.is_dir():
+                        known.update(entry.name for entry in os.scandir(subdir.path) if not entry.name.endswith(".tmp"))
+            self._known = known
+        return self._known
+
+    def put_chunk(self, data: bytes, compression_level: Optional[int] = None) -> Tuple[str, int]:
+        """保存块，返回 (sha256, 新写入的字节数)；已存在的块不重复写入"""
+        digest = hashlib.sha256(data).hexdigest()
+        known = self._known_chunks()
+        path = self._chunk_path(digest)
+        # 缓存之外再确认文件还在：块可能已被其它进程回收
+        if digest in known and path.exists():
+            return digest, 0
+        level = self.compression_level if compression_level is None else compression_level
+        compressed = zlib.compress(data, level) if level > 0 else data
+        payload = b"Z" + compressed if len(compressed) < len(data) else b"R" + bytes(data)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        known.add(digest)
+        return digest, len(payload)
+
+    def get_chunk(self, digest: str) -> bytes:
+        path = self._chunk_path(digest)
+        try:
+            payload = path.read_bytes()
+        except FileNotFoundError:
+            raise ChunkStoreError(f"块不存在: {digest}")
+        data = zlib.decompress(payload[1:]) if payload[:1] == b"Z" else payload[1:]
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ChunkStoreError(f"块校验失败: {digest}")
+        return data
+
+    def has_chunk(self, digest: str) -> bool:
+        return digest in self._known_chunks() and self._chunk_path(digest).exists()
+
+    # ---------- 文件 ----------
+
+    def store_file(self, path: Path, compression_level: Optional[int] = None) -> Tuple[List[str], int]:
+        """切分并保存文件，返回 (块列表, 新写入的字节数)"""
+        size = path.stat().st_size
+        if size == 0:
+            return [], 0
+        chunks, written = [], 0
+        with open(path, "rb") as f:
+            if size <= SINGLE_CHUNK_SIZE:
+                digest, stored = self.put_chunk(f.read(), compression_level)
+                return [digest], stored
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for start, end in chunk_boundaries(data):
+                    digest, stored = self.put_chunk(data[start:end], compression_level)
+                    chunks.append(digest)
+                    written += stored
+        return chunks, written
+
+    def write_file(self, chunks: Iterable[str], dest: Path):
+        """按块列表重新拼出文件"""
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        with open(dest, "wb") as f:
+            for digest in chunks:
+                f.write(self.get_chunk(digest))
+
+    # ---------- 备份 ----------
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict[str, Dict[str, Any]]):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.state_path)
+
+    def create_backup(self, metadata: Dict[str, Any], sources: List[Tuple[str, Path]],
+                      compression_level: Optional[int] = None) -> Dict[str, Any]:
+        """
+        创建增量备份并写入清单
+
+        Args:
+            metadata: 备份元数据（backup_id、backup_name等），原样写入清单
+            sources: (清单中的路径前缀, 源文件或目录)，与ZIP备份中的目录结构一致
+
+        Returns:
+            清单（含统计）
+        """
+        with self._lock:
+            state = self._load_state()
+            new_state = {}
+            entries = []
+            stats = {"files": 0, "unchanged_files": 0, "stored_files": 0,
+                     "total_size": 0, "new_chunks": 0, "stored_bytes": 0}
+            known_before = len(self._known_chunks())
+            for arcname, file_path in iter_source_files(sources):
+                try:
+                    st = file_path.stat()
+                except OSError as e:
+                    print(f"  ⚠️ 无法读取，跳过: {file_path} ({e})")
+                    continue
+                key = os.path.abspath(file_path)
+                previous = state.get(key)
+                if previous and previous["size"] == st.st_size and previous["mtime_ns"] == st.st_mtime_ns \
+                        and previous["inode"] == st.st_ino and all(map(self.has_chunk, previous["chunks"])):
+                    chunks = previous["chunks"]
+                    stats["unchanged_files"] += 1
+                else:
+                    chunks, written = self.store_file(file_path, compression_level)
+                    stats["stored_files"] += 1
+                    stats["stored_bytes"] += written
+                new_state[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                                  "inode": st.st_ino, "chunks": chunks}
+                entries.append({"path": arcname, "size": st.st_size,
+                                "mtime": st.st_mtime, "chunks": chunks})
+                stats["files"] += 1
+                stats["total_size"] += st.st_size
+            stats["new_chunks"] = len(self._known_chunks()) - known_before
+
+            manifest = {**metadata, "backup_mode": "incremental", "manifest_version": MANIFEST_VERSION,
+                        "stats": stats, "entries": entries}
+            self.manifests_dir.mkdir(parents=True, exist_ok=True)
+            manifest_path = self.manifest_path(metadata["backup_id"])
+            tmp_path = manifest_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, manifest_path)
+            # 保留其它备份类型记录的文件状态，只更新本次涉及的文件
+            state.update(new_state)
+            self._save_state(state)
+            return manifest
+
+    def manifest_path(self, backup_id: str) -> Path:
+        return self.manifests_dir / f"backup_{backup_id}.json"
+
+    def list_manifests(self) -> List[Path]:
+        return sorted(self.manifests_dir.glob("backup_*.json")) if self.manifests_dir.is_dir() else []
+
+    @staticmethod
+    def read_manifest(manifest_path: Path) -> Dict[str, Any]:
+        return json.loads(Path(manifest_path).read_text(encoding="utf-8"))
+
+    def missing_chunks(self, manifest: Dict[str, Any]) -> List[str]:
+        return sorted({digest for entry in manifest["entries"] for digest in entry["chunks"]
+                       if not self._chunk_path(digest).exists()})
+
+    def restore_to(self, manifest: Dict[str, Any], dest_root: Path, prefix: str = ""):
+        """把清单中（路径以 prefix 开头的）文件拼回 dest_root 下，目录结构与ZIP备份解压后一致"""
+        for entry in manifest["entries"]:
+            if prefix and not entry["path"].startswith(prefix):
+                continue
+            dest = dest_root / entry["path"]
+            self.write_file(entry["chunks"], dest)
+            os.utime(dest, (entry["mtime"], entry["mtime"]))
+
+    def delete_manifests(self, backup_ids: Iterable[str]) -> int:
+        """删除清单并回收不再被任何清单引用的块，返回删除的清单数"""
+        with self._lock:
+            deleted = 0
+            for backup_id in backup_ids:
+                manifest_path = self.manifest_path(backup_id)
+                if manifest_path.exists():
+                    manifest_path.unlink()
+                    deleted += 1
+            if deleted:
+                self._collect_garbage()
+            return deleted
+
+    def _collect_garbage(self) -> int:
+        referenced = set()
+        for manifest_path in self.list_manifests():
+            try:
+                manifest = self.read_manifest(manifest_path)
+            except (OSError, ValueError) as e:
+                # 读不了的清单可能引用任何块，这次不回收
+                print(f"  ⚠️ 清单无法读取，跳过块回收: {manifest_path.name} ({e})")
+                return 0
+            referenced.update(digest for entry in manifest["entries"] for digest in entry["chunks"])
+        # 重新扫描块目录，包含其它进程写入的块
+        self._known = None
+        known = self._known_chunks()
+        removed = 0
+        for digest in list(known - referenced):
+            try:
+                self._chunk_path(digest).unlink()
+            except FileNotFoundError:
+                pass
+            known.discard(digest)
+            removed += 1
+        # 文件状态中引用已删除块的条目下次需要重新读取
+        state = self._load_state()
+        pruned = {key: value for key, value in state.items() if all(map(known.__contains__, value["chunks"]))}
+        if len(pruned) != len(state):
+            self._save_state(pruned)
+        if removed:
+            print(f"  🗑️ 已回收 {removed} 个未引用的块")
+        return removed
+
+    def stored_size(self, manifest: Dict[str, Any]) -> int:
+        """本次备份新写入的字节数（加上清单本身）"""
+        manifest_path = self.manifest_path(manifest["backup_id"])
+        size = manifest_path.stat().st_size if manifest_path.exists() else 0
+        return size + manifest.get("stats", {}).get("stored_bytes", 0)
+
+
+# 每个备份目录共用一个块存储：已有块的缓存和锁必须是同一份，
+# 否则一个实例回收的块在另一个实例的缓存中仍被视为存在
+_chunk_stores: Dict[str, ChunkStore] = {}
+_chunk_stores_lock = threading.Lock()
+
+
+def get_chunk_store(root: Path) -> ChunkStore:
+    """获取备份目录对应的块存储实例"""
+    key = os.path.abspath(root)
+    with _chunk_stores_lock:
+        if key not in _chunk_stores:
+            _chunk_stores[key] = ChunkStore(Path(root))
+        return _chunk_stores[key]
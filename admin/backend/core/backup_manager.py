@@ -15,12 +15,15 @@ import asyncio
 import sqlite3
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-import aiofiles
+from typing import Dict, List, Optional, Any, Tuple
 
 # 添加项目路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from config import settings
+from core.backup_archive import write_archive
+from core.backup_chunk_store import get_chunk_store
+
 class BackupManager:
     """备份管理器"""
     
@@ -91,6 +94,11 @@ class BackupManager:
         # 创建必要目录
         self.backup_dir.mkdir(exist_ok=True)
         self.temp_dir.mkdir(exist_ok=True)
+
+        # 增量备份的块存储（与ZIP备份放在同一目录下）
+        self.chunk_store = get_chunk_store(self.backup_dir)
+        # ZIP备份的并行压缩线程数
+        self.compress_workers = settings.BACKUP_COMPRESS_WORKERS
         
         # 输出环境信息
         print(f"🔧 备份管理器初始化完成")
@@ -101,22 +109,22 @@ class BackupManager:
 
     async def create_backup(self, backup_type: str, backup_name: str, 
                           description: str = "", compression_level: int = 6, 
-                          include_files: bool = True) -> str:
-        """创建备份"""
+                          include_files: bool = True, incremental: bool = False) -> str:
+        """创建备份（incremental=True 时写入块存储，只保存变化的内容）"""
         backup_id = str(uuid.uuid4())
         
         print(f"🔄 开始创建备份: {backup_name} ({backup_id})")
-        print(f"📋 备份类型: {backup_type}")
+        print(f"📋 备份类型: {backup_type}{' (增量)' if incremental else ''}")
+        
+        # 验证备份类型
+        if backup_type not in ["full", "main_service", "admin_service"]:
+            raise ValueError(f"无效的备份类型: {backup_type}")
+        
+        if incremental:
+            return await self._create_incremental_backup(backup_id, backup_type, backup_name, description,
+                                                         compression_level, include_files)
         
         try:
-            # 验证备份类型
-            if backup_type not in ["full", "main_service", "admin_service"]:
-                raise ValueError(f"无效的备份类型: {backup_type}")
-            
-            # 创建临时备份目录
-            temp_backup_path = self.temp_dir / f"{backup_name}_{backup_id}"
-            temp_backup_path.mkdir(parents=True, exist_ok=True)
-            
             # 创建备份元数据
             metadata = {
                 "backup_id": backup_id,
@@ -127,140 +135,104 @@ class BackupManager:
                 "version": "1.0.0"
             }
             
-            # 执行备份
-            if backup_type == "full":
-                await self._backup_main_service(temp_backup_path, include_files)
-                await self._backup_admin_service(temp_backup_path)
-                await self._backup_system_configs(temp_backup_path)
-            elif backup_type == "main_service":
-                await self._backup_main_service(temp_backup_path, include_files)
-            elif backup_type == "admin_service":
-                await self._backup_admin_service(temp_backup_path)
-            
-            # 保存元数据
-            metadata_file = temp_backup_path / "backup_metadata.json"
-            async with aiofiles.open(metadata_file, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(metadata, indent=2, ensure_ascii=False))
-            
-            # 压缩备份
-            archive_path = await self._compress_backup(temp_backup_path, backup_id, compression_level)
-            
-            # 计算校验和
-            checksum = await self._calculate_checksum(archive_path)
-            
-            # 清理临时文件
-            shutil.rmtree(temp_backup_path)
+            # 直接从源文件流式写入归档：在线程中执行，并行压缩，写入时同时计算校验和
+            print("🗜️ 压缩备份文件...")
+            archive_path = self.backup_dir / f"backup_{backup_id}.zip"
+            sources = self._backup_sources(backup_type, include_files)
+            result = await asyncio.to_thread(write_archive, archive_path, sources, metadata,
+                                             compression_level, self.compress_workers)
+            checksum = result["checksum"]
+            self._checksum_path(archive_path).write_text(checksum, encoding="utf-8")
             
             print(f"✅ 备份创建成功: {archive_path}")
-            print(f"📊 备份大小: {archive_path.stat().st_size / (1024*1024):.2f} MB")
+            print(f"📊 共 {result['files']} 个文件 ({result['total_size'] / (1024*1024):.2f} MB)，"
+                  f"备份大小: {result['size'] / (1024*1024):.2f} MB")
             print(f"🔐 校验和: {checksum}")
             
             return backup_id
             
         except Exception as e:
             print(f"❌ 备份创建失败: {e}")
-            # 清理临时文件
-            if temp_backup_path.exists():
-                shutil.rmtree(temp_backup_path)
             raise e
 
-    async def _backup_main_service(self, backup_path: Path, include_files: bool = True):
-        """备份主服务数据"""
-        print("📦 备份主服务数据...")
-        
-        main_service_dir = backup_path / "main_service"
-        main_service_dir.mkdir(exist_ok=True)
-        
+    def _backup_sources(self, backup_type: str, include_files: bool = True) -> List[Tuple[str, Path]]:
+        """备份包含的 (归档路径, 源路径)，目录结构与ZIP备份一致"""
         # 定义文件目录（图片、视频、上传文件等）
         file_dirs = {'outputs', 'uploads', 'thumbnails'}
-        
-        for name, source_path in self.main_service_paths.items():
-            # 如果设置了不包含文件，且当前目录是文件目录，则跳过
-            if not include_files and name in file_dirs:
-                print(f"  ⏭️ 跳过文件目录: {name} (仅备份数据)")
-                continue
-                
-            if source_path.exists():
-                dest_path = main_service_dir / name
-                
-                if source_path.is_file():
-                    dest_path.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(source_path, dest_path)
-                    print(f"  ✅ 已备份文件: {name}")
-                elif source_path.is_dir():
-                    shutil.copytree(source_path, dest_path)
-                    file_count = self._count_files(source_path)
-                    size_mb = self._get_dir_size_mb(source_path)
-                    print(f"  ✅ 已备份目录: {name} ({file_count} 个文件, {size_mb:.2f} MB)")
-            else:
-                print(f"  ⚠️ 路径不存在，跳过: {name}")
+        groups = []
+        if backup_type in ("full", "main_service"):
+            groups.append(("main_service", {name: path for name, path in self.main_service_paths.items()
+                                            if include_files or name not in file_dirs}))
+        if backup_type in ("full", "admin_service"):
+            groups.append(("admin_service", self.admin_service_paths))
+        if backup_type == "full":
+            groups.append(("system", self.system_paths))
 
-    async def _backup_admin_service(self, backup_path: Path):
-        """备份Admin服务数据"""
-        print("📦 备份Admin服务数据...")
-        
-        admin_service_dir = backup_path / "admin_service"
-        admin_service_dir.mkdir(exist_ok=True)
-        
-        for name, source_path in self.admin_service_paths.items():
-            if source_path.exists():
-                dest_path = admin_service_dir / name
-                
-                if source_path.is_file():
-                    dest_path.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(source_path, dest_path)
-                    print(f"  ✅ 已备份文件: {name}")
-                elif source_path.is_dir():
-                    shutil.copytree(source_path, dest_path)
-                    print(f"  ✅ 已备份目录: {name} ({self._count_files(source_path)} 个文件)")
-            else:
-                print(f"  ⚠️ 路径不存在，跳过: {name}")
+        sources = []
+        for group, paths in groups:
+            for name, source_path in paths.items():
+                if source_path.exists():
+                    sources.append((f"{group}/{name}", source_path))
+                else:
+                    print(f"  ⚠️ 路径不存在，跳过: {group}/{name}")
+        return sources
 
-    async def _backup_system_configs(self, backup_path: Path):
-        """备份系统配置"""
-        print("📦 备份系统配置...")
-        
-        system_dir = backup_path / "system"
-        system_dir.mkdir(exist_ok=True)
-        
-        for name, source_path in self.system_paths.items():
-            if source_path.exists():
-                dest_path = system_dir / name
-                
-                if source_path.is_file():
-                    shutil.copy2(source_path, dest_path)
-                    print(f"  ✅ 已备份配置: {name}")
-                elif source_path.is_dir():
-                    shutil.copytree(source_path, dest_path)
-                    print(f"  ✅ 已备份配置目录: {name} ({self._count_files(source_path)} 个文件)")
-            else:
-                print(f"  ⚠️ 配置不存在，跳过: {name}")
+    async def _create_incremental_backup(self, backup_id: str, backup_type: str, backup_name: str,
+                                         description: str, compression_level: int, include_files: bool) -> str:
+        """增量备份：未变化的文件沿用已有的块，只读取和保存变化的内容"""
+        metadata = {
+            "backup_id": backup_id,
+            "backup_name": backup_name,
+            "backup_type": backup_type,
+            "description": description,
+            "created_at": datetime.now().isoformat(),
+            "version": "1.0.0",
+            "include_files": include_files
+        }
+        try:
+            sources = self._backup_sources(backup_type, include_files)
+            # 读文件、切块和压缩都在线程中进行，不阻塞事件循环
+            manifest = await asyncio.to_thread(self.chunk_store.create_backup, metadata, sources, compression_level)
+        except Exception as e:
+            print(f"❌ 增量备份创建失败: {e}")
+            raise e
 
-    async def _compress_backup(self, source_path: Path, backup_id: str, compression_level: int) -> Path:
-        """压缩备份文件"""
-        print("🗜️ 压缩备份文件...")
-        
-        archive_name = f"backup_{backup_id}.zip"
-        archive_path = self.backup_dir / archive_name
-        
-        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=compression_level) as zipf:
-            for root, dirs, files in os.walk(source_path):
-                for file in files:
-                    file_path = Path(root) / file
-                    arcname = file_path.relative_to(source_path)
-                    zipf.write(file_path, arcname)
-        
-        return archive_path
+        stats = manifest["stats"]
+        print(f"✅ 增量备份创建成功: {self.chunk_store.manifest_path(backup_id)}")
+        print(f"📊 共 {stats['files']} 个文件 ({stats['total_size'] / (1024*1024):.2f} MB)，"
+              f"未变化 {stats['unchanged_files']} 个，新增 {stats['new_chunks']} 个块 "
+              f"({stats['stored_bytes'] / (1024*1024):.2f} MB)")
+        return backup_id
+
+    def is_incremental(self, backup_file: Path) -> bool:
+        """备份文件是否为增量备份清单"""
+        return backup_file.suffix == ".json"
+
+    def get_backup_size(self, backup_file: Path) -> int:
+        """备份占用的空间；增量备份只计本次新增的块和清单"""
+        if self.is_incremental(backup_file):
+            return self.chunk_store.stored_size(self.chunk_store.read_manifest(backup_file))
+        return backup_file.stat().st_size
+
+    def _checksum_path(self, backup_file: Path) -> Path:
+        """ZIP备份的校验和文件（创建归档时写入）"""
+        return backup_file.with_suffix(".sha256")
 
     async def _calculate_checksum(self, file_path: Path) -> str:
-        """计算文件校验和"""
-        print("🔐 计算文件校验和...")
+        """计算文件校验和；ZIP备份优先使用创建时记录的校验和"""
+        checksum_path = self._checksum_path(file_path)
+        if not self.is_incremental(file_path) and checksum_path.exists():
+            return checksum_path.read_text(encoding="utf-8").strip()
         
+        print("🔐 计算文件校验和...")
+        return await asyncio.to_thread(self._sha256_file, file_path)
+
+    @staticmethod
+    def _sha256_file(file_path: Path) -> str:
         sha256_hash = hashlib.sha256()
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
                 sha256_hash.update(chunk)
-        
         return sha256_hash.hexdigest()
 
     async def restore_backup(self, backup_id: str, restore_type: str) -> bool:
@@ -283,21 +255,25 @@ class BackupManager:
             temp_restore_path.mkdir(exist_ok=True)
             
             try:
-                # 解压备份文件
-                await self._extract_backup(backup_file, temp_restore_path)
+                # 解压备份文件（增量备份按清单从块存储拼回文件）
+                if self.is_incremental(backup_file):
+                    manifest = self.chunk_store.read_manifest(backup_file)
+                    await asyncio.to_thread(self.chunk_store.restore_to, manifest, temp_restore_path)
+                else:
+                    await asyncio.to_thread(self._extract_backup, backup_file, temp_restore_path)
                 
                 # 停止服务（如果需要）
                 await self._stop_services_if_needed(restore_type)
                 
-                # 执行恢复
+                # 执行恢复（复制文件在线程中进行，不阻塞事件循环）
                 if restore_type == "full":
-                    await self._restore_main_service(temp_restore_path)
-                    await self._restore_admin_service(temp_restore_path)
-                    await self._restore_system_configs(temp_restore_path)
+                    await asyncio.to_thread(self._restore_main_service, temp_restore_path)
+                    await asyncio.to_thread(self._restore_admin_service, temp_restore_path)
+                    await asyncio.to_thread(self._restore_system_configs, temp_restore_path)
                 elif restore_type == "main_service":
-                    await self._restore_main_service(temp_restore_path)
+                    await asyncio.to_thread(self._restore_main_service, temp_restore_path)
                 elif restore_type == "admin_service":
-                    await self._restore_admin_service(temp_restore_path)
+                    await asyncio.to_thread(self._restore_admin_service, temp_restore_path)
                 
                 # 重启服务（如果需要）
                 await self._restart_services_if_needed(restore_type)
@@ -314,14 +290,23 @@ class BackupManager:
             print(f"❌ 备份恢复失败: {e}")
             raise e
 
+    def _read_checksum(self, backup_file: Path) -> Optional[str]:
+        checksum_path = self._checksum_path(backup_file)
+        return checksum_path.read_text(encoding="utf-8").strip() if checksum_path.exists() else None
+
     def _find_backup_file(self, backup_id: str) -> Optional[Path]:
-        """查找备份文件"""
+        """查找备份文件（ZIP或增量备份清单）"""
         for file_path in self.backup_dir.glob(f"backup_{backup_id}.zip"):
             return file_path
+        manifest_path = self.chunk_store.manifest_path(backup_id)
+        if manifest_path.exists():
+            return manifest_path
         return None
 
     async def _validate_backup(self, backup_file: Path) -> bool:
         """验证备份文件"""
+        if self.is_incremental(backup_file):
+            return await asyncio.to_thread(self._validate_manifest, backup_file)
         try:
             with zipfile.ZipFile(backup_file, 'r') as zipf:
                 # 检查是否有元数据文件
@@ -344,14 +329,49 @@ class BackupManager:
             print(f"备份验证失败: {e}")
             return False
 
-    async def _extract_backup(self, backup_file: Path, extract_path: Path):
+    def _validate_manifest(self, manifest_path: Path) -> bool:
+        """验证增量备份清单：必要字段齐全且引用的块都存在"""
+        try:
+            manifest = self.chunk_store.read_manifest(manifest_path)
+            for field in ['backup_id', 'backup_name', 'backup_type', 'created_at', 'entries']:
+                if field not in manifest:
+                    return False
+            missing = self.chunk_store.missing_chunks(manifest)
+            if missing:
+                print(f"备份验证失败: 缺少 {len(missing)} 个块")
+                return False
+            return True
+        except Exception as e:
+            print(f"备份验证失败: {e}")
+            return False
+
+    async def export_archive(self, backup_id: str) -> Optional[Path]:
+        """把增量备份导出为ZIP（用于下载），返回临时文件路径"""
+        manifest_path = self.chunk_store.manifest_path(backup_id)
+        if not manifest_path.exists():
+            return None
+        archive_path = self.temp_dir / f"backup_{backup_id}.zip"
+        await asyncio.to_thread(self._write_manifest_archive, manifest_path, archive_path)
+        return archive_path
+
+    def _write_manifest_archive(self, manifest_path: Path, archive_path: Path):
+        manifest = self.chunk_store.read_manifest(manifest_path)
+        metadata = {key: value for key, value in manifest.items() if key not in ("entries", "stats")}
+        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            zipf.writestr('backup_metadata.json', json.dumps(metadata, indent=2, ensure_ascii=False))
+            for entry in manifest["entries"]:
+                with zipf.open(entry["path"], 'w', force_zip64=True) as dest:
+                    for digest in entry["chunks"]:
+                        dest.write(self.chunk_store.get_chunk(digest))
+
+    def _extract_backup(self, backup_file: Path, extract_path: Path):
         """解压备份文件"""
         print("📂 解压备份文件...")
         
         with zipfile.ZipFile(backup_file, 'r') as zipf:
             zipf.extractall(extract_path)
 
-    async def _restore_main_service(self, restore_path: Path):
+    def _restore_main_service(self, restore_path: Path):
         """恢复主服务数据"""
         print("📦 恢复主服务数据...")
         
@@ -374,7 +394,7 @@ class BackupManager:
                     shutil.copytree(source_path, dest_path)
                     print(f"  ✅ 已恢复目录: {name}")
 
-    async def _restore_admin_service(self, restore_path: Path):
+    def _restore_admin_service(self, restore_path: Path):
         """恢复Admin服务数据"""
         print("📦 恢复Admin服务数据...")
         
@@ -397,7 +417,7 @@ class BackupManager:
                     shutil.copytree(source_path, dest_path)
                     print(f"  ✅ 已恢复目录: {name}")
 
-    async def _restore_system_configs(self, restore_path: Path):
+    def _restore_system_configs(self, restore_path: Path):
         """恢复系统配置"""
         print("📦 恢复系统配置...")
         
@@ -433,28 +453,6 @@ class BackupManager:
         # 根据用户规则，需要确认后再执行
         print("  ℹ️ 服务重启需要管理员确认")
 
-    def _count_files(self, directory: Path) -> int:
-        """统计目录中的文件数量"""
-        try:
-            return sum(1 for _ in directory.rglob('*') if _.is_file())
-        except:
-            return 0
-    
-    def _get_dir_size_mb(self, path: Path) -> float:
-        """获取目录大小（MB）"""
-        if path.is_file():
-            return path.stat().st_size / (1024 * 1024)
-        
-        total_size = 0
-        for file_path in path.rglob('*'):
-            if file_path.is_file():
-                try:
-                    total_size += file_path.stat().st_size
-                except (OSError, PermissionError):
-                    continue
-        
-        return total_size / (1024 * 1024)
-
     async def list_backups(self, page: int = 1, limit: int = 20, backup_type: str = "all") -> Dict[str, Any]:
         """获取备份列表"""
         backups = []
@@ -478,12 +476,13 @@ class BackupManager:
                             "backup_id": backup_id,
                             "backup_name": metadata.get('backup_name', ''),
                             "backup_type": metadata.get('backup_type', ''),
+                            "backup_mode": "full",
                             "file_path": str(backup_file),
                             "backup_size": backup_file.stat().st_size,
                             "status": "completed",
                             "description": metadata.get('description', ''),
                             "created_at": metadata.get('created_at', ''),
-                            "checksum": None  # 可以单独计算
+                            "checksum": self._read_checksum(backup_file)
                         }
                         
                         backups.append(backup_info)
@@ -492,6 +491,27 @@ class BackupManager:
                 print(f"读取备份信息失败 {backup_file}: {e}")
                 continue
         
+        for manifest_path in self.chunk_store.list_manifests():
+            try:
+                metadata = self.chunk_store.read_manifest(manifest_path)
+                if backup_type != "all" and metadata.get('backup_type') != backup_type:
+                    continue
+                backups.append({
+                    "backup_id": metadata['backup_id'],
+                    "backup_name": metadata.get('backup_name', ''),
+                    "backup_type": metadata.get('backup_type', ''),
+                    "backup_mode": "incremental",
+                    "file_path": str(manifest_path),
+                    "backup_size": self.chunk_store.stored_size(metadata),
+                    "status": "completed",
+                    "description": metadata.get('description', ''),
+                    "created_at": metadata.get('created_at', ''),
+                    "checksum": None
+                })
+            except Exception as e:
+                print(f"读取备份信息失败 {manifest_path}: {e}")
+                continue
+        
         # 按创建时间排序
         backups.sort(key=lambda x: x.get('created_at', ''), reverse=True)
         
@@ -512,8 +532,14 @@ class BackupManager:
     async def delete_backup(self, backup_id: str) -> bool:
         """删除备份"""
         backup_file = self._find_backup_file(backup_id)
+        if backup_file and self.is_incremental(backup_file):
+            # 删除清单后回收不再被引用的块
+            await asyncio.to_thread(self.chunk_store.delete_manifests, [backup_id])
+            print(f"✅ 已删除增量备份: {backup_id}")
+            return True
         if backup_file and backup_file.exists():
             backup_file.unlink()
+            self._checksum_path(backup_file).unlink(missing_ok=True)
             print(f"✅ 已删除备份文件: {backup_file}")
             return True
         return False
@@ -530,11 +556,25 @@ class BackupManager:
                 file_modified = datetime.fromtimestamp(backup_file.stat().st_mtime)
                 if file_modified < cutoff_date:
                     backup_file.unlink()
+                    self._checksum_path(backup_file).unlink(missing_ok=True)
                     deleted_count += 1
                     print(f"  🗑️ 已删除过期备份: {backup_file.name}")
                     
             except Exception as e:
                 print(f"删除备份失败 {backup_file}: {e}")
         
+        # 增量备份：先删除过期清单，再统一回收块
+        expired = []
+        for manifest_path in self.chunk_store.list_manifests():
+            try:
+                file_modified = datetime.fromtimestamp(manifest_path.stat().st_mtime)
+                if file_modified < cutoff_date:
+                    expired.append(manifest_path.stem.replace("backup_", ""))
+                    print(f"  🗑️ 已删除过期备份: {manifest_path.name}")
+            except Exception as e:
+                print(f"删除备份失败 {manifest_path}: {e}")
+        if expired:
+            deleted_count += await asyncio.to_thread(self.chunk_store.delete_manifests, expired)
+        
         print(f"✅ 清理完成，共删除 {deleted_count} 个过期备份")
         return deleted_count
@@ -15,6 +15,7 @@ from sqlalchemy.orm import Session
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
+from config import settings
 from database import SessionLocal
 from core.backup_manager import BackupManager
 import models
@@ -169,13 +170,14 @@ class BackupScheduler:
                     backup_type=schedule.backup_type,
                     backup_name=backup_name,
                     description=f"自动备份 - {schedule.schedule_name}",
-                    include_files=True  # 自动备份默认包含文件
+                    include_files=True,  # 自动备份默认包含文件
+                    incremental=settings.BACKUP_SCHEDULED_INCREMENTAL
                 )
                 
                 # 更新备份记录
                 backup_file = self.backup_manager._find_backup_file(actual_backup_id)
                 if backup_file:
-                    backup_record.backup_size = backup_file.stat().st_size
+                    backup_record.backup_size = self.backup_manager.get_backup_size(backup_file)
                     backup_record.file_path = str(backup_file)
                     backup_record.status = "completed"
                     backup_record.completed_at = datetime.now()
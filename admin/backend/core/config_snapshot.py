@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置同步快照
+把 config-sync 接口返回的模型、LoRA、工作流、生图配置物化为一份快照：
+响应体预先序列化，带单调递增的版本号和内容哈希（ETag）。
+基础模型、LoRA、工作流、系统配置提交变更后立即重建（写穿），主服务轮询时大多只拿到304。
+工作流模板另有清单（code、版本、sha256）和单个模板的预压缩响应体，主服务只下载变化的模板。
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import gzip
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from database import SessionLocal
+
+# 变更后需要重建快照的表
+SNAPSHOT_MODELS = (models.BaseModel, models.Lora, models.Workflow, models.SystemConfig)
+# 与原接口一致的查询数量上限
+SNAPSHOT_QUERY_LIMIT = 100
+# 不在排序配置中的条目排在最后
+UNORDERED_SORT_ORDER = 999
+# 快照用到的系统配置，一次查询全部取出
+SNAPSHOT_CONFIG_KEYS = (
+    "image_gen_base_model_order", "image_gen_lora_order", "image_gen_default_size",
+    "image_gen_size_ratios", "image_gen_default_steps", "image_gen_default_count",
+)
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _load_system_configs(db: Session) -> Dict[str, Optional[str]]:
+    """快照用到的系统配置 key -> value（不存在的key不在结果中）"""
+    rows = db.query(models.SystemConfig.key, models.SystemConfig.value).filter(
+        models.SystemConfig.key.in_(SNAPSHOT_CONFIG_KEYS)
+    ).all()
+    return {key: value for key, value in rows}
+
+
+def _load_lora_order(configs: Dict[str, Optional[str]]) -> Dict[str, List[str]]:
+    value = configs.get("image_gen_lora_order")
+    if value:
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return {}
+
+
+def _build_models(db: Session, configs: Dict[str, Optional[str]], generated_at: str) -> Dict[str, Any]:
+    """模型配置（按 image_gen_base_model_order 排序）"""
+    model_order = configs["image_gen_base_model_order"].split(",") if "image_gen_base_model_order" in configs else []
+    # 名称 -> 排序位置，避免在循环中 list.index
+    positions = {name: index + 1 for index, name in reversed(list(enumerate(model_order)))}
+
+    models_list = []
+    for model in crud.get_base_models(db, skip=0, limit=SNAPSHOT_QUERY_LIMIT):
+        models_list.append({
+            "code": model.code,
+            "name": model.name,
+            "display_name": model.display_name,
+            "model_type": model.model_type,
+            "available": model.is_available,
+            "sort_order": positions.get(model.name, UNORDERED_SORT_ORDER),
+            "description": model.description,
+            "unet_file": model.unet_file,
+            "clip_file": model.clip_file,
+            "vae_file": model.vae_file,
+            "created_at": _isoformat(model.created_at),
+            "updated_at": _isoformat(model.updated_at)
+        })
+    models_list.sort(key=lambda item: item["sort_order"])
+
+    return {
+        "models": models_list,
+        "config_source": "backend",
+        "last_updated": generated_at,
+        "total_count": len(models_list)
+    }
+
+
+def _build_loras(db: Session, configs: Dict[str, Optional[str]]) -> List[Dict[str, Any]]:
+    """全部LoRA（按 image_gen_lora_order 中各基础模型的顺序排序）"""
+    lora_order = _load_lora_order(configs)
+    positions = {
+        base_model: {code: index + 1 for index, code in reversed(list(enumerate(codes)))}
+        for base_model, codes in lora_order.items() if isinstance(codes, list)
+    }
+
+    lora_list = []
+    for lora in crud.get_loras(db, skip=0, limit=SNAPSHOT_QUERY_LIMIT):
+        lora_list.append({
+            "code": lora.code,
+            "name": lora.name,
+            "display_name": lora.display_name,
+            "base_model": lora.base_model,
+            "category": lora.category,
+            "available": lora.is_available,
+            "description": lora.description,
+            "file_size": lora.file_size,
+            "preview_image_path": lora.preview_image_path,
+            "created_at": _isoformat(lora.created_at),
+            "updated_at": _isoformat(lora.updated_at),
+            "sort_order": positions.get(lora.base_model, {}).get(lora.code, UNORDERED_SORT_ORDER)
+        })
+    lora_list.sort(key=lambda item: item["sort_order"])
+    return lora_list
+
+
+def loras_response(lora_list: List[Dict[str, Any]], generated_at: str,
+                   base_model: Optional[str] = None) -> Dict[str, Any]:
+    """LoRA配置响应（可按基础模型过滤）"""
+    if base_model:
+        lora_list = [lora for lora in lora_list if lora["base_model"] == base_model]
+    grouped_by_model: Dict[str, List[str]] = {}
+    for lora in lora_list:
+        grouped_by_model.setdefault(lora["base_model"], []).append(lora["name"])
+    return {
+        "loras": lora_list,
+        "grouped_by_model": grouped_by_model,
+        "config_source": "backend",
+        "last_updated": generated_at,
+        "total_count": len(lora_list),
+        "filtered_by_model": base_model
+    }
+
+
+def _build_workflows(db: Session) -> List[Dict[str, Any]]:
+    """全部工作流（含 workflow_json）"""
+    workflow_list = []
+    for workflow in crud.get_workflows(db, skip=0, limit=SNAPSHOT_QUERY_LIMIT):
+        workflow_list.append({
+            "id": workflow.id,
+            "code": workflow.code,  # 不可变的系统标识符
+            "name": workflow.name,  # 可变的显示名称
+            "display_name": workflow.name,
+            "base_model_type": workflow.base_model_type,
+            "workflow_type": workflow.base_model_type,
+            "workflow_json": workflow.workflow_json,
+            "available": workflow.status == "enabled",
+            "description": workflow.description,
+            "created_at": _isoformat(workflow.created_at),
+            "updated_at": _isoformat(workflow.updated_at)
+        })
+    return workflow_list
+
+
+def workflows_response(workflow_list: List[Dict[str, Any]], generated_at: str,
+                       base_model_type: Optional[str] = None,
+                       workflow_type: Optional[str] = None) -> Dict[str, Any]:
+    """工作流配置响应（可按基础模型类型、工作流类型过滤）"""
+    if base_model_type:
+        workflow_list = [item for item in workflow_list if item["base_model_type"] == base_model_type]
+    if workflow_type:
+        workflow_list = [item for item in workflow_list if item["base_model_type"] == workflow_type]
+    return {
+        "workflows": workflow_list,
+        "config_source": "backend",
+        "last_updated": generated_at,
+        "total_count": len(workflow_list),
+        "filtered_by_model": base_model_type,
+        "filtered_by_type": workflow_type
+    }
+
+
+def _load_size_ratios(configs: Dict[str, Optional[str]]) -> List[Any]:
+    """尺寸比例：JSON格式（含像素尺寸的对象列表），旧数据为逗号分隔的比例字符串"""
+    value = configs.get("image_gen_size_ratios")
+    if not value:
+        return ["1:1", "4:3", "3:4", "16:9", "9:16"]
+    try:
+        return json.loads(value)
+    except ValueError:
+        return [ratio.strip() for ratio in value.split(",") if ratio.strip()]
+
+
+def _build_image_gen(configs: Dict[str, Optional[str]], models_section: Dict[str, Any],
+                     generated_at: str) -> Dict[str, Any]:
+    """生图配置（与 /image-gen-config 一致，基础模型排序只包含可用模型）"""
+    base_model_order = [model["name"] for model in models_section["models"] if model["available"]]
+    default_size = configs["image_gen_default_size"].split(",") if "image_gen_default_size" in configs else ["1024", "1024"]
+    size_ratios = _load_size_ratios(configs)
+    default_steps = int(configs["image_gen_default_steps"]) if "image_gen_default_steps" in configs else 20
+    default_count = int(configs["image_gen_default_count"]) if "image_gen_default_count" in configs else 1
+
+    return {
+        "base_model_order": base_model_order,
+        "lora_order": _load_lora_order(configs),
+        "default_size": {
+            "width": int(default_size[0]) if len(default_size) > 0 else 1024,
+            "height": int(default_size[1]) if len(default_size) > 1 else 1024
+        },
+        "size_ratios": size_ratios,
+        "default_steps": default_steps,
+        "default_count": default_count,
+        "config_source": "backend",
+        "last_updated": generated_at
+    }
+
+
+def _template_source(workflow_json: Any) -> Any:
+    """工作流模板内容：以JSON字符串存放的模板先解析，模板接口统一返回JSON对象"""
+    if isinstance(workflow_json, str):
+        try:
+            return json.loads(workflow_json)
+        except ValueError:
+            pass
+    return workflow_json
+
+
+class WorkflowTemplateEntry:
+    """单个工作流模板：序列化后的响应体、gzip压缩体和内容sha256"""
+
+    __slots__ = ("code", "sha256", "version", "body", "gzip_body")
+
+    def __init__(self, code: str, body: bytes, version: int):
+        self.code = code
+        self.sha256 = hashlib.sha256(body).hexdigest()
+        # 模板内容最后一次变化时的快照版本
+        self.version = version
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _build_templates(workflow_list: List[Dict[str, Any]], version: int,
+                     previous: Optional[Dict[str, WorkflowTemplateEntry]]) -> Dict[str, WorkflowTemplateEntry]:
+    """按 code 构建模板条目；内容未变化的模板沿用原条目（版本号和压缩体不变）"""
+    templates = {}
+    for item in workflow_list:
+        body = serialize(_template_source(item["workflow_json"]))
+        entry = (previous or {}).get(item["code"])
+        if entry is None or entry.body != body:
+            entry = WorkflowTemplateEntry(item["code"], body, version)
+        templates[item["code"]] = entry
+    return templates
+
+
+def manifest_response(workflow_list: List[Dict[str, Any]], templates: Dict[str, WorkflowTemplateEntry],
+                      generated_at: str) -> Dict[str, Any]:
+    """工作流清单响应：工作流元数据（不含 workflow_json）及模板的版本和sha256"""
+    manifest = []
+    for item in workflow_list:
+        entry = templates[item["code"]]
+        manifest.append({
+            **{key: value for key, value in item.items() if key != "workflow_json"},
+            "version": entry.version,
+            "sha256": entry.sha256,
+            "size": len(entry.body)
+        })
+    return {
+        "workflows": manifest,
+        "config_source": "backend",
+        "last_updated": generated_at,
+        "total_count": len(manifest)
+    }
+
+
+def serialize(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def content_etag(body: bytes) -> str:
+    """响应体的强ETag（内容哈希）"""
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def _content_hash(payload: Dict[str, Any]) -> str:
+    """不含生成时间的内容哈希"""
+    content = {key: value for key, value in payload.items() if key != "last_updated"}
+    return hashlib.sha256(serialize(content)).hexdigest()[:32]
+
+
+class ConfigSnapshot:
+    """一个版本的配置快照：各接口的响应体已序列化，ETag为内容哈希"""
+
+    __slots__ = ("version", "content_hash", "generated_at", "loras", "workflows", "sections", "bodies", "etags",
+                 "section_versions", "templates", "manifest_body", "manifest_etag")
+
+    def __init__(self, version: int, generated_at: str, loras: List[Dict[str, Any]], workflows: List[Dict[str, Any]]):
+        self.version = version
+        self.generated_at = generated_at
+        # 过滤查询使用的完整列表
+        self.loras = loras
+        self.workflows = workflows
+        self.sections: Dict[str, Dict[str, Any]] = {}
+        self.bodies: Dict[str, bytes] = {}
+        self.etags: Dict[str, str] = {}
+        # 各部分内容最后一次变化时的快照版本
+        self.section_versions: Dict[str, int] = {}
+        self.content_hash = ""
+        # 工作流模板（code -> 条目）和模板清单
+        self.templates: Dict[str, WorkflowTemplateEntry] = {}
+        self.manifest_body = b""
+        self.manifest_etag = ""
+
+    def set_section(self, name: str, payload: Dict[str, Any], body: bytes, etag: str, version: int):
+        self.sections[name] = payload
+        self.bodies[name] = body
+        self.etags[name] = etag
+        self.section_versions[name] = version
+
+    def changed_since(self, since: int) -> List[str]:
+        """版本 since 之后内容发生变化的部分（不含 all）"""
+        return [name for name, version in self.section_versions.items() if name != "all" and version > since]
+
+
+class ConfigSnapshotStore:
+    """配置快照存储：首次访问时构建，配置表提交变更后写穿重建"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._version = 0
+        self._stats = {"builds": 0, "unchanged_builds": 0}
+        # 等待配置变化的长轮询请求：(事件循环, Future)
+        self._waiters: List[tuple] = []
+        self._waiters_lock = threading.Lock()
+
+    def get(self) -> ConfigSnapshot:
+        """当前快照（还没有构建时立即构建）"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.refresh()
+        return snapshot
+
+    async def get_async(self) -> ConfigSnapshot:
+        """当前快照（异步接口使用）：需要构建时在线程池中执行同步查询，不阻塞事件循环"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = await asyncio.to_thread(self.refresh)
+        return snapshot
+
+    def refresh(self) -> ConfigSnapshot:
+        """从数据库重建快照；内容没有变化时保留原版本号"""
+        with self._lock:
+            db = self._session_factory()
+            try:
+                snapshot = self._build(db)
+            finally:
+                db.close()
+            changed = self._snapshot is not snapshot
+            self._snapshot = snapshot
+        if changed:
+            self._notify_waiters()
+        return snapshot
+
+    def invalidate(self):
+        """丢弃当前快照，下次访问时重建（数据库被外部替换时使用，如恢复备份）"""
+        self._snapshot = None
+        self._notify_waiters()
+
+    async def wait_for_change(self, since: int, timeout: float) -> ConfigSnapshot:
+        """等待快照版本超过 since（长轮询），超时返回当前快照
+
+        写穿重建可能发生在线程池中的请求里，通过 call_soon_threadsafe 唤醒等待者。
+        """
+        snapshot = await self.get_async()
+        if snapshot.version != since:
+            return snapshot
+
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._waiters_lock:
+            self._waiters.append(waiter)
+        try:
+            # 注册后再检查一次，避免错过注册前完成的重建
+            if (await self.get_async()).version == since:
+                await asyncio.wait_for(waiter[1], timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._waiters_lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        return await self.get_async()
+
+    def _notify_waiters(self):
+        with self._waiters_lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve_waiter, future)
+
+    def _build(self, db: Session) -> ConfigSnapshot:
+        generated_at = datetime.now().isoformat()
+        configs = _load_system_configs(db)
+        loras = _build_loras(db, configs)
+        workflows = _build_workflows(db)
+        models_section = _build_models(db, configs, generated_at)
+        sections = {
+            "models": models_section,
+            "loras": loras_response(loras, generated_at),
+            "workflows": workflows_response(workflows, generated_at),
+            "image_gen": _build_image_gen(configs, models_section, generated_at),
+        }
+        hashes = {name: _content_hash(payload) for name, payload in sections.items()}
+        previous = self._snapshot
+        if previous is not None and all(previous.etags.get(name) == f'"{value}"' for name, value in hashes.items()):
+            self._stats["unchanged_builds"] += 1
+            return previous
+
+        # 版本号单调递增，并且不小于当前毫秒时间戳（服务重启后也不会回退）
+        self._version = max(self._version + 1, int(time.time() * 1000))
+        self._stats["builds"] += 1
+        snapshot = ConfigSnapshot(self._version, generated_at, loras, workflows)
+        for name, payload in sections.items():
+            etag = f'"{hashes[name]}"'
+            if previous is not None and previous.etags.get(name) == etag:
+                # 内容未变化的部分沿用原响应体（包括 last_updated），ETag保持不变
+                snapshot.set_section(name, previous.sections[name], previous.bodies[name], etag,
+                                     previous.section_versions[name])
+            else:
+                snapshot.set_section(name, payload, serialize(payload), etag, self._version)
+
+        all_payload = {
+            **{name: snapshot.sections[name] for name in ("models", "loras", "workflows", "image_gen")},
+            "config_source": "backend",
+            "last_updated": generated_at,
+            "version": "1.0.0",
+            "snapshot_version": self._version
+        }
+        snapshot.content_hash = _content_hash({name: hashes[name] for name in sorted(hashes)})
+        snapshot.set_section("all", all_payload, serialize(all_payload), f'"{snapshot.content_hash}"', self._version)
+
+        snapshot.templates = _build_templates(workflows, self._version, previous.templates if previous else None)
+        manifest = manifest_response(workflows, snapshot.templates, snapshot.sections["workflows"]["last_updated"])
+        snapshot.manifest_body = serialize(manifest)
+        snapshot.manifest_etag = content_etag(snapshot.manifest_body)
+        print(f"📸 配置快照已更新: version={self._version}, hash={snapshot.content_hash[:12]}")
+        return snapshot
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "content_hash": snapshot.content_hash if snapshot else None,
+            "generated_at": snapshot.generated_at if snapshot else None,
+            "watchers": len(self._waiters),
+            **self._stats
+        }
+
+
+def _resolve_waiter(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+# 全局配置快照存储
+_config_snapshot_store: Optional[ConfigSnapshotStore] = None
+
+
+def get_config_snapshot_store() -> ConfigSnapshotStore:
+    """获取全局配置快照存储实例"""
+    global _config_snapshot_store
+    if _config_snapshot_store is None:
+        _config_snapshot_store = ConfigSnapshotStore()
+    return _config_snapshot_store
+
+
+# =============================================================================
+# 写穿：配置表的变更提交后重建快照
+# =============================================================================
+
+@event.listens_for(Session, "before_flush")
+def _track_config_changes(session: Session, flush_context, instances):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, SNAPSHOT_MODELS):
+            session.info["config_snapshot_stale"] = True
+            return
+
+
+def _refresh_store():
+    try:
+        _config_snapshot_store.refresh()
+    except Exception as e:
+        # 重建失败时丢弃旧快照，下次访问重新构建
+        print(f"⚠️ 配置快照重建失败: {e}")
+        _config_snapshot_store.invalidate()
+
+
+@event.listens_for(Session, "after_commit")
+def _refresh_after_commit(session: Session):
+    if session.info.pop("config_snapshot_stale", False) and _config_snapshot_store is not None:
+        if session.info.get("async_session"):
+            # 异步会话在事件循环中提交，由 refresh_after_async_commit 放到线程池重建
+            session.info["config_snapshot_pending"] = True
+            return
+        _refresh_store()
+
+
+async def refresh_after_async_commit(session) -> None:
+    """异步会话提交后重建快照；重建使用同步查询，在线程池中执行以免阻塞事件循环"""
+    if session.info.pop("config_snapshot_pending", False) and _config_snapshot_store is not None:
+        await asyncio.to_thread(_refresh_store)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop("config_snapshot_stale", None)
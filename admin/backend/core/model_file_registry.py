@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+节点模型文件登记
+主服务节点定期上报各自模型目录的文件清单（大小、修改时间、sha256），admin在内存中按节点保存，
+用于查看哪些节点有哪些文件、每个基础模型在哪些节点上可用，以及同名文件在节点间是否一致。
+admin重启后清单为空，节点在下一次心跳（或索引变化）时重新上报。
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+# 超过该时间未上报的节点标记为过期（主服务默认每5分钟心跳一次）
+NODE_STALE_AFTER = timedelta(minutes=15)
+
+# 模型类型 -> (UNet目录, CLIP目录, VAE目录)，与主服务 core/model_file_index.py 一致
+MODEL_FILE_DIRS = {
+    "flux": ("checkpoints", "clip", "vae"),
+    "qwen": ("diffusion_models", "text_encoders", "vae"),
+    "wan": ("diffusion_models", "text_encoders", "vae"),
+}
+DEFAULT_MODEL_FILE_DIRS = ("checkpoints", "clip", "vae")
+API_MODEL_TYPES = {"gemini", "joycaption"}
+
+
+def model_file_paths(model_type: str, unet_file: Optional[str], clip_file: Optional[str],
+                     vae_file: Optional[str]) -> List[str]:
+    """基础模型需要的文件（相对模型目录的路径），API模型不需要本地文件"""
+    if model_type in API_MODEL_TYPES:
+        return []
+    directories = MODEL_FILE_DIRS.get(model_type, DEFAULT_MODEL_FILE_DIRS)
+    return [f"{directory}/{filename}" for directory, filename in zip(directories, (unet_file, clip_file, vae_file))
+            if filename]
+
+
+class ModelFileRegistry:
+    """各节点上报的模型文件清单（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nodes: Dict[str, Dict[str, Any]] = {}
+
+    def report(self, node: str, payload: Dict[str, Any]) -> int:
+        """保存节点上报的清单（整体替换），返回文件数"""
+        files = payload.get("files") or {}
+        entry = {
+            "node": node,
+            "models_dir": payload.get("models_dir"),
+            "version": payload.get("version"),
+            "files": {path.replace("\\", "/"): info for path, info in files.items()},
+            "reported_at": datetime.utcnow(),
+        }
+        with self._lock:
+            self._nodes[node] = entry
+        return len(files)
+
+    def remove(self, node: str) -> bool:
+        with self._lock:
+            return self._nodes.pop(node, None) is not None
+
+    def _summary(self, entry: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        files = entry["files"].values()
+        return {
+            "node": entry["node"],
+            "models_dir": entry["models_dir"],
+            "version": entry["version"],
+            "file_count": len(entry["files"]),
+            "total_size": sum(info.get("size") or 0 for info in files),
+            "hashed_files": sum(1 for info in files if info.get("sha256")),
+            "reported_at": entry["reported_at"].isoformat(),
+            "stale": now - entry["reported_at"] > NODE_STALE_AFTER,
+        }
+
+    def nodes(self) -> List[Dict[str, Any]]:
+        """各节点概况（不含文件列表）"""
+        now = datetime.utcnow()
+        with self._lock:
+            entries = list(self._nodes.values())
+        return [self._summary(entry, now) for entry in sorted(entries, key=lambda entry: entry["node"])]
+
+    def node_files(self, node: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._nodes.get(node)
+        if entry is None:
+            return None
+        return {**self._summary(entry, datetime.utcnow()), "files": entry["files"]}
+
+    def locate(self, path: str) -> Dict[str, Any]:
+        """哪些节点有该文件；各节点sha256不一致时 consistent 为False"""
+        path = path.replace("\\", "/").strip("/")
+        with self._lock:
+            found = {node: entry["files"][path] for node, entry in self._nodes.items() if path in entry["files"]}
+        hashes = {info.get("sha256") for info in found.values() if info.get("sha256")}
+        return {"path": path, "nodes": found, "consistent": len(hashes) <= 1}
+
+    def base_model_availability(self, base_models: Iterable[Any]) -> List[Dict[str, Any]]:
+        """每个基础模型在各节点上是否具备全部文件，缺少哪些"""
+        with self._lock:
+            node_files = {node: entry["files"] for node, entry in self._nodes.items()}
+        result = []
+        for base_model in base_models:
+            required = model_file_paths(base_model.model_type, base_model.unet_file,
+                                        base_model.clip_file, base_model.vae_file)
+            nodes = {}
+            for node, files in sorted(node_files.items()):
+                missing = [path for path in required if path not in files]
+                nodes[node] = {"available": not missing, "missing": missing}
+            result.append({
+                "name": base_model.name,
+                "display_name": base_model.display_name,
+                "model_type": base_model.model_type,
+                "files": required,
+                "available_nodes": [node for node, status in nodes.items() if status["available"]],
+                "nodes": nodes,
+            })
+        return result
+
+
+# 全局节点模型文件登记
+_model_file_registry: Optional[ModelFileRegistry] = None
+
+
+def get_model_file_registry() -> ModelFileRegistry:
+    """获取全局节点模型文件登记实例"""
+    global _model_file_registry
+    if _model_file_registry is None:
+        _model_file_registry = ModelFileRegistry()
+    return _model_file_registry
@@ -0,0 +1,274 @@
+"""
+异步数据库操作
+config-sync、LoRA、基础模型、工作流路由使用 AsyncSession，查询不阻塞事件循环。
+行为与 crud.py 中的同名函数一致；列表总数使用 COUNT 查询，需要的关联对象一次预加载。
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+import models
+import schemas_legacy as schemas
+from schemas import base_model
+from schemas import lora
+from core.config_snapshot import refresh_after_async_commit
+
+
+def _dump(data, exclude_unset: bool = False) -> Dict[str, Any]:
+    # 使用model_dump()替代dict()以兼容新版本Pydantic
+    try:
+        return data.model_dump(exclude_unset=exclude_unset)
+    except AttributeError:
+        return data.dict(exclude_unset=exclude_unset)
+
+
+async def _commit(db: AsyncSession, instance=None):
+    """提交并在需要时重建配置快照"""
+    await db.commit()
+    if instance is not None:
+        await db.refresh(instance)
+    await refresh_after_async_commit(db)
+
+
+async def _count(db: AsyncSession, model, *conditions) -> int:
+    return await db.scalar(select(func.count()).select_from(model).where(*conditions))
+
+
+# =============================================================================
+# 工作流
+# =============================================================================
+
+def _workflow_conditions(search: str = "", base_model_type: str = None) -> list:
+    conditions = []
+    if search:
+        conditions.append(models.Workflow.name.contains(search) | models.Workflow.description.contains(search))
+    if base_model_type:
+        conditions.append(models.Workflow.base_model_type == base_model_type)
+    return conditions
+
+
+async def get_workflows(db: AsyncSession, skip: int = 0, limit: int = 100, search: str = "",
+                        base_model_type: str = None) -> List[models.Workflow]:
+    query = (select(models.Workflow).where(*_workflow_conditions(search, base_model_type))
+             .order_by(models.Workflow.created_at.desc()).offset(skip).limit(limit))
+    return list(await db.scalars(query))
+
+
+async def get_workflows_count(db: AsyncSession, search: str = "", base_model_type: str = None) -> int:
+    """获取工作流总数（用于分页）"""
+    return await _count(db, models.Workflow, *_workflow_conditions(search, base_model_type))
+
+
+async def get_workflow(db: AsyncSession, workflow_id: int) -> Optional[models.Workflow]:
+    return await db.get(models.Workflow, workflow_id)
+
+
+async def create_workflow(db: AsyncSession, workflow: schemas.WorkflowCreate) -> models.Workflow:
+    db_workflow = models.Workflow(**_dump(workflow))
+    db.add(db_workflow)
+    await _commit(db, db_workflow)
+    return db_workflow
+
+
+async def update_workflow(db: AsyncSession, workflow_id: int, workflow: schemas.WorkflowUpdate):
+    db_workflow = await get_workflow(db, workflow_id)
+    if db_workflow:
+        for key, value in _dump(workflow, exclude_unset=True).items():
+            setattr(db_workflow, key, value)
+        db_workflow.updated_at = datetime.datetime.utcnow()
+        await _commit(db, db_workflow)
+    return db_workflow
+
+
+async def update_workflow_status(db: AsyncSession, workflow_id: int, status: str):
+    """更新工作流状态"""
+    db_workflow = await get_workflow(db, workflow_id)
+    if db_workflow:
+        db_workflow.status = status
+        db_workflow.updated_at = datetime.datetime.utcnow()
+        await _commit(db, db_workflow)
+    return db_workflow
+
+
+async def delete_workflow(db: AsyncSession, workflow_id: int):
+    db_workflow = await get_workflow(db, workflow_id)
+    if db_workflow:
+        await db.delete(db_workflow)
+        await _commit(db)
+    return db_workflow
+
+
+# =============================================================================
+# 基础模型
+# =============================================================================
+
+async def create_base_model(db: AsyncSession, model_create: base_model.BaseModelCreate) -> models.BaseModel:
+    db_base_model = models.BaseModel(**_dump(model_create))
+    db.add(db_base_model)
+    await _commit(db, db_base_model)
+    return db_base_model
+
+
+async def get_base_model(db: AsyncSession, base_model_id: int) -> Optional[models.BaseModel]:
+    return await db.get(models.BaseModel, base_model_id)
+
+
+async def get_base_models(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.BaseModel]:
+    """基础模型列表，关联的工作流（只取id和名称，不加载 workflow_json）一次预加载"""
+    query = (select(models.BaseModel)
+             .options(selectinload(models.BaseModel.workflow).load_only(models.Workflow.id, models.Workflow.name))
+             .order_by(models.BaseModel.id).offset(skip).limit(limit))
+    return list(await db.scalars(query))
+
+
+async def get_base_models_count(db: AsyncSession) -> int:
+    return await _count(db, models.BaseModel)
+
+
+async def sync_image_gen_config_with_available_models(db: AsyncSession):
+    """同步生图配置与可用模型"""
+    try:
+        config = await db.scalar(select(models.SystemConfig)
+                                 .where(models.SystemConfig.key == "image_gen_base_model_order"))
+        if not config:
+            return
+
+        current_order = config.value.split(",") if config.value else []
+        available_names = set(await db.scalars(select(models.BaseModel.name)
+                                               .where(models.BaseModel.is_available == True)))
+
+        # 保留配置中仍然可用的模型
+        new_order = [name for name in current_order if name in available_names]
+        if new_order != current_order:
+            config.value = ",".join(new_order)
+            await _commit(db)
+            print(f"🔄 生图配置已同步，移除了不可用模型: {set(current_order) - set(new_order)}")
+    except Exception as e:
+        print(f"❌ 同步生图配置失败: {e}")
+        await db.rollback()
+
+
+async def update_base_model(db: AsyncSession, base_model_id: int, model_update: base_model.BaseModelUpdate):
+    db_base_model = await get_base_model(db, base_model_id)
+    if db_base_model:
+        # 记录模型可用性是否改变
+        old_availability = db_base_model.is_available
+        for key, value in _dump(model_update, exclude_unset=True).items():
+            setattr(db_base_model, key, value)
+        await _commit(db, db_base_model)
+
+        # 如果模型可用性改变，自动同步生图配置
+        new_availability = db_base_model.is_available
+        if old_availability != new_availability:
+            await sync_image_gen_config_with_available_models(db)
+            print(f"🔄 模型 {db_base_model.name} 可用性从 {old_availability} 变为 {new_availability}，已同步生图配置")
+    return db_base_model
+
+
+async def delete_base_model(db: AsyncSession, base_model_id: int):
+    db_base_model = await get_base_model(db, base_model_id)
+    if db_base_model:
+        await db.delete(db_base_model)
+        await _commit(db)
+    return db_base_model
+
+
+# =============================================================================
+# LoRA
+# =============================================================================
+
+def _lora_conditions(base_model: str = None, name: str = None, category: str = None) -> list:
+    conditions = []
+    if base_model:
+        conditions.append(models.Lora.base_model == base_model)
+    if name:
+        conditions.append(models.Lora.name.contains(name))
+    if category:
+        conditions.append(models.Lora.category == category)
+    return conditions
+
+
+async def get_lora(db: AsyncSession, lora_id: int) -> Optional[models.Lora]:
+    return await db.get(models.Lora, lora_id)
+
+
+async def get_lora_by_name(db: AsyncSession, name: str) -> Optional[models.Lora]:
+    return await db.scalar(select(models.Lora).where(models.Lora.name == name))
+
+
+async def get_loras(db: AsyncSession, skip: int = 0, limit: int = 100, base_model: str = None,
+                    name: str = None, category: str = None) -> List[models.Lora]:
+    # 按创建时间倒序排序
+    query = (select(models.Lora).where(*_lora_conditions(base_model, name, category))
+             .order_by(models.Lora.created_at.desc()).offset(skip).limit(limit))
+    return list(await db.scalars(query))
+
+
+async def get_loras_count(db: AsyncSession, base_model: str = None, name: str = None, category: str = None) -> int:
+    return await _count(db, models.Lora, *_lora_conditions(base_model, name, category))
+
+
+async def get_lora_names(db: AsyncSession) -> set:
+    """数据库中已存在的LoRA文件名（只查询name列）"""
+    return set(await db.scalars(select(models.Lora.name)))
+
+
+async def create_lora(db: AsyncSession, lora_data: lora.LoraCreate) -> models.Lora:
+    db_lora = models.Lora(**_dump(lora_data))
+    db.add(db_lora)
+    await _commit(db, db_lora)
+    return db_lora
+
+
+async def _apply_lora_update(db: AsyncSession, db_lora: Optional[models.Lora], lora_data: lora.LoraUpdate):
+    if db_lora:
+        for key, value in _dump(lora_data, exclude_unset=True).items():
+            setattr(db_lora, key, value)
+        # 手动设置updated_at
+        db_lora.updated_at = datetime.datetime.utcnow()
+        await _commit(db, db_lora)
+    return db_lora
+
+
+async def update_lora(db: AsyncSession, lora_id: int, lora_data: lora.LoraUpdate):
+    return await _apply_lora_update(db, await get_lora(db, lora_id), lora_data)
+
+
+async def update_lora_by_code(db: AsyncSession, lora_code: str, lora_data: lora.LoraUpdate):
+    """通过code字段更新LoRA"""
+    db_lora = await db.scalar(select(models.Lora).where(models.Lora.code == lora_code))
+    return await _apply_lora_update(db, db_lora, lora_data)
+
+
+async def delete_lora(db: AsyncSession, lora_id: int):
+    db_lora = await get_lora(db, lora_id)
+    if db_lora:
+        await db.delete(db_lora)
+        await _commit(db)
+    return db_lora
+
+
+# =============================================================================
+# 配置状态
+# =============================================================================
+
+async def get_config_counts(db: AsyncSession) -> Dict[str, Any]:
+    """各配置表的数量和系统配置的最后更新时间（只执行COUNT/MAX查询）"""
+    system_config_count, last_updated = (await db.execute(
+        select(func.count(), func.max(models.SystemConfig.updated_at)).select_from(models.SystemConfig)
+    )).one()
+    return {
+        "models": await _count(db, models.BaseModel),
+        "loras": await _count(db, models.Lora),
+        "workflows": await _count(db, models.Workflow),
+        "system_configs": system_config_count,
+        "last_updated": last_updated,
+    }
@@ -9,7 +9,8 @@ from jose import JWTError, jwt
 
 import crud
 import schemas_legacy as schemas
-from database import SessionLocal
+# get_async_db 定义在 database.py，路由统一从 dependencies 导入
+from database import SessionLocal, get_async_db
 from config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
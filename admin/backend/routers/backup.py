@@ -10,6 +10,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 from typing import Dict, Any
 import asyncio
@@ -21,6 +22,7 @@ from schemas.backup_schemas import (
     BackupRecordResponse, BackupListResponse, BackupStatusResponse
 )
 from core.backup_manager import BackupManager
+from core.config_snapshot import get_config_snapshot_store
 import models
 import schemas_legacy as schemas
 
@@ -52,7 +54,9 @@ async def create_backup(
             status="pending",
             description=request.description,
             created_by="admin",  # 暂时使用固定用户
-            backup_metadata=f'{{"compression_level": {request.compression_level}, "include_files": {request.include_files}}}'
+            backup_metadata=json.dumps({"compression_level": request.compression_level,
+                                        "include_files": request.include_files,
+                                        "incremental": request.incremental})
         )
         
         db.add(backup_record)
@@ -68,7 +72,8 @@ async def create_backup(
             request.description,
             request.compression_level,
             request.include_files,
-            db
+            db,
+            request.incremental
         )
         
         return {
@@ -88,7 +93,8 @@ async def execute_backup_task(
     description: str,
     compression_level: int,
     include_files: bool,
-    db: Session
+    db: Session,
+    incremental: bool = False
 ):
     """执行备份任务"""
     try:
@@ -109,13 +115,14 @@ async def execute_backup_task(
             backup_name=backup_name,
             description=description,
             compression_level=compression_level,
-            include_files=include_files
+            include_files=include_files,
+            incremental=incremental
         )
         
         # 更新备份记录
         backup_file = backup_manager._find_backup_file(actual_backup_id)
         if backup_file and backup_record:
-            backup_record.backup_size = backup_file.stat().st_size
+            backup_record.backup_size = backup_manager.get_backup_size(backup_file)
             backup_record.file_path = str(backup_file)
             backup_record.status = "completed"
             backup_record.completed_at = datetime.now()
@@ -162,7 +169,8 @@ async def list_backups(
                 created_at=datetime.fromisoformat(backup_info["created_at"].replace('Z', '+00:00')),
                 completed_at=None,
                 checksum=backup_info["checksum"],
-                created_by=None
+                created_by=None,
+                backup_mode=backup_info["backup_mode"]
             )
             backups.append(backup_response)
         
@@ -193,6 +201,16 @@ async def download_backup(
         # 生成下载文件名
         download_filename = f"backup_{backup_id}.zip"
         
+        if backup_manager.is_incremental(backup_file):
+            # 增量备份按清单从块存储导出为ZIP，下载完成后删除临时文件
+            archive_path = await backup_manager.export_archive(backup_id)
+            return FileResponse(
+                path=str(archive_path),
+                filename=download_filename,
+                media_type='application/zip',
+                background=BackgroundTask(os.remove, str(archive_path))
+            )
+        
         return FileResponse(
             path=str(backup_file),
             filename=download_filename,
@@ -280,6 +298,9 @@ async def execute_restore_task(
         
         # 执行恢复
         success = await backup_manager.restore_backup(backup_id, restore_type)
+        if success:
+            # 数据库文件被替换，配置快照需要重建
+            get_config_snapshot_store().invalidate()
         
         # 更新任务状态
         if restore_task:
@@ -344,6 +365,7 @@ async def get_backup_status(
             "running_restores": len(running_restores),
             "backup_directory": str(backup_manager.backup_dir),
             "backup_count": len(list(backup_manager.backup_dir.glob("backup_*.zip")))
+                            + len(backup_manager.chunk_store.list_manifests())
         }
         
         return BackupStatusResponse(
@@ -385,5 +407,6 @@ async def cleanup_old_backups(
         raise HTTPException(status_code=500, detail=f"清理备份失败: {str(e)}")
 
 # 导入必要的模块
+import json
 import uuid
 from datetime import datetime
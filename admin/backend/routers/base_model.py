@@ -3,31 +3,30 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from dependencies import get_db
-import crud
-import models
+from dependencies import get_async_db
+import crud_async
 from schemas import base_model
 
 router = APIRouter()
 
 @router.post("/base_models/", response_model=base_model.BaseModel, summary="创建基础模型")
-def create_base_model(model_create: base_model.BaseModelCreate, db: Session = Depends(get_db)):
-    return crud.create_base_model(db=db, base_model=model_create)
+async def create_base_model(model_create: base_model.BaseModelCreate, db: AsyncSession = Depends(get_async_db)):
+    return await crud_async.create_base_model(db, model_create)
 
 @router.get("/base_models/{base_model_id}", response_model=base_model.BaseModel, summary="获取单个基础模型")
-def read_base_model(base_model_id: int, db: Session = Depends(get_db)):
-    db_base_model = crud.get_base_model(db, base_model_id=base_model_id)
+async def read_base_model(base_model_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_base_model = await crud_async.get_base_model(db, base_model_id)
     if db_base_model is None:
         raise HTTPException(status_code=404, detail="Base model not found")
     return db_base_model
 
 @router.get("/base_models/", summary="获取基础模型列表")
-def read_base_models(page: int = 1, size: int = 10, db: Session = Depends(get_db)):
+async def read_base_models(page: int = 1, size: int = 10, db: AsyncSession = Depends(get_async_db)):
     skip = (page - 1) * size
-    base_models = crud.get_base_models(db, skip=skip, limit=size)
-    total = db.query(models.BaseModel).count()
+    base_models = await crud_async.get_base_models(db, skip=skip, limit=size)
+    total = await crud_async.get_base_models_count(db)
     # 将SQLAlchemy对象转换为字典
     base_models_data = []
     for model in base_models:
@@ -42,6 +41,8 @@ def read_base_models(page: int = 1, size: int = 10, db: Session = Depends(get_db
             "clip_file": model.clip_file,
             "vae_file": model.vae_file,
             # "template_path": model.template_path,  # 已移除，完全数据库化
+            "workflow_id": model.workflow_id,
+            "workflow_name": model.workflow.name if model.workflow else None,
             "preview_image_path": model.preview_image_path,
             "is_available": model.is_available,
             "is_default": model.is_default,
@@ -63,15 +64,15 @@ def read_base_models(page: int = 1, size: int = 10, db: Session = Depends(get_db
     }
 
 @router.put("/base_models/{base_model_id}", response_model=base_model.BaseModel, summary="更新基础模型")
-def update_base_model(base_model_id: int, model_update: base_model.BaseModelUpdate, db: Session = Depends(get_db)):
-    db_base_model = crud.update_base_model(db, base_model_id=base_model_id, base_model=model_update)
+async def update_base_model(base_model_id: int, model_update: base_model.BaseModelUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_base_model = await crud_async.update_base_model(db, base_model_id, model_update)
     if db_base_model is None:
         raise HTTPException(status_code=404, detail="Base model not found")
     return db_base_model
 
 @router.delete("/base_models/{base_model_id}", response_model=base_model.BaseModel, summary="删除基础模型")
-def delete_base_model(base_model_id: int, db: Session = Depends(get_db)):
-    db_base_model = crud.delete_base_model(db, base_model_id=base_model_id)
+async def delete_base_model(base_model_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_base_model = await crud_async.delete_base_model(db, base_model_id)
     if db_base_model is None:
         raise HTTPException(status_code=404, detail="Base model not found")
     return db_base_model
\ No newline at end of file
@@ -5,18 +5,54 @@
 提供配置查询API、支持批量配置获取、配置变更通知
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, List, Any, Optional
 import json
 from datetime import datetime
 
-from dependencies import get_db
-import crud
+from dependencies import get_async_db
+import crud_async
 from schemas import system_config
+from core.config_snapshot import (
+    get_config_snapshot_store, loras_response, workflows_response, serialize, content_etag
+)
+from core.model_file_registry import get_model_file_registry
 
 router = APIRouter()
 
+# 长轮询的默认/最长等待时间（秒）
+WATCH_DEFAULT_TIMEOUT = 30
+WATCH_MAX_TIMEOUT = 120
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 是否包含当前ETag（忽略弱校验前缀）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    candidates = [value[2:] if value.startswith("W/") else value for value in candidates]
+    return "*" in candidates or etag in candidates
+
+
+def _snapshot_response(request: Request, body: bytes, etag: str, version: int) -> Response:
+    """返回快照中预先序列化的响应体；客户端ETag一致时返回空的304"""
+    headers = {"ETag": etag, "X-Config-Version": str(version), "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _serve_section(request: Request, name: str) -> Response:
+    snapshot = await get_config_snapshot_store().get_async()
+    return _snapshot_response(request, snapshot.bodies[name], snapshot.etags[name], snapshot.version)
+
+
+def _serve_filtered(request: Request, payload: Dict[str, Any], version: int) -> Response:
+    body = serialize(payload)
+    return _snapshot_response(request, body, content_etag(body), version)
+
 
 @router.get("/health", summary="配置服务健康检查")
 async def health_check():
@@ -30,44 +66,10 @@ async def health_check():
 
 
 @router.get("/models", summary="获取模型配置")
-async def get_models_config(db: Session = Depends(get_db)):
-    """获取模型配置"""
+async def get_models_config(request: Request):
+    """获取模型配置（配置快照，支持 If-None-Match）"""
     try:
-        # 获取所有基础模型
-        base_models = crud.get_base_models(db, skip=0, limit=100)
-        
-        # 获取模型排序配置
-        model_order_config = crud.get_system_config(db, "image_gen_base_model_order")
-        model_order = model_order_config.value.split(",") if model_order_config else []
-        
-        # 构建模型列表
-        models = []
-        for model in base_models:
-            models.append({
-                "code": model.code,
-                "name": model.name,
-                "display_name": model.display_name,
-                "model_type": model.model_type,
-                "available": model.is_available,
-                "sort_order": model_order.index(model.name) + 1 if model.name in model_order else 999,
-                "description": model.description,
-                "unet_file": model.unet_file,
-                "clip_file": model.clip_file,
-                "vae_file": model.vae_file,
-                # template_path 已移除，完全数据库化
-                "created_at": model.created_at.isoformat() if model.created_at else None,
-                "updated_at": model.updated_at.isoformat() if model.updated_at else None
-            })
-        
-        # 按排序顺序排序
-        models.sort(key=lambda x: x["sort_order"])
-        
-        return {
-            "models": models,
-            "config_source": "backend",
-            "last_updated": datetime.now().isoformat(),
-            "total_count": len(models)
-        }
+        return await _serve_section(request, "models")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取模型配置失败: {str(e)}")
 
@@ -92,227 +94,163 @@ async def get_lora_categories():
 
 @router.get("/loras", summary="获取LoRA配置")
 async def get_loras_config(
-    base_model: Optional[str] = Query(None, description="按基础模型过滤"),
-    db: Session = Depends(get_db)
+    request: Request,
+    base_model: Optional[str] = Query(None, description="按基础模型过滤")
 ):
-    """获取LoRA配置"""
+    """获取LoRA配置（配置快照，支持 If-None-Match）"""
     try:
-        # 获取所有LoRA
-        loras = crud.get_loras(db, skip=0, limit=100)
-        
-        # 获取LoRA排序配置
-        lora_order_config = crud.get_system_config(db, "image_gen_lora_order")
-        lora_order = {}
-        if lora_order_config and lora_order_config.value:
-            try:
-                lora_order = json.loads(lora_order_config.value)
-            except:
-                lora_order = {}
-        
-        # 构建LoRA列表
-        lora_list = []
-        grouped_by_model = {}
-        
-        for lora in loras:
-            # 按基础模型过滤
-            if base_model and lora.base_model != base_model:
-                continue
-            
-            lora_data = {
-                "code": lora.code,
-                "name": lora.name,
-                "display_name": lora.display_name,
-                "base_model": lora.base_model,
-                "category": lora.category,
-                "available": lora.is_available,
-                "description": lora.description,
-                "file_size": lora.file_size,
-                "preview_image_path": lora.preview_image_path,
-                "created_at": lora.created_at.isoformat() if lora.created_at else None,
-                "updated_at": lora.updated_at.isoformat() if lora.updated_at else None
-            }
-            
-            # 应用排序 - 使用code字段
-            if lora.base_model in lora_order and lora.code in lora_order[lora.base_model]:
-                lora_data["sort_order"] = lora_order[lora.base_model].index(lora.code) + 1
-            else:
-                lora_data["sort_order"] = 999
-            
-            lora_list.append(lora_data)
-            
-            # 按模型分组
-            if lora.base_model not in grouped_by_model:
-                grouped_by_model[lora.base_model] = []
-            grouped_by_model[lora.base_model].append(lora.name)
-        
-        # 按排序顺序排序
-        lora_list.sort(key=lambda x: x["sort_order"])
-        
-        return {
-            "loras": lora_list,
-            "grouped_by_model": grouped_by_model,
-            "config_source": "backend",
-            "last_updated": datetime.now().isoformat(),
-            "total_count": len(lora_list),
-            "filtered_by_model": base_model
-        }
+        if not base_model:
+            return await _serve_section(request, "loras")
+        snapshot = await get_config_snapshot_store().get_async()
+        payload = loras_response(snapshot.loras, snapshot.sections["loras"]["last_updated"], base_model)
+        return _serve_filtered(request, payload, snapshot.version)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取LoRA配置失败: {str(e)}")
 
 
 @router.get("/workflows", summary="获取工作流配置")
 async def get_workflows_config(
+    request: Request,
     base_model_type: Optional[str] = Query(None, description="按基础模型类型过滤"),
-    workflow_type: Optional[str] = Query(None, description="按工作流类型过滤"),
-    db: Session = Depends(get_db)
+    workflow_type: Optional[str] = Query(None, description="按工作流类型过滤")
 ):
-    """获取工作流配置"""
+    """获取工作流配置（配置快照，支持 If-None-Match）"""
     try:
-        # 获取所有工作流
-        workflows = crud.get_workflows(db, skip=0, limit=100)
-        
-        # 构建工作流列表
-        workflow_list = []
-        for workflow in workflows:
-            # 按基础模型类型过滤
-            if base_model_type and workflow.base_model_type != base_model_type:
-                continue
-            
-            # 按工作流类型过滤
-            if workflow_type and workflow.base_model_type != workflow_type:
-                continue
-            
-            workflow_data = {
-                "id": workflow.id,
-                "code": workflow.code,  # 不可变的系统标识符
-                "name": workflow.name,  # 可变的显示名称
-                "display_name": workflow.name,  # 使用name作为display_name
-                "base_model_type": workflow.base_model_type,
-                "workflow_type": workflow.base_model_type,  # 使用base_model_type作为workflow_type
-                "workflow_json": workflow.workflow_json,
-                "available": workflow.status == "enabled",  # 根据status判断是否可用
-                "description": workflow.description,
-                "created_at": workflow.created_at.isoformat() if workflow.created_at else None,
-                "updated_at": workflow.updated_at.isoformat() if workflow.updated_at else None
-            }
-            
-            workflow_list.append(workflow_data)
-        
-        return {
-            "workflows": workflow_list,
-            "config_source": "backend",
-            "last_updated": datetime.now().isoformat(),
-            "total_count": len(workflow_list),
-            "filtered_by_model": base_model_type,
-            "filtered_by_type": workflow_type
-        }
+        if not base_model_type and not workflow_type:
+            return await _serve_section(request, "workflows")
+        snapshot = await get_config_snapshot_store().get_async()
+        payload = workflows_response(snapshot.workflows, snapshot.sections["workflows"]["last_updated"],
+                                     base_model_type, workflow_type)
+        return _serve_filtered(request, payload, snapshot.version)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取工作流配置失败: {str(e)}")
 
 
+@router.get("/workflows/manifest", summary="获取工作流模板清单")
+async def get_workflows_manifest(request: Request):
+    """工作流元数据及各模板的版本和sha256（不含 workflow_json，支持 If-None-Match）"""
+    try:
+        snapshot = await get_config_snapshot_store().get_async()
+        return _snapshot_response(request, snapshot.manifest_body, snapshot.manifest_etag, snapshot.version)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取工作流清单失败: {str(e)}")
+
+
+@router.get("/workflows/{code}/template", summary="获取单个工作流模板")
+async def get_workflow_template(request: Request, code: str):
+    """单个工作流的 workflow_json（ETag为内容sha256；客户端接受gzip时返回预压缩的响应体）"""
+    entry = (await get_config_snapshot_store().get_async()).templates.get(code)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"工作流不存在: {code}")
+
+    etag = f'"{entry.sha256}"'
+    headers = {"ETag": etag, "X-Template-Version": str(entry.version), "Cache-Control": "no-cache",
+               "Vary": "Accept-Encoding"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=entry.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
 @router.get("/image-gen", summary="获取生图配置")
-async def get_image_gen_config(db: Session = Depends(get_db)):
-    """获取生图配置"""
+async def get_image_gen_config(request: Request):
+    """获取生图配置（配置快照，支持 If-None-Match）"""
     try:
-        # 获取基础模型排序配置
-        base_model_order_config = crud.get_system_config(db, "image_gen_base_model_order")
-        base_model_order = base_model_order_config.value.split(",") if base_model_order_config else []
-        
-        # 获取LoRA排序配置
-        lora_order_config = crud.get_system_config(db, "image_gen_lora_order")
-        lora_order = {}
-        if lora_order_config and lora_order_config.value:
-            try:
-                lora_order = json.loads(lora_order_config.value)
-            except:
-                lora_order = {}
-        
-        # 获取默认尺寸配置
-        default_size_config = crud.get_system_config(db, "image_gen_default_size")
-        default_size = default_size_config.value.split(",") if default_size_config else ["1024", "1024"]
-        
-        # 获取支持的尺寸比例
-        size_ratios_config = crud.get_system_config(db, "image_gen_size_ratios")
-        size_ratios = size_ratios_config.value.split(",") if size_ratios_config else ["1:1", "4:3", "3:4", "16:9", "9:16"]
-        
-        # 获取默认步数配置
-        default_steps_config = crud.get_system_config(db, "image_gen_default_steps")
-        default_steps = int(default_steps_config.value) if default_steps_config else 20
-        
-        # 获取默认数量配置
-        default_count_config = crud.get_system_config(db, "image_gen_default_count")
-        default_count = int(default_count_config.value) if default_count_config else 1
-        
-        return {
-            "base_model_order": base_model_order,
-            "lora_order": lora_order,
-            "default_size": {
-                "width": int(default_size[0]) if len(default_size) > 0 else 1024,
-                "height": int(default_size[1]) if len(default_size) > 1 else 1024
-            },
-            "size_ratios": size_ratios,
-            "default_steps": default_steps,
-            "default_count": default_count,
-            "config_source": "backend",
-            "last_updated": datetime.now().isoformat()
-        }
+        return await _serve_section(request, "image_gen")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取生图配置失败: {str(e)}")
 
 
 @router.get("/all", summary="获取所有配置")
-async def get_all_configs(db: Session = Depends(get_db)):
-    """获取所有配置"""
+async def get_all_configs(request: Request):
+    """获取所有配置（配置快照，支持 If-None-Match）"""
     try:
-        # 获取各种配置
-        models_config = await get_models_config(db)
-        loras_config = await get_loras_config(db=db)
-        workflows_config = await get_workflows_config(db=db)
-        image_gen_config = await get_image_gen_config(db)
-        
-        return {
-            "models": models_config,
-            "loras": loras_config,
-            "workflows": workflows_config,
-            "image_gen": image_gen_config,
-            "config_source": "backend",
-            "last_updated": datetime.now().isoformat(),
-            "version": "1.0.0"
-        }
+        return await _serve_section(request, "all")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取所有配置失败: {str(e)}")
 
 
+@router.get("/watch", summary="等待配置变化（长轮询）")
+async def watch_config(
+    since: int = Query(0, description="客户端已同步的快照版本，0表示尚未同步"),
+    timeout: float = Query(WATCH_DEFAULT_TIMEOUT, ge=0, le=WATCH_MAX_TIMEOUT, description="最长等待秒数")
+):
+    """配置快照版本超过 since 时立即返回变化的配置类型，否则等待到超时后返回空列表"""
+    snapshot = await get_config_snapshot_store().wait_for_change(since, timeout)
+    if snapshot.version == since:
+        changed = []
+    elif since > snapshot.version:
+        # 客户端版本比服务端新（服务端数据被替换），要求全部重新同步
+        changed = [name for name in snapshot.section_versions if name != "all"]
+    else:
+        changed = snapshot.changed_since(since)
+    return {
+        "version": snapshot.version,
+        "changed": changed,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@router.post("/model-files/{node}", summary="节点上报模型文件清单")
+async def report_model_files(node: str, payload: Dict[str, Any] = Body(...)):
+    """主服务节点上报模型目录的文件清单（整体替换该节点之前的清单）"""
+    if not isinstance(payload.get("files"), dict):
+        raise HTTPException(status_code=400, detail="files 必须是 路径 -> 文件信息 的对象")
+    count = get_model_file_registry().report(node, payload)
+    return {"node": node, "received": count, "timestamp": datetime.now().isoformat()}
+
+
+@router.get("/model-files", summary="各节点模型文件概况")
+async def get_model_files(path: Optional[str] = Query(None, description="查询哪些节点有该文件（相对模型目录的路径）")):
+    """各节点上报的模型文件概况；指定path时返回拥有该文件的节点"""
+    registry = get_model_file_registry()
+    if path:
+        return registry.locate(path)
+    return {"nodes": registry.nodes(), "timestamp": datetime.now().isoformat()}
+
+
+@router.get("/model-files/base-models", summary="基础模型在各节点上的可用性")
+async def get_base_model_file_availability(db: AsyncSession = Depends(get_async_db)):
+    """每个基础模型需要的文件在哪些节点上齐全，缺少哪些"""
+    base_models = await crud_async.get_base_models(db, limit=1000)
+    return {
+        "models": get_model_file_registry().base_model_availability(base_models),
+        "nodes": [node["node"] for node in get_model_file_registry().nodes()],
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@router.get("/model-files/{node}", summary="节点的模型文件清单")
+async def get_node_model_files(node: str):
+    """指定节点上报的完整文件清单"""
+    files = get_model_file_registry().node_files(node)
+    if files is None:
+        raise HTTPException(status_code=404, detail=f"节点未上报模型文件: {node}")
+    return files
+
+
+@router.delete("/model-files/{node}", summary="移除节点的模型文件清单")
+async def delete_node_model_files(node: str):
+    """移除已下线节点的清单（节点仍在运行时会在下一次心跳重新上报）"""
+    if not get_model_file_registry().remove(node):
+        raise HTTPException(status_code=404, detail=f"节点未上报模型文件: {node}")
+    return {"node": node, "removed": True}
+
+
 @router.get("/config-status", summary="获取配置状态")
-async def get_config_status(db: Session = Depends(get_db)):
+async def get_config_status(db: AsyncSession = Depends(get_async_db)):
     """获取配置状态信息"""
     try:
-        # 统计各种配置的数量
-        models_count = len(crud.get_base_models(db, skip=0, limit=1000))
-        loras_count = len(crud.get_loras(db, skip=0, limit=1000))
-        workflows_count = len(crud.get_workflows(db, skip=0, limit=1000))
-        
-        # 获取系统配置数量
-        system_configs = crud.get_system_configs(db, skip=0, limit=1000)
-        system_config_count = len(system_configs)
-        
-        # 获取最后更新时间
-        last_updated = None
-        if system_configs:
-            last_updated = max(
-                config.updated_at for config in system_configs 
-                if config.updated_at
-            ).isoformat()
+        # 统计各种配置的数量（COUNT查询，不加载记录）及系统配置的最后更新时间
+        counts = await crud_async.get_config_counts(db)
+        last_updated = counts.pop("last_updated")
         
         return {
             "status": "healthy",
-            "config_counts": {
-                "models": models_count,
-                "loras": loras_count,
-                "workflows": workflows_count,
-                "system_configs": system_config_count
-            },
-            "last_updated": last_updated,
+            "config_counts": counts,
+            "last_updated": last_updated.isoformat() if last_updated else None,
             "timestamp": datetime.now().isoformat(),
             "version": "1.0.0"
         }
@@ -326,16 +264,21 @@ async def get_config_version():
     return {
         "version": "1.0.0",
         "api_version": "1.0.0",
+        "snapshot": get_config_snapshot_store().get_stats(),
         "supported_formats": ["json"],
         "endpoints": [
             "/health",
             "/models",
             "/loras",
             "/workflows", 
+            "/workflows/manifest",
+            "/workflows/{code}/template",
             "/image-gen",
             "/all",
+            "/watch",
             "/config-status",
-            "/config-version"
+            "/config-version",
+            "/model-files"
         ],
         "timestamp": datetime.now().isoformat()
     }
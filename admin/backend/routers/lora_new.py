@@ -1,10 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-import crud
-import models
+import crud_async
 from schemas import lora
-from dependencies import get_db, get_current_user
+from dependencies import get_async_db, get_current_user
 from config import settings
 import os
 import uuid
@@ -34,13 +33,13 @@ async def get_lora_categories():
 async def upload_lora_preview(
     lora_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     # current_user: models.AdminUser = Depends(get_current_user)  # 暂时移除认证
 ):
     """上传LoRA预览图片"""
     try:
         # 检查LoRA是否存在
-        lora_data = crud.get_lora(db, lora_id)
+        lora_data = await crud_async.get_lora(db, lora_id)
         if not lora_data:
             raise HTTPException(status_code=404, detail="LoRA不存在")
         
@@ -74,7 +73,7 @@ async def upload_lora_preview(
         # 使用正斜杠确保跨平台兼容性
         normalized_path = str(file_path).replace('\\', '/')
         update_data = LoraUpdate(preview_image_path=normalized_path)
-        crud.update_lora(db, lora_id, update_data)
+        await crud_async.update_lora(db, lora_id, update_data)
         
         return {
             "code": 200,
@@ -98,7 +97,7 @@ async def get_loras(
     base_model_filter: Optional[str] = Query(None, description="基础模型过滤"),
     name_filter: Optional[str] = Query(None, description="名称搜索"),
     category_filter: Optional[str] = Query(None, description="分类过滤"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     # current_user: models.AdminUser = Depends(get_current_user)  # 暂时移除认证
 ):
     """获取LoRA列表 - 从数据库获取已管理的记录"""
@@ -108,18 +107,12 @@ async def get_loras(
         import json
         
         # 从数据库获取已管理的LoRA记录
-        db_loras = crud.get_loras(db, skip=(page-1)*page_size, limit=page_size, 
+        db_loras = await crud_async.get_loras(db, skip=(page-1)*page_size, limit=page_size, 
                                  base_model=base_model_filter, name=name_filter, category=category_filter)
         
         # 获取总数
-        total_query = db.query(models.Lora)
-        if base_model_filter:
-            total_query = total_query.filter(models.Lora.base_model == base_model_filter)
-        if name_filter:
-            total_query = total_query.filter(models.Lora.name.contains(name_filter))
-        if category_filter:
-            total_query = total_query.filter(models.Lora.category == category_filter)
-        total = total_query.count()
+        total = await crud_async.get_loras_count(db, base_model=base_model_filter, name=name_filter,
+                                                 category=category_filter)
         
         # 转换为前端需要的格式
         lora_list = []
@@ -155,12 +148,12 @@ async def get_loras(
 @router.get("/loras/{lora_id}", response_model=dict)
 async def get_lora(
     lora_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     # current_user: models.AdminUser = Depends(get_current_user)  # 暂时移除认证
 ):
     """获取单个LoRA详情"""
     try:
-        lora_data = crud.get_lora(db, lora_id)
+        lora_data = await crud_async.get_lora(db, lora_id)
         if not lora_data:
             raise HTTPException(status_code=404, detail="LoRA不存在")
         
@@ -194,12 +187,12 @@ async def get_lora(
 async def update_lora(
     lora_id: int,
     lora_data: lora.LoraUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     # current_user: models.AdminUser = Depends(get_current_user)  # 暂时移除认证
 ):
     """更新LoRA信息"""
     try:
-        updated_lora = crud.update_lora(db, lora_id, lora_data)
+        updated_lora = await crud_async.update_lora(db, lora_id, lora_data)
         if not updated_lora:
             raise HTTPException(status_code=404, detail="LoRA不存在")
         
@@ -234,12 +227,12 @@ async def update_lora(
 async def update_lora_by_code(
     lora_code: str,
     lora_data: lora.LoraUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     # current_user: models.AdminUser = Depends(get_current_user)  # 暂时移除认证
 ):
     """通过code字段更新LoRA信息"""
     try:
-        updated_lora = crud.update_lora_by_code(db, lora_code, lora_data)
+        updated_lora = await crud_async.update_lora_by_code(db, lora_code, lora_data)
         if not updated_lora:
             raise HTTPException(status_code=404, detail="LoRA不存在")
         
@@ -273,12 +266,12 @@ async def update_lora_by_code(
 @router.delete("/loras/{lora_id}", response_model=dict)
 async def delete_lora(
     lora_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     # current_user: models.AdminUser = Depends(get_current_user)  # 暂时移除认证
 ):
     """删除LoRA"""
     try:
-        deleted_lora = crud.delete_lora(db, lora_id)
+        deleted_lora = await crud_async.delete_lora(db, lora_id)
         if not deleted_lora:
             raise HTTPException(status_code=404, detail="LoRA不存在")
         
@@ -295,13 +288,13 @@ async def delete_lora(
 @router.post("/loras", response_model=dict)
 async def create_lora(
     lora_data: lora.LoraCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     # current_user: models.AdminUser = Depends(get_current_user)  # 暂时移除认证
 ):
     """创建LoRA记录"""
     try:
         # 检查名称是否已存在
-        existing_lora = crud.get_lora_by_name(db, lora_data.name)
+        existing_lora = await crud_async.get_lora_by_name(db, lora_data.name)
         if existing_lora:
             # 如果LoRA已存在，更新其信息而不是创建新的
             from schemas.lora import LoraUpdate
@@ -311,7 +304,7 @@ async def create_lora(
                 description=lora_data.description,
                 is_available=lora_data.is_available
             )
-            updated_lora = crud.update_lora(db, existing_lora.id, update_data)
+            updated_lora = await crud_async.update_lora(db, existing_lora.id, update_data)
             
             # 手动序列化数据
             lora_dict = {
@@ -346,7 +339,7 @@ async def create_lora(
             # 如果文件不存在，设置为未管理状态
             lora_data.is_managed = False
         
-        new_lora = crud.create_lora(db, lora_data)
+        new_lora = await crud_async.create_lora(db, lora_data)
         
         # 手动序列化数据
         lora_dict = {
@@ -376,7 +369,7 @@ async def create_lora(
 
 @router.get("/loras/unassociated/list", response_model=dict)
 async def get_unassociated_loras(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     # current_user: models.AdminUser = Depends(get_current_user)  # 暂时移除认证
 ):
     """获取未关联的LoRA文件列表"""
@@ -401,8 +394,7 @@ async def get_unassociated_loras(
                 lora_files.append(file_path.name)
         
         # 获取数据库中已存在的LoRA文件名
-        existing_loras = crud.get_loras(db, skip=0, limit=1000)  # 获取所有LoRA记录
-        existing_names = {lora.name for lora in existing_loras}
+        existing_names = await crud_async.get_lora_names(db)
         
         # 找出未关联的文件，如果没有未关联的文件，则返回所有文件供选择
         unassociated_files = [name for name in lora_files if name not in existing_names]
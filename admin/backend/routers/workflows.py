@@ -3,13 +3,14 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any, Optional
 import json
 
-import crud
+import crud_async
 import schemas_legacy as schemas
-from dependencies import get_db
+from dependencies import get_async_db
 from workflow_validator import WorkflowValidator
 
 router = APIRouter(
@@ -21,61 +22,73 @@ router = APIRouter(
 
 
 @router.post("/", response_model=schemas.Workflow)
-def create_workflow(
-    workflow: schemas.WorkflowCreate, db: Session = Depends(get_db)
+async def create_workflow(
+    workflow: schemas.WorkflowCreate, db: AsyncSession = Depends(get_async_db)
 ):
-    return crud.create_workflow(db=db, workflow=workflow)
+    return await crud_async.create_workflow(db=db, workflow=workflow)
 
 
 @router.get("/")
-def read_workflows(
+async def read_workflows(
     skip: int = 0, 
     limit: int = 100, 
     search: str = "", 
     base_model_type: Optional[str] = Query(None, description="按基础模型类型过滤"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    workflows = crud.get_workflows(db, skip=skip, limit=limit, search=search, base_model_type=base_model_type)
-    total = crud.get_workflows_count(db, search=search, base_model_type=base_model_type)
+    workflows = await crud_async.get_workflows(db, skip=skip, limit=limit, search=search, base_model_type=base_model_type)
+    total = await crud_async.get_workflows_count(db, search=search, base_model_type=base_model_type)
     
-    return {
-        "data": workflows,
+    # 直接序列化，避免 jsonable_encoder 逐层遍历每个 workflow_json
+    data = [{
+        "id": workflow.id,
+        "code": workflow.code,
+        "name": workflow.name,
+        "description": workflow.description,
+        "workflow_json": workflow.workflow_json,
+        "base_model_type": workflow.base_model_type,
+        "status": workflow.status,
+        "created_at": workflow.created_at.isoformat() if workflow.created_at else None,
+        "updated_at": workflow.updated_at.isoformat() if workflow.updated_at else None
+    } for workflow in workflows]
+    return JSONResponse({
+        "data": data,
         "total": total,
         "page": (skip // limit) + 1,
         "pageSize": limit,
         "hasMore": (skip + limit) < total
-    }
+    })
 
 
 
 @router.get("/{workflow_id}", response_model=schemas.Workflow)
-def read_workflow(workflow_id: int, db: Session = Depends(get_db)):
-    workflow = crud.get_workflow(db, workflow_id=workflow_id)
+async def read_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
+    workflow = await crud_async.get_workflow(db, workflow_id=workflow_id)
     if workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
     return workflow
 
 
 @router.put("/{workflow_id}", response_model=schemas.Workflow)
-def update_workflow(
+async def update_workflow(
     workflow_id: int, 
     workflow: schemas.WorkflowUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_workflow = crud.update_workflow(db, workflow_id=workflow_id, workflow=workflow)
+    db_workflow = await crud_async.update_workflow(db, workflow_id=workflow_id, workflow=workflow)
     if db_workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
     return db_workflow
 
 
 @router.patch("/{workflow_id}/status")
-def update_workflow_status(
+async def update_workflow_status(
     workflow_id: int, 
     status_data: Dict[str, str], 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新工作流状态（启用/禁用）"""
-    workflow = crud.get_workflow(db, workflow_id=workflow_id)
+    workflow = await crud_async.get_workflow(db, workflow_id=workflow_id)
     if workflow is None:
         raise HTTPException(status_code=404, detail="工作流未找到")
     
@@ -83,27 +96,27 @@ def update_workflow_status(
     if new_status not in ["enabled", "disabled"]:
         raise HTTPException(status_code=400, detail="状态值必须是 'enabled' 或 'disabled'")
     
-    return crud.update_workflow_status(db=db, workflow_id=workflow_id, status=new_status)
+    return await crud_async.update_workflow_status(db=db, workflow_id=workflow_id, status=new_status)
 
 @router.delete("/{workflow_id}")
-def delete_workflow(workflow_id: int, db: Session = Depends(get_db)):
+async def delete_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
     """删除工作流（只能删除禁用的工作流）"""
-    workflow = crud.get_workflow(db, workflow_id=workflow_id)
+    workflow = await crud_async.get_workflow(db, workflow_id=workflow_id)
     if workflow is None:
         raise HTTPException(status_code=404, detail="工作流未找到")
     
     if workflow.status == "enabled":
         raise HTTPException(status_code=400, detail="只能删除禁用的工作流，请先禁用工作流")
     
-    return crud.delete_workflow(db=db, workflow_id=workflow_id)
+    return await crud_async.delete_workflow(db=db, workflow_id=workflow_id)
 
 
 @router.post("/upload", response_model=schemas.Workflow)
-def upload_workflow_file(
+async def upload_workflow_file(
     file: UploadFile = File(...),
     name: str = None,
     description: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """上传工作流JSON文件"""
     if not file.filename.endswith('.json'):
@@ -111,7 +124,7 @@ def upload_workflow_file(
     
     try:
         # 读取文件内容
-        content = file.file.read().decode('utf-8')
+        content = (await file.read()).decode('utf-8')
         workflow_json = json.loads(content)
         
         # 使用文件名作为名称（如果没有提供名称）
@@ -124,7 +137,7 @@ def upload_workflow_file(
             workflow_json=workflow_json
         )
         
-        return crud.create_workflow(db=db, workflow=workflow_data)
+        return await crud_async.create_workflow(db=db, workflow=workflow_data)
         
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON file")
@@ -133,9 +146,9 @@ def upload_workflow_file(
 
 
 @router.get("/{workflow_id}/download")
-def download_workflow(workflow_id: int, db: Session = Depends(get_db)):
+async def download_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
     """下载工作流JSON文件"""
-    workflow = crud.get_workflow(db, workflow_id=workflow_id)
+    workflow = await crud_async.get_workflow(db, workflow_id=workflow_id)
     if workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
@@ -169,11 +182,11 @@ def validate_workflow(workflow_data: Dict[str, Any]):
         raise HTTPException(status_code=500, detail=f"验证失败: {str(e)}")
 
 @router.post("/upload-and-validate")
-def upload_and_validate_workflow(
+async def upload_and_validate_workflow(
     file: UploadFile = File(...),
     name: str = None,
     description: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """上传工作流文件并验证"""
     if not file.filename.endswith('.json'):
@@ -181,7 +194,7 @@ def upload_and_validate_workflow(
     
     try:
         # 读取文件内容
-        content = file.file.read().decode('utf-8')
+        content = (await file.read()).decode('utf-8')
         workflow_json = json.loads(content)
         
         # 验证工作流
@@ -202,7 +215,7 @@ def upload_and_validate_workflow(
                 description=description,
                 workflow_json=workflow_json
             )
-            workflow = crud.create_workflow(db=db, workflow=workflow_data)
+            workflow = await crud_async.create_workflow(db=db, workflow=workflow_data)
             
             return {
                 "valid": True,
@@ -227,9 +240,9 @@ def upload_and_validate_workflow(
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
 @router.post("/create-from-upload")
-def create_workflow_from_upload(
+async def create_workflow_from_upload(
     workflow_config: Dict[str, Any],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """从上传的工作流创建配置"""
     try:
@@ -246,7 +259,7 @@ def create_workflow_from_upload(
             description=workflow_config["description"],
             workflow_json=workflow_config["workflow_json"]
         )
-        workflow = crud.create_workflow(db=db, workflow=workflow_data)
+        workflow = await crud_async.create_workflow(db=db, workflow=workflow_data)
         
         return {
             "workflow_id": workflow.id,
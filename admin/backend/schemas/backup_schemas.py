@@ -13,6 +13,7 @@ class BackupCreateRequest(BaseModel):
     description: Optional[str] = Field(None, description="备份描述")
     include_files: bool = Field(True, description="是否包含文件")
     compression_level: int = Field(6, description="压缩级别 1-9")
+    incremental: bool = Field(False, description="增量备份：只保存自上次备份以来变化的内容")
 
 class BackupRestoreRequest(BaseModel):
     """恢复备份请求"""
@@ -41,6 +42,7 @@ class BackupRecordResponse(BaseModel):
     completed_at: Optional[datetime]
     checksum: Optional[str]
     created_by: Optional[str]
+    backup_mode: str = "full"  # full: ZIP归档, incremental: 块存储清单
 
     class Config:
         from_attributes = True
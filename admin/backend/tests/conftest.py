@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Admin后端测试公共配置
+
+    cd admin/backend
+    python -m pytest tests -q
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def backup_env(tmp_path, monkeypatch):
+    """在临时目录中运行备份管理器：backups/ 等相对路径都落在 tmp_path 下"""
+    monkeypatch.chdir(tmp_path)
+    source = tmp_path / "src"
+    (source / "outputs").mkdir(parents=True)
+    return source
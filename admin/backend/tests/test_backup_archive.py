@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式备份归档测试
+
+检查：并行预压缩、流式压缩和直接存储三种条目写出的ZIP能通过 ZipFile.testzip() 且内容一致
+（写入预压缩条目依赖 zipfile 的内部步骤，升级Python版本时需要运行）；返回的校验和等于归档文件的sha256；
+列出后被删除的文件只跳过该文件。
+"""
+
+import hashlib
+import json
+import os
+import zipfile
+
+import pytest
+
+from core import backup_archive
+from core.backup_archive import write_archive
+
+
+@pytest.fixture
+def sources(tmp_path):
+    root = tmp_path / "src"
+    (root / "outputs" / "nested").mkdir(parents=True)
+    files = {
+        "main_service/database": b"sqlite" * 50_000,
+        "main_service/outputs/a.png": os.urandom(20_000),
+        "main_service/outputs/nested/b.json": json.dumps({"k": list(range(5000))}).encode(),
+        "main_service/outputs/nested/large.bin": b"large-file-" * 30_000,
+        "main_service/outputs/empty.txt": b"",
+    }
+    (root / "tasks.db").write_bytes(files["main_service/database"])
+    for name, content in files.items():
+        if name.startswith("main_service/outputs/"):
+            (root / "outputs" / name[len("main_service/outputs/"):]).write_bytes(content)
+    return [("main_service/database", root / "tasks.db"), ("main_service/outputs", root / "outputs")], files
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_archive_contents_and_checksum(tmp_path, sources, monkeypatch, workers):
+    # 让 large.bin 走写入线程的流式压缩路径
+    monkeypatch.setattr(backup_archive, "PRECOMPRESS_MAX_SIZE", 200_000)
+    archive_path = tmp_path / "backup_x.zip"
+    result = write_archive(archive_path, sources[0], {"backup_id": "x"}, compression_level=6, workers=workers)
+
+    assert result["checksum"] == hashlib.sha256(archive_path.read_bytes()).hexdigest()
+    assert result["size"] == archive_path.stat().st_size
+    assert result["files"] == len(sources[1])
+    assert not archive_path.with_name(archive_path.name + ".partial").exists()
+
+    with zipfile.ZipFile(archive_path) as zipf:
+        assert zipf.testzip() is None
+        assert json.loads(zipf.read("backup_metadata.json")) == {"backup_id": "x"}
+        for name, content in sources[1].items():
+            assert zipf.read(name) == content
+        assert zipf.getinfo("main_service/outputs/a.png").compress_type == zipfile.ZIP_STORED
+        database = zipf.getinfo("main_service/database")
+        assert database.compress_type == zipfile.ZIP_DEFLATED and database.compress_size < database.file_size
+
+
+def test_file_deleted_after_listing_is_skipped(tmp_path, sources, monkeypatch):
+    compress_file = backup_archive._compress_file
+
+    def deleted_before_read(path, *args):
+        if path.name == "b.json":
+            path.unlink()
+        return compress_file(path, *args)
+
+    monkeypatch.setattr(backup_archive, "_compress_file", deleted_before_read)
+    archive_path = tmp_path / "backup_y.zip"
+    result = write_archive(archive_path, sources[0], {"backup_id": "y"}, workers=2)
+
+    with zipfile.ZipFile(archive_path) as zipf:
+        assert zipf.testzip() is None
+        assert "main_service/outputs/nested/b.json" not in zipf.namelist()
+        assert zipf.read("main_service/outputs/nested/large.bin") == sources[1]["main_service/outputs/nested/large.bin"]
+    assert result["files"] == len(sources[1]) - 1
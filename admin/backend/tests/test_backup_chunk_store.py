@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量备份（块存储）测试
+
+检查：备份后恢复的文件逐字节一致；多次备份之间的去重和未变化文件的复用；
+另一个备份管理器实例删除备份、回收块之后，后续备份不会引用已删除的块；
+向量化切分与逐字节实现的切点一致，吞吐满足要求。
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from core.backup_chunk_store import MAX_CHUNK_SIZE, ChunkStore
+from core.backup_manager import BackupManager
+
+
+def _manager(source):
+    manager = BackupManager()
+    manager.main_service_paths = {"database": source / "tasks.db", "outputs": source / "outputs"}
+    manager.admin_service_paths = {}
+    manager.system_paths = {}
+    return manager
+
+
+def _backup(manager):
+    return asyncio.run(manager.create_backup("main_service", "test", incremental=True))
+
+
+def _stats(manager, backup_id):
+    return manager.chunk_store.read_manifest(manager._find_backup_file(backup_id))["stats"]
+
+
+@pytest.fixture
+def source(backup_env):
+    (backup_env / "tasks.db").write_bytes(os.urandom(MAX_CHUNK_SIZE * 2 + 12345))
+    for i in range(5):
+        (backup_env / "outputs" / f"img{i}.png").write_bytes(os.urandom(50_000))
+    (backup_env / "outputs" / "empty.txt").write_bytes(b"")
+    return backup_env
+
+
+def test_restore_round_trip(source):
+    manager = _manager(source)
+    originals = {path: path.read_bytes() for path in source.rglob("*") if path.is_file()}
+    backup_id = _backup(manager)
+    assert asyncio.run(manager._validate_backup(manager._find_backup_file(backup_id)))
+
+    (source / "tasks.db").write_bytes(b"broken")
+    (source / "outputs" / "img2.png").unlink()
+    assert asyncio.run(manager.restore_backup(backup_id, "main_service"))
+    assert {path: path.read_bytes() for path in source.rglob("*") if path.is_file()} == originals
+
+
+def test_dedup_across_backups(source):
+    manager = _manager(source)
+    first = _stats(manager, _backup(manager))
+    assert first["unchanged_files"] == 0 and first["new_chunks"] >= 3
+
+    second = _stats(manager, _backup(manager))
+    assert second["unchanged_files"] == second["files"] == first["files"]
+    assert second["new_chunks"] == 0 and second["stored_bytes"] == 0
+
+    # 修改大文件中间的一段，只产生少量新块；新增的图片只增加一个块
+    database = bytearray((source / "tasks.db").read_bytes())
+    database[MAX_CHUNK_SIZE:MAX_CHUNK_SIZE + 100] = os.urandom(100)
+    (source / "tasks.db").write_bytes(bytes(database))
+    (source / "outputs" / "new.png").write_bytes(os.urandom(1000))
+    third = _stats(manager, _backup(manager))
+    assert third["stored_files"] == 2 and third["unchanged_files"] == first["files"] - 1
+    assert 2 <= third["new_chunks"] < first["new_chunks"]
+
+
+def test_delete_from_another_manager_keeps_later_backups_restorable(source):
+    scheduler_manager = _manager(source)
+    router_manager = _manager(source)
+    kept = (source / "outputs" / "img0.png").read_bytes()
+
+    # 备份1只包含 img0，备份2不包含它；另一个实例删除备份1后 img0 的块被回收
+    image = {"image": source / "outputs" / "img0.png"}
+    scheduler_manager.main_service_paths = image
+    first = _backup(scheduler_manager)
+    scheduler_manager.main_service_paths = {"database": source / "tasks.db"}
+    _backup(scheduler_manager)
+    assert asyncio.run(router_manager.delete_backup(first))
+
+    # 同一内容再次备份时必须重新写入块
+    scheduler_manager.main_service_paths = image
+    third = _backup(scheduler_manager)
+    assert asyncio.run(scheduler_manager._validate_backup(scheduler_manager._find_backup_file(third)))
+    (source / "outputs" / "img0.png").unlink()
+    router_manager.main_service_paths = image
+    assert asyncio.run(router_manager.restore_backup(third, "main_service"))
+    assert (source / "outputs" / "img0.png").read_bytes() == kept
+
+
+def test_chunk_removed_by_other_process_is_rewritten(tmp_path):
+    # 两个独立实例模拟两个进程：缓存中有的块在磁盘上被删除后会重新写入
+    store = ChunkStore(tmp_path / "backups")
+    other = ChunkStore(tmp_path / "backups")
+    digest, written = store.put_chunk(b"payload" * 100)
+    assert written > 0 and other.has_chunk(digest)
+
+    other._chunk_path(digest).unlink()
+    assert not store.has_chunk(digest)
+    assert store.put_chunk(b"payload" * 100)[1] > 0
+    assert store.get_chunk(digest) == b"payload" * 100
+
+
+def test_vectorised_boundaries_match_and_are_fast(monkeypatch):
+    import time
+
+    import core.backup_chunk_store as chunk_store
+
+    if chunk_store.np is None:
+        pytest.skip("未安装numpy")
+    # 宽松的切点条件：小数据上产生足够多的切点，且跨越多个哈希计算块
+    data = os.urandom(300_000)
+    mask = ((1 << 8) - 1) << 56
+    monkeypatch.setattr(chunk_store, "_HASH_BLOCK_SIZE", 4096)
+    vectorised = list(chunk_store.chunk_boundaries(data, 1000, 20_000, mask))
+    monkeypatch.setattr(chunk_store, "np", None)
+    assert list(chunk_store.chunk_boundaries(data, 1000, 20_000, mask)) == vectorised
+    assert len(vectorised) > 100
+    monkeypatch.undo()
+
+    # 变化的大文件（数据库、视频）切分不能长时间占用GIL：逐字节实现约 7 MB/s
+    data = os.urandom(16 * 1024 * 1024)
+    started = time.perf_counter()
+    boundaries = list(chunk_store.chunk_boundaries(data))
+    throughput = len(data) / (time.perf_counter() - started) / 1024 / 1024
+    assert boundaries[0][0] == 0 and boundaries[-1][1] == len(data)
+    assert throughput > 40, f"{throughput:.1f} MB/s"
@@ -4,21 +4,22 @@
 图像高清放大API路由
 """
 
-import asyncio
 from typing import Dict, Any
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from pathlib import Path
 
-from core.service_manager import get_upscale_manager
+from core.service_manager import get_upscale_manager, get_upscale_batch_manager, get_task_manager
 from models.upscale_schemas import (
     UpscaleRequest, 
     UpscaleResponse, 
     UpscaleStatusResponse,
     UpscaleResult,
+    UpscaleBatchStatusResponse,
     AVAILABLE_ALGORITHMS
 )
 from config.settings import (
-    UPLOAD_DIR, OUTPUT_DIR
+    UPLOAD_DIR, OUTPUT_DIR, UPSCALE_BATCH_MAX_FILES
 )
 
 # 创建路由器
@@ -29,7 +30,9 @@ router = APIRouter(prefix="/api/upscale", tags=["图像放大"])
 async def upscale_image(
     image: UploadFile = File(..., description="要放大的图像文件"),
     scale_factor: int = Form(default=2, ge=1, le=4, description="放大倍数"),
-    algorithm: str = Form(default="ultimate", description="放大算法")
+    algorithm: str = Form(default="ultimate", description="放大算法"),
+    sharpen: bool = Form(default=False, description="插值放大后锐化（lanczos/bicubic/nearest）"),
+    tiled: bool = Form(default=False, description="分块放大：大图切成分块分别放大后拼接（ultimate）")
 ):
     """图像高清放大接口"""
     try:
@@ -66,7 +69,9 @@ async def upscale_image(
         result = await manager.upscale_image(
             str(image_path),
             scale_factor,
-            algorithm
+            algorithm,
+            sharpen,
+            tiled
         )
         
         return UpscaleResponse(
@@ -87,7 +92,9 @@ async def upscale_image(
 async def upscale_image_by_path(
     image_path: str = Form(..., description="要放大的图像文件路径"),
     scale_factor: int = Form(default=2, ge=1, le=4, description="放大倍数"),
-    algorithm: str = Form(default="ultimate", description="放大算法")
+    algorithm: str = Form(default="ultimate", description="放大算法"),
+    sharpen: bool = Form(default=False, description="插值放大后锐化（lanczos/bicubic/nearest）"),
+    tiled: bool = Form(default=False, description="分块放大：大图切成分块分别放大后拼接（ultimate）")
 ):
     """通过文件路径进行图像高清放大接口"""
     try:
@@ -289,7 +296,9 @@ async def upscale_image_by_path(
         result = await manager.upscale_image(
             str(local_image_path),
             scale_factor,
-            algorithm
+            algorithm,
+            sharpen,
+            tiled
         )
         
         return UpscaleResponse(
@@ -315,38 +324,15 @@ async def get_upscale_status(task_id: str):
     try:
         manager = get_upscale_manager()
         
-        # 检查任务结果
-        result = await manager.get_upscale_result(task_id)
+        # 只读取状态，结果由后台跟踪写入数据库
+        result = manager.get_upscale_result(task_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail="放大任务不存在")
         
-        if result:
-            # 任务完成
-            # 将文件路径转换为可访问的URL
-            upscaled_urls = []
-            for image_path in result["upscaled_images"]:
-                # 从完整路径中提取文件名
-                filename = Path(image_path).name
-                # 构建API访问URL
-                upscaled_urls.append(f"/api/upscale/image/{task_id}/{filename}")
-            
-            return UpscaleStatusResponse(
-                task_id=task_id,
-                status="completed",
-                progress=100,
-                result={
-                    "original_image": f"/api/upscale/image/{task_id}/original",
-                    "upscaled_images": upscaled_urls,
-                    "output_dir": result["output_dir"]
-                }
-            )
-        else:
-            # 任务仍在处理中
-            return UpscaleStatusResponse(
-                task_id=task_id,
-                status="processing",
-                progress=50,
-                result=None
-            )
+        return UpscaleStatusResponse(**result)
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取任务状态失败: {str(e)}")
 
@@ -421,13 +407,19 @@ async def cleanup_upscale_task(task_id: str):
         raise HTTPException(status_code=500, detail=f"清理任务失败: {str(e)}")
 
 
-@router.post("/batch")
+@router.post("/batch", response_model=UpscaleBatchStatusResponse)
 async def batch_upscale(
     images: list[UploadFile] = File(..., description="要放大的图像文件列表"),
     scale_factor: int = Form(default=2, ge=1, le=4, description="放大倍数"),
-    algorithm: str = Form(default="lanczos", description="放大算法")
+    algorithm: str = Form(default="lanczos", description="放大算法"),
+    sharpen: bool = Form(default=False, description="插值放大后锐化（lanczos/bicubic/nearest）"),
+    tiled: bool = Form(default=False, description="分块放大：大图切成分块分别放大后拼接（ultimate）")
 ):
-    """批量图像放大接口"""
+    """批量图像放大接口
+    
+    图片逐块保存后立即返回批次，后台按并发窗口逐张放大；
+    通过 /batch/{batch_id}、/batch/{batch_id}/events 查询进度，/batch/{batch_id}/zip 下载结果。
+    """
     try:
         # 验证算法（现在主要支持UltimateSDUpscale）
         if algorithm not in AVAILABLE_ALGORITHMS and algorithm != "ultimate":
@@ -435,63 +427,67 @@ async def batch_upscale(
                 status_code=400, 
                 detail=f"不支持的放大算法: {algorithm}，推荐使用 ultimate"
             )
-        
-        manager = get_upscale_manager()
-        tasks = []
-        
-        for image in images:
-            # 验证文件类型
-            if not image.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                continue
-            
-            # 保存上传的图像
-            upload_dir = Path(UPLOAD_DIR)
-            upload_dir.mkdir(exist_ok=True)
-            
-            image_filename = f"batch_upscale_{image.filename}"
-            image_path = upload_dir / image_filename
-            
-            # 读取并保存文件
-            content = await image.read()
-            with open(image_path, 'wb') as f:
-                f.write(content)
-            
-            # 创建放大任务
-            task = manager.upscale_image(
-                str(image_path),
-                scale_factor,
-                algorithm
+        if len(images) > UPSCALE_BATCH_MAX_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"单个批次最多 {UPSCALE_BATCH_MAX_FILES} 张图片"
             )
-            tasks.append(task)
-        
-        # 并发执行所有任务
-        results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        # 处理结果
-        successful_tasks = []
-        failed_tasks = []
-        
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                failed_tasks.append({
-                    "index": i,
-                    "filename": images[i].filename,
-                    "error": str(result)
-                })
-            else:
-                successful_tasks.append({
-                    "index": i,
-                    "filename": images[i].filename,
-                    "task_id": result["task_id"]
-                })
-        
-        return {
-            "total_images": len(images),
-            "successful_tasks": successful_tasks,
-            "failed_tasks": failed_tasks,
-            "scale_factor": scale_factor,
-            "algorithm": algorithm
-        }
+        batch_manager = get_upscale_batch_manager()
+        result = await batch_manager.create_batch(images, scale_factor, algorithm, sharpen, tiled)
+        return UpscaleBatchStatusResponse(**result)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"批量放大失败: {str(e)}")
+
+
+@router.get("/batch/{batch_id}", response_model=UpscaleBatchStatusResponse)
+async def get_batch_upscale_status(batch_id: str):
+    """获取批量放大进度"""
+    result = get_upscale_batch_manager().get_batch_status(batch_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="批量放大任务不存在")
+    return UpscaleBatchStatusResponse(**result)
+
+
+@router.get("/batch/{batch_id}/events")
+async def stream_batch_upscale_events(batch_id: str):
+    """批量放大进度事件流（Server-Sent Events）"""
+    batch_manager = get_upscale_batch_manager()
+    if batch_manager.get_batch_status(batch_id) is None:
+        raise HTTPException(status_code=404, detail="批量放大任务不存在")
+    return StreamingResponse(
+        batch_manager.stream_events(batch_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/batch/{batch_id}/zip")
+async def download_batch_upscale_zip(batch_id: str):
+    """流式下载批次中已完成的放大结果"""
+    batch_manager = get_upscale_batch_manager()
+    status = batch_manager.get_batch_status(batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="批量放大任务不存在")
+    if status["counts"]["completed"] == 0:
+        raise HTTPException(status_code=404, detail="批次中还没有已完成的图片")
+    return StreamingResponse(
+        batch_manager.iter_zip(batch_id),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="upscale_{batch_id[:8]}.zip"',
+            "X-Batch-Finished": "true" if status["finished"] else "false"
+        }
+    )
+
+
+@router.delete("/batch/{batch_id}")
+async def cancel_batch_upscale(batch_id: str):
+    """取消批量放大中尚未结束的图片"""
+    result = await get_upscale_batch_manager().cancel_batch(batch_id, get_task_manager())
+    if result is None:
+        raise HTTPException(status_code=404, detail="批量放大任务不存在")
+    return result
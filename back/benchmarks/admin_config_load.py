@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+admin 配置接口并发压测脚本
+模拟多个主服务实例同时拉取 config-sync 配置（带/不带 If-None-Match），并混合 admin 管理页面的
+LoRA、基础模型、工作流列表查询，统计各接口 p50/p95/p99 延迟和总吞吐。
+--watchers 可同时保持若干个 /watch 长轮询连接，模拟空闲的主服务实例。
+
+    python admin/backend/main.py &
+    python benchmarks/admin_config_load.py --clients 50 --duration 30 --json-out admin-baseline.json
+    python benchmarks/admin_config_load.py --clients 50 --duration 30 --baseline admin-baseline.json --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from load_generator import percentile
+
+CONFIG_SYNC = "/api/admin/config-sync"
+
+# 请求类型 -> 路径
+ENDPOINTS = {
+    "models": f"{CONFIG_SYNC}/models",
+    "loras": f"{CONFIG_SYNC}/loras",
+    "workflows": f"{CONFIG_SYNC}/workflows",
+    "all": f"{CONFIG_SYNC}/all",
+    "status": f"{CONFIG_SYNC}/config-status",
+    "lora_list": "/api/loras?page=1&page_size=20",
+    "model_list": "/api/base_models/?page=1&size=20",
+    "workflow_list": "/api/admin/workflows/?skip=0&limit=20",
+}
+
+# 默认请求配比（权重）：以主服务的配置拉取为主
+DEFAULT_MIX = "models=4,loras=4,workflows=2,all=2,status=1,lora_list=1,model_list=1,workflow_list=1"
+
+# 主服务会带上ETag做条件请求的接口
+CONDITIONAL_ENDPOINTS = {"models", "loras", "workflows", "all"}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """解析请求配比，例如 models=4,loras=4"""
+    weights = {}
+    for part in mix.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(ENDPOINTS)
+    if unknown:
+        raise ValueError(f"未知的请求类型: {', '.join(sorted(unknown))}")
+    return weights
+
+
+class AdminConfigLoad:
+    """闭环压测器：每个客户端顺序发送请求，收到响应后立即发送下一个"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.base_url = args.base_url.rstrip("/")
+        self.mix = parse_mix(args.mix)
+        self.latencies: Dict[str, List[float]] = {name: [] for name in self.mix}
+        self.errors: Dict[str, int] = {name: 0 for name in self.mix}
+        self.not_modified = 0
+        self.watch_responses = 0
+
+    async def _request(self, session: aiohttp.ClientSession, name: str, etags: Dict[str, str]):
+        headers = {}
+        if self.args.etag and name in etags:
+            headers["If-None-Match"] = etags[name]
+        start = time.perf_counter()
+        ok = False
+        try:
+            async with session.get(f"{self.base_url}{ENDPOINTS[name]}", headers=headers) as response:
+                await response.read()
+                ok = response.status in (200, 304)
+                if response.status == 304:
+                    self.not_modified += 1
+                elif ok and name in CONDITIONAL_ENDPOINTS and response.headers.get("ETag"):
+                    etags[name] = response.headers["ETag"]
+        except Exception as e:
+            if self.args.verbose:
+                print(f"❌ {name} 请求异常: {e}")
+        self.latencies[name].append((time.perf_counter() - start) * 1000)
+        if not ok:
+            self.errors[name] += 1
+
+    async def _client(self, session: aiohttp.ClientSession, deadline: float):
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        # 每个客户端各自记录ETag，相当于一个主服务实例
+        etags: Dict[str, str] = {}
+        while time.perf_counter() < deadline:
+            await self._request(session, random.choices(names, weights=weights)[0], etags)
+
+    async def _watcher(self, session: aiohttp.ClientSession, deadline: float):
+        since = 0
+        while time.perf_counter() < deadline:
+            timeout = max(1.0, min(30.0, deadline - time.perf_counter()))
+            try:
+                async with session.get(f"{self.base_url}{CONFIG_SYNC}/watch",
+                                       params={"since": since, "timeout": timeout}) as response:
+                    since = (await response.json()).get("version", since)
+                    self.watch_responses += 1
+            except Exception as e:
+                if self.args.verbose:
+                    print(f"❌ watch 请求异常: {e}")
+                await asyncio.sleep(1)
+
+    async def run(self) -> Dict[str, Any]:
+        timeout = aiohttp.ClientTimeout(total=max(self.args.request_timeout, 40))
+        connector = aiohttp.TCPConnector(limit=self.args.clients + self.args.watchers)
+
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            print(f"🚀 开始压测: {self.base_url} clients={self.args.clients} watchers={self.args.watchers} "
+                  f"duration={self.args.duration}s etag={self.args.etag}")
+            start = time.perf_counter()
+            deadline = start + self.args.duration
+            watchers = [asyncio.create_task(self._watcher(session, deadline)) for _ in range(self.args.watchers)]
+            await asyncio.gather(*(self._client(session, deadline) for _ in range(self.args.clients)))
+            end = time.perf_counter()
+            for task in watchers:
+                task.cancel()
+            await asyncio.gather(*watchers, return_exceptions=True)
+
+        return self._build_report(end - start)
+
+    def _build_report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for name, values in self.latencies.items():
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": max(values) if values else None,
+            }
+        all_values = [value for values in self.latencies.values() for value in values]
+        return {
+            "config": {
+                "base_url": self.base_url,
+                "clients": self.args.clients,
+                "watchers": self.args.watchers,
+                "duration": self.args.duration,
+                "mix": self.args.mix,
+                "etag": self.args.etag,
+            },
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(len(all_values) / max(elapsed, 1e-6), 1),
+            "not_modified": self.not_modified,
+            "watch_responses": self.watch_responses,
+            "overall": {
+                "requests": len(all_values),
+                "errors": sum(self.errors.values()),
+                "p50_ms": percentile(all_values, 50),
+                "p95_ms": percentile(all_values, 95),
+                "p99_ms": percentile(all_values, 99),
+                "max_ms": max(all_values) if all_values else None,
+            },
+            "endpoints": endpoints,
+        }
+
+
+def print_report(report: Dict[str, Any]):
+    def fmt(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    print("")
+    print("📊 压测结果")
+    print(f"   时长: {report['seconds']}s  吞吐: {report['requests_per_second']} 请求/秒  "
+          f"304: {report['not_modified']}  watch响应: {report['watch_responses']}")
+    print(f"   {'接口':<14}{'请求数':>8}{'错误':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for name, stats in [*report["endpoints"].items(), ("overall", report["overall"])]:
+        print(f"   {name:<14}{stats['requests']:>8}{stats['errors']:>6}{fmt(stats['p50_ms']):>10}"
+              f"{fmt(stats['p95_ms']):>10}{fmt(stats['p99_ms']):>10}{fmt(stats['max_ms']):>10}")
+
+
+def compare_with_baseline(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """与基线对比，返回回归项列表"""
+    regressions = []
+    current_items = {**report["endpoints"], "overall": report["overall"]}
+    baseline_items = {**baseline.get("endpoints", {}), "overall": baseline.get("overall", {})}
+    for name, stats in current_items.items():
+        base = baseline_items.get(name)
+        if not base:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            current, previous = stats.get(key), base.get(key)
+            if current is not None and previous and current > previous * (1 + threshold):
+                regressions.append(f"{name} {key}: {previous:.1f} -> {current:.1f}")
+
+    previous_rps = baseline.get("requests_per_second")
+    if previous_rps and report["requests_per_second"] < previous_rps * (1 - threshold):
+        regressions.append(f"requests_per_second: {previous_rps} -> {report['requests_per_second']}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="admin 配置接口并发压测")
+    parser.add_argument("--base-url", default="http://localhost:8888", help="admin后端地址")
+    parser.add_argument("--clients", type=int, default=50, help="并发客户端数（模拟的主服务实例数）")
+    parser.add_argument("--watchers", type=int, default=0, help="同时保持的 /watch 长轮询连接数")
+    parser.add_argument("--duration", type=float, default=30.0, help="压测时长（秒）")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"请求配比，可选: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--etag", action="store_true", help="配置拉取带上次的ETag（If-None-Match）")
+    parser.add_argument("--request-timeout", type=float, default=30.0, help="单个请求超时（秒）")
+    parser.add_argument("--json-out", help="将结果写入JSON文件")
+    parser.add_argument("--baseline", help="基线结果JSON文件，用于回归检测")
+    parser.add_argument("--threshold", type=float, default=0.2, help="回归阈值（相对变化比例）")
+    parser.add_argument("--verbose", action="store_true", help="打印请求异常")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.clients <= 0:
+        print("❌ clients 必须大于0")
+        sys.exit(2)
+
+    report = asyncio.run(AdminConfigLoad(args).run())
+    print_report(report)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存: {args.json_out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.threshold)
+        if regressions:
+            print(f"❌ 检测到性能回归（阈值 {args.threshold:.0%}）:")
+            for item in regressions:
+                print(f"   - {item}")
+            sys.exit(1)
+        print(f"✅ 未检测到性能回归（阈值 {args.threshold:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作流构建基准测试的公共夹具
+
+- 在导入 config.settings 之前把 ComfyUI 目录指向临时目录
+- 用 back/workflows 下的模板构造 admin 工作流配置，替换 requests.get 和配置客户端
+- 记录每个用例的内存分配，并与基线对比
+"""
+
+import copy
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import pytest
+
+BACK_DIR = Path(__file__).resolve().parent.parent
+WORKFLOWS_DIR = BACK_DIR / "workflows"
+
+# 必须在导入任何 core/config 模块之前设置
+_WORK_DIR = Path(tempfile.mkdtemp(prefix="workflow-bench-"))
+for _name, _sub in (
+    ("COMFYUI_OUTPUT_DIR", "comfyui/output/yeepay"),
+    ("COMFYUI_MAIN_OUTPUT_DIR", "comfyui/output"),
+    ("COMFYUI_INPUT_DIR", "comfyui/input"),
+    ("COMFYUI_MODELS_DIR", "comfyui/models"),
+    ("COMFYUI_LORAS_DIR", "comfyui/models/loras"),
+):
+    os.environ[_name] = str(_WORK_DIR / _sub)
+os.environ["ADMIN_BACKEND_URL"] = "http://admin.benchmark.invalid"
+os.environ["BACKEND_CONFIG_URL"] = "http://admin.benchmark.invalid"
+os.environ["WORKFLOW_TEMPLATE_CACHE_DIR"] = str(_WORK_DIR / "workflow_templates")
+for _sub in ("comfyui/output/yeepay", "comfyui/input/clipspace", "uploads"):
+    (_WORK_DIR / _sub).mkdir(parents=True, exist_ok=True)
+
+if str(BACK_DIR) not in sys.path:
+    sys.path.insert(0, str(BACK_DIR))
+
+
+# =============================================================================
+# admin 配置夹具
+# =============================================================================
+
+BENCH_MODELS = [
+    {"code": "flux1-dev", "name": "flux1-dev", "display_name": "FLUX.1 Kontext", "model_type": "flux",
+     "unet_file": "flux1-dev-kontext_fp8_scaled.safetensors", "clip_file": "clip_l.safetensors", "vae_file": "ae.safetensors"},
+    {"code": "qwen-image", "name": "qwen-image", "display_name": "Qwen Image", "model_type": "qwen",
+     "unet_file": "qwen_image_fp8_e4m3fn.safetensors", "clip_file": "qwen_2.5_vl_7b_fp8_scaled.safetensors",
+     "vae_file": "qwen_image_vae.safetensors"},
+    {"code": "wan2.2-video", "name": "wan2.2-video", "display_name": "Wan2.2 Video", "model_type": "wan",
+     "unet_file": "wan2.2_ti2v_5B_fp16.safetensors", "clip_file": "umt5_xxl_fp8_e4m3fn_scaled.safetensors",
+     "vae_file": "wan2.2_vae.safetensors"},
+    {"code": "gemini-image", "name": "gemini-image", "display_name": "Nano Banana", "model_type": "gemini",
+     "unet_file": "", "clip_file": "", "vae_file": ""},
+    {"code": "seedream4", "name": "seedream4", "display_name": "Seedream4", "model_type": "seedream4",
+     "unet_file": "", "clip_file": "", "vae_file": ""},
+    {"code": "joycaption", "name": "joycaption", "display_name": "JoyCaption", "model_type": "joycaption",
+     "unet_file": "", "clip_file": "", "vae_file": ""},
+]
+
+# 与 admin/backend/init_seedream4.py 写入数据库的模板一致
+SEEDREAM4_TEMPLATE = {
+    "11": {"inputs": {"image": "generated-image-1758020573908.png"}, "class_type": "LoadImage",
+           "_meta": {"title": "加载图像"}},
+    "12": {"inputs": {"filename_prefix": "ComfyUI", "images": ["22", 0]}, "class_type": "SaveImage",
+           "_meta": {"title": "保存图像"}},
+    "22": {"inputs": {"prompt": "图1与图2合并", "size_preset": "2304x1728 (4:3)", "width": 2048, "height": 2048,
+                      "seed": 559718440, "image_input": ["24", 0]},
+           "class_type": "Seedream4_VolcEngine", "_meta": {"title": "Seedream4 Volcano Engine"}},
+    "24": {"inputs": {"image1": ["11", 0], "image2": ["25", 0]}, "class_type": "ImageBatch",
+           "_meta": {"title": "图像组合批处理"}},
+    "25": {"inputs": {"image": "generated-image-1758020573908.png"}, "class_type": "LoadImage",
+           "_meta": {"title": "加载图像"}},
+}
+
+
+def _load_json(relative_path: str) -> Dict[str, Any]:
+    with open(WORKFLOWS_DIR / relative_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _lora_stack_node(model_ref: list, clip_ref: list) -> Dict[str, Any]:
+    inputs = {"model": model_ref, "clip": clip_ref}
+    for i in range(1, 5):
+        inputs[f"lora_{i:02d}"] = "None"
+        inputs[f"strength_{i:02d}"] = 1.0
+    return {"inputs": inputs, "class_type": "Lora Loader Stack (rgthree)", "_meta": {"title": "Lora Loader Stack"}}
+
+
+def _build_flux_templates() -> Dict[str, Dict[str, Any]]:
+    """仓库中没有 admin 里的 Flux 模板，按 FluxWorkflow 的约定（节点74 LoRA堆栈、节点9 保存、{{...}}变量）改造 flux1 样例"""
+    text_to_image = _load_json("flux1/flux1_vector_workflow.json")
+    text_to_image["6"]["inputs"]["text"] = "{{description}}"
+    text_to_image["74"] = _lora_stack_node(["12", 0], ["11", 0])
+
+    image_to_image = _load_json("flux1/flux_kontext_dev_basic_2.json")
+    image_to_image["6"]["inputs"]["text"] = "{{description}}"
+    for node_id in ("142", "147"):
+        image_to_image[node_id] = {"inputs": {"image": "{{reference_image}}"}, "class_type": "LoadImage",
+                                   "_meta": {"title": "加载图像"}}
+    image_to_image["9"] = image_to_image.pop("136")
+    image_to_image["74"] = _lora_stack_node(["37", 0], ["38", 0])
+
+    return {
+        "flux_text_to_image_workflow": text_to_image,
+        "flux_image_to_image_workflow": image_to_image,
+    }
+
+
+def build_workflows_payload() -> Dict[str, Any]:
+    """构造 /api/admin/config-sync/workflows 的响应体，workflow_json 与 admin 一样以字符串存放"""
+    templates = {
+        "qwen_image_generation_workflow": _load_json("qwen_image_generation_workflow.json"),
+        "qwen_fusion_2image_fusion": _load_json("qwen/fusion/2image_fusion.json"),
+        "qwen_fusion_3image_fusion": _load_json("qwen/fusion/3image_fusion.json"),
+        "qwen_edit_inpainting": _load_json("cgmi_qwen_inpainting_workflow.json"),
+        "wan2.2_video_generation_workflow": _load_json("wan2.2_video_generation_workflow.json"),
+        "seedream4_volcano_engine": copy.deepcopy(SEEDREAM4_TEMPLATE),
+    }
+    templates.update(_build_flux_templates())
+
+    return {
+        "workflows": [
+            {"code": code, "name": code, "workflow_json": json.dumps(workflow, ensure_ascii=False)}
+            for code, workflow in templates.items()
+        ]
+    }
+
+
+def build_template_routes(payload_text: str) -> Dict[str, str]:
+    """构造工作流清单和单个模板接口的响应体（URL路径 -> 响应体），与 admin 的配置快照一致"""
+    routes = {}
+    manifest = []
+    for workflow in json.loads(payload_text)["workflows"]:
+        template = workflow["workflow_json"]
+        if isinstance(template, str):
+            template = json.loads(template)
+        body = json.dumps(template, ensure_ascii=False, separators=(",", ":"))
+        routes[f"/api/admin/config-sync/workflows/{workflow['code']}/template"] = body
+        manifest.append({**{key: value for key, value in workflow.items() if key != "workflow_json"},
+                         "version": 1, "sha256": hashlib.sha256(body.encode("utf-8")).hexdigest()})
+    routes["/api/admin/config-sync/workflows/manifest"] = json.dumps({"workflows": manifest}, ensure_ascii=False)
+    routes["/api/admin/config-sync/workflows"] = payload_text
+    return routes
+
+
+class FakeResponse:
+    """模拟 requests.Response，每次 json() 都重新解析，与真实 HTTP 响应一致"""
+
+    def __init__(self, text: str, status_code: int = 200, headers: Optional[Dict[str, str]] = None):
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeConfigClient:
+    """模拟 core.config_client.ConfigClient，只提供工作流构建用到的接口"""
+
+    def __init__(self, payload_text: str):
+        self._payload_text = payload_text
+        self._cache = {"workflows": json.loads(payload_text)}
+
+    async def get_models_config(self) -> Dict[str, Any]:
+        return {"models": copy.deepcopy(BENCH_MODELS)}
+
+    async def get_workflows_config(self) -> Dict[str, Any]:
+        return json.loads(self._payload_text)
+
+
+@pytest.fixture(scope="session")
+def bench_workdir() -> Path:
+    """基准测试工作目录，uploads/ 下放置参考图和遮罩"""
+    from PIL import Image
+
+    uploads = _WORK_DIR / "uploads"
+    for i, color in enumerate([(200, 80, 80), (80, 200, 80), (80, 80, 200)], start=1):
+        Image.new("RGB", (320, 240), color).save(uploads / f"ref_{i}.png")
+    mask = Image.new("L", (320, 240), 0)
+    mask.paste(255, (80, 60, 240, 180))
+    mask.save(uploads / "mask_1.png")
+    return _WORK_DIR
+
+
+@pytest.fixture(scope="session")
+def workflows_payload_text() -> str:
+    return json.dumps(build_workflows_payload(), ensure_ascii=False)
+
+
+@pytest.fixture(autouse=True)
+def reset_circuit_breakers():
+    """熔断器按依赖名称全局共享，每个测试使用新的熔断器"""
+    import core.circuit_breaker
+
+    core.circuit_breaker._circuit_breakers.clear()
+    yield
+    core.circuit_breaker._circuit_breakers.clear()
+
+
+@pytest.fixture
+def fake_admin(monkeypatch, bench_workdir, workflows_payload_text):
+    """替换 admin API 和配置客户端，并切换到工作目录使 uploads/ 相对路径可用"""
+    import requests
+    import core.config_client
+
+    routes = build_template_routes(workflows_payload_text)
+
+    def fake_get(url, *args, **kwargs):
+        path = url.split("://", 1)[-1].split("/", 1)[-1]
+        body = routes.get(f"/{path}")
+        if body is not None:
+            return FakeResponse(body)
+        return FakeResponse("{}", status_code=404)
+
+    client = FakeConfigClient(workflows_payload_text)
+    monkeypatch.setattr(requests, "get", fake_get)
+    monkeypatch.setattr(core.config_client, "get_config_client", lambda: client)
+    monkeypatch.chdir(bench_workdir)
+    return client
+
+
+# =============================================================================
+# 内存分配记录与回归检测
+# =============================================================================
+
+def pytest_addoption(parser):
+    group = parser.getgroup("workflow-bench", "工作流构建基准测试")
+    group.addoption("--alloc-baseline", default=None,
+                    help="内存分配基线JSON，超过阈值的用例判为失败")
+    group.addoption("--alloc-save", default=None,
+                    help="把本次内存分配结果保存为基线JSON")
+    group.addoption("--alloc-threshold", type=float, default=0.25,
+                    help="内存分配回归阈值（相对基线的比例，默认0.25）")
+
+
+class AllocationRecorder:
+    """记录每个用例的峰值/保留内存，并与基线比较"""
+
+    METRICS = ("peak_bytes", "retained_bytes")
+
+    def __init__(self, baseline_path: Optional[str], save_path: Optional[str], threshold: float):
+        self.save_path = save_path
+        self.threshold = threshold
+        self.results: Dict[str, Dict[str, int]] = {}
+        self.baseline: Dict[str, Dict[str, int]] = {}
+        if baseline_path:
+            with open(baseline_path, "r", encoding="utf-8") as f:
+                self.baseline = json.load(f)
+
+    def record(self, name: str, metrics: Dict[str, int]) -> Optional[str]:
+        """记录结果，出现回归时返回描述"""
+        self.results[name] = metrics
+        base = self.baseline.get(name)
+        if not base:
+            return None
+
+        regressions = []
+        for metric in self.METRICS:
+            old, new = base.get(metric), metrics.get(metric)
+            # 忽略 4KB 以内的波动，避免小用例误报
+            if old is None or new is None or new - old <= 4096:
+                continue
+            if new > old * (1 + self.threshold):
+                regressions.append(f"{metric}: {old} -> {new} (+{(new - old) / max(old, 1):.0%})")
+        return "; ".join(regressions) or None
+
+    def save(self):
+        if not self.save_path or not self.results:
+            return
+        with open(self.save_path, "w", encoding="utf-8") as f:
+            json.dump(self.results, f, indent=2, sort_keys=True)
+
+
+def pytest_configure(config):
+    config._alloc_recorder = AllocationRecorder(
+        config.getoption("--alloc-baseline"),
+        config.getoption("--alloc-save"),
+        config.getoption("--alloc-threshold"),
+    )
+
+
+def pytest_sessionfinish(session, exitstatus):
+    recorder = getattr(session.config, "_alloc_recorder", None)
+    if recorder:
+        recorder.save()
+
+
+def measure_allocations(build: Callable[[], Any]) -> Dict[str, int]:
+    """在 tracemalloc 下执行一次构建，返回峰值内存和构建结果保留的内存"""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = build()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {"peak_bytes": peak - before, "retained_bytes": current - before}
+
+
+@pytest.fixture
+def bench_build(request, benchmark):
+    """计时 + 记录内存分配；build 的日志输出丢弃到 /dev/null，避免测量终端输出"""
+    import contextlib
+
+    recorder: AllocationRecorder = request.config._alloc_recorder
+
+    def run(build: Callable[[], Any]) -> Any:
+        with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+            # 预热一次，排除首次导入和模块级缓存
+            build()
+            allocations = measure_allocations(build)
+            result = benchmark(build)
+
+        benchmark.extra_info.update(allocations)
+        regression = recorder.record(request.node.name, allocations)
+        if regression:
+            pytest.fail(f"内存分配回归超过 {recorder.threshold:.0%}: {regression}")
+        return result
+
+    return run
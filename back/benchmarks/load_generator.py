@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后端端到端压测脚本
+以目标RPS（开环）驱动 /api/generate-image、/api/history、/api/task/{id} 和缩略图接口，
+统计各接口 p50/p95/p99 延迟、任务端到端耗时以及每分钟完成任务数。
+
+配合 benchmarks/stub_comfyui.py 可以在纯CPU机器上运行，作为性能改动的回归门禁:
+    python benchmarks/stub_comfyui.py --exec-latency 2 &
+    python benchmarks/load_generator.py --rps 5 --duration 60 --json-out result.json
+    python benchmarks/load_generator.py --rps 5 --duration 60 --baseline result.json --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from PIL import Image
+
+# 默认请求配比（权重）
+DEFAULT_MIX = "generate=1,history=4,task=4,thumbnail=2"
+
+# 任务终态
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近秩百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """解析请求配比，例如 generate=1,history=4"""
+    weights = {}
+    for part in mix.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"generate", "history", "task", "thumbnail"}
+    if unknown:
+        raise ValueError(f"未知的请求类型: {', '.join(sorted(unknown))}")
+    return weights
+
+
+class LoadGenerator:
+    """开环压测器"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.base_url = args.base_url.rstrip("/")
+        self.mix = parse_mix(args.mix)
+        self.latencies: Dict[str, List[float]] = {name: [] for name in self.mix}
+        self.errors: Dict[str, int] = {name: 0 for name in self.mix}
+        self.dropped = 0
+        self.active_tasks: Dict[str, float] = {}
+        self.finished_tasks: Dict[str, Dict[str, Any]] = {}
+        self.completed_task_ids: List[str] = []
+        self.inflight: set = set()
+        self.semaphore = asyncio.Semaphore(args.max_inflight)
+        self.reference_image = self._build_reference_image() if args.reference_image else None
+
+    @staticmethod
+    def _build_reference_image() -> bytes:
+        buffer = io.BytesIO()
+        Image.new("RGB", (512, 512), (120, 160, 200)).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    # ------------------------------------------------------------------
+    # 单个请求
+    # ------------------------------------------------------------------
+
+    async def _timed(self, name: str, coro):
+        start = time.perf_counter()
+        try:
+            ok = await coro
+        except Exception as e:
+            ok = False
+            if self.args.verbose:
+                print(f"❌ {name} 请求异常: {e}")
+        elapsed = (time.perf_counter() - start) * 1000
+        self.latencies[name].append(elapsed)
+        if not ok:
+            self.errors[name] += 1
+
+    async def _generate(self, session: aiohttp.ClientSession) -> bool:
+        form = aiohttp.FormData()
+        form.add_field("description", self.args.description)
+        form.add_field("model", self.args.model)
+        form.add_field("count", str(self.args.count))
+        form.add_field("steps", str(self.args.steps))
+        form.add_field("size", self.args.size)
+        if self.reference_image:
+            form.add_field("reference_image", self.reference_image,
+                           filename="bench_reference.png", content_type="image/png")
+        async with session.post(f"{self.base_url}/api/generate-image", data=form) as response:
+            if response.status != 200:
+                return False
+            result = await response.json()
+            task_id = result.get("task_id")
+            if task_id:
+                self.active_tasks[task_id] = time.perf_counter()
+            return bool(task_id)
+
+    async def _history(self, session: aiohttp.ClientSession) -> bool:
+        params = {"limit": 20, "offset": 0, "order": "desc"}
+        async with session.get(f"{self.base_url}/api/history", params=params) as response:
+            await response.read()
+            return response.status == 200
+
+    async def _task(self, session: aiohttp.ClientSession, task_id: str) -> bool:
+        async with session.get(f"{self.base_url}/api/task/{task_id}") as response:
+            if response.status != 200:
+                return False
+            result = await response.json()
+            self._observe_task(task_id, result)
+            return True
+
+    async def _thumbnail(self, session: aiohttp.ClientSession, task_id: str) -> bool:
+        async with session.get(f"{self.base_url}/api/thumbnail/{task_id}_0_small.jpg") as response:
+            await response.read()
+            return response.status == 200
+
+    def _observe_task(self, task_id: str, result: Dict[str, Any]):
+        """记录任务终态和端到端耗时"""
+        status = result.get("status")
+        if status in TERMINAL_STATUSES and task_id in self.active_tasks:
+            started = self.active_tasks.pop(task_id)
+            self.finished_tasks[task_id] = {
+                "status": status,
+                "latency_ms": (time.perf_counter() - started) * 1000,
+                "finished_at": time.perf_counter(),
+            }
+            if status == "completed":
+                self.completed_task_ids.append(task_id)
+
+    async def _dispatch(self, session: aiohttp.ClientSession, name: str):
+        async with self.semaphore:
+            if name == "generate":
+                await self._timed(name, self._generate(session))
+            elif name == "history":
+                await self._timed(name, self._history(session))
+            elif name == "task":
+                if self.active_tasks:
+                    task_id = random.choice(list(self.active_tasks))
+                elif self.completed_task_ids:
+                    task_id = random.choice(self.completed_task_ids)
+                else:
+                    return
+                await self._timed(name, self._task(session, task_id))
+            elif name == "thumbnail":
+                if not self.completed_task_ids:
+                    return
+                await self._timed(name, self._thumbnail(session, random.choice(self.completed_task_ids)))
+
+    # ------------------------------------------------------------------
+    # 主流程
+    # ------------------------------------------------------------------
+
+    async def run(self) -> Dict[str, Any]:
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        interval = 1.0 / self.args.rps
+        timeout = aiohttp.ClientTimeout(total=self.args.request_timeout)
+        connector = aiohttp.TCPConnector(limit=self.args.max_inflight)
+
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            print(f"🚀 开始压测: {self.base_url} rps={self.args.rps} duration={self.args.duration}s mix={self.args.mix}")
+            start = time.perf_counter()
+            next_tick = start
+            sent = 0
+            while time.perf_counter() - start < self.args.duration:
+                if self.semaphore.locked():
+                    # 客户端并发已满，记录丢弃避免协调遗漏（coordinated omission）被掩盖
+                    self.dropped += 1
+                else:
+                    name = random.choices(names, weights=weights)[0]
+                    task = asyncio.create_task(self._dispatch(session, name))
+                    self.inflight.add(task)
+                    task.add_done_callback(self.inflight.discard)
+                sent += 1
+                next_tick = start + sent * interval
+                await asyncio.sleep(max(0.0, next_tick - time.perf_counter()))
+
+            load_end = time.perf_counter()
+            if self.inflight:
+                await asyncio.gather(*list(self.inflight), return_exceptions=True)
+
+            # 等待剩余任务进入终态
+            drain_deadline = time.perf_counter() + self.args.drain_timeout
+            if self.active_tasks:
+                print(f"⏳ 压测结束，等待 {len(self.active_tasks)} 个任务完成（最多 {self.args.drain_timeout}s）...")
+            while self.active_tasks and time.perf_counter() < drain_deadline:
+                await asyncio.gather(*(self._task(session, task_id) for task_id in list(self.active_tasks)),
+                                     return_exceptions=True)
+                await asyncio.sleep(1)
+            end = time.perf_counter()
+
+        return self._build_report(start, load_end, end)
+
+    def _build_report(self, start: float, load_end: float, end: float) -> Dict[str, Any]:
+        endpoints = {}
+        for name, values in self.latencies.items():
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": max(values) if values else None,
+            }
+
+        completed = [t for t in self.finished_tasks.values() if t["status"] == "completed"]
+        failed = [t for t in self.finished_tasks.values() if t["status"] != "completed"]
+        task_latencies = [t["latency_ms"] for t in completed]
+        elapsed_minutes = max(end - start, 1e-6) / 60
+
+        return {
+            "config": {
+                "base_url": self.base_url,
+                "rps": self.args.rps,
+                "duration": self.args.duration,
+                "mix": self.args.mix,
+                "model": self.args.model,
+                "count": self.args.count,
+            },
+            "load_seconds": round(load_end - start, 3),
+            "total_seconds": round(end - start, 3),
+            "dropped": self.dropped,
+            "endpoints": endpoints,
+            "tasks": {
+                "completed": len(completed),
+                "failed": len(failed),
+                "unfinished": len(self.active_tasks),
+                "tasks_per_minute": round(len(completed) / elapsed_minutes, 3),
+                "p50_ms": percentile(task_latencies, 50),
+                "p95_ms": percentile(task_latencies, 95),
+                "p99_ms": percentile(task_latencies, 99),
+            },
+        }
+
+
+def print_report(report: Dict[str, Any]):
+    def fmt(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    print("")
+    print("📊 压测结果")
+    print(f"   压测时长: {report['load_seconds']}s  总时长(含等待): {report['total_seconds']}s  丢弃: {report['dropped']}")
+    print(f"   {'接口':<10}{'请求数':>8}{'错误':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for name, stats in report["endpoints"].items():
+        print(f"   {name:<10}{stats['requests']:>8}{stats['errors']:>6}{fmt(stats['p50_ms']):>10}"
+              f"{fmt(stats['p95_ms']):>10}{fmt(stats['p99_ms']):>10}{fmt(stats['max_ms']):>10}")
+    tasks = report["tasks"]
+    print(f"   任务: 完成 {tasks['completed']} 失败 {tasks['failed']} 未完成 {tasks['unfinished']}")
+    print(f"   吞吐: {tasks['tasks_per_minute']} 任务/分钟")
+    print(f"   任务端到端: p50={fmt(tasks['p50_ms'])}ms p95={fmt(tasks['p95_ms'])}ms p99={fmt(tasks['p99_ms'])}ms")
+
+
+def compare_with_baseline(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """与基线对比，返回回归项列表"""
+    regressions = []
+    for name, stats in report["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            current, previous = stats.get(key), base.get(key)
+            if current is not None and previous and current > previous * (1 + threshold):
+                regressions.append(f"{name} {key}: {previous:.1f} -> {current:.1f}")
+
+    current_tpm = report["tasks"]["tasks_per_minute"]
+    previous_tpm = baseline.get("tasks", {}).get("tasks_per_minute")
+    if previous_tpm and current_tpm < previous_tpm * (1 - threshold):
+        regressions.append(f"tasks_per_minute: {previous_tpm} -> {current_tpm}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="后端端到端压测")
+    parser.add_argument("--base-url", default="http://localhost:9000", help="后端服务地址")
+    parser.add_argument("--rps", type=float, default=5.0, help="目标每秒请求数")
+    parser.add_argument("--duration", type=float, default=60.0, help="压测时长（秒）")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="请求配比，例如 generate=1,history=4,task=4,thumbnail=2")
+    parser.add_argument("--model", default="qwen-image", help="生成使用的模型")
+    parser.add_argument("--description", default="a cat sitting on a chair", help="生成描述")
+    parser.add_argument("--count", type=int, default=1, help="每个任务生成的图片数量")
+    parser.add_argument("--steps", type=int, default=4, help="采样步数")
+    parser.add_argument("--size", default="512x512", help="图片尺寸")
+    parser.add_argument("--reference-image", action="store_true", help="生成请求附带参考图")
+    parser.add_argument("--max-inflight", type=int, default=200, help="客户端最大并发请求数")
+    parser.add_argument("--request-timeout", type=float, default=30.0, help="单个请求超时（秒）")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="压测结束后等待任务完成的最长时间（秒）")
+    parser.add_argument("--json-out", help="将结果写入JSON文件")
+    parser.add_argument("--baseline", help="基线结果JSON文件，用于回归检测")
+    parser.add_argument("--threshold", type=float, default=0.2, help="回归阈值（相对变化比例）")
+    parser.add_argument("--verbose", action="store_true", help="打印请求异常")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.rps <= 0:
+        print("❌ rps 必须大于0")
+        sys.exit(2)
+
+    report = asyncio.run(LoadGenerator(args).run())
+    print_report(report)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存: {args.json_out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.threshold)
+        if regressions:
+            print(f"❌ 检测到性能回归（阈值 {args.threshold:.0%}）:")
+            for item in regressions:
+                print(f"   - {item}")
+            sys.exit(1)
+        print(f"✅ 未检测到性能回归（阈值 {args.threshold:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
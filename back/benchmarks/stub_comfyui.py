@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ComfyUI 桩服务（Stub）
+在没有GPU的机器上模拟ComfyUI的HTTP/WebSocket接口，用于后端吞吐量压测和回归测试
+
+实现的接口:
+    GET  /                      健康检查
+    POST /prompt                提交工作流，返回prompt_id
+    GET  /history/{prompt_id}   查询执行历史（包含outputs）
+    GET  /queue                 查询队列（queue_running / queue_pending）
+    POST /queue                 删除排队中的prompt（{"delete": [...]}）或清空队列（{"clear": true}）
+    POST /interrupt             中断当前正在执行的prompt
+    GET  /view                  获取输出/输入文件
+    POST /upload/image          上传图片到输入目录
+    GET  /ws                    WebSocket事件流（status / executing / progress / executed / 二进制预览帧）
+
+执行模型:
+    - 排队延迟（--queue-latency）模拟模型加载等固定开销
+    - 执行延迟（--exec-latency）按步数拆分，期间推送progress和预览帧
+    - --workers 控制并发执行槽位数（真实ComfyUI为1）
+    - 根据工作流中的 SaveImage / SaveVideo 节点在输出目录写入占位PNG/MP4
+
+使用方法:
+    python benchmarks/stub_comfyui.py --port 8188 --exec-latency 2.0 --queue-latency 0.5 --admin-config
+    然后以 COMFYUI_URL=http://127.0.0.1:8188 COMFYUI_MAIN_OUTPUT_DIR=<输出目录> 启动后端服务
+    （--admin-config 时同时设置 ADMIN_BACKEND_URL=http://127.0.0.1:8188，无需启动admin服务）
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import random
+import struct
+import tempfile
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response
+from PIL import Image
+
+# 视频输出节点类型
+VIDEO_OUTPUT_NODES = {"SaveVideo", "VHS_VideoCombine", "SaveAnimatedWEBP"}
+# 图片输出节点类型
+IMAGE_OUTPUT_NODES = {"SaveImage"}
+# 预览节点类型（ComfyUI会写入temp目录）
+PREVIEW_OUTPUT_NODES = {"PreviewImage"}
+
+# ComfyUI二进制事件类型：预览图
+BINARY_EVENT_PREVIEW_IMAGE = 1
+# 预览图编码格式：1=JPEG 2=PNG
+PREVIEW_FORMAT_JPEG = 1
+
+# --admin-config 模式下提供的工作流模板（code -> 本地文件）
+ADMIN_WORKFLOW_FILES = {
+    "qwen_image_generation_workflow": "qwen_image_generation_workflow.json",
+    "qwen_fusion_2image_fusion": "qwen_image_fusion_workflow.json",
+    "qwen_edit_inpainting": "cgmi_qwen_inpainting_workflow.json",
+    "wan2.2_video_generation_workflow": "wan2.2_video_generation_workflow.json",
+}
+
+# --admin-config 模式下提供的基础模型
+ADMIN_BASE_MODELS = [
+    {"code": "qwen-image", "name": "qwen-image", "display_name": "Qwen（Stub）", "model_type": "qwen",
+     "unet_file": "qwen_image_fp8_e4m3fn.safetensors", "clip_file": "qwen_2.5_vl_7b_fp8_scaled.safetensors",
+     "vae_file": "qwen_image_vae.safetensors", "is_available": True},
+    {"code": "wan2.2-video", "name": "wan2.2-video", "display_name": "Wan2.2（Stub）", "model_type": "wan",
+     "unet_file": "wan2.2_i2v_high_noise_14B_fp8_scaled.safetensors", "clip_file": "umt5_xxl_fp8_e4m3fn_scaled.safetensors",
+     "vae_file": "wan_2.1_vae.safetensors", "is_available": True},
+]
+
+# 加载权重的节点类型及字段（用于模拟换模型开销）
+MODEL_LOADER_INPUTS = {
+    "UNETLoader": ("unet_name",),
+    "CheckpointLoaderSimple": ("ckpt_name",),
+    "CLIPLoader": ("clip_name",),
+    "DualCLIPLoader": ("clip_name1", "clip_name2"),
+    "VAELoader": ("vae_name",),
+}
+
+# 最小的MP4占位文件（仅包含ftyp盒子，足够让后端按扩展名识别）
+PLACEHOLDER_MP4 = struct.pack(">I", 24) + b"ftypisom" + struct.pack(">I", 0x200) + b"isomiso2"
+
+
+class StubConfig:
+    """桩服务配置"""
+
+    def __init__(self,
+                 output_dir: Path,
+                 input_dir: Path,
+                 queue_latency: float = 0.5,
+                 exec_latency: float = 2.0,
+                 jitter: float = 0.1,
+                 workers: int = 1,
+                 steps: int = 10,
+                 preview: bool = True,
+                 fail_rate: float = 0.0,
+                 image_size: int = 512,
+                 admin_config: bool = False,
+                 swap_latency: float = 0.0):
+        self.output_dir = output_dir
+        self.input_dir = input_dir
+        self.temp_dir = output_dir.parent / "temp"
+        self.queue_latency = queue_latency
+        self.exec_latency = exec_latency
+        self.jitter = jitter
+        self.workers = workers
+        self.steps = steps
+        self.preview = preview
+        self.fail_rate = fail_rate
+        self.image_size = image_size
+        self.admin_config = admin_config
+        self.swap_latency = swap_latency
+
+
+class StubComfyUI:
+    """模拟ComfyUI的执行队列和历史记录"""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.pending: deque = deque()
+        self.running: Dict[str, List[Any]] = {}
+        self.history: Dict[str, Dict[str, Any]] = {}
+        self.websockets: Dict[str, WebSocket] = {}
+        self.number = 0
+        self.file_counters: Dict[str, int] = {}
+        self.interrupted: Set[str] = set()
+        self.wakeup = asyncio.Event()
+        self.worker_tasks: List[asyncio.Task] = []
+        self.stats = {"submitted": 0, "completed": 0, "interrupted": 0, "failed": 0,
+                      "model_swaps": 0, "swap_seconds": 0.0}
+        self.loaded_models: Optional[tuple] = None
+
+        for directory in (config.output_dir, config.input_dir, config.temp_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def start(self):
+        """启动执行槽位"""
+        for i in range(self.config.workers):
+            self.worker_tasks.append(asyncio.create_task(self._worker_loop(i)))
+
+    async def stop(self):
+        """停止执行槽位"""
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+
+    # ------------------------------------------------------------------
+    # 队列操作
+    # ------------------------------------------------------------------
+
+    def enqueue(self, prompt: Dict[str, Any], client_id: Optional[str], front: bool = False) -> Dict[str, Any]:
+        """加入队列，返回与ComfyUI一致的响应结构"""
+        prompt_id = str(uuid.uuid4())
+        self.number += 1
+        item = [self.number, prompt_id, prompt, {"client_id": client_id}, self._output_node_ids(prompt)]
+        if front:
+            self.pending.appendleft(item)
+        else:
+            self.pending.append(item)
+        self.stats["submitted"] += 1
+        self.wakeup.set()
+        return {"prompt_id": prompt_id, "number": self.number, "node_errors": {}}
+
+    def delete_pending(self, prompt_ids: List[str]) -> int:
+        """从等待队列中删除指定prompt"""
+        before = len(self.pending)
+        self.pending = deque(item for item in self.pending if item[1] not in prompt_ids)
+        return before - len(self.pending)
+
+    def clear_pending(self) -> int:
+        """清空等待队列"""
+        removed = len(self.pending)
+        self.pending.clear()
+        return removed
+
+    def interrupt(self, prompt_id: Optional[str] = None) -> List[str]:
+        """中断正在执行的prompt（不指定时中断全部）"""
+        targets = [prompt_id] if prompt_id else list(self.running.keys())
+        interrupted = [pid for pid in targets if pid in self.running]
+        self.interrupted.update(interrupted)
+        return interrupted
+
+    def queue_snapshot(self) -> Dict[str, Any]:
+        """队列快照"""
+        return {
+            "queue_running": list(self.running.values()),
+            "queue_pending": list(self.pending),
+        }
+
+    # ------------------------------------------------------------------
+    # 执行
+    # ------------------------------------------------------------------
+
+    async def _worker_loop(self, worker_index: int):
+        """单个执行槽位：串行执行队列中的prompt"""
+        while True:
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            item = self.pending.popleft()
+            prompt_id = item[1]
+            self.running[prompt_id] = item
+            try:
+                await self._execute(item)
+            except Exception as e:
+                print(f"❌ [stub] 执行prompt失败 {prompt_id}: {e}")
+                self._record_history(item, {}, "error", [str(e)])
+                self.stats["failed"] += 1
+            finally:
+                self.running.pop(prompt_id, None)
+                self.interrupted.discard(prompt_id)
+                await self._broadcast_status()
+
+    def _sample_latency(self, base: float) -> float:
+        """按抖动比例采样延迟"""
+        if base <= 0:
+            return 0.0
+        return max(0.0, base * (1 + random.uniform(-self.config.jitter, self.config.jitter)))
+
+    async def _execute(self, item: List[Any]):
+        """执行单个prompt：排队开销 + 分步执行 + 写出占位文件"""
+        prompt_id = item[1]
+        prompt = item[2]
+        client_id = item[3].get("client_id")
+
+        await self._send_json({"type": "execution_start", "data": {"prompt_id": prompt_id}}, client_id)
+        await asyncio.sleep(self._sample_latency(self.config.queue_latency))
+        await self._load_models(prompt)
+
+        steps = max(1, self.config.steps)
+        step_time = self._sample_latency(self.config.exec_latency) / steps
+        sampler_node = self._find_node(prompt, "KSampler") or next(iter(prompt.keys()), None)
+
+        for step in range(1, steps + 1):
+            if prompt_id in self.interrupted:
+                self.stats["interrupted"] += 1
+                self._record_history(item, {}, "error", ["Processing interrupted"])
+                await self._send_json({"type": "execution_interrupted",
+                                       "data": {"prompt_id": prompt_id, "node_id": sampler_node}}, client_id)
+                print(f"⏹️ [stub] prompt已中断: {prompt_id}")
+                return
+            await asyncio.sleep(step_time)
+            await self._send_json({"type": "progress",
+                                   "data": {"value": step, "max": steps, "prompt_id": prompt_id,
+                                            "node": sampler_node}}, client_id)
+            if self.config.preview:
+                await self._send_preview(step, steps, client_id)
+
+        if self.config.fail_rate > 0 and random.random() < self.config.fail_rate:
+            self.stats["failed"] += 1
+            self._record_history(item, {}, "error", ["Simulated failure"])
+            await self._send_json({"type": "execution_error",
+                                   "data": {"prompt_id": prompt_id, "exception_message": "Simulated failure"}},
+                                  client_id)
+            return
+
+        outputs = self._write_outputs(prompt)
+        self._record_history(item, outputs, "success", [])
+        self.stats["completed"] += 1
+
+        for node_id, output in outputs.items():
+            await self._send_json({"type": "executed",
+                                   "data": {"node": node_id, "output": output, "prompt_id": prompt_id}}, client_id)
+        await self._send_json({"type": "executing", "data": {"node": None, "prompt_id": prompt_id}}, client_id)
+
+    def _record_history(self, item: List[Any], outputs: Dict[str, Any], status_str: str, messages: List[str]):
+        """写入历史记录"""
+        self.history[item[1]] = {
+            "prompt": item,
+            "outputs": outputs,
+            "status": {
+                "status_str": status_str,
+                "completed": status_str == "success",
+                "messages": messages,
+            },
+        }
+
+    async def _load_models(self, prompt: Dict[str, Any]):
+        """模拟换模型：权重集合与上一个prompt不同时额外等待 swap_latency"""
+        files = set()
+        for node in prompt.values():
+            for field in MODEL_LOADER_INPUTS.get(node.get("class_type"), ()):
+                value = node.get("inputs", {}).get(field)
+                if isinstance(value, str):
+                    files.add(value)
+        if not files:
+            return
+        models = tuple(sorted(files))
+        if self.loaded_models is not None and models != self.loaded_models and self.config.swap_latency > 0:
+            swap_time = self._sample_latency(self.config.swap_latency)
+            self.stats["model_swaps"] += 1
+            self.stats["swap_seconds"] += swap_time
+            await asyncio.sleep(swap_time)
+        self.loaded_models = models
+
+    @staticmethod
+    def _find_node(prompt: Dict[str, Any], class_type: str) -> Optional[str]:
+        for node_id, node in prompt.items():
+            if isinstance(node, dict) and node.get("class_type") == class_type:
+                return node_id
+        return None
+
+    @staticmethod
+    def _output_node_ids(prompt: Dict[str, Any]) -> List[str]:
+        output_types = IMAGE_OUTPUT_NODES | VIDEO_OUTPUT_NODES | PREVIEW_OUTPUT_NODES
+        return [node_id for node_id, node in prompt.items()
+                if isinstance(node, dict) and node.get("class_type") in output_types]
+
+    def _next_filename(self, folder: Path, prefix: str, ext: str) -> str:
+        """按ComfyUI规则生成文件名: {prefix}_{counter:05}_.{ext}"""
+        key = f"{folder}/{prefix}"
+        counter = self.file_counters.get(key, 0) + 1
+        self.file_counters[key] = counter
+        return f"{prefix}_{counter:05}_.{ext}"
+
+    def _write_outputs(self, prompt: Dict[str, Any]) -> Dict[str, Any]:
+        """根据输出节点写入占位文件，返回history中的outputs结构"""
+        outputs: Dict[str, Any] = {}
+        for node_id, node in prompt.items():
+            if not isinstance(node, dict):
+                continue
+            class_type = node.get("class_type")
+            inputs = node.get("inputs", {})
+
+            if class_type in IMAGE_OUTPUT_NODES or class_type in PREVIEW_OUTPUT_NODES:
+                is_preview = class_type in PREVIEW_OUTPUT_NODES
+                raw_prefix = "ComfyUI_temp_stub" if is_preview else str(inputs.get("filename_prefix", "ComfyUI"))
+                subfolder, _, prefix = raw_prefix.rpartition("/")
+                base_dir = self.config.temp_dir if is_preview else self.config.output_dir
+                folder = base_dir / subfolder if subfolder else base_dir
+                folder.mkdir(parents=True, exist_ok=True)
+                filename = self._next_filename(folder, prefix, "png")
+                self._write_png(folder / filename)
+                outputs[node_id] = {"images": [{"filename": filename, "subfolder": subfolder,
+                                                "type": "temp" if is_preview else "output"}]}
+
+            elif class_type in VIDEO_OUTPUT_NODES:
+                raw_prefix = str(inputs.get("filename_prefix", "video/ComfyUI"))
+                subfolder, _, prefix = raw_prefix.rpartition("/")
+                folder = self.config.output_dir / subfolder if subfolder else self.config.output_dir
+                folder.mkdir(parents=True, exist_ok=True)
+                filename = self._next_filename(folder, prefix, "mp4")
+                (folder / filename).write_bytes(PLACEHOLDER_MP4)
+                outputs[node_id] = {"images": [{"filename": filename, "subfolder": subfolder, "type": "output"}],
+                                    "animated": [True]}
+        return outputs
+
+    def _write_png(self, path: Path):
+        """写入占位PNG（随机纯色）"""
+        size = self.config.image_size
+        color = tuple(random.randint(0, 255) for _ in range(3))
+        Image.new("RGB", (size, size), color).save(path, format="PNG")
+
+    # ------------------------------------------------------------------
+    # WebSocket
+    # ------------------------------------------------------------------
+
+    async def _send_json(self, message: Dict[str, Any], client_id: Optional[str] = None):
+        """发送JSON事件：指定client_id且已连接时单发，否则广播"""
+        await self._broadcast(json.dumps(message), binary=False, client_id=client_id)
+
+    async def _send_preview(self, step: int, steps: int, client_id: Optional[str] = None):
+        """推送二进制预览帧（与ComfyUI格式一致: 事件类型 + 图片格式 + JPEG数据）"""
+        if not self.websockets:
+            return
+        shade = int(255 * step / steps)
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 64), (shade, shade, shade)).save(buffer, format="JPEG", quality=60)
+        payload = struct.pack(">I", BINARY_EVENT_PREVIEW_IMAGE) + struct.pack(">I", PREVIEW_FORMAT_JPEG) + buffer.getvalue()
+        await self._broadcast(payload, binary=True, client_id=client_id)
+
+    async def _broadcast_status(self):
+        await self._send_json({"type": "status",
+                               "data": {"status": {"exec_info": {"queue_remaining": len(self.pending) + len(self.running)}}}})
+
+    async def _broadcast(self, payload, binary: bool, client_id: Optional[str] = None):
+        if client_id and client_id in self.websockets:
+            targets = [(client_id, self.websockets[client_id])]
+        else:
+            targets = list(self.websockets.items())
+        for sid, ws in targets:
+            try:
+                if binary:
+                    await ws.send_bytes(payload)
+                else:
+                    await ws.send_text(payload)
+            except Exception:
+                self.websockets.pop(sid, None)
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    """创建桩服务应用"""
+    app = FastAPI(title="ComfyUI Stub", version="1.0.0")
+    stub = StubComfyUI(config)
+    app.state.stub = stub
+
+    @app.on_event("startup")
+    async def _startup():
+        stub.start()
+        print(f"🧪 [stub] ComfyUI桩服务已启动")
+        print(f"   输出目录: {config.output_dir}")
+        print(f"   输入目录: {config.input_dir}")
+        print(f"   排队延迟: {config.queue_latency}s 执行延迟: {config.exec_latency}s 并发: {config.workers}")
+
+    @app.on_event("shutdown")
+    async def _shutdown():
+        await stub.stop()
+
+    @app.get("/")
+    async def root():
+        return {"status": "ok", "stub": True}
+
+    @app.get("/system_stats")
+    async def system_stats():
+        return {"system": {"os": "stub", "python_version": "", "embedded_python": False},
+                "devices": [], "stub_stats": stub.stats}
+
+    @app.post("/prompt")
+    async def submit_prompt(request: Request):
+        body = await request.json()
+        prompt = body.get("prompt")
+        if not isinstance(prompt, dict) or not prompt:
+            raise HTTPException(status_code=400, detail={"error": {"type": "prompt_no_outputs",
+                                                                   "message": "Prompt has no outputs"}})
+        return stub.enqueue(prompt, body.get("client_id"), front=bool(body.get("front")))
+
+    @app.get("/prompt")
+    async def prompt_info():
+        return {"exec_info": {"queue_remaining": len(stub.pending) + len(stub.running)}}
+
+    @app.get("/history")
+    async def get_all_history(max_items: Optional[int] = None):
+        items = list(stub.history.items())
+        if max_items:
+            items = items[-max_items:]
+        return dict(items)
+
+    @app.get("/history/{prompt_id}")
+    async def get_history(prompt_id: str):
+        if prompt_id in stub.history:
+            return {prompt_id: stub.history[prompt_id]}
+        return {}
+
+    @app.get("/queue")
+    async def get_queue():
+        return stub.queue_snapshot()
+
+    @app.post("/queue")
+    async def modify_queue(request: Request):
+        body = await request.json()
+        if body.get("clear"):
+            stub.clear_pending()
+        if body.get("delete"):
+            stub.delete_pending(list(body["delete"]))
+        return {}
+
+    @app.post("/interrupt")
+    async def interrupt(request: Request):
+        prompt_id = None
+        try:
+            body = await request.json()
+            if isinstance(body, dict):
+                prompt_id = body.get("prompt_id")
+        except Exception:
+            pass
+        stub.interrupt(prompt_id)
+        return {}
+
+    @app.get("/view")
+    async def view(filename: str, subfolder: str = "", type: str = "output"):
+        base_dirs = {"output": config.output_dir, "input": config.input_dir, "temp": config.temp_dir}
+        base_dir = base_dirs.get(type)
+        if base_dir is None or ".." in filename or ".." in subfolder:
+            raise HTTPException(status_code=400, detail="Invalid path")
+        file_path = base_dir / subfolder / filename if subfolder else base_dir / filename
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail="File not found")
+        return FileResponse(file_path)
+
+    @app.post("/upload/image")
+    async def upload_image(image: UploadFile = File(...),
+                           subfolder: str = Form(""),
+                           overwrite: str = Form("false"),
+                           type: str = Form("input")):
+        if ".." in subfolder or not image.filename:
+            raise HTTPException(status_code=400, detail="Invalid path")
+        folder = config.input_dir / subfolder if subfolder else config.input_dir
+        folder.mkdir(parents=True, exist_ok=True)
+        filename = Path(image.filename).name
+        target = folder / filename
+        if target.exists() and overwrite.lower() != "true":
+            stem, suffix = target.stem, target.suffix
+            index = 1
+            while target.exists():
+                filename = f"{stem} ({index}){suffix}"
+                target = folder / filename
+                index += 1
+        target.write_bytes(await image.read())
+        return {"name": filename, "subfolder": subfolder, "type": type}
+
+    @app.websocket("/ws")
+    async def websocket_endpoint(websocket: WebSocket):
+        await websocket.accept()
+        sid = websocket.query_params.get("clientId") or uuid.uuid4().hex
+        stub.websockets[sid] = websocket
+        await websocket.send_text(json.dumps({
+            "type": "status",
+            "data": {"status": {"exec_info": {"queue_remaining": len(stub.pending) + len(stub.running)}},
+                     "sid": sid},
+        }))
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            stub.websockets.pop(sid, None)
+
+    if config.admin_config:
+        _register_admin_config_routes(app)
+
+    return app
+
+
+def _register_admin_config_routes(app: FastAPI):
+    """注册最小化的admin配置接口，使后端无需启动admin服务即可压测"""
+    workflows_dir = Path(__file__).parent.parent / "workflows"
+    workflows = []
+    for code, filename in ADMIN_WORKFLOW_FILES.items():
+        workflow_file = workflows_dir / filename
+        if workflow_file.exists():
+            with open(workflow_file, "r", encoding="utf-8") as f:
+                workflows.append({"code": code, "name": code, "workflow_json": json.load(f)})
+
+    @app.get("/api/admin/config-sync/models")
+    async def admin_base_models():
+        return {"models": ADMIN_BASE_MODELS}
+
+    # 工作流清单和单个模板（sha256与admin一致，按紧凑JSON计算）
+    template_bodies = {
+        workflow["code"]: json.dumps(workflow["workflow_json"], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        for workflow in workflows
+    }
+    manifest = [
+        {"code": code, "name": code, "version": 1, "sha256": hashlib.sha256(body).hexdigest(), "size": len(body)}
+        for code, body in template_bodies.items()
+    ]
+
+    @app.get("/api/admin/config-sync/workflows")
+    async def admin_workflows():
+        return {"workflows": workflows}
+
+    @app.get("/api/admin/config-sync/workflows/manifest")
+    async def admin_workflows_manifest():
+        return {"workflows": manifest}
+
+    @app.get("/api/admin/config-sync/workflows/{code}/template")
+    async def admin_workflow_template(code: str):
+        if code not in template_bodies:
+            raise HTTPException(status_code=404, detail=f"工作流不存在: {code}")
+        return Response(content=template_bodies[code], media_type="application/json")
+
+    @app.get("/api/admin/config-sync/loras")
+    async def admin_loras():
+        return {"loras": []}
+
+    @app.get("/api/admin/config-sync/image-gen")
+    async def admin_image_gen_config():
+        return {"default_size": {"width": 1024, "height": 1024}, "size_ratios": ["1:1"], "default_count": 1}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ComfyUI桩服务（用于CPU环境压测）")
+    parser.add_argument("--host", default=os.getenv("STUB_COMFYUI_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("STUB_COMFYUI_PORT", "8188")))
+    parser.add_argument("--output-dir", default=os.getenv("STUB_COMFYUI_OUTPUT_DIR"),
+                        help="输出目录（默认创建临时目录）")
+    parser.add_argument("--input-dir", default=os.getenv("STUB_COMFYUI_INPUT_DIR"),
+                        help="输入目录（默认在输出目录旁创建input）")
+    parser.add_argument("--queue-latency", type=float, default=float(os.getenv("STUB_QUEUE_LATENCY", "0.5")),
+                        help="每个prompt开始执行前的固定开销（秒）")
+    parser.add_argument("--exec-latency", type=float, default=float(os.getenv("STUB_EXEC_LATENCY", "2.0")),
+                        help="每个prompt的执行时长（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="延迟抖动比例（0-1）")
+    parser.add_argument("--workers", type=int, default=1, help="并发执行槽位数")
+    parser.add_argument("--steps", type=int, default=10, help="每个prompt推送的进度步数")
+    parser.add_argument("--no-preview", action="store_true", help="不推送二进制预览帧")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="模拟失败概率（0-1）")
+    parser.add_argument("--image-size", type=int, default=512, help="占位图片边长")
+    parser.add_argument("--swap-latency", type=float, default=float(os.getenv("STUB_SWAP_LATENCY", "0")),
+                        help="权重集合变化时的额外换模型耗时（秒）")
+    parser.add_argument("--admin-config", action="store_true",
+                        help="同时提供最小化的admin配置接口（后端ADMIN_BACKEND_URL指向本服务）")
+    return parser.parse_args()
+
+
+def main():
+    import uvicorn
+
+    args = parse_args()
+    if args.output_dir:
+        output_dir = Path(args.output_dir)
+    else:
+        output_dir = Path(tempfile.mkdtemp(prefix="stub_comfyui_")) / "output"
+    input_dir = Path(args.input_dir) if args.input_dir else output_dir.parent / "input"
+
+    config = StubConfig(
+        output_dir=output_dir,
+        input_dir=input_dir,
+        queue_latency=args.queue_latency,
+        exec_latency=args.exec_latency,
+        jitter=args.jitter,
+        workers=args.workers,
+        steps=args.steps,
+        preview=not args.no_preview,
+        fail_rate=args.fail_rate,
+        image_size=args.image_size,
+        admin_config=args.admin_config,
+        swap_latency=args.swap_latency,
+    )
+
+    print("💡 后端服务请使用以下环境变量指向桩服务:")
+    print(f"   COMFYUI_URL=http://{args.host}:{args.port}")
+    print(f"   COMFYUI_MAIN_OUTPUT_DIR={output_dir}")
+    print(f"   COMFYUI_OUTPUT_DIR={output_dir / 'yeepay'}")
+    print(f"   COMFYUI_INPUT_DIR={input_dir}")
+    if args.admin_config:
+        print(f"   ADMIN_BACKEND_URL=http://{args.host}:{args.port}")
+
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
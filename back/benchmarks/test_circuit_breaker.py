@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+依赖熔断器测试
+
+检查：连续失败达到阈值后熔断，请求不再发出；没有探测函数时熔断间隔过后放行一个试探请求；
+后台探测成功后恢复；admin熔断时配置客户端立即返回最后一次成功的配置；ComfyUI健康检查的错误状态码计为失败。
+
+    cd back
+    python -m pytest benchmarks/test_circuit_breaker.py -q
+"""
+
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from aiohttp import web
+
+import core.circuit_breaker
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState
+
+
+def _fail(breaker: CircuitBreaker):
+    with pytest.raises(ConnectionError):
+        with breaker.guard():
+            raise ConnectionError("refused")
+
+
+def test_opens_after_threshold_and_retries_with_half_open_trial():
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=0.05, max_recovery_timeout=1)
+    for _ in range(3):
+        _fail(breaker)
+    assert breaker.state is CircuitState.OPEN
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        with breaker.guard():
+            calls.append(1)
+    assert not calls and breaker.get_stats()["rejected"] == 1
+
+    # 熔断间隔过后放行一个试探请求；试探失败时熔断间隔翻倍
+    time.sleep(0.08)
+    _fail(breaker)
+    assert breaker.state is CircuitState.OPEN and breaker._open_interval == pytest.approx(0.1)
+
+    time.sleep(0.15)
+    with breaker.guard():
+        # 试探期间其他请求仍然立即失败
+        assert not breaker.allow_request()
+    assert breaker.state is CircuitState.CLOSED and breaker._open_interval == 0.05
+
+    # 依赖有响应的业务错误不计为故障
+    with pytest.raises(ValueError):
+        with breaker.guard():
+            raise ValueError("bad request")
+    assert breaker.get_stats()["consecutive_failures"] == 0
+
+
+def test_background_probe_closes_circuit():
+    async def scenario():
+        healthy = False
+        probes = []
+
+        async def probe():
+            probes.append(1)
+            return healthy
+
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.02, max_recovery_timeout=0.05)
+        breaker.set_probe(probe)
+        _fail(breaker)
+        await asyncio.sleep(0.15)
+        assert breaker.is_open and len(probes) >= 2
+        # 有后台探测时不放行试探请求
+        assert not breaker.allow_request()
+
+        healthy = True
+        deadline = time.monotonic() + 2
+        while breaker.is_open:
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.01)
+        assert breaker.allow_request()
+
+    asyncio.run(scenario())
+
+
+def test_config_client_serves_last_known_good_while_admin_is_down(monkeypatch):
+    from core.config_client import ConfigClient
+
+    async def scenario():
+        requests = []
+        state = {"status": 503}
+
+        async def handler(request):
+            requests.append(request.path)
+            return web.json_response({"models": [{"name": "flux1-dev"}]}, status=state["status"])
+
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        core.circuit_breaker._circuit_breakers["admin"] = CircuitBreaker(
+            "admin", failure_threshold=3, recovery_timeout=0.05, max_recovery_timeout=0.1)
+        monkeypatch.setenv("BACKEND_CONFIG_URL", f"http://127.0.0.1:{port}")
+        client = ConfigClient()
+        # 最后一次成功的配置（已超过缓存有效期）
+        client._cache["models"] = {"models": [{"name": "cached"}]}
+        client._cache_timestamps["models"] = datetime(2000, 1, 1)
+        try:
+            for _ in range(3):
+                await client.get_models_config(refresh=True)
+            assert len(requests) == 3 and client._breaker.is_open
+
+            # 熔断中：不再请求admin，直接返回最后一次成功的配置
+            for _ in range(20):
+                config = await client.get_models_config(refresh=True)
+                assert config["models"] == [{"name": "cached"}] and config["config_source"] == "cache"
+            assert all(path.endswith("/health") for path in requests[3:])
+
+            # admin恢复后由后台探测关闭熔断
+            state["status"] = 200
+            deadline = time.monotonic() + 2
+            while client._breaker.is_open:
+                assert time.monotonic() < deadline
+                await asyncio.sleep(0.02)
+            config = await client.get_models_config(refresh=True)
+            assert config["models"] == [{"name": "flux1-dev"}]
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_comfyui_health_check_counts_error_status_as_failure():
+    from core.comfyui_client import ComfyUIClient
+
+    async def bad_gateway(request):
+        # ComfyUI前面的代理在ComfyUI停止时返回502
+        return web.Response(status=502)
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_get("/", bad_gateway)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            client = ComfyUIClient(f"http://127.0.0.1:{port}")
+            assert await client.check_health() is False
+            return client._breaker.get_stats()
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(scenario())["consecutive_failures"] == 1
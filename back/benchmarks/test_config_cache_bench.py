@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置缓存读写基准测试
+
+测量 ConfigCache 热命中 get、set 的吞吐，以及启动时加载全部条目的耗时；
+同时检查过期、跨实例持久化和多线程并发写入。
+
+    cd back
+    python -m pytest benchmarks/test_config_cache_bench.py --benchmark-only
+"""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+ENTRY_COUNT = 500
+CONFIG = {
+    "models": [{"name": f"model-{i}", "unet_file": f"unet-{i}.safetensors", "available": True} for i in range(20)],
+    "config_source": "admin_backend",
+}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    from core.config_cache import ConfigCache
+
+    cache = ConfigCache(tmp_path, default_ttl=300)
+    yield cache
+    cache.close()
+
+
+def _fill(cache, count=ENTRY_COUNT):
+    for i in range(count):
+        cache.set("models", CONFIG, params={"page": i})
+
+
+def test_get_warm_hit(benchmark, cache):
+    _fill(cache)
+    result = benchmark(cache.get, "models", {"page": 7})
+    assert result == CONFIG
+
+
+def test_set(benchmark, cache):
+    counter = iter(range(10 ** 9))
+    benchmark(lambda: cache.set("models", CONFIG, params={"page": next(counter)}))
+    assert cache.get("models", {"page": 0}) == CONFIG
+
+
+def test_startup_load(benchmark, cache, tmp_path):
+    from core.config_cache import ConfigCache
+
+    _fill(cache)
+
+    def load():
+        reopened = ConfigCache(tmp_path)
+        reopened.close()
+        return reopened
+
+    reopened = benchmark(load)
+    assert reopened.get_cache_info()["total_entries"] == ENTRY_COUNT
+
+
+def test_expiry_and_persistence(cache, tmp_path, monkeypatch):
+    from core.config_cache import ConfigCache
+
+    cache.set("loras", {"loras": ["a"]}, ttl=60)
+    cache.set("workflows", {"workflows": []})
+    cache.remove("workflows")
+    (tmp_path / "models.cache").write_bytes(b"legacy")
+
+    reopened = ConfigCache(tmp_path)
+    assert reopened.get("loras") == {"loras": ["a"]}
+    assert reopened.get("workflows") is None
+    assert not (tmp_path / "models.cache").exists()
+
+    # 60秒后过期；调用方传入的ttl优先
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert reopened.get("loras") is None
+    assert reopened.get("loras", ttl=120) == {"loras": ["a"]}
+    reopened.cleanup_expired()
+    assert reopened.get_cache_info()["total_entries"] == 0
+    reopened.close()
+
+
+def test_concurrent_writers(cache, tmp_path):
+    from core.config_cache import ConfigCache
+
+    other = ConfigCache(tmp_path)
+
+    def write(target, worker):
+        for i in range(50):
+            target.set("image_gen", {"worker": worker, "index": i}, params={"worker": worker, "index": i})
+
+    threads = [threading.Thread(target=write, args=(cache if worker % 2 else other, worker)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 另一个实例写入的条目在内存索引未命中时从数据库读取
+    assert cache.get("image_gen", {"worker": 0, "index": 49}) == {"worker": 0, "index": 49}
+    assert ConfigCache(tmp_path).get_cache_info()["total_entries"] == 200
+    other.close()
+
+
+def test_sees_writes_from_other_instances(cache, tmp_path):
+    from core.config_cache import ConfigCache
+
+    other = ConfigCache(tmp_path, sync_interval=0)
+    cache.set("models", {"version": 1})
+    assert other.get("models") == {"version": 1}
+
+    # 内存索引命中的条目被另一个实例更新或删除后，不会一直返回旧值直到TTL过期
+    cache.set("models", {"version": 2})
+    assert other.get("models") == {"version": 2}
+    cache.remove("models")
+    assert other.get("models") is None
+    other.close()
+
+
+def test_equal_params_of_different_types_do_not_collide(cache):
+    # True == 1 == 1.0，但序列化后的缓存键不同，记忆的键不能混用
+    cache.set("loras", {"value": "bool"}, params={"enabled": True})
+    cache.set("loras", {"value": "int"}, params={"enabled": 1})
+    assert cache.get("loras", {"enabled": True}) == {"value": "bool"}
+    assert cache.get("loras", {"enabled": 1}) == {"value": "int"}
+    assert cache.get("loras", {"enabled": 1.0}) is None
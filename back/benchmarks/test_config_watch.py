@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置变化监听测试
+
+用 aiohttp 模拟 admin 的 /watch 长轮询和配置接口，检查：
+首次同步拉取全部配置；之后只拉取变化的配置类型；已同步时请求路径不访问网络。
+
+    cd back
+    python -m pytest benchmarks/test_config_watch.py -q
+"""
+
+import asyncio
+
+from aiohttp import web
+
+
+class FakeAdmin:
+    def __init__(self):
+        self.version = 1
+        self.loras = [{"name": "a"}]
+        self.changed = asyncio.Event()
+        self.requests = []
+
+    async def watch(self, request):
+        since = int(request.query["since"])
+        if since == self.version:
+            try:
+                await asyncio.wait_for(self.changed.wait(), float(request.query["timeout"]))
+            except asyncio.TimeoutError:
+                pass
+            self.changed.clear()
+        changed = ["loras"] if since and since != self.version else []
+        return web.json_response({"version": self.version, "changed": changed})
+
+    async def config(self, request):
+        if request.path.endswith("/manifest"):
+            # 不支持工作流清单的admin，工作流配置退回到完整列表
+            return web.json_response({}, status=404)
+        self.requests.append(request.path)
+        if request.path.endswith("/loras"):
+            return web.json_response({"loras": list(self.loras)})
+        if request.path.endswith("/models"):
+            return web.json_response({"models": [{"name": "flux1-dev", "available": True}]})
+        if request.path.endswith("/workflows"):
+            return web.json_response({"workflows": []})
+        return web.json_response({"config": {}})
+
+    def publish_loras(self, loras):
+        self.loras = loras
+        self.version += 1
+        self.changed.set()
+
+
+async def _wait_until(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.02)
+
+
+def test_watch_refreshes_only_changed_types(monkeypatch, tmp_path):
+    import core.workflow_template_store
+    from core.config_client import ConfigClient
+    from core.workflow_template_store import WorkflowTemplateStore
+
+    async def scenario():
+        admin = FakeAdmin()
+        app = web.Application()
+        app.router.add_get("/api/admin/config-sync/watch", admin.watch)
+        app.router.add_get("/{tail:.*}", admin.config)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        monkeypatch.setenv("BACKEND_CONFIG_URL", f"http://127.0.0.1:{port}")
+        monkeypatch.setattr(core.workflow_template_store, "_workflow_template_store",
+                            WorkflowTemplateStore(f"http://127.0.0.1:{port}", tmp_path))
+        monkeypatch.setenv("CONFIG_WATCH_TIMEOUT", "5")
+        client = ConfigClient()
+        try:
+            assert client.start_watch() and not client.start_watch()
+            await _wait_until(lambda: client._watch_synced)
+            assert len(admin.requests) == 4
+
+            # 已同步：请求路径直接返回内存中的配置
+            loras = await client.get_loras_config()
+            assert loras["loras"] == [{"name": "a"}] and len(admin.requests) == 4
+
+            admin.publish_loras([{"name": "a"}, {"name": "b"}])
+            await _wait_until(lambda: len(client._cache["loras"]["loras"]) == 2)
+            assert admin.requests[4:] == ["/api/admin/config-sync/loras"]
+            assert client._watch_version == admin.version
+        finally:
+            await client.stop_watch()
+            await runner.cleanup()
+        assert not client._watch_synced
+
+    asyncio.run(scenario())
+
+
+class SnapshotAdmin:
+    """带ETag的配置快照接口：If-None-Match 一致时返回304"""
+
+    def __init__(self):
+        self.sections = {
+            "models": {"models": [{"name": "flux1-dev", "available": True},
+                                  {"name": "sdxl", "available": False}]},
+            "image-gen": {"base_model_order": ["flux1-dev"], "default_size": {"width": 1024, "height": 1024},
+                          "size_ratios": ["1:1", "16:9"], "default_count": 2},
+        }
+        self.requests = []
+
+    async def section(self, request):
+        name = request.match_info["name"]
+        etag = f'"{name}-1"'
+        self.requests.append((request.path, request.headers.get("If-None-Match")))
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(self.sections[name], headers={"ETag": etag})
+
+
+def test_models_and_image_gen_use_snapshot_routes(monkeypatch):
+    from core.config_client import ConfigClient
+
+    async def scenario():
+        admin = SnapshotAdmin()
+        app = web.Application()
+        app.router.add_get("/api/admin/config-sync/{name}", admin.section)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        monkeypatch.setenv("BACKEND_CONFIG_URL", f"http://127.0.0.1:{port}")
+        client = ConfigClient()
+        try:
+            results = []
+            for _ in range(2):
+                results.append((await client.get_models_config(refresh=True),
+                                await client.get_image_gen_config(refresh=True)))
+        finally:
+            await runner.cleanup()
+        return admin.requests, results
+
+    requests, results = asyncio.run(scenario())
+
+    # 第二次拉取带上ETag，admin返回304，内容与第一次一致
+    assert requests == [
+        ("/api/admin/config-sync/models", None),
+        ("/api/admin/config-sync/image-gen", None),
+        ("/api/admin/config-sync/models", '"models-1"'),
+        ("/api/admin/config-sync/image-gen", '"image-gen-1"'),
+    ]
+    for models, image_gen in results:
+        assert [model["name"] for model in models["models"]] == ["flux1-dev"]
+        assert image_gen["supported_ratios"] == ["1:1", "16:9"]
+        assert image_gen["size_ratios"][1] == {"ratio": "16:9", "width": 1024, "height": 576, "description": ""}
+        assert image_gen["base_model_order"] == ["flux1-dev"] and image_gen["default_count"] == 2
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+局部重绘裁剪测试
+
+    cd back
+    python -m pytest benchmarks/test_inpaint_crop.py -q
+"""
+
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+
+
+@pytest.fixture
+def canvas(tmp_path, monkeypatch):
+    """2000x1500 原图和一个小范围涂抹的遮罩（alpha=0为重绘区域）"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uploads").mkdir()
+    image_path = tmp_path / "image.png"
+    Image.effect_noise((2000, 1500), 40).convert("RGB").save(image_path)
+
+    mask = Image.new("RGBA", (2000, 1500), (0, 0, 0, 255))
+    ImageDraw.Draw(mask).ellipse((1500, 200, 1650, 320), fill=(0, 0, 0, 0))
+    mask_path = tmp_path / "mask.png"
+    mask.save(mask_path)
+    return image_path, mask_path
+
+
+def test_crop_contains_mask_with_context(canvas):
+    from core.inpaint_crop import prepare_inpaint_crop
+
+    image_path, mask_path = canvas
+    crop = prepare_inpaint_crop(str(image_path), str(mask_path), 1024, "task")
+    left, top, right, bottom = crop.box
+
+    assert left <= 1500 - 64 and top <= 200 - 64 and right >= 1650 + 64 and bottom >= 320 + 64
+    assert right - left == 512 and bottom - top == 512
+    assert crop.diffusion_size == 512
+    with Image.open(crop.image_path) as image, Image.open(crop.mask_path) as mask:
+        assert image.size == mask.size == (512, 512)
+    crop.cleanup()
+    assert not crop.image_path.exists()
+
+
+def test_full_frame_or_empty_mask_is_not_cropped(canvas, tmp_path):
+    from core.inpaint_crop import prepare_inpaint_crop
+
+    image_path, _ = canvas
+    empty = tmp_path / "empty.png"
+    Image.new("RGBA", (2000, 1500), (0, 0, 0, 255)).save(empty)
+    full = tmp_path / "full.png"
+    Image.new("RGBA", (2000, 1500), (0, 0, 0, 0)).save(full)
+    no_alpha = tmp_path / "no_alpha.png"
+    Image.new("L", (2000, 1500), 255).save(no_alpha)
+
+    for mask_path in (empty, full, no_alpha):
+        assert prepare_inpaint_crop(str(image_path), str(mask_path), 1024, "task") is None
+
+
+def test_composite_only_changes_masked_region(canvas, tmp_path):
+    from core.inpaint_crop import composite_inpaint_result, prepare_inpaint_crop
+    from config.settings import INPAINT_FEATHER
+
+    image_path, mask_path = canvas
+    crop = prepare_inpaint_crop(str(image_path), str(mask_path), 1024, "task")
+
+    # 模拟ComfyUI输出：按扩散边长缩放后的纯色结果
+    result_path = tmp_path / "result.png"
+    Image.new("RGB", (crop.diffusion_size, crop.diffusion_size), (255, 0, 0)).save(result_path)
+    composite_inpaint_result(crop, str(image_path), str(result_path))
+
+    with Image.open(image_path) as original, Image.open(result_path) as result:
+        assert result.size == original.size
+        changed = ImageChops.difference(original.convert("RGB"), result.convert("RGB")).getbbox()
+        assert result.getpixel((1575, 260)) == (255, 0, 0)
+    # 羽化过渡带（扩展 + 模糊）不超过两倍羽化宽度
+    margin = 2 * INPAINT_FEATHER
+    assert changed[0] >= 1500 - margin and changed[2] <= 1650 + margin
+    assert changed[1] >= 200 - margin and changed[3] <= 320 + margin
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时预览转发测试
+
+用aiohttp模拟ComfyUI的WebSocket事件流：进度事件 + 二进制预览帧，
+检查只为订阅的prompt转发、按帧率上限丢帧、缩小并重新编码。
+
+    cd back
+    python -m pytest benchmarks/test_live_preview.py -q
+"""
+
+import asyncio
+import io
+import json
+import struct
+
+from aiohttp import web
+from PIL import Image
+
+FRAMES = 20
+FRAME_INTERVAL = 0.02
+
+
+def _preview_frame(shade: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (1024, 768), (shade, shade, shade)).save(buffer, format="JPEG", quality=90)
+    return struct.pack(">I", 1) + struct.pack(">I", 1) + buffer.getvalue()
+
+
+async def _fake_comfyui(prompt_ids):
+    """按顺序执行prompt，每个prompt推送 FRAMES 个进度事件和预览帧"""
+    sent = asyncio.Event()
+
+    async def websocket(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        for prompt_id in prompt_ids:
+            await ws.send_str(json.dumps({"type": "execution_start", "data": {"prompt_id": prompt_id}}))
+            for step in range(1, FRAMES + 1):
+                await ws.send_str(json.dumps({"type": "progress",
+                                              "data": {"value": step, "max": FRAMES, "prompt_id": prompt_id}}))
+                await ws.send_bytes(_preview_frame(step * 10))
+                await asyncio.sleep(FRAME_INTERVAL)
+            await ws.send_str(json.dumps({"type": "executing", "data": {"node": None, "prompt_id": prompt_id}}))
+        sent.set()
+        async for _ in ws:
+            pass
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/ws", websocket)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", sent
+
+
+def test_frames_are_throttled_and_reencoded():
+    from core.live_preview import LivePreviewListener
+
+    async def scenario():
+        runner, url, sent = await _fake_comfyui(["other-prompt", "prompt-a"])
+        listener = LivePreviewListener(url, client_id="test", max_fps=10)
+        queue = asyncio.Queue(maxsize=1)
+        listener.subscribe(queue, "prompt-a")
+        frames = []
+
+        async def collect():
+            while True:
+                frames.append(await queue.get())
+
+        collector = asyncio.ensure_future(collect())
+        listener.start()
+        try:
+            await asyncio.wait_for(sent.wait(), timeout=10)
+            await asyncio.sleep(0.3)
+        finally:
+            collector.cancel()
+            await listener.stop()
+            await runner.cleanup()
+        return frames, listener.get_stats()
+
+    frames, stats = asyncio.run(scenario())
+
+    # 未订阅的prompt不解码；订阅的prompt按10fps丢帧
+    assert frames and all(frame["prompt_id"] == "prompt-a" for frame in frames)
+    assert stats["frames_received"] == 2 * FRAMES
+    assert stats["frames_dropped"] > 0
+    assert stats["frames_sent"] < FRAMES
+    assert frames[-1]["steps"] == FRAMES and frames[-1]["step"] > frames[0]["step"]
+
+    with Image.open(io.BytesIO(frames[0]["data"])) as image:
+        assert max(image.size) <= 320
+    assert frames[0]["mime"] in ("image/webp", "image/jpeg")
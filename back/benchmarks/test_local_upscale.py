@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地插值放大测试
+
+逐条带缩放并流式写出的PNG应与整张图片 resize（及USM锐化）的结果逐像素一致。
+
+    cd back
+    python -m pytest benchmarks/test_local_upscale.py -q
+"""
+
+import pytest
+from PIL import Image, ImageFilter
+
+
+@pytest.fixture
+def noise_image(tmp_path):
+    path = tmp_path / "input.png"
+    Image.effect_noise((240, 160), 60).convert("RGB").save(path)
+    return path
+
+
+@pytest.mark.parametrize("algorithm", ["lanczos", "bicubic", "nearest"])
+def test_strips_match_full_resize(tmp_path, noise_image, algorithm):
+    from core.local_upscale import LOCAL_UPSCALE_FILTERS, upscale_file
+
+    output = tmp_path / "output.png"
+    # 限制条带缓冲，使输出被拆成多个条带
+    info = upscale_file(str(noise_image), str(output), 3, algorithm, memory_limit=64 * 1024)
+    assert info["strips"] > 1
+
+    with Image.open(noise_image) as source:
+        expected = source.resize((720, 480), LOCAL_UPSCALE_FILTERS[algorithm])
+    with Image.open(output) as result:
+        assert result.size == (720, 480)
+        assert result.tobytes() == expected.tobytes()
+
+
+def test_sharpen_has_no_strip_seams(tmp_path, noise_image):
+    from core.local_upscale import SHARPEN_PERCENT, SHARPEN_RADIUS, SHARPEN_THRESHOLD, upscale_file
+
+    output = tmp_path / "output.png"
+    upscale_file(str(noise_image), str(output), 2, "lanczos", sharpen=True, memory_limit=32 * 1024)
+
+    with Image.open(noise_image) as source:
+        expected = source.resize((480, 320), Image.Resampling.LANCZOS).filter(
+            ImageFilter.UnsharpMask(SHARPEN_RADIUS, SHARPEN_PERCENT, SHARPEN_THRESHOLD))
+    with Image.open(output) as result:
+        assert result.tobytes() == expected.tobytes()
+
+
+def test_alpha_channel_is_preserved(tmp_path):
+    from core.local_upscale import upscale_file
+
+    source = tmp_path / "alpha.png"
+    Image.new("RGBA", (20, 10), (10, 20, 30, 128)).save(source)
+    output = tmp_path / "output.png"
+    upscale_file(str(source), str(output), 2, "bicubic")
+
+    with Image.open(source) as image:
+        expected = image.resize((40, 20), Image.Resampling.BICUBIC)
+    with Image.open(output) as result:
+        assert result.mode == "RGBA"
+        assert result.tobytes() == expected.tobytes()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地LoRA目录索引测试与基准
+
+用只有头部的 safetensors 文件构造LoRA目录，检查：头部元数据和张量形状的解析；
+重启后按 (inode, 大小, 修改时间) 复用行、不重新读取头部；增量更新和目录监听/轮询；
+按基础模型查询的耗时与目录大小无关。
+
+    cd back
+    python -m pytest benchmarks/test_lora_catalog.py -q
+"""
+
+import json
+import struct
+import time
+
+import pytest
+
+import core.lora_catalog
+from core.lora_catalog import LoraCatalog
+
+
+def write_safetensors(path, metadata=None, tensors=None):
+    """写入只有头部的safetensors文件（张量数据用0填充）"""
+    header = dict(tensors or {})
+    if metadata is not None:
+        header["__metadata__"] = metadata
+    body = json.dumps(header).encode()
+    size = max((t["data_offsets"][1] for t in header.values() if "data_offsets" in t), default=0)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(struct.pack("<Q", len(body)) + body + b"\0" * size)
+
+
+def _tensor(shape):
+    return {"dtype": "F16", "shape": shape, "data_offsets": [0, 2 * shape[0] * shape[1]]}
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def lora_dir(tmp_path):
+    root = tmp_path / "loras"
+    write_safetensors(root / "logo_style.safetensors",
+                      {"ss_network_dim": "32", "ss_network_alpha": "16", "ss_base_model_version": "flux1",
+                       "ss_output_name": "logo_style", "ss_tag_frequency": "{}"})
+    write_safetensors(root / "poster" / "poster_v2.safetensors", None,
+                      {"transformer_blocks.0.img_mlp.net.0.proj.lora_A.weight": _tensor([16, 3072])})
+    (root / "poster" / "broken.safetensors").write_bytes(b"\xff" * 4)
+    (root / "old_qwen_lora.pt").write_bytes(b"\0" * 16)
+    (root / "readme.txt").write_text("not a lora")
+    return root
+
+
+def test_reads_headers_and_indexes_by_base_model_and_category(lora_dir, tmp_path):
+    catalog = LoraCatalog(lora_dir, tmp_path / "catalog.json", watch=False)
+
+    assert [row["name"] for row in catalog.list()] == [
+        "logo_style.safetensors", "old_qwen_lora.pt", "poster/broken.safetensors", "poster/poster_v2.safetensors"]
+
+    logo = catalog.get("logo_style.safetensors")
+    assert (logo["base_model"], logo["base_model_source"]) == ("flux-dev", "metadata")
+    assert (logo["network_dim"], logo["network_alpha"]) == (32, 16)
+    assert logo["metadata"] == {"output_name": "logo_style", "base_model_version": "flux1"}
+
+    poster = catalog.get("poster/poster_v2.safetensors")
+    assert (poster["base_model"], poster["base_model_source"], poster["network_dim"]) == ("qwen-image", "tensors", 16)
+    assert poster["category"] == "poster"
+
+    assert catalog.get("poster/broken.safetensors")["header_error"]
+    assert catalog.get("old_qwen_lora.pt")["base_model_source"] == "filename"
+
+    assert [row["name"] for row in catalog.list(base_model="qwen-image")] == [
+        "old_qwen_lora.pt", "poster/poster_v2.safetensors"]
+    assert [row["name"] for row in catalog.list(base_model="qwen-image", category="poster")] == [
+        "poster/poster_v2.safetensors"]
+    assert catalog.categories() == {"": 2, "poster": 2}
+
+
+def test_restart_reuses_rows_and_updates_incrementally(lora_dir, tmp_path, monkeypatch):
+    catalog_path = tmp_path / "catalog.json"
+    LoraCatalog(lora_dir, catalog_path, watch=False).ensure_loaded()
+
+    reads = []
+    original = core.lora_catalog.read_safetensors_header
+    monkeypatch.setattr(core.lora_catalog, "read_safetensors_header", lambda path: reads.append(path) or original(path))
+
+    catalog = LoraCatalog(lora_dir, catalog_path, watch=False)
+    assert len(catalog.list()) == 4 and reads == []
+
+    # 只有变化的文件重新读取头部
+    write_safetensors(lora_dir / "logo_style.safetensors", {"ss_network_dim": "64", "ss_base_model_version": "flux1"})
+    (lora_dir / "old_qwen_lora.pt").unlink()
+    assert catalog.scan() == {"added": 0, "updated": 1, "removed": 1}
+    assert reads == [lora_dir / "logo_style.safetensors"]
+    assert catalog.get("logo_style.safetensors")["network_dim"] == 64
+    assert [row["name"] for row in catalog.list(base_model="qwen-image")] == ["poster/poster_v2.safetensors"]
+
+    write_safetensors(lora_dir / "wan_motion.safetensors", None,
+                      {"blocks.3.cross_attn.k.lora_down.weight": _tensor([8, 5120])})
+    assert catalog.update_path(lora_dir / "wan_motion.safetensors")
+    assert not catalog.update_path(lora_dir / "wan_motion.safetensors")
+    assert catalog.get("wan_motion.safetensors")["base_model"] == "wan2.2-video"
+
+
+@pytest.mark.parametrize("watch", [True, False], ids=["watch", "poll"])
+def test_background_thread_picks_up_changes(lora_dir, tmp_path, watch):
+    catalog = LoraCatalog(lora_dir, tmp_path / "catalog.json", watch=watch, poll_interval=0.1)
+    assert catalog.start()
+    try:
+        _wait_until(lambda: len(catalog) == 4)
+        assert catalog.get_stats()["mode"] == ("watch" if watch else "poll")
+
+        write_safetensors(lora_dir / "new" / "flux_icon.safetensors", {"modelspec.architecture": "Flux.1-dev/lora"})
+        _wait_until(lambda: catalog.get("new/flux_icon.safetensors") is not None)
+        (lora_dir / "logo_style.safetensors").unlink()
+        _wait_until(lambda: catalog.get("logo_style.safetensors") is None)
+        assert [row["name"] for row in catalog.list(base_model="flux-dev")] == ["new/flux_icon.safetensors"]
+    finally:
+        catalog.stop()
+
+    saved = json.loads((tmp_path / "catalog.json").read_text(encoding="utf-8"))
+    assert set(saved["entries"]) == {"new/flux_icon.safetensors", "old_qwen_lora.pt",
+                                     "poster/broken.safetensors", "poster/poster_v2.safetensors"}
+
+
+def test_first_query_waits_for_initial_scan(lora_dir, tmp_path, monkeypatch):
+    """后台线程已启动但还没有完成首次对账时，查询等待对账结果而不是返回空索引"""
+    monkeypatch.setattr(core.lora_catalog.DirectoryWatcher, "running", property(lambda self: True))
+    catalog = LoraCatalog(lora_dir, tmp_path / "catalog.json", watch=True)
+    assert [row["name"] for row in catalog.list(base_model="flux-dev")] == ["logo_style.safetensors"]
+    assert catalog.get_stats()["scans"] == 1
+
+    # 后台线程随后的对账复用已读取的行，不重新读取头部
+    catalog._on_watcher_scan()
+    assert catalog.get_stats()["scans"] == 2 and catalog.get_stats()["header_reads"] == 3
+
+
+def test_lookup_by_base_model_bench(tmp_path, benchmark):
+    root = tmp_path / "loras"
+    for i in range(2000):
+        write_safetensors(root / f"cat{i % 20}" / f"style_{i}.safetensors",
+                          {"ss_base_model_version": "flux1" if i % 100 == 0 else "qwen_image", "ss_network_dim": "16"})
+    catalog = LoraCatalog(root, tmp_path / "catalog.json", watch=False)
+    catalog.ensure_loaded()
+
+    rows = benchmark(catalog.list, base_model="flux-dev")
+    assert len(rows) == 20
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型文件索引测试
+
+检查：ModelConfig 可用性检查只查内存索引；增量更新；后台sha256计算及重启后复用；
+向admin上报文件清单。
+
+    cd back
+    python -m pytest benchmarks/test_model_file_index.py -q
+"""
+
+import asyncio
+import hashlib
+import time
+
+import pytest
+from aiohttp import web
+
+import core.model_manager
+from core.model_file_index import ModelFileIndex, model_file_paths
+from core.model_manager import ModelConfig, ModelType
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    root = tmp_path / "models"
+    for relative_path, content in [("diffusion_models/qwen_image.safetensors", b"unet" * 1000),
+                                   ("text_encoders/qwen_vl.safetensors", b"clip" * 100),
+                                   ("vae/qwen_vae.safetensors", b"vae"),
+                                   ("vae/notes.txt", b"not a model")]:
+        (root / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (root / relative_path).write_bytes(content)
+    return root
+
+
+def _qwen_config():
+    return ModelConfig(ModelType.QWEN, "qwen-image", "Qwen Image", "qwen_image.safetensors",
+                       "qwen_vl.safetensors", "qwen_vae.safetensors")
+
+
+def test_availability_reads_from_index(models_dir, tmp_path, monkeypatch):
+    index = ModelFileIndex(models_dir, tmp_path / "index.json", watch=False)
+    monkeypatch.setattr(core.model_manager, "get_model_file_index", lambda: index)
+    index.sweep()
+    assert index.snapshot()["files"].keys() == {
+        "diffusion_models/qwen_image.safetensors", "text_encoders/qwen_vl.safetensors", "vae/qwen_vae.safetensors"}
+    assert model_file_paths("gemini", "a", "b", "c") == []
+
+    assert _qwen_config().available
+    assert ModelConfig(ModelType.JOYCAPTION, "joycaption", "JoyCaption", "", "", "").available
+
+    # 索引建立后不再访问文件系统：文件删除后直到收到事件（或巡检）前仍视为存在
+    (models_dir / "vae/qwen_vae.safetensors").unlink()
+    assert _qwen_config().available
+    assert index.update_path(models_dir / "vae/qwen_vae.safetensors")
+    assert not _qwen_config().available
+
+    (models_dir / "vae/qwen_vae.safetensors").write_bytes(b"vae2")
+    assert index.update_path(models_dir / "vae/qwen_vae.safetensors")
+    assert _qwen_config().available and index.get("vae/qwen_vae.safetensors")["size"] == 4
+
+
+def test_background_hashing_is_reused_after_restart(models_dir, tmp_path):
+    index_path = tmp_path / "index.json"
+    index = ModelFileIndex(models_dir, index_path, watch=True, hash_files=True)
+    assert index.start()
+    try:
+        _wait_until(lambda: index.get_stats()["hashed_files"] == 3)
+        unet = index.get("diffusion_models/qwen_image.safetensors")
+        assert unet["sha256"] == hashlib.sha256(b"unet" * 1000).hexdigest()
+
+        # 修改后的文件重新计算
+        (models_dir / "vae/qwen_vae.safetensors").write_bytes(b"vae-v2")
+        _wait_until(lambda: (index.get("vae/qwen_vae.safetensors") or {}).get("sha256")
+                    == hashlib.sha256(b"vae-v2").hexdigest())
+    finally:
+        index.stop()
+
+    restarted = ModelFileIndex(models_dir, index_path, watch=False, hash_files=True)
+    assert restarted.start()
+    try:
+        _wait_until(lambda: restarted.ready)
+        time.sleep(0.2)
+        stats = restarted.get_stats()
+        assert stats["hashed_files"] == 3 and stats["hashed"] == 0
+    finally:
+        restarted.stop()
+
+
+def test_reports_file_list_to_admin(models_dir, tmp_path, monkeypatch):
+    import core.model_file_index
+
+    async def scenario():
+        reports = []
+
+        async def handler(request):
+            reports.append((request.match_info["node"], await request.json()))
+            return web.json_response({"received": len(reports[-1][1]["files"])})
+
+        app = web.Application()
+        app.router.add_post("/api/admin/config-sync/model-files/{node}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(core.model_file_index, "ADMIN_BACKEND_URL", f"http://127.0.0.1:{port}")
+
+        index = ModelFileIndex(models_dir, tmp_path / "index.json", watch=False, node="gpu-1")
+        index.sweep()
+        try:
+            assert await index.report()
+            node, payload = reports[-1]
+            assert node == "gpu-1" and payload["version"] == index.version
+            assert payload["files"]["vae/qwen_vae.safetensors"]["size"] == 3
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(scenario())
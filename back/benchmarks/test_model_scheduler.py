@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型亲和调度模拟测试
+
+用单执行槽位模拟ComfyUI：权重集合变化时额外付出换模型时间，
+比较交替提交 Flux/Qwen/Wan 任务时按提交顺序与按模型亲和放行的换模型次数和总耗时。
+
+    cd back
+    python -m pytest benchmarks/test_model_scheduler.py -q -s
+"""
+
+import asyncio
+from typing import Dict, List, Tuple
+
+EXEC_SECONDS = 0.01
+SWAP_SECONDS = 0.04
+
+FLUX = {"1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "flux1-dev-fp8.safetensors"}}}
+QWEN = {
+    "1": {"class_type": "UNETLoader", "inputs": {"unet_name": "qwen_image_fp8_e4m3fn.safetensors"}},
+    "2": {"class_type": "CLIPLoader", "inputs": {"clip_name": "qwen_2.5_vl_7b_fp8_scaled.safetensors"}},
+    "3": {"class_type": "VAELoader", "inputs": {"vae_name": "qwen_image_vae.safetensors"}},
+}
+QWEN_EDIT = {
+    "1": {"class_type": "UNETLoader", "inputs": {"unet_name": "qwen_image_edit_fp8_e4m3fn.safetensors"}},
+    "2": {"class_type": "CLIPLoader", "inputs": {"clip_name": "qwen_2.5_vl_7b_fp8_scaled.safetensors"}},
+    "3": {"class_type": "VAELoader", "inputs": {"vae_name": "qwen_image_vae.safetensors"}},
+}
+WAN = {"1": {"class_type": "UNETLoader", "inputs": {"unet_name": "wan2.2_i2v_high_noise_14B_fp8_scaled.safetensors"}}}
+GEMINI = {"1": {"class_type": "Google-Gemini", "inputs": {"prompt": "a cat"}}}
+
+# 4个用户交替提交不同模型的任务
+INTERLEAVED = [FLUX, QWEN, WAN, QWEN_EDIT] * 6
+
+
+class SimulatedComfyUI:
+    """单槽位串行执行，记录换模型次数"""
+
+    def __init__(self):
+        self.loaded = None
+        self.swaps = 0
+        self.lock = asyncio.Lock()
+
+    async def run(self, key: Tuple[str, ...]):
+        async with self.lock:
+            if key and self.loaded is not None and key != self.loaded:
+                self.swaps += 1
+                await asyncio.sleep(SWAP_SECONDS)
+            if key:
+                self.loaded = key
+            await asyncio.sleep(EXEC_SECONDS)
+
+
+async def _run_jobs(workflows: List[Dict], max_inflight: int, max_delay: float):
+    from core.model_scheduler import ModelAffinityScheduler, workflow_model_key
+
+    scheduler = ModelAffinityScheduler(max_inflight=max_inflight, max_delay=max_delay)
+    comfyui = SimulatedComfyUI()
+    loop = asyncio.get_running_loop()
+    waits = []
+
+    async def job(index: int, workflow: Dict):
+        submitted = loop.time()
+        ticket = await scheduler.acquire(f"task-{index}", workflow_model_key(workflow))
+        waits.append(loop.time() - submitted)
+        try:
+            await comfyui.run(ticket.key)
+        finally:
+            scheduler.release(ticket)
+
+    start = loop.time()
+    await asyncio.gather(*(job(i, workflow) for i, workflow in enumerate(workflows)))
+    return {
+        "elapsed": loop.time() - start,
+        "swaps": comfyui.swaps,
+        "max_wait": max(waits),
+        "stats": scheduler.get_stats(),
+    }
+
+
+def test_workflow_model_key_uses_loader_files():
+    from core.model_scheduler import workflow_model_key
+
+    assert workflow_model_key(QWEN) == (
+        "qwen_image_fp8_e4m3fn.safetensors", "qwen_2.5_vl_7b_fp8_scaled.safetensors", "qwen_image_vae.safetensors")
+    assert workflow_model_key(QWEN) != workflow_model_key(QWEN_EDIT)
+    assert workflow_model_key(GEMINI) == ()
+
+
+def test_affinity_reduces_model_swaps():
+    """按模型亲和放行后换模型次数和总耗时都应明显下降"""
+    fifo = asyncio.run(_run_jobs(INTERLEAVED, max_inflight=len(INTERLEAVED), max_delay=60))
+    affinity = asyncio.run(_run_jobs(INTERLEAVED, max_inflight=1, max_delay=60))
+
+    print(f"\n提交顺序: 换模型 {fifo['swaps']} 次, 耗时 {fifo['elapsed']:.2f}s")
+    print(f"模型亲和: 换模型 {affinity['swaps']} 次, 耗时 {affinity['elapsed']:.2f}s")
+
+    assert fifo["swaps"] == len(INTERLEAVED) - 1
+    assert affinity["swaps"] == 3
+    assert affinity["stats"]["swaps"] == affinity["swaps"]
+    assert affinity["stats"]["affinity_hits"] == len(INTERLEAVED) - 4
+    assert affinity["elapsed"] < fifo["elapsed"]
+
+
+async def _starvation_wait(max_delay: float) -> float:
+    """持续到达的Flux任务中夹着一个Qwen任务，返回Qwen任务的等待时间"""
+    from core.model_scheduler import ModelAffinityScheduler, workflow_model_key
+
+    scheduler = ModelAffinityScheduler(max_inflight=1, max_delay=max_delay)
+    comfyui = SimulatedComfyUI()
+    loop = asyncio.get_running_loop()
+    qwen_wait = []
+
+    async def job(index: int, workflow: Dict, delay: float):
+        await asyncio.sleep(delay)
+        submitted = loop.time()
+        ticket = await scheduler.acquire(f"task-{index}", workflow_model_key(workflow))
+        if workflow is QWEN:
+            qwen_wait.append(loop.time() - submitted)
+        try:
+            await comfyui.run(ticket.key)
+        finally:
+            scheduler.release(ticket)
+
+    jobs = [job(i, FLUX, i * EXEC_SECONDS / 2) for i in range(30)]
+    jobs.append(job(99, QWEN, EXEC_SECONDS / 4))
+    await asyncio.gather(*jobs)
+    return qwen_wait[0]
+
+
+def test_fairness_delay_prevents_starvation():
+    """同模型任务持续到达时，其他模型的任务最多等待公平时限加一次执行"""
+    max_delay = 0.05
+    bounded = asyncio.run(_starvation_wait(max_delay))
+    unbounded = asyncio.run(_starvation_wait(60))
+
+    assert bounded < max_delay + EXEC_SECONDS * 5
+    assert unbounded > bounded
+
+
+def test_api_only_workflows_do_not_change_loaded_model():
+    result = asyncio.run(_run_jobs([QWEN, GEMINI, QWEN, GEMINI, QWEN], max_inflight=1, max_delay=60))
+    assert result["swaps"] == 0
+    assert result["stats"]["loaded_model"] == "qwen_image_fp8_e4m3fn.safetensors"
+
+
+def test_withdraw_releases_waiting_request():
+    from core.model_scheduler import ModelAffinityScheduler, workflow_model_key
+
+    async def scenario():
+        scheduler = ModelAffinityScheduler(max_inflight=1, max_delay=60)
+        first = await scheduler.acquire("task-a", workflow_model_key(FLUX))
+        waiting = asyncio.ensure_future(scheduler.acquire("task-b", workflow_model_key(QWEN)))
+        await asyncio.sleep(0)
+        assert scheduler.withdraw("task-b") == 1
+        assert await waiting is None
+        scheduler.release(first)
+        scheduler.release(first)
+        stats = scheduler.get_stats()
+        assert stats["inflight"] == 0 and stats["waiting"] == 0 and stats["withdrawn"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_priority_request_skips_queue():
+    """高优先级请求（渐进式重绘预览）先于更早排队的普通请求放行"""
+    from core.model_scheduler import ModelAffinityScheduler, workflow_model_key
+
+    async def scenario():
+        scheduler = ModelAffinityScheduler(max_inflight=1, max_delay=0)
+        first = await scheduler.acquire("task-a", workflow_model_key(QWEN))
+        normal = asyncio.ensure_future(scheduler.acquire("task-b", workflow_model_key(QWEN)))
+        preview = asyncio.ensure_future(scheduler.acquire("task-c#preview", workflow_model_key(QWEN_EDIT), priority=True))
+        await asyncio.sleep(0)
+        scheduler.release(first)
+        ticket = await preview
+        assert ticket.owner == "task-c#preview" and not normal.done()
+        scheduler.release(ticket)
+        scheduler.release(await normal)
+        assert scheduler.get_stats()["prioritized"] == 1
+
+    asyncio.run(scenario())
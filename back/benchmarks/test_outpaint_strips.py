@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分条扩图切分与合成测试
+
+    cd back
+    python -m pytest benchmarks/test_outpaint_strips.py -q
+"""
+
+from PIL import Image, ImageChops
+
+ORIGINAL_SIZE = (600, 400)
+PADDING = (200, 100, 300, 150)
+CONTEXT = 128
+
+
+def _covered(strips, canvas_size):
+    """条带输出区域和原图是否覆盖整个画布"""
+    coverage = Image.new("L", canvas_size, 0)
+    coverage.paste(255, (PADDING[0], PADDING[1], PADDING[0] + ORIGINAL_SIZE[0], PADDING[1] + ORIGINAL_SIZE[1]))
+    for strip in strips:
+        coverage.paste(255, strip.output_box)
+    return coverage.getextrema() == (255, 255)
+
+
+def test_strips_cover_canvas_in_two_phases():
+    from core.outpaint_strips import plan_strips
+
+    strips = plan_strips(ORIGINAL_SIZE, PADDING, CONTEXT)
+    canvas_size = (ORIGINAL_SIZE[0] + PADDING[0] + PADDING[2], ORIGINAL_SIZE[1] + PADDING[1] + PADDING[3])
+
+    assert [(strip.edge, strip.phase) for strip in strips] == [("left", 0), ("right", 0), ("top", 1), ("bottom", 1)]
+    assert _covered(strips, canvas_size)
+    # 左右条带只包含原图上下文，输出高度与原图一致
+    left = strips[0]
+    assert left.output_box == (0, PADDING[1], PADDING[0] + CONTEXT, PADDING[1] + ORIGINAL_SIZE[1])
+    # 只向下扩图时只有一个条带，且在第一阶段
+    single = plan_strips(ORIGINAL_SIZE, (0, 0, 0, 150), CONTEXT)
+    assert [(strip.edge, strip.phase) for strip in single] == [("bottom", 0)]
+    assert plan_strips(ORIGINAL_SIZE, (0, 0, 0, 0), CONTEXT) == []
+
+
+def test_composite_preserves_original_and_blends_context(tmp_path):
+    from core.outpaint_strips import composite_strips, plan_strips
+
+    original = Image.effect_noise(ORIGINAL_SIZE, 40).convert("RGB")
+    origin = (PADDING[0], PADDING[1])
+    canvas = Image.new("RGB", (ORIGINAL_SIZE[0] + PADDING[0] + PADDING[2],
+                               ORIGINAL_SIZE[1] + PADDING[1] + PADDING[3]))
+    canvas.paste(original, origin)
+    strips = plan_strips(ORIGINAL_SIZE, PADDING, CONTEXT)
+
+    # 模拟ComfyUI输出：按扩散边长缩放后的纯色结果
+    colors = {"left": (255, 0, 0), "right": (0, 255, 0), "top": (0, 0, 255), "bottom": (255, 255, 0)}
+    for phase in (0, 1):
+        outputs = []
+        for strip in (strip for strip in strips if strip.phase == phase):
+            box = strip.output_box
+            path = tmp_path / f"{strip.edge}.png"
+            Image.new("RGB", ((box[2] - box[0]) // 2, (box[3] - box[1]) // 2), colors[strip.edge]).save(path)
+            outputs.append((strip, path))
+        composite_strips(canvas, outputs, original, origin)
+
+    inner = canvas.crop((origin[0], origin[1], origin[0] + ORIGINAL_SIZE[0], origin[1] + ORIGINAL_SIZE[1]))
+    assert ImageChops.difference(inner, original).getbbox() is None
+    # 新增区域（含四个角）全部由条带填充
+    assert canvas.getpixel((10, PADDING[1] + 200)) == colors["left"]
+    assert canvas.getpixel((canvas.width - 10, PADDING[1] + 200)) == colors["right"]
+    assert canvas.getpixel((5, 5)) == colors["top"]
+    assert canvas.getpixel((canvas.width - 5, canvas.height - 5)) == colors["bottom"]
+    # 上方条带在左侧条带结果上的上下文区域内线性过渡
+    near_edge = canvas.getpixel((10, PADDING[1] + 2))
+    far_edge = canvas.getpixel((10, PADDING[1] + CONTEXT - 2))
+    assert near_edge[2] > far_edge[2] and far_edge[0] > near_edge[0]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+订阅者断开时取消临时任务的测试
+
+模拟客户端在任务结束前断开事件流（Starlette 取消响应任务），检查：
+临时（ephemeral）任务被取消并中断ComfyUI上的prompt；非临时任务、仍有其他订阅者的任务不受影响。
+
+    cd back
+    python -m pytest benchmarks/test_session_cancel.py -q
+"""
+
+import asyncio
+
+import pytest
+
+from core.database_manager import DatabaseManager
+
+
+class FakeComfyUI:
+    def __init__(self):
+        self.cancelled = []
+
+    async def cancel_prompt(self, prompt_id):
+        self.cancelled.append(prompt_id)
+        return "interrupted"
+
+
+@pytest.fixture
+def manager(tmp_path):
+    from core.task_manager import TaskManager
+
+    comfyui = FakeComfyUI()
+    return TaskManager(DatabaseManager(str(tmp_path / "tasks.db")), comfyui, None), comfyui
+
+
+def _start(manager, task_id, ephemeral):
+    manager.db.create_task(task_id, "edit", "uploads/ref.png", {"session_id": "canvas-1", "ephemeral": ephemeral})
+    manager.db.update_task_status(task_id, "processing")
+    run = manager._start_run(task_id, {"session_id": "canvas-1", "ephemeral": ephemeral})
+    run["prompt_id"] = f"prompt-{task_id}"
+
+
+async def _subscribe(stream):
+    """消费事件流，返回的任务被取消即模拟客户端断开"""
+    async def consume():
+        async for _ in stream:
+            pass
+    consumer = asyncio.ensure_future(consume())
+    await asyncio.sleep(0.05)
+    return consumer
+
+
+async def _disconnect(consumer):
+    consumer.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+    await asyncio.sleep(0.05)
+
+
+@pytest.mark.parametrize("stream", ["stream_qwen_edit_events", "stream_live_previews"])
+def test_disconnect_cancels_ephemeral_task(manager, stream):
+    task_manager, comfyui = manager
+    _start(task_manager, "task-1", ephemeral=True)
+
+    async def scenario():
+        consumer = await _subscribe(getattr(task_manager, stream)("task-1"))
+        await _disconnect(consumer)
+
+    asyncio.run(scenario())
+    assert task_manager.db.get_task("task-1")["status"] == "cancelled"
+    assert comfyui.cancelled == ["prompt-task-1"]
+
+
+def test_disconnect_keeps_persistent_and_watched_tasks(manager):
+    task_manager, comfyui = manager
+    _start(task_manager, "kept", ephemeral=False)
+    _start(task_manager, "watched", ephemeral=True)
+
+    async def scenario():
+        await _disconnect(await _subscribe(task_manager.stream_qwen_edit_events("kept")))
+
+        # 同一任务还有另一个事件流时不取消，最后一个订阅者断开后才取消
+        first = await _subscribe(task_manager.stream_qwen_edit_events("watched"))
+        second = await _subscribe(task_manager.stream_live_previews("watched"))
+        await _disconnect(first)
+        assert task_manager.db.get_task("watched")["status"] == "processing"
+        await _disconnect(second)
+
+    asyncio.run(scenario())
+    assert task_manager.db.get_task("kept")["status"] == "processing"
+    assert task_manager.db.get_task("watched")["status"] == "cancelled"
+    assert comfyui.cancelled == ["prompt-watched"]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成任务准备流水线测试
+
+翻译、模型配置获取和工作流构建用固定延迟模拟，检查：
+翻译与配置获取并行；第 k+1 张图片的工作流在第 k 张执行期间准备完成。
+
+    cd back
+    python -m pytest benchmarks/test_task_pipeline.py -q
+"""
+
+import asyncio
+import time
+
+TRANSLATE_SECONDS = 0.3
+CONFIG_SECONDS = 0.3
+BUILD_SECONDS = 0.2
+EXEC_SECONDS = 0.3
+COUNT = 3
+
+
+class FakeDB:
+    def __init__(self):
+        self.status = {}
+
+    def update_task_status(self, task_id, status, result_path=None, error=None):
+        self.status[task_id] = (status, result_path, error)
+
+    def update_task_progress(self, task_id, progress):
+        pass
+
+
+class FakeTemplate:
+    def __init__(self):
+        self.config_fetches = 0
+        self.build_started = []
+
+    async def fetch_model_config(self, model_name):
+        self.config_fetches += 1
+        await asyncio.sleep(CONFIG_SECONDS)
+        return {"model_type": "flux"}
+
+    async def customize_workflow(self, reference_image_path, description, parameters, model_name, model_config=None):
+        assert model_config == {"model_type": "flux"} and description == "translated"
+        self.build_started.append(time.monotonic())
+        await asyncio.sleep(BUILD_SECONDS)
+        return {"seed": parameters["seed"]}
+
+
+def test_preparation_overlaps_execution():
+    from core.task_manager import TaskManager
+
+    db, template = FakeDB(), FakeTemplate()
+    manager = TaskManager(db, None, template)
+    submitted, finished = [], []
+
+    async def translate(model_name, description):
+        await asyncio.sleep(TRANSLATE_SECONDS)
+        return "translated"
+
+    async def submit(task_id, workflow, persist=True, priority=False):
+        submitted.append(time.monotonic())
+        return f"prompt-{len(submitted)}"
+
+    async def wait(task_id, prompt_id, max_wait_time=0):
+        await asyncio.sleep(EXEC_SECONDS)
+        finished.append(time.monotonic())
+        return [f"outputs/{prompt_id}.png"]
+
+    async def no_sleep(task_id, seconds):
+        pass
+
+    manager._translate_description = translate
+    manager._submit_prompt = submit
+    manager.wait_for_completion = wait
+    manager._sleep_unless_cancelled = no_sleep
+
+    async def scenario():
+        start = time.monotonic()
+        await manager.execute_task("task", "", "描述", {"model": "flux-dev", "count": COUNT})
+        return start
+
+    start = asyncio.run(scenario())
+
+    status, result_path, error = db.status["task"]
+    assert status == "completed", error
+    assert len(submitted) == COUNT and template.config_fetches == 1
+    # 首次提交 ≈ max(翻译, 配置) + 构建，而不是依次相加
+    assert submitted[0] - start < TRANSLATE_SECONDS + CONFIG_SECONDS
+    # 后续工作流在前一张执行期间开始准备，执行结束后立即提交
+    for index in range(1, COUNT):
+        assert template.build_started[index] < finished[index - 1]
+        assert submitted[index] - finished[index - 1] < BUILD_SECONDS / 2
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量放大测试
+
+检查：批次条目按并发窗口提交；批次状态中各条目的状态（queued/processing/completed/failed）、
+计数和 finished；服务重启后中断的条目（processing 但没有 prompt_id）重新排队并完成；
+放大状态从数据库读取，已结束的状态进入缓存；后台放大任务由管理器持有直到结束。
+
+    cd back
+    python -m pytest benchmarks/test_upscale_batch.py -q
+"""
+
+import asyncio
+
+import pytest
+
+from core.database_manager import DatabaseManager
+from core.upscale_batch_manager import UpscaleBatchManager
+from core.upscale_manager import UpscaleManager
+
+
+class _FakeUpscale:
+    """代替 start_upscale：标记为processing，等待放行后写入结果，并记录同时处理的数量"""
+
+    def __init__(self, db_manager, fail=()):
+        self.db_manager = db_manager
+        self.fail = set(fail)
+        self.running = 0
+        self.max_running = 0
+        self.started = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, task_id):
+        self.started.append(task_id)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.db_manager.update_task_status(task_id, "processing")
+        try:
+            await self.release.wait()
+            if task_id in self.fail:
+                self.db_manager.update_task_status(task_id, "failed", error="boom")
+            else:
+                self.db_manager.update_task_status(task_id, "completed", result_path=f"/tmp/{task_id}.png")
+        finally:
+            self.running -= 1
+
+
+@pytest.fixture
+def managers(tmp_path):
+    db_manager = DatabaseManager(str(tmp_path / "tasks.db"))
+    upscale_manager = UpscaleManager(None, tmp_path / "outputs", db_manager, task_manager=object())
+    return db_manager, upscale_manager
+
+
+def _create_batch(tmp_path, db_manager, upscale_manager, count, algorithm="lanczos"):
+    item_ids = []
+    for index in range(count):
+        image = tmp_path / f"image{index}.png"
+        image.write_bytes(b"png")
+        item_ids.append(upscale_manager.register_upscale(
+            str(image), 2, algorithm, {"batch_id": "batch-1", "batch_index": index, "filename": image.name}))
+    db_manager.create_upscale_batch("batch-1", item_ids, 2, algorithm)
+    return item_ids
+
+
+def test_batch_window_and_status(tmp_path, managers):
+    db_manager, upscale_manager = managers
+    item_ids = _create_batch(tmp_path, db_manager, upscale_manager, 5)
+    batch_manager = UpscaleBatchManager(upscale_manager, db_manager, concurrency=2)
+
+    async def scenario():
+        fake = _FakeUpscale(db_manager, fail={item_ids[1]})
+        upscale_manager.start_upscale = fake
+        batch_manager._start_runner("batch-1", item_ids)
+        await asyncio.sleep(0.05)
+
+        status = batch_manager.get_batch_status("batch-1")
+        assert fake.started == item_ids[:2]
+        assert status["counts"] == {"queued": 3, "processing": 2, "completed": 0, "failed": 0, "cancelled": 0}
+        assert [item["index"] for item in status["items"]] == [0, 1, 2, 3, 4]
+        assert not status["finished"]
+
+        fake.release.set()
+        await batch_manager._runners["batch-1"]
+        assert fake.max_running == 2
+
+        status = batch_manager.get_batch_status("batch-1")
+        assert status["counts"] == {"queued": 0, "processing": 0, "completed": 4, "failed": 1, "cancelled": 0}
+        assert status["finished"]
+        failed = status["items"][1]
+        assert (failed["status"], failed["result_path"]) == ("failed", None)
+        assert status["items"][0]["result_path"] == f"/tmp/{item_ids[0]}.png"
+
+    asyncio.run(scenario())
+
+
+def test_resume_requeues_interrupted_items(tmp_path, managers):
+    db_manager, upscale_manager = managers
+    item_ids = _create_batch(tmp_path, db_manager, upscale_manager, 3)
+    # 重启前：第一张已完成，第二张本地放大执行到一半（processing，没有prompt_id），第三张尚未提交
+    db_manager.update_task_status(item_ids[0], "completed", result_path="/tmp/done.png")
+    db_manager.update_task_status(item_ids[1], "processing")
+
+    async def scenario():
+        fake = _FakeUpscale(db_manager)
+        fake.release.set()
+        upscale_manager.start_upscale = fake
+        batch_manager = UpscaleBatchManager(upscale_manager, db_manager, concurrency=1)
+
+        assert upscale_manager.resume_unfinished() == 0
+        assert db_manager.get_task(item_ids[1])["status"] == "pending"
+        assert batch_manager.resume_unfinished() == 1
+        await batch_manager._runners["batch-1"]
+
+        assert fake.started == item_ids[1:]
+        status = batch_manager.get_batch_status("batch-1")
+        assert status["finished"] and status["counts"]["completed"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_result_is_read_from_database_and_final_states_cached(tmp_path, managers):
+    db_manager, upscale_manager = managers
+    task_id = _create_batch(tmp_path, db_manager, upscale_manager, 1)[0]
+
+    assert upscale_manager.get_upscale_result(task_id)["status"] == "processing"
+    assert task_id not in upscale_manager.tasks
+
+    db_manager.update_task_status(task_id, "completed", result_path=str(tmp_path / "out" / "result.png"))
+    result = upscale_manager.get_upscale_result(task_id)
+    assert result["status"] == "completed" and result["progress"] == 100
+    assert result["result"]["upscaled_images"] == [f"/api/upscale/image/{task_id}/result.png"]
+    # 已结束的状态缓存后不再读数据库
+    db_manager.get_task = None
+    assert upscale_manager.get_upscale_result(task_id) is result
+
+    # 标记完成却没有结果文件视为失败
+    assert upscale_manager.build_result({"id": "x", "status": "completed"})["status"] == "failed"
+
+
+def test_background_upscale_is_kept_until_finished(tmp_path, managers):
+    import gc
+
+    db_manager, upscale_manager = managers
+    image = tmp_path / "image.png"
+    image.write_bytes(b"png")
+
+    async def scenario():
+        release = asyncio.Event()
+        finished = []
+
+        async def run_local(task_id, parameters):
+            await release.wait()
+            finished.append(task_id)
+
+        upscale_manager._run_local = run_local
+        task_id = (await upscale_manager.upscale_image(str(image), 2, "lanczos"))["task_id"]
+        # 调用方没有保留任务引用：由管理器持有，回收后仍会执行完
+        gc.collect()
+        assert len(upscale_manager._running) == 1
+        release.set()
+        await asyncio.sleep(0.01)
+        assert finished == [task_id] and not upscale_manager._running
+
+    asyncio.run(scenario())
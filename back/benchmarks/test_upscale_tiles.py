@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分块放大切分/拼接测试
+
+    cd back
+    python -m pytest benchmarks/test_upscale_tiles.py -q
+"""
+
+from PIL import Image
+
+
+def test_plan_covers_image_with_overlap():
+    from core.upscale_tiles import plan_tiles
+
+    boxes = plan_tiles(1000, 600, tile=384, overlap=64)
+    covered = Image.new("L", (1000, 600), 0)
+    for left, top, right, bottom in boxes:
+        assert right - left <= 384 and bottom - top <= 384
+        covered.paste(255, (left, top, right, bottom))
+    assert covered.getextrema() == (255, 255)
+
+    lefts = sorted({box[0] for box in boxes})
+    assert all(b - a <= 384 - 64 for a, b in zip(lefts, lefts[1:]))
+    assert plan_tiles(200, 100, tile=384, overlap=64) == [(0, 0, 200, 100)]
+
+
+def test_stitch_reproduces_image_from_consistent_tiles(tmp_path):
+    """各分块内容一致时，羽化拼接的结果与整张放大相同"""
+    from core.upscale_tiles import plan_tiles, stitch_tiles
+
+    source = Image.effect_noise((300, 200), 60).convert("RGB")
+    expected = source.resize((600, 400), Image.Resampling.NEAREST)
+
+    tiles = []
+    for index, box in enumerate(plan_tiles(300, 200, tile=128, overlap=32)):
+        path = tmp_path / f"tile_{index}.png"
+        expected.crop(tuple(value * 2 for value in box)).save(path)
+        tiles.append((box, path))
+
+    output = stitch_tiles(tiles, (300, 200), 2, tmp_path / "output.png")
+    with Image.open(output) as result:
+        assert result.tobytes() == expected.tobytes()
+
+
+def test_stitch_feathers_overlap(tmp_path):
+    """相邻分块颜色不同时，重叠区域内平滑过渡，没有硬接缝"""
+    from core.upscale_tiles import plan_tiles, stitch_tiles
+
+    boxes = plan_tiles(200, 100, tile=128, overlap=56)
+    assert len(boxes) == 2
+    tiles = []
+    for index, (box, value) in enumerate(zip(boxes, (0, 200))):
+        path = tmp_path / f"tile_{index}.png"
+        Image.new("RGB", ((box[2] - box[0]) * 2, (box[3] - box[1]) * 2), (value,) * 3).save(path)
+        tiles.append((box, path))
+
+    output = stitch_tiles(tiles, (200, 100), 2, tmp_path / "output.png")
+    with Image.open(output) as result:
+        row = [result.getpixel((x, 50))[0] for x in range(result.width)]
+    overlap_start, overlap_end = boxes[1][0] * 2, boxes[0][2] * 2
+    assert row[overlap_start - 1] == 0 and row[overlap_end] == 200
+    steps = [b - a for a, b in zip(row, row[1:])]
+    assert all(0 <= step <= 10 for step in steps)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作流构建微基准测试
+
+覆盖 WorkflowTemplate.customize_workflow 分发到的所有工作流类型，
+分别测量有无 LoRA 堆栈、有无参考图时的构建耗时和内存分配。
+
+    cd back
+    pip install -r benchmarks/requirements.txt
+    python -m pytest benchmarks/test_workflow_build_bench.py --benchmark-autosave --alloc-save alloc.json
+    python -m pytest benchmarks/test_workflow_build_bench.py \
+        --benchmark-compare --benchmark-compare-fail=median:20% \
+        --alloc-baseline alloc.json --alloc-threshold 0.2
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+DESCRIPTION = "a red vintage car parked by the sea, 基准测试"
+
+BENCH_LORAS = [
+    {"name": "style_film_grain.safetensors", "strength_model": 0.8, "strength_clip": 0.8, "enabled": True},
+    {"name": "detail_tweaker.safetensors", "strength_model": 0.6, "strength_clip": 0.6, "enabled": True},
+    {"name": "lighting_soft.safetensors", "strength_model": 0.5, "strength_clip": 0.5, "enabled": True},
+]
+
+
+class Case:
+    """一个基准用例：模型 + 参考图数量 + 是否带LoRA"""
+
+    def __init__(self, case_id: str, model_name: str, ref_count: int = 0, loras: bool = False,
+                 extra: Optional[Dict[str, Any]] = None, expects_description: bool = True):
+        self.case_id = case_id
+        self.model_name = model_name
+        self.ref_count = ref_count
+        self.loras = loras
+        self.extra = extra or {}
+        self.expects_description = expects_description
+
+    def reference_paths(self) -> List[str]:
+        return [f"uploads/ref_{i}.png" for i in range(1, self.ref_count + 1)]
+
+    def parameters(self) -> Dict[str, Any]:
+        parameters = {"steps": 8, "count": 1, "seed": 123456789, "size": "1024x1024"}
+        if self.ref_count:
+            parameters["reference_image_paths"] = self.reference_paths()
+        if self.loras:
+            parameters["loras"] = [dict(lora) for lora in BENCH_LORAS]
+        parameters.update(self.extra)
+        return parameters
+
+
+CUSTOMIZE_CASES = [
+    Case("flux-t2i", "flux1-dev"),
+    Case("flux-t2i-lora", "flux1-dev", loras=True),
+    Case("flux-i2i", "flux1-dev", ref_count=1),
+    Case("flux-i2i-lora", "flux1-dev", ref_count=1, loras=True),
+    Case("qwen-t2i", "qwen-image"),
+    Case("qwen-t2i-lora", "qwen-image", loras=True),
+    Case("qwen-i2i", "qwen-image", ref_count=1),
+    Case("qwen-i2i-lora", "qwen-image", ref_count=1, loras=True),
+    Case("qwen-fusion-2", "qwen-image", ref_count=2),
+    Case("qwen-fusion-2-lora", "qwen-image", ref_count=2, loras=True),
+    Case("qwen-fusion-3", "qwen-image", ref_count=3),
+    Case("qwen-outpainting", "qwen-outpainting", ref_count=1,
+         extra={"outpaint_left": 128, "outpaint_right": 128, "outpaint_top": 64, "outpaint_bottom": 64}),
+    Case("wan-t2v", "wan2.2-video"),
+    Case("wan-t2v-lora", "wan2.2-video", loras=True),
+    Case("wan-i2v", "wan2.2-video", ref_count=1),
+    Case("gemini-t2i", "gemini-image"),
+    Case("gemini-1img", "gemini-image", ref_count=1),
+    Case("gemini-2img", "gemini-image", ref_count=2),
+    Case("seedream4-1img", "seedream4", ref_count=1),
+    Case("seedream4-2img", "seedream4", ref_count=2),
+    Case("joycaption", "joycaption", ref_count=1, expects_description=False),
+]
+
+
+def _assert_valid_workflow(workflow: Dict[str, Any], case: Case):
+    """构建结果必须是完整的 ComfyUI API 格式，且描述已注入"""
+    assert isinstance(workflow, dict) and workflow
+    for node_id, node in workflow.items():
+        assert isinstance(node, dict) and "class_type" in node and "inputs" in node, node_id
+    if case.expects_description:
+        assert DESCRIPTION in json.dumps(workflow, ensure_ascii=False)
+
+
+@pytest.fixture(scope="module")
+def event_loop_runner():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.mark.parametrize("case", CUSTOMIZE_CASES, ids=[case.case_id for case in CUSTOMIZE_CASES])
+def test_customize_workflow(case, fake_admin, bench_build, event_loop_runner):
+    """WorkflowTemplate.customize_workflow 端到端构建"""
+    from core.workflow_template import WorkflowTemplate
+
+    template = WorkflowTemplate()
+    references = case.reference_paths()
+    reference_image_path = references[0] if references else ""
+
+    def build():
+        return event_loop_runner(template.customize_workflow(
+            reference_image_path, DESCRIPTION, case.parameters(), case.model_name))
+
+    workflow = bench_build(build)
+    _assert_valid_workflow(workflow, case)
+
+
+@pytest.mark.parametrize("lora_strength", [None, 0.75], ids=["plain", "lora-strength"])
+def test_qwen_edit_workflow(lora_strength, fake_admin, bench_build):
+    """QwenEditWorkflow 局部重绘构建（不经过 customize_workflow 分发）"""
+    from core.model_manager import ModelConfig, ModelType
+    from core.workflows.qwen_edit_workflow import QwenEditWorkflow
+
+    model_config = ModelConfig(ModelType.QWEN, "qwen-image-edit", "Qwen Image Edit",
+                               "qwen_image_edit_fp8_e4m3fn.safetensors",
+                               "qwen_2.5_vl_7b_fp8_scaled.safetensors", "qwen_image_vae.safetensors")
+    case = Case("qwen-edit", "qwen-image-edit", ref_count=1)
+
+    def build():
+        parameters = {"mask_path": "uploads/mask_1.png", "task_id": "bench0001-0000", "steps": 8, "seed": 123456789}
+        if lora_strength is not None:
+            parameters["lora_strength"] = lora_strength
+        return QwenEditWorkflow(model_config).create_workflow("uploads/ref_1.png", DESCRIPTION, parameters)
+
+    workflow = bench_build(build)
+    _assert_valid_workflow(workflow, case)
+
+
+def test_customize_workflow_does_not_share_state(fake_admin, event_loop_runner):
+    """连续两次构建的结果互不影响（为后续模板缓存准备的正确性基线）"""
+    import copy
+    import contextlib
+    import os
+    from core.workflow_template import WorkflowTemplate
+
+    template = WorkflowTemplate()
+    case = Case("qwen-t2i-lora", "qwen-image", loras=True)
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        first = event_loop_runner(template.customize_workflow("", DESCRIPTION, case.parameters(), case.model_name))
+        snapshot = copy.deepcopy(first)
+        second = event_loop_runner(template.customize_workflow("", "another prompt", case.parameters(), case.model_name))
+
+    for node in second.values():
+        node["inputs"]["__bench_marker__"] = True
+    assert first == snapshot
+
+
+def _legacy_apply_parameters(workflow_template: Dict[str, Any], values: Dict[str, Any]) -> Dict[str, Any]:
+    """逐节点匹配 class_type 的参考实现，用于校验编译后的注入计划"""
+    import copy
+
+    workflow = copy.deepcopy(workflow_template)
+    for node in workflow.values():
+        class_type = node.get("class_type", "")
+        inputs = node.get("inputs", {})
+        if class_type in ["CLIPTextEncode", "CLIPTextEncodeAdvanced"] or "text" in inputs:
+            if "text" in inputs:
+                inputs["text"] = values["description"]
+        elif class_type in ["KSampler", "KSamplerAdvanced", "SamplerCustom", "ModelSamplingAuraFlow"]:
+            if "steps" in inputs:
+                inputs["steps"] = values["steps"]
+            if "seed" in inputs and values["seed"] is not None:
+                inputs["seed"] = values["seed"]
+        elif class_type in ["EmptyLatentImage", "LatentUpscale", "LatentFromBatch"]:
+            if "width" in inputs:
+                inputs["width"] = values["width"]
+            if "height" in inputs:
+                inputs["height"] = values["height"]
+        elif class_type == "Google-Gemini":
+            if "prompt" in inputs:
+                inputs["prompt"] = values["description"]
+            if "seed" in inputs and values["seed"] is not None:
+                inputs["seed"] = values["seed"]
+            if "steps" in inputs:
+                inputs["steps"] = values["steps"]
+    return workflow
+
+
+APPLY_TEMPLATES = [
+    "qwen_image_generation_workflow.json",
+    "qwen_image_fusion_workflow.json",
+    "wan2.2_video_generation_workflow.json",
+    "flux1/flux_redux_model_2.json",
+]
+
+
+@pytest.mark.parametrize("template_file", APPLY_TEMPLATES)
+def test_apply_parameters_to_workflow(template_file, bench_build):
+    """customize_workflow_from_config 路径：admin 工作流 + 参数注入"""
+    from conftest import WORKFLOWS_DIR
+    from core.workflow_template import WorkflowTemplate
+
+    with open(WORKFLOWS_DIR / template_file, "r", encoding="utf-8") as f:
+        workflow_template = json.load(f)
+    template = WorkflowTemplate()
+    parameters = {"description": DESCRIPTION, "size": "832x1216", "steps": 12, "seed": 42}
+
+    workflow = bench_build(lambda: template._apply_parameters_to_workflow(workflow_template, parameters))
+
+    expected = _legacy_apply_parameters(workflow_template, {
+        "description": DESCRIPTION, "steps": 12, "seed": 42, "width": 832, "height": 1216})
+    assert workflow == expected
+
+    # 修改结果不能影响模板（旧实现的浅拷贝会共享 inputs）
+    for node in workflow.values():
+        node["inputs"]["__bench_marker__"] = True
+    assert all("__bench_marker__" not in node["inputs"] for node in workflow_template.values())
+
+
+def test_cached_dict_templates_are_not_mutated(fake_admin, event_loop_runner):
+    """配置客户端缓存中的 workflow_json 为字典时，构建不能修改缓存"""
+    import contextlib
+    import copy
+    import os
+    from core.workflow_template import WorkflowTemplate
+
+    for workflow in fake_admin._cache["workflows"]["workflows"]:
+        workflow["workflow_json"] = json.loads(workflow["workflow_json"])
+    cached = copy.deepcopy(fake_admin._cache)
+
+    template = WorkflowTemplate()
+    case = Case("seedream4-2img", "seedream4", ref_count=2)
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        event_loop_runner(template.customize_workflow("uploads/ref_1.png", DESCRIPTION, case.parameters(), case.model_name))
+
+    assert fake_admin._cache == cached
+
+
+def test_flux_workflow_without_template_plan():
+    """子类自行构造的工作流（没有注入计划）也能配置LoRA堆栈和模板变量"""
+    import contextlib
+    import os
+    from conftest import _build_flux_templates
+    from core.model_manager import ModelConfig, ModelType
+    from core.workflows.flux_workflow import FluxWorkflow
+
+    template = _build_flux_templates()["flux_text_to_image_workflow"]
+    # LoRA堆栈不在默认的节点74
+    template["80"] = template.pop("74")
+
+    class DictFluxWorkflow(FluxWorkflow):
+        def _load_flux_kontext_workflow_template(self, workflow_type="flux_text_to_image_workflow"):
+            return json.loads(json.dumps(template))
+
+    model_config = ModelConfig(ModelType.FLUX, "flux1-dev", "FLUX.1 Kontext", "flux1-dev-kontext_fp8_scaled.safetensors",
+                               "clip_l.safetensors", "ae.safetensors")
+    parameters = {"loras": [{"name": "style.safetensors", "strength_model": 0.8, "strength_clip": 0.8}], "seed": 1}
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        workflow = DictFluxWorkflow(model_config).create_workflow("", DESCRIPTION, parameters)
+
+    assert workflow["80"]["inputs"]["lora_01"] == "style.safetensors"
+    assert workflow["6"]["inputs"]["text"] == DESCRIPTION
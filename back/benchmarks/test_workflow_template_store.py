@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作流模板增量同步测试
+
+模拟 admin 的工作流清单和单个模板接口，检查：
+只有sha256变化的模板会重新下载和解析；冷启动时未变化的模板从磁盘加载；admin不可达时使用本地清单；
+确认清单的网络请求不阻塞其他线程加载模板；多个线程同时写入同一缓存文件不会互相覆盖临时文件。
+
+    cd back
+    python -m pytest benchmarks/test_workflow_template_store.py -q
+"""
+
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from conftest import FakeResponse, build_template_routes, build_workflows_payload
+
+BASE_URL = "http://admin.template-store.invalid"
+
+
+class FakeTemplateAdmin:
+    def __init__(self):
+        self.payload = build_workflows_payload()
+        self.routes = build_template_routes(json.dumps(self.payload, ensure_ascii=False))
+        self.online = True
+        self.paths = []
+
+    def get(self, url, *args, **kwargs):
+        if not self.online:
+            raise requests.ConnectionError("admin不可达")
+        path = url[len(BASE_URL):]
+        self.paths.append(path)
+        body = self.routes.get(path)
+        if body is None:
+            return FakeResponse("{}", status_code=404)
+        return FakeResponse(body)
+
+    def update_template(self, code, template):
+        for workflow in self.payload["workflows"]:
+            if workflow["code"] == code:
+                workflow["workflow_json"] = json.dumps(template)
+        self.routes = build_template_routes(json.dumps(self.payload, ensure_ascii=False))
+
+    def downloads(self):
+        return [path for path in self.paths if path.endswith("/template")]
+
+
+@pytest.fixture
+def template_admin(monkeypatch):
+    admin = FakeTemplateAdmin()
+    monkeypatch.setattr(requests, "get", admin.get)
+    return admin
+
+
+def test_only_changed_templates_are_downloaded(template_admin, tmp_path):
+    from core.workflow_template_store import WorkflowTemplateStore
+
+    store = WorkflowTemplateStore(BASE_URL, tmp_path, manifest_ttl=60)
+    first = store.load("qwen_image_generation_workflow")
+    assert first["20"]["class_type"] == "KSampler"
+    assert store.load("qwen_image_generation_workflow") is first
+    assert store.load("missing_workflow") is None
+    # 清单在有效期内只请求一次，模板只下载一次
+    assert len(template_admin.paths) == 2
+
+    workflows = store.load_workflows()
+    codes = [workflow["code"] for workflow in workflows]
+    assert len(template_admin.downloads()) == len(codes)
+    unchanged = {workflow["code"]: workflow["workflow_json"] for workflow in workflows}
+
+    template_admin.update_template("seedream4_volcano_engine", {"1": {"class_type": "SaveImage", "inputs": {}}})
+    template_admin.paths.clear()
+    workflows = store.load_workflows(refresh=True)
+    assert template_admin.downloads() == ["/api/admin/config-sync/workflows/seedream4_volcano_engine/template"]
+    for workflow in workflows:
+        if workflow["code"] == "seedream4_volcano_engine":
+            assert workflow["workflow_json"] == {"1": {"class_type": "SaveImage", "inputs": {}}}
+        else:
+            assert workflow["workflow_json"] is unchanged[workflow["code"]]
+    # 旧版本的模板文件已从磁盘清理
+    assert len(list(tmp_path.glob("*.json"))) == len(codes) + 1
+
+
+def test_cold_start_loads_templates_from_disk(template_admin, tmp_path):
+    from core.workflow_template_store import WorkflowTemplateStore
+
+    WorkflowTemplateStore(BASE_URL, tmp_path).load_workflows()
+    template_admin.paths.clear()
+
+    # 重启后admin可用：只请求清单，模板从磁盘加载
+    store = WorkflowTemplateStore(BASE_URL, tmp_path)
+    assert store.load("wan2.2_video_generation_workflow")
+    assert template_admin.downloads() == [] and store.get_stats()["disk_loads"] == 1
+
+    # 重启后admin不可达：使用磁盘上的清单和模板
+    template_admin.online = False
+    store = WorkflowTemplateStore(BASE_URL, tmp_path)
+    assert store.load("flux_text_to_image_workflow")
+    assert store.load_workflows() is None
+    assert store.get_stats()["admin_available"] is False
+
+
+def test_load_does_not_wait_for_manifest_refresh(template_admin, tmp_path, monkeypatch):
+    from core.workflow_template_store import WorkflowTemplateStore
+
+    store = WorkflowTemplateStore(BASE_URL, tmp_path, manifest_ttl=60)
+    template = store.load("flux_text_to_image_workflow")
+
+    # 清单过期后第一个请求去admin确认，网络请求卡住时其他请求继续使用当前清单
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_get(url, *args, **kwargs):
+        entered.set()
+        release.wait(5)
+        return template_admin.get(url, *args, **kwargs)
+
+    monkeypatch.setattr(requests, "get", slow_get)
+    store.invalidate()
+    refresher = threading.Thread(target=store.load, args=("flux_text_to_image_workflow",))
+    refresher.start()
+    assert entered.wait(5)
+    try:
+        started = time.monotonic()
+        assert store.load("flux_text_to_image_workflow") is template
+        assert time.monotonic() - started < 1
+        assert store.get_stats()["manifest_requests"] == 2
+    finally:
+        release.set()
+        refresher.join(5)
+    assert not refresher.is_alive()
+
+
+def test_concurrent_cache_writes_do_not_collide(tmp_path, capsys):
+    from core.workflow_template_store import WorkflowTemplateStore
+
+    # 多个线程同时缓存同一个模板（同一sha256），临时文件互不覆盖
+    store = WorkflowTemplateStore(BASE_URL, tmp_path)
+    body = json.dumps({"1": {"class_type": "SaveImage", "inputs": {}}}).encode() * 2000
+    barrier = threading.Barrier(8)
+
+    def write():
+        barrier.wait()
+        for _ in range(30):
+            store._write_atomic(tmp_path / "same.json", body)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert "写入工作流模板缓存失败" not in capsys.readouterr().out
+    assert (tmp_path / "same.json").read_bytes() == body
+    assert not list(tmp_path.glob(".*.tmp"))
@@ -6,12 +6,40 @@
 """
 
 import os
+import socket
 from pathlib import Path
 
 # =============================================================================
 # ComfyUI服务配置
 # =============================================================================
 COMFYUI_URL = os.getenv("COMFYUI_URL", "http://127.0.0.1:8188")
+# 同时提交到ComfyUI的prompt上限，其余在后端按模型亲和排队
+COMFYUI_MAX_INFLIGHT_PROMPTS = int(os.getenv("COMFYUI_MAX_INFLIGHT_PROMPTS", "2"))
+# 模型亲和调度的公平时限（秒），超过后按提交顺序放行
+MODEL_AFFINITY_MAX_DELAY = float(os.getenv("MODEL_AFFINITY_MAX_DELAY", "30"))
+
+# =============================================================================
+# 模型预热配置
+# =============================================================================
+# 启动后在ComfyUI健康时为每个模型提交一次低步数prompt，避免首个用户请求承担权重加载时间
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "false").lower() == "true"
+# 只预热指定模型（逗号分隔的模型code），为空时预热全部可用的本地模型
+WARMUP_MODELS = [name.strip() for name in os.getenv("WARMUP_MODELS", "").split(",") if name.strip()]
+WARMUP_INTERVAL = float(os.getenv("WARMUP_INTERVAL", "5"))  # 两个预热prompt之间的间隔（秒）
+WARMUP_STEPS = int(os.getenv("WARMUP_STEPS", "1"))
+WARMUP_SIZE = os.getenv("WARMUP_SIZE", "512x512")
+WARMUP_TIMEOUT = int(os.getenv("WARMUP_TIMEOUT", "300"))  # 单个预热prompt的最长等待（秒）
+WARMUP_HEALTH_TIMEOUT = int(os.getenv("WARMUP_HEALTH_TIMEOUT", "600"))  # 等待ComfyUI健康的最长时间（秒）
+
+# =============================================================================
+# 实时预览配置
+# =============================================================================
+# 通过ComfyUI WebSocket接收采样过程中的预览帧，缩小重新编码后推送给订阅的客户端
+LIVE_PREVIEW_ENABLED = os.getenv("LIVE_PREVIEW_ENABLED", "true").lower() == "true"
+LIVE_PREVIEW_MAX_FPS = float(os.getenv("LIVE_PREVIEW_MAX_FPS", "3"))  # 每个任务每秒最多推送的帧数
+LIVE_PREVIEW_MAX_SIZE = int(os.getenv("LIVE_PREVIEW_MAX_SIZE", "320"))  # 预览帧最长边（像素）
+LIVE_PREVIEW_FORMAT = os.getenv("LIVE_PREVIEW_FORMAT", "webp").lower()  # webp / jpeg
+LIVE_PREVIEW_QUALITY = int(os.getenv("LIVE_PREVIEW_QUALITY", "70"))
 
 # =============================================================================
 # 工作流目录配置
@@ -30,6 +58,15 @@ OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
 # =============================================================================
 ADMIN_BACKEND_URL = os.getenv("ADMIN_BACKEND_URL", "http://localhost:8888")
 
+# =============================================================================
+# 依赖熔断配置（admin后端、Ollama、ComfyUI）
+# =============================================================================
+# 连续失败次数达到阈值后熔断：请求立即失败或使用最后一次成功的配置，后台带抖动地探测恢复
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "5"))  # 首次探测间隔（秒），之后逐次翻倍
+CIRCUIT_MAX_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_MAX_RECOVERY_TIMEOUT", "60"))
+CIRCUIT_PROBE_TIMEOUT = float(os.getenv("CIRCUIT_PROBE_TIMEOUT", "3"))  # 单次探测超时（秒）
+
 # =============================================================================
 # API密钥配置
 # =============================================================================
@@ -60,6 +97,21 @@ else:
 # =============================================================================
 UPLOAD_DIR = Path("uploads")
 OUTPUT_DIR = Path("outputs")
+# admin工作流模板的本地缓存（按内容sha256存放），只下载变化的模板
+WORKFLOW_TEMPLATE_CACHE_DIR = Path(os.getenv("WORKFLOW_TEMPLATE_CACHE_DIR", "cache/workflow_templates"))
+WORKFLOW_MANIFEST_TTL = float(os.getenv("WORKFLOW_MANIFEST_TTL", "10"))  # 工作流清单的本地有效期（秒）
+# 本地LoRA目录索引：持久化的文件清单（按inode/大小/修改时间复用行，只读取safetensors头部）
+LORA_CATALOG_PATH = Path(os.getenv("LORA_CATALOG_PATH", "cache/lora_catalog.json"))
+LORA_CATALOG_WATCH = os.getenv("LORA_CATALOG_WATCH", "true").lower() == "true"  # 监听目录变化（不可用时轮询）
+LORA_CATALOG_POLL_INTERVAL = float(os.getenv("LORA_CATALOG_POLL_INTERVAL", "30"))  # 轮询间隔（秒）
+# 模型文件索引：启动时建立，目录监听或定期巡检更新，可用性检查只读内存
+MODEL_FILE_INDEX_PATH = Path(os.getenv("MODEL_FILE_INDEX_PATH", "cache/model_files.json"))
+MODEL_FILE_WATCH = os.getenv("MODEL_FILE_WATCH", "true").lower() == "true"
+MODEL_FILE_SWEEP_INTERVAL = float(os.getenv("MODEL_FILE_SWEEP_INTERVAL", "300"))  # 无法监听时的巡检间隔（秒）
+MODEL_FILE_HASH = os.getenv("MODEL_FILE_HASH", "false").lower() == "true"  # 后台计算新增/变化文件的sha256
+MODEL_FILE_REPORT_INTERVAL = float(os.getenv("MODEL_FILE_REPORT_INTERVAL", "300"))  # 向admin上报文件清单的心跳间隔（秒）
+# 本节点名称（admin按节点展示模型文件）
+NODE_NAME = os.getenv("NODE_NAME", socket.gethostname())
 
 # 数据库路径配置
 if ENVIRONMENT == "local":
@@ -84,6 +136,29 @@ MAX_WAIT_TIME = 300  # 秒
 MIN_FILE_SIZE = 100  # 字节
 TARGET_IMAGE_WIDTH = 1024
 TARGET_IMAGE_HEIGHT = 1024
+UPSCALE_TASK_CACHE_SIZE = 256  # 内存中缓存的已结束放大任务数量
+# 批量放大同时处理的图片数量，其余条目在后端排队，避免一次性灌满ComfyUI队列
+UPSCALE_BATCH_CONCURRENCY = int(os.getenv("UPSCALE_BATCH_CONCURRENCY", "2"))
+UPSCALE_BATCH_MAX_FILES = int(os.getenv("UPSCALE_BATCH_MAX_FILES", "500"))  # 单个批次的图片数量上限
+# lanczos/bicubic/nearest 在本地进程池中执行，不提交到ComfyUI
+UPSCALE_LOCAL_WORKERS = int(os.getenv("UPSCALE_LOCAL_WORKERS", "2"))
+# 本地放大逐条带输出，单个任务条带缓冲的内存上限
+UPSCALE_LOCAL_MEMORY_LIMIT = int(os.getenv("UPSCALE_LOCAL_MEMORY_LIMIT_MB", "64")) * 1024 * 1024
+# 分块放大：源图按分块切开，每块作为独立prompt提交，失败的分块单独重试
+UPSCALE_TILE_SIZE = int(os.getenv("UPSCALE_TILE_SIZE", "768"))  # 分块边长（源图像素）
+UPSCALE_TILE_OVERLAP = int(os.getenv("UPSCALE_TILE_OVERLAP", "64"))  # 相邻分块重叠（源图像素）
+UPSCALE_TILE_RETRIES = int(os.getenv("UPSCALE_TILE_RETRIES", "2"))
+# 局部重绘只把遮罩区域（加上下文边距）发送给ComfyUI，结果羽化贴回原图
+INPAINT_CROP_ENABLED = os.getenv("INPAINT_CROP_ENABLED", "true").lower() == "true"
+INPAINT_CROP_PADDING = int(os.getenv("INPAINT_CROP_PADDING", "64"))  # 遮罩外框四周的最小上下文边距（像素）
+INPAINT_CROP_MIN_SIZE = int(os.getenv("INPAINT_CROP_MIN_SIZE", "512"))  # 裁剪区域的最小边长（像素）
+INPAINT_FEATHER = int(os.getenv("INPAINT_FEATHER", "16"))  # 贴回原图时的羽化宽度（像素）
+INPAINT_PREVIEW_STEPS = int(os.getenv("INPAINT_PREVIEW_STEPS", "4"))  # 渐进式重绘预览的采样步数
+INPAINT_PREVIEW_SIZE = int(os.getenv("INPAINT_PREVIEW_SIZE", "512"))  # 渐进式重绘预览的扩散边长（像素）
+# 扩图只对新增的边缘条带做扩散，条带结果贴回原图，原图像素保持不变
+OUTPAINT_STRIPS_ENABLED = os.getenv("OUTPAINT_STRIPS_ENABLED", "true").lower() == "true"
+OUTPAINT_STRIP_CONTEXT = int(os.getenv("OUTPAINT_STRIP_CONTEXT", "256"))  # 每个条带包含的原图边缘上下文（像素）
+OUTPAINT_STRIP_RETRIES = int(os.getenv("OUTPAINT_STRIP_RETRIES", "2"))
 
 # =============================================================================
 # 初始化目录
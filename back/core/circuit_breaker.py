@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+依赖熔断器
+admin后端、Ollama、ComfyUI 不可用时，每个请求都要等满超时才能回退。熔断器按依赖共享：
+连续失败达到阈值后进入熔断（open），请求立即失败（调用方可改用最后一次成功的数据）；
+后台按带抖动的指数间隔探测依赖，探测成功后恢复（closed）。
+没有注册探测函数（或不在事件循环中）时，熔断间隔过后放行一个试探请求（half-open）。
+"""
+
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import aiohttp
+
+from config.settings import (
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RECOVERY_TIMEOUT, CIRCUIT_MAX_RECOVERY_TIMEOUT, CIRCUIT_PROBE_TIMEOUT
+)
+
+# 计为依赖故障的异常：连接失败、超时（requests 的异常都是 OSError 的子类）
+TRANSIENT_ERRORS = (OSError, asyncio.TimeoutError, aiohttp.ClientError)
+# 探测间隔的随机抖动比例，避免多个实例同时探测
+PROBE_JITTER = 0.2
+
+
+class CircuitState(Enum):
+    """熔断器状态"""
+    CLOSED = "closed"        # 正常
+    OPEN = "open"            # 熔断：请求立即失败
+    HALF_OPEN = "half_open"  # 试探：放行一个请求
+
+
+class CircuitOpenError(Exception):
+    """依赖处于熔断状态，请求未发出"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name}暂时不可用（熔断中），约{retry_after:.0f}秒后重试")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class _Attempt:
+    """guard() 中的一次调用；依赖返回了错误响应（如5xx）时调用 fail()"""
+    __slots__ = ("failed",)
+
+    def __init__(self):
+        self.failed = False
+
+    def fail(self):
+        self.failed = True
+
+
+class CircuitBreaker:
+    """单个依赖的熔断器（线程安全，同步和异步调用方共用）"""
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT,
+                 max_recovery_timeout: float = CIRCUIT_MAX_RECOVERY_TIMEOUT,
+                 probe_timeout: float = CIRCUIT_PROBE_TIMEOUT):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max(recovery_timeout, max_recovery_timeout)
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        # 当前熔断间隔（每次探测失败翻倍）和下一次允许探测/试探的时间
+        self._open_interval = recovery_timeout
+        self._next_attempt_at = 0.0
+        self._trial_started_at: Optional[float] = None
+        self._probe: Optional[Callable[[], Awaitable[bool]]] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        self._stats = {"opened": 0, "rejected": 0, "probes": 0, "failed_probes": 0}
+        self._last_error: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # 状态
+    # ------------------------------------------------------------------
+
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """是否处于熔断（或试探）状态，调用方据此直接使用最后一次成功的数据"""
+        return self._state is not CircuitState.CLOSED
+
+    def retry_after(self) -> float:
+        return max(0.0, self._next_attempt_at - time.monotonic())
+
+    def set_probe(self, probe: Callable[[], Awaitable[bool]]):
+        """注册后台探测函数（不经过熔断器直接访问依赖，返回依赖是否可用）"""
+        self._probe = probe
+
+    def allow_request(self) -> bool:
+        """是否放行一次请求；熔断时立即返回False"""
+        with self._lock:
+            if self._state is CircuitState.CLOSED:
+                return True
+            now = time.monotonic()
+            probing = self._probing()
+            if self._state is CircuitState.OPEN and not probing and now >= self._next_attempt_at:
+                # 没有后台探测在运行：放行一个试探请求
+                self._state = CircuitState.HALF_OPEN
+                self._trial_started_at = now
+                return True
+            if (self._state is CircuitState.HALF_OPEN and self._trial_started_at is not None
+                    and now - self._trial_started_at > self._open_interval):
+                # 上一个试探请求没有结果（被取消等），重新放行
+                self._trial_started_at = now
+                return True
+            self._stats["rejected"] += 1
+        self._ensure_probe()
+        return False
+
+    def record_success(self):
+        with self._lock:
+            recovered = self._state is not CircuitState.CLOSED
+            self._state = CircuitState.CLOSED
+            self._failures = 0
+            self._open_interval = self.recovery_timeout
+            self._trial_started_at = None
+        if recovered:
+            print(f"✅ {self.name} 已恢复，熔断关闭")
+
+    def record_failure(self, error: Any = None):
+        with self._lock:
+            if error is not None:
+                self._last_error = str(error) or type(error).__name__
+            self._failures += 1
+            if self._state is CircuitState.HALF_OPEN:
+                # 试探失败：延长熔断间隔
+                self._open_interval = min(self._open_interval * 2, self.max_recovery_timeout)
+            elif self._state is CircuitState.OPEN or self._failures < self.failure_threshold:
+                return
+            else:
+                self._stats["opened"] += 1
+                print(f"🔌 {self.name} 连续失败 {self._failures} 次，熔断 {self._open_interval:.0f} 秒: {self._last_error}")
+            self._state = CircuitState.OPEN
+            self._trial_started_at = None
+            self._next_attempt_at = time.monotonic() + self._jittered(self._open_interval)
+        self._ensure_probe()
+
+    def _release_trial(self):
+        """试探请求没有得到结论（取消等），允许下一个请求重新试探"""
+        with self._lock:
+            if self._state is CircuitState.HALF_OPEN:
+                self._state = CircuitState.OPEN
+                self._trial_started_at = None
+
+    @contextmanager
+    def guard(self):
+        """保护一次对依赖的调用
+
+        熔断时抛出 CircuitOpenError，不发出请求；连接失败、超时计为故障后继续抛出；
+        其他异常说明依赖有响应（如参数错误），除非调用了 attempt.fail()，计为成功。
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after())
+        attempt = _Attempt()
+        try:
+            yield attempt
+        except TRANSIENT_ERRORS as e:
+            self.record_failure(e)
+            raise
+        except Exception:
+            if attempt.failed:
+                self.record_failure("错误响应")
+            else:
+                self.record_success()
+            raise
+        except BaseException:
+            self._release_trial()
+            raise
+        if attempt.failed:
+            self.record_failure("错误响应")
+        else:
+            self.record_success()
+
+    # ------------------------------------------------------------------
+    # 后台探测
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _jittered(interval: float) -> float:
+        return interval * random.uniform(1 - PROBE_JITTER, 1 + PROBE_JITTER)
+
+    def _ensure_probe(self):
+        """熔断且注册了探测函数时，在当前事件循环中启动后台探测（不在事件循环中时跳过）"""
+        if self._probe is None or self._state is CircuitState.CLOSED or self._probing():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._probe_task = loop.create_task(self._probe_loop())
+
+    def _probing(self) -> bool:
+        """后台探测是否在运行（所在的事件循环已结束时视为没有运行）"""
+        task = self._probe_task
+        return task is not None and not task.done() and task.get_loop().is_running()
+
+    async def _probe_loop(self):
+        while self._state is not CircuitState.CLOSED:
+            await asyncio.sleep(max(0.0, self._next_attempt_at - time.monotonic()))
+            if self._state is CircuitState.CLOSED:
+                return
+            self._stats["probes"] += 1
+            try:
+                healthy = await asyncio.wait_for(self._probe(), timeout=self.probe_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                healthy = False
+                self._last_error = str(e) or type(e).__name__
+            if healthy:
+                self.record_success()
+                return
+            self._stats["failed_probes"] += 1
+            with self._lock:
+                self._open_interval = min(self._open_interval * 2, self.max_recovery_timeout)
+                self._next_attempt_at = time.monotonic() + self._jittered(self._open_interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self._state.value,
+            "consecutive_failures": self._failures,
+            "retry_after": round(self.retry_after(), 1) if self.is_open else 0,
+            "last_error": self._last_error,
+            **self._stats
+        }
+
+
+# 按依赖名称共享的熔断器
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """获取指定依赖的熔断器（admin、ollama、comfyui），同一依赖的所有调用方共享"""
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(name)
+        if breaker is None:
+            breaker = _circuit_breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def get_circuit_stats() -> Dict[str, Dict[str, Any]]:
+    """所有熔断器的状态"""
+    return {name: breaker.get_stats() for name, breaker in list(_circuit_breakers.items())}
@@ -5,13 +5,24 @@ ComfyUI客户端
 负责与ComfyUI服务进行通信
 """
 
+import uuid
+
 import aiohttp
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 from fastapi import HTTPException
 
+from core.circuit_breaker import CircuitOpenError, get_circuit_breaker
+
+# 提交prompt时使用的client_id，ComfyUI把该prompt的进度和预览帧发给同一client_id的WebSocket
+COMFYUI_CLIENT_ID = uuid.uuid4().hex
+
 
 class ComfyUIClient:
-    """ComfyUI客户端，负责与ComfyUI服务进行通信"""
+    """ComfyUI客户端，负责与ComfyUI服务进行通信
+    
+    所有请求经过 comfyui 熔断器：ComfyUI不可用时立即抛出 CircuitOpenError，
+    轮询任务状态的调用方不再每次等待连接超时。
+    """
     
     def __init__(self, base_url: str):
         """初始化ComfyUI客户端
@@ -20,12 +31,15 @@ class ComfyUIClient:
             base_url: ComfyUI服务的基础URL
         """
         self.base_url = base_url
+        self._breaker = get_circuit_breaker("comfyui")
+        self._breaker.set_probe(self._probe)
     
-    async def submit_workflow(self, workflow: Dict[str, Any]) -> str:
+    async def submit_workflow(self, workflow: Dict[str, Any], front: bool = False) -> str:
         """提交工作流到ComfyUI
         
         Args:
             workflow: 要提交的工作流字典
+            front: 插入ComfyUI队列最前面（高优先级的预览prompt）
             
         Returns:
             prompt_id: 提交后返回的prompt_id
@@ -33,18 +47,28 @@ class ComfyUIClient:
         Raises:
             HTTPException: 当提交失败时抛出
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/prompt",
-                json={"prompt": workflow}
-            ) as response:
-                if response.status != 200:
-                    error_detail = await response.text()
-                    print(f"ComfyUI提交失败，状态码: {response.status}")
-                    print(f"错误详情: {error_detail}")
-                    raise HTTPException(status_code=500, detail=f"Failed to submit workflow to ComfyUI: {error_detail}")
-                result = await response.json()
-                return result["prompt_id"]
+        payload = {"prompt": workflow, "client_id": COMFYUI_CLIENT_ID}
+        if front:
+            payload["front"] = True
+        try:
+            with self._breaker.guard() as attempt:
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(
+                        f"{self.base_url}/prompt",
+                        json=payload
+                    ) as response:
+                        if response.status != 200:
+                            # 4xx是工作流本身的问题，ComfyUI是可用的
+                            if response.status >= 500:
+                                attempt.fail()
+                            error_detail = await response.text()
+                            print(f"ComfyUI提交失败，状态码: {response.status}")
+                            print(f"错误详情: {error_detail}")
+                            raise HTTPException(status_code=500, detail=f"Failed to submit workflow to ComfyUI: {error_detail}")
+                        result = await response.json()
+                        return result["prompt_id"]
+        except CircuitOpenError as e:
+            raise HTTPException(status_code=503, detail=str(e))
     
     async def get_task_status(self, prompt_id: str) -> Dict[str, Any]:
         """查询任务状态
@@ -55,13 +79,16 @@ class ComfyUIClient:
         Returns:
             任务状态信息字典
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.base_url}/history/{prompt_id}"
-            ) as response:
-                if response.status != 200:
-                    return {"status": "unknown"}
-                return await response.json()
+        with self._breaker.guard() as attempt:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(
+                    f"{self.base_url}/history/{prompt_id}"
+                ) as response:
+                    if response.status != 200:
+                        if response.status >= 500:
+                            attempt.fail()
+                        return {"status": "unknown"}
+                    return await response.json()
     
     async def get_queue_status(self) -> Dict[str, Any]:
         """获取队列状态
@@ -69,14 +96,79 @@ class ComfyUIClient:
         Returns:
             队列状态信息字典
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.base_url}/queue"
-            ) as response:
-                if response.status != 200:
-                    return {"queue_running": [], "queue_pending": []}
-                return await response.json()
+        with self._breaker.guard() as attempt:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(
+                    f"{self.base_url}/queue"
+                ) as response:
+                    if response.status != 200:
+                        if response.status >= 500:
+                            attempt.fail()
+                        return {"queue_running": [], "queue_pending": []}
+                    return await response.json()
     
+    async def delete_queued(self, prompt_ids: List[str]) -> bool:
+        """从ComfyUI等待队列中删除prompt
+
+        Args:
+            prompt_ids: 要删除的prompt_id列表
+
+        Returns:
+            True表示请求成功
+        """
+        with self._breaker.guard() as attempt:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    f"{self.base_url}/queue",
+                    json={"delete": prompt_ids}
+                ) as response:
+                    if response.status >= 500:
+                        attempt.fail()
+                    return response.status == 200
+
+    async def interrupt(self, prompt_id: Optional[str] = None) -> bool:
+        """中断ComfyUI正在执行的prompt
+
+        Args:
+            prompt_id: 只中断指定的prompt（旧版ComfyUI会忽略该参数，中断当前执行的prompt）
+
+        Returns:
+            True表示请求成功
+        """
+        payload = {"prompt_id": prompt_id} if prompt_id else {}
+        with self._breaker.guard() as attempt:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    f"{self.base_url}/interrupt",
+                    json=payload
+                ) as response:
+                    if response.status >= 500:
+                        attempt.fail()
+                    return response.status == 200
+
+    async def cancel_prompt(self, prompt_id: str) -> str:
+        """取消prompt：排队中的从队列删除，执行中的中断
+
+        只有确认该prompt正在执行时才调用 /interrupt，避免中断其他用户的任务。
+
+        Args:
+            prompt_id: 要取消的prompt_id
+
+        Returns:
+            "deleted" / "interrupted" / "not_found"
+        """
+        queue_status = await self.get_queue_status()
+        running_ids = {item[1] for item in queue_status.get("queue_running", []) if len(item) > 1}
+        pending_ids = {item[1] for item in queue_status.get("queue_pending", []) if len(item) > 1}
+
+        if prompt_id in running_ids:
+            await self.interrupt(prompt_id)
+            return "interrupted"
+        if prompt_id in pending_ids:
+            await self.delete_queued([prompt_id])
+            return "deleted"
+        return "not_found"
+
     async def check_health(self) -> bool:
         """检查ComfyUI服务健康状态
         
@@ -84,10 +176,20 @@ class ComfyUIClient:
             True表示服务正常，False表示服务异常
         """
         try:
-            timeout = aiohttp.ClientTimeout(total=5)  # 5秒超时
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(f"{self.base_url}/") as response:
-                    return response.status == 200
+            # 熔断中直接返回False，由后台探测判断恢复
+            with self._breaker.guard() as attempt:
+                healthy = await self._probe()
+                if not healthy:
+                    # 非200（如代理返回的502）同样记为失败
+                    attempt.fail()
+                return healthy
         except Exception as e:
             print(f"ComfyUI健康检查失败: {e}")
             return False
+
+    async def _probe(self) -> bool:
+        """请求ComfyUI首页（不经过熔断器），熔断器后台探测也使用该方法"""
+        timeout = aiohttp.ClientTimeout(total=5)  # 5秒超时
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(f"{self.base_url}/") as response:
+                return response.status == 200
@@ -3,134 +3,261 @@
 """
 配置缓存管理模块
 负责本地配置缓存、缓存过期管理、配置版本控制
+
+所有条目存放在一个SQLite文件中（WAL模式）：值为pickle二进制，创建时间和过期时间为整数时间戳。
+启动时一次顺序读取全部条目建立内存索引，命中时只做一次字典查找；写入在单个事务中原子完成，
+多个进程可以同时读写同一个缓存文件。读取时检查 PRAGMA data_version（不读表，最多每
+SYNC_INTERVAL 秒一次），其他进程提交过写入时丢弃内存索引、条目在下次命中时从数据库重新读取，
+因此其他进程的更新最迟 SYNC_INTERVAL 秒后可见，而不是等到TTL过期。
 """
 
 import json
 import pickle
 import hashlib
-from datetime import datetime, timedelta
+import sqlite3
+import threading
+import time
 from pathlib import Path
 from typing import Dict, Any, Optional, Union
 import logging
 
 logger = logging.getLogger(__name__)
 
+CACHE_DB_NAME = "config_cache.db"
+# 旧版本每个键一个pickle文件 + 整体重写的元数据JSON
+LEGACY_METADATA_NAME = "cache_metadata.json"
+# 另一个进程持有写锁时的最长等待（毫秒）
+BUSY_TIMEOUT_MS = 5000
+# 缓存键计算结果的记忆数量上限
+KEY_MEMO_SIZE = 1024
+# 可以记忆缓存键的参数值类型（容器类型中 True/1/1.0 无法按类型区分，不记忆）
+_MEMO_VALUE_TYPES = frozenset((str, int, float, bool, type(None)))
+# 检查其他进程写入的最短间隔（秒）；每次命中都检查会使热命中慢数倍
+SYNC_INTERVAL = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    cache_key TEXT PRIMARY KEY,
+    config_type TEXT NOT NULL,
+    params TEXT,
+    created_at INTEGER NOT NULL,
+    expires_at INTEGER NOT NULL,
+    ttl INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    value BLOB NOT NULL
+)
+"""
+_COLUMNS = "cache_key, config_type, params, created_at, expires_at, ttl, size, value"
+
+
+class _CacheEntry:
+    """内存索引中的一个条目；值在首次命中时才反序列化"""
+
+    __slots__ = ("config_type", "params", "created_at", "expires_at", "ttl", "size", "blob", "value")
+
+    _UNLOADED = object()
+
+    def __init__(self, config_type: str, params: Optional[str], created_at: int, expires_at: int, ttl: int,
+                 size: int, blob: Optional[bytes], value: Any = _UNLOADED):
+        self.config_type = config_type
+        self.params = params
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.ttl = ttl
+        self.size = size
+        self.blob = blob
+        self.value = value
+
+    def is_valid(self, now: int, ttl: Optional[int] = None) -> bool:
+        if ttl:
+            return now < self.created_at + ttl
+        return now < self.expires_at
+
+    def load(self) -> Any:
+        if self.value is _CacheEntry._UNLOADED:
+            self.value = pickle.loads(self.blob)
+            # 反序列化后不再需要原始字节
+            self.blob = None
+        return self.value
+
 
 class ConfigCache:
     """配置缓存管理器"""
-    
-    def __init__(self, cache_dir: Optional[Path] = None, default_ttl: int = 300):
+
+    def __init__(self, cache_dir: Optional[Path] = None, default_ttl: int = 300,
+                 sync_interval: float = SYNC_INTERVAL):
         """
         初始化配置缓存
-        
+
         Args:
             cache_dir: 缓存目录路径
             default_ttl: 默认缓存过期时间（秒）
+            sync_interval: 检查其他进程写入的最短间隔（秒），0表示每次读取都检查
         """
         self.default_ttl = default_ttl
+        self.sync_interval = sync_interval
         self.cache_dir = cache_dir or Path(__file__).parent.parent / "cache" / "config"
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 内存缓存
-        self._memory_cache: Dict[str, Dict[str, Any]] = {}
-        self._cache_metadata: Dict[str, Dict[str, Any]] = {}
-        
+        self.db_path = self.cache_dir / CACHE_DB_NAME
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=BUSY_TIMEOUT_MS / 1000,
+                                     isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._conn.execute(_SCHEMA)
+
+        # 内存索引：缓存键 -> 条目
+        self._entries: Dict[str, _CacheEntry] = {}
+        # (配置类型, 参数) -> 缓存键
+        self._key_memo: Dict[tuple, str] = {}
+        # 最后一次看到的数据库版本（只在其他连接提交写入后变化）
+        self._data_version = self._read_data_version()
+        self._synced_at = time.monotonic()
+
         # 加载现有缓存
-        self._load_cache_metadata()
-    
+        self._remove_legacy_files()
+        self._load_entries()
+
     def _get_cache_key(self, config_type: str, params: Optional[Dict[str, Any]] = None) -> str:
         """生成缓存键"""
         if params:
+            # 参数都是标量时记住计算结果，热命中不再重复序列化；
+            # 记忆键带上类型，True、1、1.0 相等但序列化结果不同
+            memo_key, cache_key = self._memo_key(config_type, params), None
+            if memo_key is not None:
+                cache_key = self._key_memo.get(memo_key)
+            if cache_key is not None:
+                return cache_key
+
             # 将参数序列化为字符串并生成哈希
             params_str = json.dumps(params, sort_keys=True)
             params_hash = hashlib.md5(params_str.encode()).hexdigest()[:8]
-            return f"{config_type}_{params_hash}"
+            cache_key = f"{config_type}_{params_hash}"
+            if memo_key is not None:
+                if len(self._key_memo) >= KEY_MEMO_SIZE:
+                    self._key_memo.clear()
+                self._key_memo[memo_key] = cache_key
+            return cache_key
         return config_type
-    
-    def _get_cache_file_path(self, cache_key: str) -> Path:
-        """获取缓存文件路径"""
-        return self.cache_dir / f"{cache_key}.cache"
-    
-    def _get_metadata_file_path(self, cache_key: str) -> Path:
-        """获取元数据文件路径"""
-        return self.cache_dir / f"{cache_key}.meta"
-    
-    def _load_cache_metadata(self):
-        """加载缓存元数据"""
+
+    def _read_data_version(self) -> Optional[int]:
         try:
-            metadata_file = self.cache_dir / "cache_metadata.json"
-            if metadata_file.exists():
-                with open(metadata_file, 'r', encoding='utf-8') as f:
-                    self._cache_metadata = json.load(f)
-            else:
-                self._cache_metadata = {}
-        except Exception as e:
-            logger.error(f"加载缓存元数据失败: {e}")
-            self._cache_metadata = {}
-    
-    def _save_cache_metadata(self):
-        """保存缓存元数据"""
+            with self._lock:
+                return self._conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"读取缓存版本失败: {e}")
+            return None
+
+    def _sync_external_writes(self):
+        """其他进程（或其他实例）提交过写入时丢弃内存索引"""
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
         try:
-            metadata_file = self.cache_dir / "cache_metadata.json"
-            with open(metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(self._cache_metadata, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"保存缓存元数据失败: {e}")
-    
-    def _is_cache_valid(self, cache_key: str, ttl: Optional[int] = None) -> bool:
-        """检查缓存是否有效"""
-        if cache_key not in self._cache_metadata:
-            return False
-        
-        metadata = self._cache_metadata[cache_key]
-        cache_time = datetime.fromisoformat(metadata["created_at"])
-        cache_ttl = ttl or metadata.get("ttl", self.default_ttl)
-        
-        return datetime.now() - cache_time < timedelta(seconds=cache_ttl)
-    
-    def get(self, config_type: str, params: Optional[Dict[str, Any]] = None, 
+            with self._lock:
+                version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                if version != self._data_version:
+                    self._data_version = version
+                    self._entries = {}
+        except sqlite3.Error as e:
+            logger.error(f"读取缓存版本失败: {e}")
+
+    @staticmethod
+    def _memo_key(config_type: str, params: Dict[str, Any]) -> Optional[tuple]:
+        """缓存键的记忆键；参数中有非标量值或键无法排序时返回None（不记忆）"""
+        try:
+            items = sorted(params.items())
+        except TypeError:
+            return None
+        parts = []
+        for key, value in items:
+            value_type = type(value)
+            if value_type not in _MEMO_VALUE_TYPES:
+                return None
+            parts.append((key, type(key), value, value_type))
+        return config_type, tuple(parts)
+
+    def _load_entries(self):
+        """一次顺序读取全部未过期条目，建立内存索引"""
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM cache_entries WHERE expires_at > ?", (int(time.time()),)
+                ).fetchall()
+            self._entries = {row[0]: _CacheEntry(*row[1:]) for row in rows}
+        except sqlite3.Error as e:
+            logger.error(f"加载缓存失败: {e}")
+            self._entries = {}
+
+    def _remove_legacy_files(self):
+        """删除旧版本的逐键pickle文件和元数据JSON（缓存数据，不做迁移）"""
+        legacy_files = list(self.cache_dir.glob("*.cache"))
+        metadata_file = self.cache_dir / LEGACY_METADATA_NAME
+        if metadata_file.exists():
+            legacy_files.append(metadata_file)
+        for path in legacy_files:
+            try:
+                path.unlink()
+            except OSError as e:
+                logger.error(f"删除旧缓存文件失败: {e}")
+        if legacy_files:
+            logger.info(f"已删除 {len(legacy_files)} 个旧版本缓存文件")
+
+    def _fetch_entry(self, cache_key: str) -> Optional[_CacheEntry]:
+        """内存索引未命中时查询数据库（其他进程写入的条目）"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM cache_entries WHERE cache_key = ?", (cache_key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"读取缓存失败: {e}")
+            return None
+        if row is None:
+            return None
+        entry = _CacheEntry(*row[1:])
+        self._entries[cache_key] = entry
+        return entry
+
+    def get(self, config_type: str, params: Optional[Dict[str, Any]] = None,
             ttl: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
         获取缓存配置
-        
+
         Args:
             config_type: 配置类型
             params: 查询参数
             ttl: 缓存过期时间
-            
+
         Returns:
             缓存的配置数据，如果不存在或已过期则返回None
         """
         cache_key = self._get_cache_key(config_type, params)
-        
-        # 检查内存缓存
-        if cache_key in self._memory_cache and self._is_cache_valid(cache_key, ttl):
-            logger.debug(f"从内存缓存获取配置: {config_type}")
-            return self._memory_cache[cache_key]
-        
-        # 检查文件缓存
-        cache_file = self._get_cache_file_path(cache_key)
-        if cache_file.exists() and self._is_cache_valid(cache_key, ttl):
-            try:
-                with open(cache_file, 'rb') as f:
-                    cached_data = pickle.load(f)
-                
-                # 更新内存缓存
-                self._memory_cache[cache_key] = cached_data
-                logger.debug(f"从文件缓存获取配置: {config_type}")
-                return cached_data
-            except Exception as e:
-                logger.error(f"读取文件缓存失败: {e}")
-                # 删除损坏的缓存文件
-                self.remove(config_type, params)
-        
-        return None
-    
-    def set(self, config_type: str, data: Dict[str, Any], 
+        now = int(time.time())
+        self._sync_external_writes()
+        entry = self._entries.get(cache_key)
+        if entry is None or not entry.is_valid(now, ttl):
+            # 未命中或已过期时查询数据库，其他进程可能已写入新值
+            entry = self._fetch_entry(cache_key)
+            if entry is None or not entry.is_valid(now, ttl):
+                return None
+
+        try:
+            return entry.load()
+        except Exception as e:
+            logger.error(f"读取缓存失败: {e}")
+            # 删除损坏的缓存条目
+            self.remove(config_type, params)
+            return None
+
+    def set(self, config_type: str, data: Dict[str, Any],
             params: Optional[Dict[str, Any]] = None, ttl: Optional[int] = None):
         """
         设置缓存配置
-        
+
         Args:
             config_type: 配置类型
             data: 配置数据
@@ -139,142 +266,112 @@ class ConfigCache:
         """
         cache_key = self._get_cache_key(config_type, params)
         cache_ttl = ttl or self.default_ttl
-        
-        # 更新内存缓存
-        self._memory_cache[cache_key] = data
-        
-        # 更新元数据
-        self._cache_metadata[cache_key] = {
-            "config_type": config_type,
-            "params": params,
-            "created_at": datetime.now().isoformat(),
-            "ttl": cache_ttl,
-            "size": len(str(data))
-        }
-        
-        # 保存到文件缓存
+        created_at = int(time.time())
+        params_str = json.dumps(params, sort_keys=True) if params else None
+
         try:
-            cache_file = self._get_cache_file_path(cache_key)
-            with open(cache_file, 'wb') as f:
-                pickle.dump(data, f)
-            
-            self._save_cache_metadata()
-            logger.debug(f"配置已缓存: {config_type}")
+            blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
         except Exception as e:
-            logger.error(f"保存文件缓存失败: {e}")
-    
+            logger.error(f"序列化缓存失败: {e}")
+            return
+
+        entry = _CacheEntry(config_type, params_str, created_at, created_at + cache_ttl, cache_ttl,
+                            len(blob), None, data)
+        try:
+            with self._lock:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO cache_entries ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (cache_key, config_type, params_str, created_at, entry.expires_at, cache_ttl, len(blob), blob)
+                )
+                self._entries[cache_key] = entry
+            logger.debug(f"配置已缓存: {config_type}")
+        except sqlite3.Error as e:
+            logger.error(f"保存缓存失败: {e}")
+
     def remove(self, config_type: str, params: Optional[Dict[str, Any]] = None):
         """
         删除缓存配置
-        
+
         Args:
             config_type: 配置类型
             params: 查询参数
         """
         cache_key = self._get_cache_key(config_type, params)
-        
-        # 删除内存缓存
-        if cache_key in self._memory_cache:
-            del self._memory_cache[cache_key]
-        
-        # 删除文件缓存
-        cache_file = self._get_cache_file_path(cache_key)
-        if cache_file.exists():
-            try:
-                cache_file.unlink()
-            except Exception as e:
-                logger.error(f"删除缓存文件失败: {e}")
-        
-        # 删除元数据
-        if cache_key in self._cache_metadata:
-            del self._cache_metadata[cache_key]
-            self._save_cache_metadata()
-        
+        self._remove_by_key(cache_key)
         logger.debug(f"缓存已删除: {config_type}")
-    
+
     def clear(self, config_type: Optional[str] = None):
         """
         清空缓存
-        
+
         Args:
             config_type: 指定配置类型，如果为None则清空所有缓存
         """
-        if config_type:
-            # 清空指定类型的缓存
-            keys_to_remove = [
-                key for key in self._cache_metadata.keys()
-                if self._cache_metadata[key]["config_type"] == config_type
-            ]
-            for key in keys_to_remove:
-                self._remove_by_key(key)
-        else:
-            # 清空所有缓存
-            keys_to_remove = list(self._cache_metadata.keys())
-            for key in keys_to_remove:
-                self._remove_by_key(key)
-        
+        try:
+            with self._lock:
+                if config_type:
+                    # 清空指定类型的缓存
+                    self._conn.execute("DELETE FROM cache_entries WHERE config_type = ?", (config_type,))
+                    self._entries = {key: entry for key, entry in self._entries.items()
+                                     if entry.config_type != config_type}
+                else:
+                    # 清空所有缓存
+                    self._conn.execute("DELETE FROM cache_entries")
+                    self._entries = {}
+        except sqlite3.Error as e:
+            logger.error(f"清空缓存失败: {e}")
+
         logger.info(f"缓存已清空: {config_type or 'all'}")
-    
+
     def _remove_by_key(self, cache_key: str):
         """根据缓存键删除缓存"""
-        # 删除内存缓存
-        if cache_key in self._memory_cache:
-            del self._memory_cache[cache_key]
-        
-        # 删除文件缓存
-        cache_file = self._get_cache_file_path(cache_key)
-        if cache_file.exists():
-            try:
-                cache_file.unlink()
-            except Exception as e:
-                logger.error(f"删除缓存文件失败: {e}")
-        
-        # 删除元数据
-        if cache_key in self._cache_metadata:
-            del self._cache_metadata[cache_key]
-    
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM cache_entries WHERE cache_key = ?", (cache_key,))
+                self._entries.pop(cache_key, None)
+        except sqlite3.Error as e:
+            logger.error(f"删除缓存失败: {e}")
+
     def cleanup_expired(self):
         """清理过期缓存"""
-        expired_keys = []
-        current_time = datetime.now()
-        
-        for cache_key, metadata in self._cache_metadata.items():
-            cache_time = datetime.fromisoformat(metadata["created_at"])
-            cache_ttl = metadata.get("ttl", self.default_ttl)
-            
-            if current_time - cache_time >= timedelta(seconds=cache_ttl):
-                expired_keys.append(cache_key)
-        
-        for key in expired_keys:
-            self._remove_by_key(key)
-        
-        if expired_keys:
-            self._save_cache_metadata()
-            logger.info(f"已清理 {len(expired_keys)} 个过期缓存")
-    
+        now = int(time.time())
+        try:
+            with self._lock:
+                removed = self._conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,)).rowcount
+                self._entries = {key: entry for key, entry in self._entries.items() if entry.expires_at > now}
+        except sqlite3.Error as e:
+            logger.error(f"清理过期缓存失败: {e}")
+            return
+
+        if removed:
+            logger.info(f"已清理 {removed} 个过期缓存")
+
+    def close(self):
+        """关闭缓存数据库连接"""
+        with self._lock:
+            self._conn.close()
+
     def get_cache_info(self) -> Dict[str, Any]:
         """获取缓存信息"""
+        now = int(time.time())
         total_size = 0
         valid_count = 0
-        expired_count = 0
-        
-        for cache_key, metadata in self._cache_metadata.items():
-            total_size += metadata.get("size", 0)
-            
-            if self._is_cache_valid(cache_key):
+
+        for entry in self._entries.values():
+            total_size += entry.size
+            if entry.is_valid(now):
                 valid_count += 1
-            else:
-                expired_count += 1
-        
+
         return {
-            "total_entries": len(self._cache_metadata),
+            "total_entries": len(self._entries),
             "valid_entries": valid_count,
-            "expired_entries": expired_count,
+            "expired_entries": len(self._entries) - valid_count,
             "total_size": total_size,
             "cache_dir": str(self.cache_dir),
+            "cache_file": str(self.db_path),
             "default_ttl": self.default_ttl
         }
-    
+
     def get_cache_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
         stats = {
@@ -285,39 +382,34 @@ class ConfigCache:
                 "very_old": 0     # 24小时以上
             }
         }
-        
-        current_time = datetime.now()
-        
-        for cache_key, metadata in self._cache_metadata.items():
-            config_type = metadata["config_type"]
-            created_at = datetime.fromisoformat(metadata["created_at"])
-            age_hours = (current_time - created_at).total_seconds() / 3600
-            
+
+        now = int(time.time())
+
+        for entry in self._entries.values():
+            age_seconds = now - entry.created_at
+
             # 按类型统计
-            if config_type not in stats["by_type"]:
-                stats["by_type"][config_type] = {
-                    "count": 0,
-                    "size": 0,
-                    "valid": 0,
-                    "expired": 0
-                }
-            
-            stats["by_type"][config_type]["count"] += 1
-            stats["by_type"][config_type]["size"] += metadata.get("size", 0)
-            
-            if self._is_cache_valid(cache_key):
-                stats["by_type"][config_type]["valid"] += 1
+            type_stats = stats["by_type"].setdefault(entry.config_type, {
+                "count": 0,
+                "size": 0,
+                "valid": 0,
+                "expired": 0
+            })
+            type_stats["count"] += 1
+            type_stats["size"] += entry.size
+            if entry.is_valid(now):
+                type_stats["valid"] += 1
             else:
-                stats["by_type"][config_type]["expired"] += 1
-            
+                type_stats["expired"] += 1
+
             # 按年龄统计
-            if age_hours < 1:
+            if age_seconds < 3600:
                 stats["by_age"]["recent"] += 1
-            elif age_hours < 24:
+            elif age_seconds < 86400:
                 stats["by_age"]["old"] += 1
             else:
                 stats["by_age"]["very_old"] += 1
-        
+
         return stats
 
 
@@ -334,14 +426,14 @@ def get_config_cache() -> ConfigCache:
 
 
 # 便捷函数
-def cache_config(config_type: str, data: Dict[str, Any], 
+def cache_config(config_type: str, data: Dict[str, Any],
                 params: Optional[Dict[str, Any]] = None, ttl: Optional[int] = None):
     """缓存配置"""
     cache = get_config_cache()
     cache.set(config_type, data, params, ttl)
 
 
-def get_cached_config(config_type: str, params: Optional[Dict[str, Any]] = None, 
+def get_cached_config(config_type: str, params: Optional[Dict[str, Any]] = None,
                      ttl: Optional[int] = None) -> Optional[Dict[str, Any]]:
     """获取缓存的配置"""
     cache = get_config_cache()
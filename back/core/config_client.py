@@ -15,6 +15,9 @@ from typing import Dict, List, Any, Optional, Union
 from enum import Enum
 import logging
 
+from core.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from core.workflow_template_store import get_workflow_template_store
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,6 +31,17 @@ class ConfigSource(Enum):
     ERROR = "error"      # 配置错误
 
 
+# 长轮询返回的变化部分 -> 需要重新拉取的配置类型（生图配置中的基础模型顺序依赖可用模型）
+WATCH_CONFIG_TYPES = {
+    "models": ("models", "image_gen"),
+    "loras": ("loras",),
+    "workflows": ("workflows",),
+    "image_gen": ("image_gen",),
+}
+# 监听连接失败后的最大重连间隔（秒）
+WATCH_MAX_RETRY_DELAY = 30
+
+
 class ConfigClient:
     """配置客户端核心类"""
     
@@ -46,11 +60,15 @@ class ConfigClient:
         
         self.backend_url = admin_backend_url
         self.cache_ttl = int(os.getenv("CONFIG_CACHE_TTL", "300"))  # 5分钟缓存
-        self.sync_interval = int(os.getenv("CONFIG_SYNC_INTERVAL", "60"))  # 1分钟同步间隔
+        # 配置变化监听：与admin保持一个长轮询连接，配置变化时立即更新内存中的配置
+        self.watch_enabled = os.getenv("CONFIG_WATCH_ENABLED", "true").lower() == "true"
+        self.watch_timeout = int(os.getenv("CONFIG_WATCH_TIMEOUT", "30"))  # 单次长轮询的等待时间（秒）
         
         # 配置缓存
         self._cache: Dict[str, Dict[str, Any]] = {}
         self._cache_timestamps: Dict[str, datetime] = {}
+        # 条件请求：URL -> (ETag, 响应体)，配置未变化时admin返回304，复用上次的响应
+        self._etag_cache: Dict[str, tuple] = {}
         
         # 本地配置文件路径
         self.local_config_path = Path(__file__).parent.parent / "config" / "local_config.yaml"
@@ -58,67 +76,136 @@ class ConfigClient:
         # 健康状态
         self._backend_healthy = True
         self._last_health_check = None
+        # admin熔断器（与工作流模板加载共享）：admin不可用时请求立即失败，使用最后一次成功的配置
+        self._breaker = get_circuit_breaker("admin")
+        self._breaker.set_probe(self._probe_backend)
         
-        # 启动后台同步任务
-        self._sync_task = None
-        # 暂时禁用后台同步任务，避免在Docker环境中产生连接错误
-        # self._start_sync_task()
+        # 配置变化监听任务；已同步时请求路径直接使用内存中的配置，不访问网络
+        self._watch_task: Optional[asyncio.Task] = None
+        self._watch_version = 0
+        self._watch_synced = False
     
-    def _start_sync_task(self):
-        """启动后台同步任务"""
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                self._sync_task = asyncio.create_task(self._background_sync())
-            else:
-                # 如果事件循环未运行，延迟启动
-                asyncio.run_coroutine_threadsafe(self._background_sync(), loop)
-        except Exception as e:
-            logger.warning(f"启动后台同步任务失败: {e}")
+    def start_watch(self) -> bool:
+        """启动配置变化监听（已启动或未启用时返回False）"""
+        if not self.watch_enabled or (self._watch_task is not None and not self._watch_task.done()):
+            return False
+        self._watch_task = asyncio.create_task(self._watch_loop())
+        return True
     
-    async def _background_sync(self):
-        """后台配置同步任务"""
-        while True:
-            try:
-                await asyncio.sleep(self.sync_interval)
-                await self._sync_all_configs()
-            except Exception as e:
-                logger.error(f"后台同步任务错误: {e}")
-                await asyncio.sleep(30)  # 错误时等待30秒再重试
+    async def stop_watch(self):
+        """停止配置变化监听"""
+        if self._watch_task is None:
+            return
+        self._watch_task.cancel()
+        await asyncio.gather(self._watch_task, return_exceptions=True)
+        self._watch_task = None
+        self._watch_synced = False
     
-    async def _sync_all_configs(self):
-        """同步所有配置"""
-        try:
-            # 检查后台服务健康状态
-            await self.check_backend_health()
-            
-            if self._backend_healthy:
-                # 同步各种配置
-                await self._sync_models_config()
-                await self._sync_loras_config()
-                await self._sync_workflows_config()
-                await self._sync_image_gen_config()
-                logger.info("配置同步完成")
-            else:
-                logger.warning("后台服务不可用，跳过配置同步")
-        except Exception as e:
-            logger.error(f"配置同步失败: {e}")
+    async def _watch_loop(self):
+        """长轮询admin的配置版本：首次全部拉取，之后只按顺序拉取变化的配置类型
+        
+        连接失败时退回到请求路径直接访问admin，并指数退避重连。
+        """
+        url = f"{self.backend_url.rstrip('/')}/api/admin/config-sync/watch"
+        delay = 1
+        async with aiohttp.ClientSession() as session:
+            while True:
+                try:
+                    params = {"since": self._watch_version, "timeout": self.watch_timeout}
+                    timeout = aiohttp.ClientTimeout(total=self.watch_timeout + 10)
+                    if self._breaker.is_open:
+                        # admin熔断中：等待后台探测恢复后再连接
+                        raise CircuitOpenError(self._breaker.name, self._breaker.retry_after())
+                    async with session.get(url, params=params, timeout=timeout) as response:
+                        if response.status != 200:
+                            raise Exception(f"状态码: {response.status}")
+                        result = await response.json()
+                    
+                    if not self._watch_synced:
+                        config_types = ["models", "loras", "workflows", "image_gen"]
+                    else:
+                        config_types = []
+                        for section in result.get("changed", []):
+                            for config_type in WATCH_CONFIG_TYPES.get(section, ()):
+                                if config_type not in config_types:
+                                    config_types.append(config_type)
+                    
+                    if config_types:
+                        await self._refresh_config_types(config_types)
+                    if not self._watch_synced:
+                        logger.info(f"配置监听已同步: version={result.get('version')}")
+                    self._watch_version = result.get("version", 0)
+                    self._watch_synced = True
+                    delay = 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError, OSError)):
+                        self._breaker.record_failure(e)
+                    if self._watch_synced or delay == 1:
+                        logger.warning(f"配置监听连接失败，请求路径暂时直接访问admin: {e}")
+                    self._watch_synced = False
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, WATCH_MAX_RETRY_DELAY)
+    
+    async def _refresh_config_types(self, config_types: List[str]):
+        """按顺序从admin重新拉取指定的配置类型并更新缓存，任一失败时抛出异常"""
+        fetchers = {
+            "models": self.get_models_config,
+            "loras": self.get_loras_config,
+            "workflows": self.get_workflows_config,
+            "image_gen": self.get_image_gen_config,
+        }
+        for config_type in config_types:
+            config = await fetchers[config_type](refresh=True)
+            if config.get("config_source") in (ConfigSource.CACHE.value, ConfigSource.ERROR.value):
+                raise Exception(f"拉取{config_type}配置失败")
+            logger.info(f"配置已更新: {config_type}")
+    
+    def _get_watched_config(self, config_type: str) -> Optional[Dict[str, Any]]:
+        """监听已同步时返回内存中的配置（浅拷贝），否则返回None"""
+        if self._watch_synced and config_type in self._cache:
+            return dict(self._cache[config_type])
+        return None
     
     async def _make_request(self, endpoint: str, timeout: int = 10) -> Optional[Dict[str, Any]]:
-        """发起HTTP请求"""
+        """发起HTTP请求（admin熔断时立即返回None）"""
+        url = f"{self.backend_url.rstrip('/')}/{endpoint.lstrip('/')}"
         try:
-            url = f"{self.backend_url.rstrip('/')}/{endpoint.lstrip('/')}"
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
+            with self._breaker.guard() as attempt:
+                headers = {}
+                cached = self._etag_cache.get(url)
+                if cached:
+                    headers["If-None-Match"] = cached[0]
+                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+                    async with session.get(url, headers=headers) as response:
+                        if response.status == 304 and cached:
+                            # 每次返回新解析的对象，调用方可以自由修改
+                            return json.loads(cached[1])
+                        if response.status == 200:
+                            body = await response.read()
+                            etag = response.headers.get("ETag")
+                            if etag:
+                                self._etag_cache[url] = (etag, body)
+                            return json.loads(body)
+                        if response.status >= 500:
+                            attempt.fail()
                         logger.warning(f"请求失败: {url}, 状态码: {response.status}")
                         return None
+        except CircuitOpenError as e:
+            logger.debug(f"跳过请求: {url}, {e}")
+            return None
         except Exception as e:
             logger.error(f"请求异常: {url}, 错误: {e}")
             return None
     
+    async def _probe_backend(self) -> bool:
+        """admin熔断时的后台探测（不经过熔断器）"""
+        url = f"{self.backend_url.rstrip('/')}/api/admin/config-sync/health"
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self._breaker.probe_timeout)) as session:
+            async with session.get(url) as response:
+                return response.status < 500
+    
     async def check_backend_health(self) -> bool:
         """检查后台服务健康状态"""
         try:
@@ -158,8 +245,8 @@ class ConfigClient:
                 backend_data["last_updated"] = datetime.now().isoformat()
             return backend_data
         
-        # 2. 使用缓存配置
-        if self._is_cache_valid(config_type) and config_type in self._cache:
+        # 2. 使用缓存配置；admin熔断时使用最后一次成功的配置（不受缓存有效期限制）
+        if config_type in self._cache and (self._is_cache_valid(config_type) or self._breaker.is_open):
             cached_data = self._cache[config_type].copy()
             cached_data["config_source"] = ConfigSource.CACHE.value
             return cached_data
@@ -187,15 +274,24 @@ class ConfigClient:
             return None
     
     
-    async def get_models_config(self) -> Dict[str, Any]:
-        """获取模型配置"""
+    async def get_models_config(self, refresh: bool = False) -> Dict[str, Any]:
+        """获取模型配置
+        
+        Args:
+            refresh: 忽略监听同步的内存配置，直接从admin拉取
+        """
+        if not refresh:
+            watched = self._get_watched_config("models")
+            if watched is not None:
+                return watched
+        
         try:
-            # 尝试从admin后端获取基础模型列表
-            backend_data = await self._make_request("/api/admin/image-gen-config/base-models")
+            # 尝试从admin后端的配置快照获取基础模型列表（已按排序配置排好，未变化时为304）
+            backend_data = await self._make_request("/api/admin/config-sync/models")
             if backend_data and "models" in backend_data:
-                # 转换admin后端的格式到主服务需要的格式
+                # 转换admin后端的格式到主服务需要的格式（快照包含不可用模型，这里只保留可用的）
                 models_data = {
-                    "models": backend_data["models"],
+                    "models": [model for model in backend_data["models"] if model.get("available", True)],
                     "config_source": "admin_backend",
                     "last_updated": datetime.now().isoformat()
                 }
@@ -206,8 +302,17 @@ class ConfigClient:
             logger.error(f"获取模型配置失败: {e}")
             return self._get_config_with_fallback("models")
     
-    async def get_loras_config(self) -> Dict[str, Any]:
-        """获取LoRA配置"""
+    async def get_loras_config(self, refresh: bool = False) -> Dict[str, Any]:
+        """获取LoRA配置
+        
+        Args:
+            refresh: 忽略监听同步的内存配置，直接从admin拉取
+        """
+        if not refresh:
+            watched = self._get_watched_config("loras")
+            if watched is not None:
+                return watched
+        
         try:
             # 尝试从admin后端获取LoRA配置
             backend_data = await self._make_request("/api/admin/config-sync/loras")
@@ -245,11 +350,24 @@ class ConfigClient:
                 "角色设计"
             ]
     
-    async def get_workflows_config(self) -> Dict[str, Any]:
-        """获取工作流配置"""
+    async def get_workflows_config(self, refresh: bool = False) -> Dict[str, Any]:
+        """获取工作流配置
+        
+        Args:
+            refresh: 忽略监听同步的内存配置，直接从admin拉取
+        """
+        if not refresh:
+            watched = self._get_watched_config("workflows")
+            if watched is not None:
+                return watched
+        
         try:
-            # 尝试从admin后端获取工作流配置
-            backend_data = await self._make_request("/api/admin/config-sync/workflows")
+            # 工作流清单 + 本地模板缓存，只下载变化的模板；admin不支持清单接口时获取完整列表
+            workflows = await asyncio.to_thread(get_workflow_template_store().load_workflows, refresh)
+            if workflows is not None:
+                backend_data = {"workflows": workflows}
+            else:
+                backend_data = await self._make_request("/api/admin/config-sync/workflows")
             if backend_data and "workflows" in backend_data:
                 # 转换admin后端的格式到主服务需要的格式
                 workflows_data = {
@@ -264,11 +382,20 @@ class ConfigClient:
             logger.error(f"获取工作流配置失败: {e}")
             return self._get_config_with_fallback("workflows")
     
-    async def get_image_gen_config(self) -> Dict[str, Any]:
-        """获取生图配置"""
+    async def get_image_gen_config(self, refresh: bool = False) -> Dict[str, Any]:
+        """获取生图配置
+        
+        Args:
+            refresh: 忽略监听同步的内存配置，直接从admin拉取
+        """
+        if not refresh:
+            watched = self._get_watched_config("image_gen")
+            if watched is not None:
+                return watched
+        
         try:
-            # 尝试从admin后端获取生图配置
-            backend_data = await self._make_request("/api/admin/image-gen-config")
+            # 尝试从admin后端的配置快照获取生图配置（未变化时为304）
+            backend_data = await self._make_request("/api/admin/config-sync/image-gen")
             if backend_data:
                 # 处理新的尺寸比例配置格式
                 size_ratios_data = backend_data.get("size_ratios", [])
@@ -354,42 +481,6 @@ class ConfigClient:
             logger.error(f"获取所有配置失败: {e}")
             raise Exception(f"无法获取配置，admin后端不可用: {e}")
     
-    async def _sync_models_config(self):
-        """同步模型配置"""
-        try:
-            config = await self.get_models_config()
-            self._cache["models"] = config
-            self._cache_timestamps["models"] = datetime.now()
-        except Exception as e:
-            logger.error(f"同步模型配置失败: {e}")
-    
-    async def _sync_loras_config(self):
-        """同步LoRA配置"""
-        try:
-            config = await self.get_loras_config()
-            self._cache["loras"] = config
-            self._cache_timestamps["loras"] = datetime.now()
-        except Exception as e:
-            logger.error(f"同步LoRA配置失败: {e}")
-    
-    async def _sync_workflows_config(self):
-        """同步工作流配置"""
-        try:
-            config = await self.get_workflows_config()
-            self._cache["workflows"] = config
-            self._cache_timestamps["workflows"] = datetime.now()
-        except Exception as e:
-            logger.error(f"同步工作流配置失败: {e}")
-    
-    async def _sync_image_gen_config(self):
-        """同步生图配置"""
-        try:
-            config = await self.get_image_gen_config()
-            self._cache["image_gen"] = config
-            self._cache_timestamps["image_gen"] = datetime.now()
-        except Exception as e:
-            logger.error(f"同步生图配置失败: {e}")
-    
     def refresh_cache(self):
         """刷新缓存"""
         self._cache.clear()
@@ -401,6 +492,7 @@ class ConfigClient:
         status = {
             "backend_healthy": self._backend_healthy,
             "last_health_check": self._last_health_check.isoformat() if self._last_health_check else None,
+            "circuit": self._breaker.get_stats(),
             "cache_status": {}
         }
         
@@ -449,10 +541,14 @@ _config_client: Optional[ConfigClient] = None
 
 
 def get_config_client() -> ConfigClient:
-    """获取配置客户端实例"""
+    """获取配置客户端实例
+    
+    全局共享一个实例（条件请求的ETag和监听同步的配置保存在实例中）；
+    配置通过监听实时更新，未启用监听时每次仍直接请求admin。
+    """
     global _config_client
-    # 每次都重新创建配置客户端，确保使用最新的配置
-    _config_client = ConfigClient()
+    if _config_client is None:
+        _config_client = ConfigClient()
     return _config_client
 
 
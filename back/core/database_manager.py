@@ -74,6 +74,17 @@ class DatabaseManager:
             )
         """)
         
+        # 创建批量放大任务表（每个条目是一个upscale任务）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS upscale_batches (
+                id TEXT PRIMARY KEY,
+                item_ids TEXT NOT NULL,
+                scale_factor INTEGER,
+                algorithm TEXT,
+                created_at TIMESTAMP
+            )
+        """)
+        
         # 检查是否需要添加字段（兼容旧数据库）
         cursor.execute("PRAGMA table_info(tasks)")
         columns = [column[1] for column in cursor.fetchall()]
@@ -194,6 +205,72 @@ class DatabaseManager:
             return task_data
         return None
     
+    def get_tasks_by_ids(self, task_ids: List[str]) -> List[Dict[str, Any]]:
+        """按ID批量获取任务信息（保持传入顺序，不存在的ID被忽略）"""
+        if not task_ids:
+            return []
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        placeholders = ",".join("?" for _ in task_ids)
+        cursor.execute(f"SELECT * FROM tasks WHERE id IN ({placeholders})", list(task_ids))
+        rows = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
+        conn.close()
+        tasks = {row[0]: dict(zip(columns, row)) for row in rows}
+        return [tasks[task_id] for task_id in task_ids if task_id in tasks]
+    
+    def create_upscale_batch(self, batch_id: str, item_ids: List[str], scale_factor: int, algorithm: str) -> None:
+        """创建批量放大记录
+        
+        Args:
+            batch_id: 批次ID
+            item_ids: 批次中各图片对应的upscale任务ID（按上传顺序）
+            scale_factor: 放大倍数
+            algorithm: 放大算法
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO upscale_batches (id, item_ids, scale_factor, algorithm, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (batch_id, json.dumps(item_ids), scale_factor, algorithm, datetime.now()))
+        conn.commit()
+        conn.close()
+    
+    def get_upscale_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """获取批量放大记录，item_ids 已解析为列表"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM upscale_batches WHERE id = ?", (batch_id,))
+        row = cursor.fetchone()
+        columns = [desc[0] for desc in cursor.description]
+        conn.close()
+        if not row:
+            return None
+        batch = dict(zip(columns, row))
+        batch["item_ids"] = json.loads(batch["item_ids"])
+        return batch
+    
+    def get_unfinished_tasks(self, task_type: str) -> List[Dict[str, Any]]:
+        """获取指定类型中尚未结束（pending/processing）的任务
+        
+        Args:
+            task_type: 任务类型
+            
+        Returns:
+            任务信息列表
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM tasks WHERE task_type = ? AND status IN ('pending', 'processing') ORDER BY created_at",
+            (task_type,)
+        )
+        rows = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
+        conn.close()
+        return [dict(zip(columns, row)) for row in rows]
+    
     def get_tasks_with_filters(self, limit: int = 20, offset: int = 0, order: str = "desc", 
                               favorite_filter: str = None, time_filter: str = None) -> Dict[str, Any]:
         """获取任务列表（支持筛选）
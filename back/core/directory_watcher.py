@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录变化监听
+LoRA目录索引和模型文件索引共用：watchdog 监听目录，事件合并后在后台线程中回调；
+watchdog 不可用（未安装、inotify数量上限、网络文件系统）时按间隔调用完整对账。
+"""
+
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+# 收到事件后等待片刻再处理，合并复制大文件时的连续事件
+EVENT_DEBOUNCE = 0.5
+
+
+class DirectoryWatcher:
+    """在后台线程中监听目录：启动时先完整对账，之后按文件事件增量更新，监听不可用时轮询"""
+
+    def __init__(self, root: Path, name: str, on_scan: Callable[[], None],
+                 on_paths: Callable[[Iterable[Path]], None], watch: bool = True,
+                 poll_interval: float = 30, debounce: float = EVENT_DEBOUNCE):
+        """
+        Args:
+            root: 监听的目录
+            name: 日志和线程中使用的名称
+            on_scan: 完整对账（启动时、子目录变化时、轮询时）
+            on_paths: 按变化的文件路径增量更新
+            watch: 是否尝试使用watchdog监听（否则直接轮询）
+            poll_interval: 轮询间隔（秒）
+        """
+        self.root = Path(root)
+        self.name = name
+        self.on_scan = on_scan
+        self.on_paths = on_paths
+        self.watch = watch
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.mode: Optional[str] = None
+        self.events = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._pending_paths: set = set()
+        self._pending_scan = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        """启动后台线程（已启动时返回False）"""
+        if self.running:
+            return False
+        self._stop.clear()
+        self.mode = "watch" if self.watch and self._start_observer() else "poll"
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+                self._observer.join(timeout=5)
+            except Exception:
+                pass
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _start_observer(self) -> bool:
+        if not self.root.is_dir():
+            return False
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            print(f"⚠️ 未安装watchdog，{self.name}改为轮询")
+            return False
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                # 目录的modified事件只表示其中的文件有变化，文件本身的事件会单独到达
+                if event.event_type in ("opened", "closed_no_write") or \
+                        (event.is_directory and event.event_type == "modified"):
+                    return
+                watcher._on_event(event.is_directory, event.src_path, getattr(event, "dest_path", ""))
+
+        try:
+            observer = Observer()
+            observer.schedule(_Handler(), str(self.root), recursive=True)
+            observer.start()
+        except Exception as e:
+            print(f"⚠️ 无法监听{self.name}，改为轮询: {e}")
+            return False
+        self._observer = observer
+        return True
+
+    def _on_event(self, is_directory: bool, src_path: str, dest_path: str):
+        with self._lock:
+            self.events += 1
+            if is_directory:
+                # 子目录新增、移动或删除：完整对账
+                self._pending_scan = True
+            else:
+                self._pending_paths.update(path for path in (src_path, dest_path) if path)
+        self._wake.set()
+
+    def _run(self):
+        self._safe_call(self.on_scan)
+        while not self._stop.is_set():
+            polling = self._observer is None
+            woke = self._wake.wait(timeout=self.poll_interval if polling else None)
+            if self._stop.is_set():
+                break
+            if woke:
+                time.sleep(self.debounce)
+                self._wake.clear()
+            with self._lock:
+                paths, self._pending_paths = self._pending_paths, set()
+                full_scan, self._pending_scan = self._pending_scan or polling, False
+            if full_scan:
+                self._safe_call(self.on_scan)
+            elif paths:
+                self._safe_call(self.on_paths, [Path(path) for path in paths])
+
+    def _safe_call(self, callback: Callable, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"⚠️ 更新{self.name}失败: {e}")
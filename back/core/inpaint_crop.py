@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+局部重绘裁剪
+只把遮罩所在区域（加上下文边距）发送给ComfyUI，扩散分辨率按裁剪区域大小选择，
+重绘结果缩放回裁剪尺寸后用羽化遮罩贴回原图，未涂抹的区域保持原始像素和分辨率。
+"""
+
+import math
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PIL import Image, ImageFilter
+
+from config.settings import (
+    UPLOAD_DIR, INPAINT_CROP_PADDING, INPAINT_CROP_MIN_SIZE, INPAINT_FEATHER
+)
+
+# 上下文边距占遮罩区域边长的比例（与 INPAINT_CROP_PADDING 取较大值）
+CONTEXT_RATIO = 0.3
+# 裁剪区域超过原图面积的该比例时直接使用整图
+MAX_CROP_AREA_RATIO = 0.6
+# 扩散分辨率取64的整数倍
+SIZE_MULTIPLE = 64
+
+Box = Tuple[int, int, int, int]
+
+
+class InpaintCrop:
+    """一次局部重绘的裁剪信息"""
+
+    __slots__ = ("box", "image_path", "mask_path", "diffusion_size", "region")
+
+    def __init__(self, box: Box, image_path: Path, mask_path: Path, diffusion_size: int, region: Image.Image):
+        self.box = box
+        self.image_path = image_path
+        self.mask_path = mask_path
+        self.diffusion_size = diffusion_size
+        # 裁剪区域内需要重绘的像素（L模式，255为重绘）
+        self.region = region
+
+    def cleanup(self):
+        """删除裁剪产生的临时文件"""
+        for path in (self.image_path, self.mask_path):
+            path.unlink(missing_ok=True)
+
+
+def mask_region(mask: Image.Image) -> Optional[Image.Image]:
+    """遮罩中需要重绘的区域
+
+    工作流使用 LoadImageMask(channel=alpha)，透明（alpha低）的像素为重绘区域；
+    没有alpha通道的遮罩返回None（不裁剪，保持原有流程）。
+    """
+    if "A" not in mask.getbands():
+        return None
+    return mask.getchannel("A").point(lambda value: 255 if value < 128 else 0)
+
+
+def _expand_box(bbox: Box, image_size: Tuple[int, int]) -> Box:
+    """在遮罩外框四周加上下文边距并保证最小边长，结果限制在原图内"""
+    width, height = image_size
+    left, top, right, bottom = bbox
+    pad = max(INPAINT_CROP_PADDING, int(max(right - left, bottom - top) * CONTEXT_RATIO))
+    left, top, right, bottom = left - pad, top - pad, right + pad, bottom + pad
+
+    def grow(start: int, end: int, limit: int) -> Tuple[int, int]:
+        length = max(end - start, min(INPAINT_CROP_MIN_SIZE, limit))
+        center = (start + end) / 2
+        start = int(round(center - length / 2))
+        start = min(max(0, start), max(0, limit - length))
+        return start, min(limit, start + length)
+
+    left, right = grow(left, right, width)
+    top, bottom = grow(top, bottom, height)
+    return left, top, right, bottom
+
+
+def prepare_inpaint_crop(image_path: str, mask_path: str, target_size: int, task_id: str) -> Optional[InpaintCrop]:
+    """计算遮罩外框并裁剪图像和遮罩
+
+    Args:
+        image_path: 原图路径
+        mask_path: 遮罩路径（alpha通道为遮罩）
+        target_size: 最大扩散边长（原工作流的 scale_to_length）
+        task_id: 任务ID，用于临时文件命名
+
+    Returns:
+        裁剪信息；遮罩为空、没有alpha通道或遮罩区域接近整图时返回None（使用整图）
+    """
+    with Image.open(image_path) as image, Image.open(mask_path) as mask:
+        image_size = image.size
+        if mask.size != image_size:
+            mask = mask.resize(image_size, Image.Resampling.NEAREST)
+        region = mask_region(mask)
+        if region is None:
+            return None
+        bbox = region.getbbox()
+        if bbox is None:
+            return None
+
+        box = _expand_box(bbox, image_size)
+        crop_width, crop_height = box[2] - box[0], box[3] - box[1]
+        if crop_width * crop_height >= image_size[0] * image_size[1] * MAX_CROP_AREA_RATIO:
+            return None
+
+        upload_dir = Path(UPLOAD_DIR)
+        crop_image_path = upload_dir / f"{task_id}_crop_image.png"
+        crop_mask_path = upload_dir / f"{task_id}_crop_mask.png"
+        image.crop(box).save(crop_image_path, "PNG")
+        mask.crop(box).save(crop_mask_path, "PNG")
+        region = region.crop(box)
+
+    longest = max(crop_width, crop_height)
+    diffusion_size = min(target_size, math.ceil(longest / SIZE_MULTIPLE) * SIZE_MULTIPLE)
+    print(f"✂️ 局部重绘裁剪: {image_size[0]}x{image_size[1]} -> {box} ({crop_width}x{crop_height}), "
+          f"扩散边长 {diffusion_size}")
+    return InpaintCrop(box, crop_image_path, crop_mask_path, diffusion_size, region)
+
+
+def feather_mask(region: Image.Image, feather: int = INPAINT_FEATHER) -> Image.Image:
+    """羽化贴回遮罩：重绘区域向外扩展 feather/2 后做高斯模糊，边缘平滑过渡"""
+    if feather <= 0:
+        return region
+    radius = max(1, feather // 2)
+    dilated = region.filter(ImageFilter.MaxFilter(radius * 2 + 1))
+    return dilated.filter(ImageFilter.GaussianBlur(radius / 2))
+
+
+def composite_inpaint_result(crop: InpaintCrop, image_path: str, result_path: str):
+    """把ComfyUI输出的裁剪区域重绘结果贴回原图，覆盖保存到 result_path"""
+    left, top, right, bottom = crop.box
+    with Image.open(image_path) as image:
+        canvas = image.convert("RGB")
+    with Image.open(result_path) as result:
+        patch = result.convert("RGB")
+    if patch.size != (right - left, bottom - top):
+        patch = patch.resize((right - left, bottom - top), Image.Resampling.LANCZOS)
+
+    canvas.paste(patch, (left, top), feather_mask(crop.region))
+    canvas.save(result_path, "PNG")
+    print(f"✅ 局部重绘结果已贴回原图: {result_path} ({canvas.width}x{canvas.height})")
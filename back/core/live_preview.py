@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ComfyUI实时预览
+通过ComfyUI的WebSocket接收采样过程中的二进制预览帧，按prompt_id归类。
+只有被客户端订阅的prompt才解码、缩小并重新编码（WebP/JPEG），
+每个prompt按帧率上限推送，订阅者只保留最新一帧，不增加GPU负担。
+"""
+
+import asyncio
+import io
+import json
+import struct
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+import aiohttp
+from PIL import Image, features
+
+from config.settings import (
+    COMFYUI_URL, LIVE_PREVIEW_MAX_FPS, LIVE_PREVIEW_MAX_SIZE, LIVE_PREVIEW_FORMAT, LIVE_PREVIEW_QUALITY
+)
+from core.comfyui_client import COMFYUI_CLIENT_ID
+
+# ComfyUI WebSocket二进制事件类型（前4字节）
+BINARY_EVENT_PREVIEW_IMAGE = 1
+BINARY_EVENT_PREVIEW_IMAGE_WITH_METADATA = 4
+# 断线重连的最大间隔（秒）
+MAX_RECONNECT_DELAY = 30
+
+_WEBP_SUPPORTED = features.check("webp")
+
+
+def encode_preview_frame(image_bytes: bytes, max_size: int = LIVE_PREVIEW_MAX_SIZE,
+                         image_format: str = LIVE_PREVIEW_FORMAT,
+                         quality: int = LIVE_PREVIEW_QUALITY) -> Tuple[bytes, str]:
+    """缩小并重新编码预览帧
+
+    Returns:
+        (图片数据, MIME类型)；Pillow不支持WebP时使用JPEG
+    """
+    with Image.open(io.BytesIO(image_bytes)) as source:
+        image = source.convert("RGB")
+    image.thumbnail((max_size, max_size), Image.Resampling.BILINEAR)
+
+    buffer = io.BytesIO()
+    if image_format == "webp" and _WEBP_SUPPORTED:
+        image.save(buffer, "WEBP", quality=quality, method=0)
+        return buffer.getvalue(), "image/webp"
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue(), "image/jpeg"
+
+
+class LivePreviewListener:
+    """ComfyUI事件监听器：捕获预览帧并转发给订阅的客户端"""
+
+    def __init__(self, base_url: str = COMFYUI_URL, client_id: str = COMFYUI_CLIENT_ID,
+                 max_fps: float = LIVE_PREVIEW_MAX_FPS):
+        """初始化监听器
+
+        Args:
+            base_url: ComfyUI服务地址
+            client_id: 提交prompt时使用的client_id，ComfyUI只把预览帧发给该客户端
+            max_fps: 每个prompt每秒最多推送的帧数
+        """
+        self.ws_url = base_url.replace("http", "ws", 1).rstrip("/") + f"/ws?clientId={client_id}"
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+        # 当前执行中的prompt（旧版ComfyUI的预览帧不带prompt_id）
+        self._executing: Optional[str] = None
+        self._progress: Dict[str, Tuple[int, int]] = {}
+        # prompt_id -> 订阅队列（每个队列只保留最新一帧）
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._last_sent: Dict[str, float] = {}
+        # 正在编码的prompt，编码完成前到达的帧直接丢弃
+        self._encoding: Set[str] = set()
+        # 编码中的后台任务（保留引用，避免执行中被回收）
+        self._publishing: Set[asyncio.Task] = set()
+        self._stats = {"received": 0, "sent": 0, "dropped": 0}
+
+    def start(self) -> bool:
+        """在后台连接ComfyUI WebSocket（已启动时返回False）"""
+        if self._task is not None and not self._task.done():
+            return False
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    async def stop(self):
+        """断开连接并停止监听"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        for task in self._publishing:
+            task.cancel()
+        await asyncio.gather(self._task, *self._publishing, return_exceptions=True)
+        self._task = None
+        self.connected = False
+
+    async def _run(self):
+        """保持WebSocket连接，断开后指数退避重连"""
+        delay = 1
+        async with aiohttp.ClientSession() as session:
+            while True:
+                try:
+                    async with session.ws_connect(self.ws_url, heartbeat=30, max_msg_size=0) as ws:
+                        self.connected = True
+                        delay = 1
+                        print(f"📡 已连接ComfyUI事件流: {self.ws_url}")
+                        async for message in ws:
+                            if message.type == aiohttp.WSMsgType.TEXT:
+                                self._handle_event(json.loads(message.data))
+                            elif message.type == aiohttp.WSMsgType.BINARY:
+                                self._handle_binary(message.data)
+                            elif message.type == aiohttp.WSMsgType.ERROR:
+                                break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"⚠️ ComfyUI事件流连接失败: {e}")
+                self.connected = False
+                self._executing = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _handle_event(self, event: Dict[str, Any]):
+        """根据执行事件跟踪当前prompt和采样进度"""
+        event_type = event.get("type")
+        data = event.get("data") or {}
+        prompt_id = data.get("prompt_id")
+
+        if event_type == "execution_start":
+            self._executing = prompt_id
+        elif event_type == "executing":
+            if data.get("node") is None:
+                self._finish(prompt_id)
+            elif prompt_id:
+                self._executing = prompt_id
+        elif event_type == "progress":
+            if prompt_id:
+                self._executing = prompt_id
+                self._progress[prompt_id] = (data.get("value", 0), data.get("max", 0))
+        elif event_type in ("execution_success", "execution_error", "execution_interrupted"):
+            self._finish(prompt_id)
+
+    def _finish(self, prompt_id: Optional[str]):
+        prompt_id = prompt_id or self._executing
+        self._progress.pop(prompt_id, None)
+        self._last_sent.pop(prompt_id, None)
+        if self._executing == prompt_id:
+            self._executing = None
+
+    def _handle_binary(self, payload: bytes):
+        """解析二进制预览帧：事件类型 + 图片格式 + 图片数据（或 元数据长度 + JSON元数据 + 图片数据）"""
+        if len(payload) < 8:
+            return
+        event_type = struct.unpack(">I", payload[:4])[0]
+        prompt_id = self._executing
+        if event_type == BINARY_EVENT_PREVIEW_IMAGE:
+            image_bytes = payload[8:]
+        elif event_type == BINARY_EVENT_PREVIEW_IMAGE_WITH_METADATA:
+            metadata_length = struct.unpack(">I", payload[4:8])[0]
+            try:
+                metadata = json.loads(payload[8:8 + metadata_length])
+                prompt_id = metadata.get("prompt_id") or prompt_id
+            except ValueError:
+                pass
+            image_bytes = payload[8 + metadata_length:]
+        else:
+            return
+
+        self._stats["received"] += 1
+        # 没有订阅者时不解码
+        if not prompt_id or not self._subscribers.get(prompt_id):
+            return
+        now = time.monotonic()
+        if prompt_id in self._encoding or now - self._last_sent.get(prompt_id, 0.0) < self.min_interval:
+            self._stats["dropped"] += 1
+            return
+        self._last_sent[prompt_id] = now
+        self._encoding.add(prompt_id)
+        task = asyncio.create_task(self._publish(prompt_id, image_bytes))
+        self._publishing.add(task)
+        task.add_done_callback(self._publishing.discard)
+
+    async def _publish(self, prompt_id: str, image_bytes: bytes):
+        """在线程中重新编码预览帧，推送给该prompt的订阅者"""
+        try:
+            data, mime = await asyncio.to_thread(encode_preview_frame, image_bytes)
+        except Exception as e:
+            print(f"⚠️ 预览帧编码失败: {e}")
+            return
+        finally:
+            self._encoding.discard(prompt_id)
+
+        value, maximum = self._progress.get(prompt_id, (0, 0))
+        frame = {"prompt_id": prompt_id, "data": data, "mime": mime, "step": value, "steps": maximum}
+        for queue in list(self._subscribers.get(prompt_id, ())):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(frame)
+        self._stats["sent"] += 1
+
+    def subscribe(self, queue: asyncio.Queue, prompt_id: str):
+        """订阅prompt的预览帧，队列应设置 maxsize=1（只保留最新一帧）"""
+        self._subscribers.setdefault(prompt_id, set()).add(queue)
+
+    def unsubscribe(self, queue: asyncio.Queue, prompt_id: str):
+        queues = self._subscribers.get(prompt_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[prompt_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """连接状态和帧统计"""
+        return {
+            "connected": self.connected,
+            "executing": self._executing,
+            "subscribed_prompts": len(self._subscribers),
+            "frames_received": self._stats["received"],
+            "frames_sent": self._stats["sent"],
+            "frames_dropped": self._stats["dropped"],
+        }
+
+
+# 全局实时预览监听器
+_live_preview_listener: Optional[LivePreviewListener] = None
+
+
+def get_live_preview_listener() -> LivePreviewListener:
+    """获取全局实时预览监听器实例"""
+    global _live_preview_listener
+    if _live_preview_listener is None:
+        _live_preview_listener = LivePreviewListener()
+    return _live_preview_listener
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地插值放大
+lanczos/bicubic/nearest 等传统插值不需要GPU，在本地进程池中执行，不再排在ComfyUI的扩散任务后面。
+输出按水平条带逐段缩放并直接写入PNG数据块，大尺寸输出的内存占用不超过 UPSCALE_LOCAL_MEMORY_LIMIT。
+"""
+
+import multiprocessing
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from PIL import Image, ImageChops, ImageFilter
+
+from config.settings import UPSCALE_LOCAL_WORKERS, UPSCALE_LOCAL_MEMORY_LIMIT
+
+# 本地执行的插值算法
+LOCAL_UPSCALE_FILTERS = {
+    "lanczos": Image.Resampling.LANCZOS,
+    "bicubic": Image.Resampling.BICUBIC,
+    "nearest": Image.Resampling.NEAREST,
+}
+
+# 锐化（USM）参数，条带上下各多渲染 SHARPEN_MARGIN 行，避免条带接缝
+SHARPEN_RADIUS = 2
+SHARPEN_PERCENT = 80
+SHARPEN_THRESHOLD = 2
+SHARPEN_MARGIN = SHARPEN_RADIUS * 3
+
+# 条带缓冲的估算倍数：缩放结果 + 锐化结果 + Sub滤波结果 + 序列化字节
+STRIP_BUFFER_FACTOR = 4
+IDAT_CHUNK_SIZE = 256 * 1024
+# 大图的PNG编码耗时远超插值本身，使用最快的压缩级别（体积约增加一成）
+PNG_COMPRESS_LEVEL = 1
+
+
+def is_local_algorithm(algorithm: str) -> bool:
+    """算法是否在本地执行（不需要ComfyUI）"""
+    return algorithm in LOCAL_UPSCALE_FILTERS
+
+
+def upscale_file(input_path: str, output_path: str, scale_factor: int, algorithm: str,
+                 sharpen: bool = False, memory_limit: int = UPSCALE_LOCAL_MEMORY_LIMIT) -> Dict[str, int]:
+    """放大图片并保存为PNG（在进程池中执行）
+
+    Args:
+        input_path: 输入图片路径
+        output_path: 输出PNG路径
+        scale_factor: 放大倍数
+        algorithm: 插值算法（LOCAL_UPSCALE_FILTERS 中的键）
+        sharpen: 放大后做一次USM锐化
+        memory_limit: 条带缓冲的内存上限（字节）
+
+    Returns:
+        输出宽高和条带数量
+    """
+    resample = LOCAL_UPSCALE_FILTERS[algorithm]
+    with Image.open(input_path) as source:
+        source.load()
+        mode = "RGBA" if source.mode in ("RGBA", "LA", "PA") or "transparency" in source.info else "RGB"
+        image = source.convert(mode) if source.mode != mode else source.copy()
+
+    width, height = image.size[0] * scale_factor, image.size[1] * scale_factor
+    channels = len(mode)
+    # 条带高度取放大倍数的整数倍，条带边界对齐到整行源像素
+    strip_rows = max(1, memory_limit // (width * channels * STRIP_BUFFER_FACTOR * scale_factor))
+    strip_height = strip_rows * scale_factor
+
+    strips = 0
+    with open(output_path, "wb") as output:
+        writer = _PNGStreamWriter(output, width, height, mode)
+        for top in range(0, height, strip_height):
+            bottom = min(height, top + strip_height)
+            strip = _render_strip(image, scale_factor, top, bottom, resample, sharpen)
+            writer.write_rows(strip)
+            strips += 1
+        writer.close()
+
+    return {"width": width, "height": height, "strips": strips}
+
+
+def _render_strip(image: Image.Image, scale_factor: int, top: int, bottom: int, resample, sharpen: bool) -> Image.Image:
+    """渲染输出图片的 [top, bottom) 行
+
+    resize 的 box 参数按源图坐标截取区域，插值核仍会读取区域外的源像素，
+    条带边界对齐到整行源像素时，逐条带缩放的结果与整张缩放一致。
+    """
+    width, height = image.size[0] * scale_factor, image.size[1] * scale_factor
+    margin = -(-SHARPEN_MARGIN // scale_factor) * scale_factor if sharpen else 0
+    render_top, render_bottom = max(0, top - margin), min(height, bottom + margin)
+
+    box = (0, render_top // scale_factor, image.size[0], -(-render_bottom // scale_factor))
+    strip = image.resize((width, render_bottom - render_top), resample, box=box)
+
+    if sharpen:
+        strip = strip.filter(ImageFilter.UnsharpMask(SHARPEN_RADIUS, SHARPEN_PERCENT, SHARPEN_THRESHOLD))
+        strip = strip.crop((0, top - render_top, width, bottom - render_top))
+    return strip
+
+
+class _PNGStreamWriter:
+    """按行写入PNG：每行使用Sub滤波，压缩数据分块写成IDAT，不需要完整图片在内存中"""
+
+    COLOR_TYPES = {"RGB": 2, "RGBA": 6}
+
+    def __init__(self, output, width: int, height: int, mode: str):
+        self.output = output
+        self.width = width
+        self.mode = mode
+        self.compressor = zlib.compressobj(PNG_COMPRESS_LEVEL)
+        self.pending = b""
+        output.write(b"\x89PNG\r\n\x1a\n")
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, self.COLOR_TYPES[mode], 0, 0, 0))
+
+    def write_rows(self, strip: Image.Image):
+        # Sub滤波：每个字节减去左侧像素的同一通道（模256），用ImageChops在C层完成
+        shifted = Image.new(self.mode, strip.size)
+        shifted.paste(strip.crop((0, 0, strip.width - 1, strip.height)), (1, 0))
+        raw = ImageChops.subtract_modulo(strip, shifted).tobytes()
+
+        row_bytes = self.width * len(self.mode)
+        rows = b"".join(b"\x01" + raw[offset:offset + row_bytes] for offset in range(0, len(raw), row_bytes))
+        self._write_data(self.compressor.compress(rows))
+
+    def close(self):
+        self._write_data(self.compressor.flush(), final=True)
+        self._write_chunk(b"IEND", b"")
+
+    def _write_data(self, data: bytes, final: bool = False):
+        self.pending += data
+        while len(self.pending) >= IDAT_CHUNK_SIZE or (final and self.pending):
+            chunk, self.pending = self.pending[:IDAT_CHUNK_SIZE], self.pending[IDAT_CHUNK_SIZE:]
+            self._write_chunk(b"IDAT", chunk)
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes):
+        self.output.write(struct.pack(">I", len(data)))
+        self.output.write(chunk_type)
+        self.output.write(data)
+        self.output.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+# 全局进程池
+_local_upscale_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_local_upscale_pool() -> ProcessPoolExecutor:
+    """获取本地放大进程池（spawn启动，子进程不继承事件循环和数据库连接）"""
+    global _local_upscale_pool
+    if _local_upscale_pool is None:
+        _local_upscale_pool = ProcessPoolExecutor(
+            max_workers=UPSCALE_LOCAL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _local_upscale_pool
+
+
+def shutdown_local_upscale_pool():
+    """关闭本地放大进程池"""
+    global _local_upscale_pool
+    if _local_upscale_pool is not None:
+        _local_upscale_pool.shutdown(wait=False, cancel_futures=True)
+        _local_upscale_pool = None
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地LoRA目录索引
+LoRA目录的持久化清单：每个文件按 (inode, 大小, 修改时间) 记录一行，未变化的文件重启后直接复用；
+safetensors 文件通过mmap只读取JSON头部（不加载张量），得到训练元数据、网络维度和基础模型线索。
+目录变化由 watchdog 监听后增量更新（监听不可用时按间隔轮询），查询按基础模型、分类走索引，
+耗时只与结果数量有关。
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config.settings import COMFYUI_LORAS_DIR, LORA_CATALOG_PATH, LORA_CATALOG_WATCH, LORA_CATALOG_POLL_INTERVAL
+from core.directory_watcher import DirectoryWatcher
+
+LORA_SUFFIXES = {".safetensors", ".ckpt", ".pt"}
+UNKNOWN_BASE_MODEL = "未知"
+CATALOG_VERSION = 1
+# safetensors 头部长度上限，超过时视为损坏的文件
+MAX_HEADER_SIZE = 64 * 1024 * 1024
+
+# 基础模型线索（元数据或文件名中的关键词） -> 基础模型名称，按顺序匹配
+BASE_MODEL_KEYWORDS = [
+    ("flux", "flux-dev"),
+    ("qwen", "qwen-image"),
+    ("wan", "wan2.2-video"),
+    ("gemini", "gemini-image"),
+]
+# 写入行中的训练元数据（kohya ss_* 和 modelspec.*），其余元数据（如标签频率）体积大且不需要
+TRAINING_METADATA_KEYS = {
+    "ss_output_name": "output_name",
+    "ss_sd_model_name": "sd_model_name",
+    "ss_base_model_version": "base_model_version",
+    "modelspec.architecture": "architecture",
+    "modelspec.title": "title",
+    "modelspec.trigger_phrase": "trigger_phrase",
+    "ss_resolution": "resolution",
+    "ss_num_epochs": "epochs",
+    "ss_steps": "steps",
+    "ss_learning_rate": "learning_rate",
+    "ss_training_comment": "training_comment",
+}
+# LoRA下投影权重的键名，形状第一维即网络维度（rank）
+_DOWN_WEIGHT_RE = re.compile(r"(lora_down|lora_A|lora\.down)\.weight$")
+
+
+def infer_base_model_from_filename(filename: str) -> str:
+    """从文件名推断基础模型"""
+    return _match_keywords(filename) or UNKNOWN_BASE_MODEL
+
+
+def _match_keywords(text: str) -> Optional[str]:
+    text = text.lower()
+    for keyword, base_model in BASE_MODEL_KEYWORDS:
+        if keyword in text:
+            return base_model
+    return None
+
+
+def generate_display_name(filename: str) -> str:
+    """生成显示名称：去掉扩展名，下划线和连字符替换为空格，首字母大写"""
+    return Path(filename).stem.replace("_", " ").replace("-", " ").title()
+
+
+def read_safetensors_header(path: Path) -> Dict[str, Any]:
+    """通过mmap读取safetensors的JSON头部（8字节小端长度 + JSON），不读取张量数据"""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if len(mm) < 8:
+                raise ValueError("文件过短")
+            (header_size,) = struct.unpack_from("<Q", mm, 0)
+            if header_size > MAX_HEADER_SIZE or 8 + header_size > len(mm):
+                raise ValueError(f"头部长度无效: {header_size}")
+            return json.loads(mm[8:8 + header_size])
+
+
+def _infer_base_model_from_tensors(keys: Iterable[str]) -> Optional[str]:
+    """根据张量键名的结构推断基础模型"""
+    for key in keys:
+        if "double_blocks" in key or "single_blocks" in key or "single_transformer_blocks" in key:
+            return "flux-dev"
+        if "img_mlp" in key or "txt_mlp" in key:
+            return "qwen-image"
+        if "cross_attn" in key and "blocks." in key and "transformer_blocks" not in key:
+            return "wan2.2-video"
+    return None
+
+
+def _to_number(value: Any) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else number
+
+
+def describe_safetensors(header: Dict[str, Any]) -> Dict[str, Any]:
+    """从safetensors头部提取训练元数据、网络维度和基础模型线索"""
+    metadata = header.get("__metadata__") or {}
+    tensor_keys = [key for key in header if key != "__metadata__"]
+
+    network_dim = _to_number(metadata.get("ss_network_dim"))
+    if network_dim is None:
+        for key in tensor_keys:
+            shape = header[key].get("shape") if isinstance(header[key], dict) else None
+            if shape and _DOWN_WEIGHT_RE.search(key):
+                network_dim = shape[0]
+                break
+
+    hint_text = " ".join(str(metadata.get(key, "")) for key in
+                         ("modelspec.architecture", "ss_base_model_version", "ss_sd_model_name"))
+    base_model, source = _match_keywords(hint_text), "metadata"
+    if base_model is None:
+        base_model, source = _infer_base_model_from_tensors(tensor_keys), "tensors"
+
+    return {
+        "base_model": base_model,
+        "base_model_source": source if base_model else None,
+        "network_dim": network_dim,
+        "network_alpha": _to_number(metadata.get("ss_network_alpha")),
+        "network_module": metadata.get("ss_network_module"),
+        "tensor_count": len(tensor_keys),
+        "metadata": {name: metadata[key] for key, name in TRAINING_METADATA_KEYS.items() if key in metadata},
+    }
+
+
+class LoraCatalog:
+    """本地LoRA目录索引（线程安全）：持久化清单 + 基础模型/分类索引 + 目录监听"""
+
+    def __init__(self, lora_dir: Path = COMFYUI_LORAS_DIR, catalog_path: Path = LORA_CATALOG_PATH,
+                 watch: bool = LORA_CATALOG_WATCH, poll_interval: float = LORA_CATALOG_POLL_INTERVAL):
+        self.lora_dir = Path(lora_dir)
+        self.catalog_path = Path(catalog_path)
+        self._lock = threading.RLock()
+        # 首次加载和对账只执行一次，并发的首次查询等待完成（不持有 _lock）
+        self._load_lock = threading.Lock()
+        # 名称（相对LoRA目录的路径） -> (文件指纹, 行)
+        self._entries: Dict[str, Tuple[Tuple[int, int, int], Dict[str, Any]]] = {}
+        self._by_base_model: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._by_category: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # (基础模型, 分类) -> 按名称排序的结果，索引变化时清空
+        self._sorted: Dict[Tuple[Optional[str], Optional[str]], List[Dict[str, Any]]] = {}
+        self._loaded = False
+        self._dirty = False
+        # 后台线程：处理监听事件、轮询、保存清单
+        self._watcher = DirectoryWatcher(self.lora_dir, "LoRA目录索引", self._on_watcher_scan,
+                                         self._on_watcher_paths, watch=watch, poll_interval=poll_interval)
+        self._stats = {"scans": 0, "header_reads": 0, "reused": 0}
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def list(self, base_model: Optional[str] = None, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按基础模型、分类查询LoRA（按名称排序）；返回的行是共享的，调用方不要修改"""
+        self.ensure_loaded()
+        key = (base_model, category)
+        with self._lock:
+            rows = self._sorted.get(key)
+            if rows is None:
+                if base_model is None and category is None:
+                    candidates = (row for _, row in self._entries.values())
+                elif category is None:
+                    candidates = self._by_base_model.get(base_model, {}).values()
+                elif base_model is None:
+                    candidates = self._by_category.get(category, {}).values()
+                else:
+                    candidates = (row for row in self._by_category.get(category, {}).values()
+                                  if row["base_model"] == base_model)
+                rows = self._sorted[key] = sorted(candidates, key=lambda row: row["name"])
+            return list(rows)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        self.ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry[1] if entry else None
+
+    def base_models(self) -> Dict[str, int]:
+        """各基础模型的LoRA数量"""
+        self.ensure_loaded()
+        with self._lock:
+            return {base_model: len(rows) for base_model, rows in self._by_base_model.items()}
+
+    def categories(self) -> Dict[str, int]:
+        """各分类（LoRA目录下的子目录）的LoRA数量"""
+        self.ensure_loaded()
+        with self._lock:
+            return {category: len(rows) for category, rows in self._by_category.items()}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # 更新
+    # ------------------------------------------------------------------
+
+    def ensure_loaded(self):
+        """首次使用时加载持久化清单并与目录对账，对账完成前的查询等待对账结果"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            with self._lock:
+                self._load()
+            # scan 在 _lock 外读取头部
+            self.scan()
+            self.save()
+            self._loaded = True
+
+    def scan(self) -> Dict[str, int]:
+        """与目录完全对账：指纹未变化的文件复用已有的行，只读取新增或变化文件的头部"""
+        seen = {}
+        if self.lora_dir.is_dir():
+            self._walk(self.lora_dir, "", seen)
+        with self._lock:
+            self._stats["scans"] += 1
+            removed = [name for name in self._entries if name not in seen]
+            changed = [(name, path, fingerprint) for name, (path, fingerprint) in seen.items()
+                       if self._entries.get(name, (None,))[0] != fingerprint]
+        # 在锁外读取头部，查询不等待
+        rows = [(name, fingerprint, self._build_row(name, path, fingerprint)) for name, path, fingerprint in changed]
+        result = {"added": 0, "updated": 0, "removed": len(removed)}
+        with self._lock:
+            for name in removed:
+                if name in self._entries:
+                    self._remove(name)
+            for name, fingerprint, row in rows:
+                result["updated" if name in self._entries else "added"] += 1
+                self._put(name, fingerprint, row)
+        if any(result.values()):
+            print(f"🗂️ LoRA索引已更新: 新增 {result['added']}，更新 {result['updated']}，删除 {result['removed']}，"
+                  f"共 {len(self._entries)} 个")
+        return result
+
+    def update_path(self, path: Path) -> bool:
+        """增量更新单个文件（新增、修改或删除），返回索引是否变化"""
+        path = Path(path)
+        try:
+            name = path.relative_to(self.lora_dir).as_posix()
+        except ValueError:
+            return False
+        if path.suffix.lower() not in LORA_SUFFIXES:
+            return False
+        try:
+            st = path.stat()
+            fingerprint = (st.st_ino, st.st_size, st.st_mtime_ns) if path.is_file() else None
+        except OSError:
+            fingerprint = None
+        with self._lock:
+            entry = self._entries.get(name)
+            if fingerprint is None:
+                if entry is None:
+                    return False
+                self._remove(name)
+                return True
+            if entry and entry[0] == fingerprint:
+                return False
+        row = self._build_row(name, path, fingerprint)
+        with self._lock:
+            self._put(name, fingerprint, row)
+        return True
+
+    def _walk(self, directory: Path, prefix: str, seen: Dict[str, Tuple[Path, Tuple[int, int, int]]]):
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            self._walk(Path(entry.path), f"{prefix}{entry.name}/", seen)
+                        elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in LORA_SUFFIXES:
+                            st = entry.stat()
+                            seen[f"{prefix}{entry.name}"] = (Path(entry.path), (st.st_ino, st.st_size, st.st_mtime_ns))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"⚠️ 扫描LoRA目录失败 {directory}: {e}")
+
+    def _build_row(self, name: str, path: Path, fingerprint: Tuple[int, int, int]) -> Dict[str, Any]:
+        file_type = path.suffix.lower()
+        category = name.rpartition("/")[0]
+        row = {
+            "name": name,
+            "display_name": generate_display_name(path.name),
+            "base_model": None,
+            "base_model_source": None,
+            "category": category,
+            "available": True,
+            "file_size": fingerprint[1],
+            "file_path": str(path),
+            "file_type": file_type,
+            "modified_at": fingerprint[2] / 1e9,
+            "network_dim": None,
+            "network_alpha": None,
+            "network_module": None,
+            "metadata": {},
+        }
+        if file_type == ".safetensors":
+            self._stats["header_reads"] += 1
+            try:
+                row.update(describe_safetensors(read_safetensors_header(path)))
+            except (OSError, ValueError) as e:
+                # 文件正在写入或已损坏：修改完成后会收到新的事件（或下一次轮询）重新读取
+                row["header_error"] = str(e)
+        if row["base_model"] is None:
+            row["base_model"] = infer_base_model_from_filename(path.name)
+            row["base_model_source"] = "filename"
+        return row
+
+    def _put(self, name: str, fingerprint: Tuple[int, int, int], row: Dict[str, Any]):
+        if name in self._entries:
+            self._remove(name)
+        self._entries[name] = (fingerprint, row)
+        self._by_base_model.setdefault(row["base_model"], {})[name] = row
+        self._by_category.setdefault(row["category"], {})[name] = row
+        self._sorted.clear()
+        self._dirty = True
+
+    def _remove(self, name: str):
+        _, row = self._entries.pop(name)
+        for index, key in ((self._by_base_model, row["base_model"]), (self._by_category, row["category"])):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(name, None)
+                if not bucket:
+                    del index[key]
+        self._sorted.clear()
+        self._dirty = True
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        try:
+            data = json.loads(self.catalog_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 读取LoRA索引失败，重新扫描: {e}")
+            return
+        if data.get("version") != CATALOG_VERSION or data.get("lora_dir") != str(self.lora_dir):
+            return
+        for name, entry in data.get("entries", {}).items():
+            self._put(name, tuple(entry["fingerprint"]), entry["row"])
+        self._stats["reused"] = len(self._entries)
+        self._dirty = False
+
+    def save(self):
+        """清单有变化时写入磁盘（先写临时文件再替换）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "version": CATALOG_VERSION,
+                "lora_dir": str(self.lora_dir),
+                "entries": {name: {"fingerprint": list(fingerprint), "row": row}
+                            for name, (fingerprint, row) in self._entries.items()},
+            }
+            self._dirty = False
+        try:
+            self.catalog_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.catalog_path.with_name(
+                f".{self.catalog_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.catalog_path)
+        except OSError as e:
+            self._dirty = True
+            print(f"⚠️ 写入LoRA索引失败: {e}")
+
+    # ------------------------------------------------------------------
+    # 目录监听
+    # ------------------------------------------------------------------
+
+    def start(self) -> bool:
+        """启动后台线程：监听目录变化（watchdog不可用时按间隔轮询），已启动时返回False"""
+        if self._watcher.running:
+            return False
+        return self._watcher.start()
+
+    def stop(self):
+        self._watcher.stop()
+        self.save()
+
+    def _on_watcher_scan(self):
+        if not self._loaded:
+            # 启动时的首次对账与查询触发的首次对账只执行一次
+            self.ensure_loaded()
+            return
+        self.scan()
+        self.save()
+
+    def _on_watcher_paths(self, paths: Iterable[Path]):
+        for path in paths:
+            self.update_path(path)
+        self.save()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "lora_dir": str(self.lora_dir),
+            "count": len(self._entries),
+            "base_models": len(self._by_base_model),
+            "categories": len(self._by_category),
+            "mode": self._watcher.mode,
+            "events": self._watcher.events,
+            **self._stats
+        }
+
+
+# 全局LoRA目录索引
+_lora_catalog: Optional[LoraCatalog] = None
+
+
+def get_lora_catalog() -> LoraCatalog:
+    """获取全局LoRA目录索引实例"""
+    global _lora_catalog
+    if _lora_catalog is None:
+        _lora_catalog = LoraCatalog()
+    return _lora_catalog
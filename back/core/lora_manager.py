@@ -3,15 +3,15 @@
 """
 LoRA管理器
 负责从配置客户端获取LoRA配置，支持LoRA分组和排序
+配置客户端不可用时使用本地LoRA目录索引（core/lora_catalog.py）
 """
 
 import os
 import asyncio
-from pathlib import Path
 from typing import Dict, List, Any, Optional
 import logging
 
-from config.settings import COMFYUI_LORAS_DIR
+from core.lora_catalog import get_lora_catalog, infer_base_model_from_filename, generate_display_name
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +22,6 @@ class LoraManager:
     def __init__(self):
         """初始化LoRA管理器"""
         self._config_client = None
-        self._local_loras_cache = {}
-        self._last_local_scan = None
         # 模型映射已移除，现在完全依赖配置客户端动态获取
         # 所有模型配置都通过配置客户端从admin后端获取
     
@@ -103,13 +101,14 @@ class LoraManager:
             # 降级到本地扫描
             return await self._get_loras_from_local_scan(base_model)
     
-    async def _get_loras_from_local_scan(self, base_model: Optional[str] = None) -> Dict[str, Any]:
-        """从本地文件系统扫描LoRA"""
+    async def _get_loras_from_local_scan(self, base_model: Optional[str] = None,
+                                         category: Optional[str] = None) -> Dict[str, Any]:
+        """从本地LoRA目录索引获取LoRA（按基础模型、分类走索引，不扫描目录）"""
         try:
-            lora_dir = COMFYUI_LORAS_DIR
+            catalog = get_lora_catalog()
             
-            if not lora_dir.exists():
-                logger.warning(f"LoRA目录不存在: {lora_dir}")
+            if not catalog.lora_dir.exists():
+                logger.warning(f"LoRA目录不存在: {catalog.lora_dir}")
                 return {
                     "loras": [],
                     "grouped_by_model": {},
@@ -117,38 +116,12 @@ class LoraManager:
                     "error": "LoRA目录不存在"
                 }
             
-            loras = []
-            grouped_by_model = {}
+            loras = catalog.list(base_model=base_model, category=category)
             
-            # 扫描LoRA文件
-            for file_path in lora_dir.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in ['.safetensors', '.ckpt', '.pt']:
-                    # 尝试从文件名推断基础模型
-                    inferred_model = self._infer_base_model_from_filename(file_path.name)
-                    
-                    lora_data = {
-                        "name": file_path.name,
-                        "display_name": self._generate_display_name(file_path.name),
-                        "base_model": inferred_model,
-                        "available": True,
-                        "file_size": file_path.stat().st_size,
-                        "file_path": str(file_path),
-                        "file_type": file_path.suffix.lower()
-                    }
-                    
-                    # 如果指定了基础模型，进行过滤
-                    if base_model and inferred_model != base_model:
-                        continue
-                    
-                    loras.append(lora_data)
-                    
-                    # 按模型分组
-                    if inferred_model not in grouped_by_model:
-                        grouped_by_model[inferred_model] = []
-                    grouped_by_model[inferred_model].append(file_path.name)
-            
-            # 按名称排序
-            loras.sort(key=lambda x: x["name"])
+            # 按模型分组
+            grouped_by_model = {}
+            for lora in loras:
+                grouped_by_model.setdefault(lora["base_model"], []).append(lora["name"])
             
             return {
                 "loras": loras,
@@ -168,36 +141,11 @@ class LoraManager:
     
     def _infer_base_model_from_filename(self, filename: str) -> str:
         """从文件名推断基础模型"""
-        filename_lower = filename.lower()
-        
-        # 根据文件名中的关键词推断模型类型
-        if "flux" in filename_lower:
-            return "flux-dev"
-        elif "qwen" in filename_lower:
-            return "qwen-image"
-        elif "wan" in filename_lower:
-            return "wan2.2-video"
-        elif "gemini" in filename_lower:
-            return "gemini-image"
-        else:
-            # 如果没有找到匹配的模型，返回第一个可用的模型
-            available_models = list(self.model_mapping.keys())
-            if available_models:
-                return available_models[0]
-            return None
+        return infer_base_model_from_filename(filename)
     
     def _generate_display_name(self, filename: str) -> str:
         """生成显示名称"""
-        # 移除文件扩展名
-        name = Path(filename).stem
-        
-        # 替换下划线和连字符为空格
-        name = name.replace("_", " ").replace("-", " ")
-        
-        # 首字母大写
-        name = name.title()
-        
-        return name
+        return generate_display_name(filename)
     
     async def get_loras_by_model(self, base_model: str) -> List[Dict[str, Any]]:
         """获取指定模型的LoRA列表"""
@@ -211,22 +159,15 @@ class LoraManager:
     def get_local_loras(self) -> List[Dict[str, Any]]:
         """获取本地LoRA文件列表（同步方法，降级使用）"""
         try:
-            lora_dir = COMFYUI_LORAS_DIR
-            
-            if not lora_dir.exists():
-                return []
-            
-            loras = []
-            for file_path in lora_dir.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in ['.safetensors', '.ckpt', '.pt']:
-                    loras.append({
-                        "name": file_path.name,
-                        "path": str(file_path),
-                        "size": file_path.stat().st_size,
-                        "type": file_path.suffix.lower()
-                    })
-            
-            return loras
+            return [
+                {
+                    "name": lora["name"],
+                    "path": lora["file_path"],
+                    "size": lora["file_size"],
+                    "type": lora["file_type"]
+                }
+                for lora in get_lora_catalog().list()
+            ]
         except Exception as e:
             logger.error(f"获取本地LoRA失败: {e}")
             return []
@@ -262,9 +203,10 @@ class LoraManager:
             return None
     
     def refresh_local_cache(self):
-        """刷新本地缓存"""
-        self._local_loras_cache.clear()
-        self._last_local_scan = None
+        """刷新本地缓存：与LoRA目录重新对账（未变化的文件不重新读取）"""
+        catalog = get_lora_catalog()
+        catalog.scan()
+        catalog.save()
         logger.info("LoRA本地缓存已刷新")
 
 
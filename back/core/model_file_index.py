@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型文件索引
+启动时遍历一次 COMFYUI_MODELS_DIR，记录每个模型文件的大小、修改时间（可选sha256），之后由目录监听
+（不可用时定期巡检）增量更新；ModelConfig 的可用性检查只查内存，不再对网络挂载的模型卷逐个stat。
+索引持久化到磁盘，重启后未变化文件的sha256直接复用；文件清单定期上报admin，admin据此展示各节点上的模型文件。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from config.settings import (
+    ADMIN_BACKEND_URL, COMFYUI_MODELS_DIR, MODEL_FILE_INDEX_PATH, MODEL_FILE_WATCH, MODEL_FILE_SWEEP_INTERVAL,
+    MODEL_FILE_HASH, MODEL_FILE_REPORT_INTERVAL, NODE_NAME
+)
+from core.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from core.directory_watcher import DirectoryWatcher
+
+MODEL_FILE_SUFFIXES = {".safetensors", ".sft", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".onnx"}
+INDEX_VERSION = 1
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+# 上报任务检查索引变化的间隔（秒）；索引没有变化时按 MODEL_FILE_REPORT_INTERVAL 发送心跳
+REPORT_CHECK_INTERVAL = 10
+REPORT_PATH = "/api/admin/config-sync/model-files/{node}"
+
+# 模型类型 -> (UNet目录, CLIP目录, VAE目录)
+MODEL_FILE_DIRS = {
+    "flux": ("checkpoints", "clip", "vae"),
+    "qwen": ("diffusion_models", "text_encoders", "vae"),
+    "wan": ("diffusion_models", "text_encoders", "vae"),
+}
+DEFAULT_MODEL_FILE_DIRS = ("checkpoints", "clip", "vae")
+# API模型不需要本地文件
+API_MODEL_TYPES = {"gemini", "joycaption"}
+
+
+def model_file_paths(model_type: str, unet_file: str, clip_file: str, vae_file: str) -> List[str]:
+    """模型需要的本地文件（相对模型目录的路径），未配置的文件和API模型不需要"""
+    if model_type in API_MODEL_TYPES:
+        return []
+    directories = MODEL_FILE_DIRS.get(model_type, DEFAULT_MODEL_FILE_DIRS)
+    return [f"{directory}/{filename}" for directory, filename in zip(directories, (unet_file, clip_file, vae_file))
+            if filename]
+
+
+def _key(relative_path: str) -> str:
+    """索引键：统一使用/分隔；Windows文件系统不区分大小写"""
+    key = relative_path.replace("\\", "/").strip("/")
+    return key.lower() if os.name == "nt" else key
+
+
+class ModelFileIndex:
+    """模型文件索引（线程安全）：相对路径 -> 大小、修改时间、sha256"""
+
+    def __init__(self, models_dir: Path = COMFYUI_MODELS_DIR, index_path: Path = MODEL_FILE_INDEX_PATH,
+                 watch: bool = MODEL_FILE_WATCH, sweep_interval: float = MODEL_FILE_SWEEP_INTERVAL,
+                 hash_files: bool = MODEL_FILE_HASH, node: str = NODE_NAME):
+        self.models_dir = Path(models_dir)
+        self.index_path = Path(index_path)
+        self.hash_files = hash_files
+        self.node = node
+        self._lock = threading.RLock()
+        # 索引键 -> {"path", "size", "mtime", "sha256"}；指纹 (inode, 大小, 修改时间ns) 单独保存
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._fingerprints: Dict[str, Tuple[int, int, int]] = {}
+        # 每次变化加1，上报任务据此判断是否需要重新上报
+        self.version = 0
+        self._ready = False
+        self._dir_exists = False
+        self._dirty = False
+        self._watcher = DirectoryWatcher(self.models_dir, "模型文件索引", self._on_watcher_scan,
+                                         self._on_watcher_paths, watch=watch, poll_interval=sweep_interval)
+        # 后台计算sha256
+        self._hash_thread: Optional[threading.Thread] = None
+        self._hash_wake = threading.Event()
+        self._hash_stop = threading.Event()
+        # 无法读取的文件（键, 指纹），文件变化前不再重试
+        self._hash_failed: set = set()
+        # 上报admin
+        self._report_task: Optional[asyncio.Task] = None
+        self._reported_version: Optional[int] = None
+        self._reported_at = 0.0
+        self._retry_at = 0.0
+        self._stats = {"sweeps": 0, "hashed": 0, "hashed_bytes": 0, "reports": 0, "failed_reports": 0}
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def models_dir_exists(self) -> bool:
+        """模型目录是否存在（索引建立后使用最近一次巡检的结果）"""
+        return self._dir_exists if self._ready else self.models_dir.exists()
+
+    def has_file(self, relative_path: str) -> bool:
+        """模型文件是否存在；索引建立前（或扩展名不在索引范围内时）退回到直接检查文件"""
+        if not self._ready or os.path.splitext(relative_path)[1].lower() not in MODEL_FILE_SUFFIXES:
+            return (self.models_dir / relative_path).exists()
+        return _key(relative_path) in self._files
+
+    def get(self, relative_path: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._files.get(_key(relative_path))
+            return dict(entry) if entry else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """本节点的文件清单（上报admin、/api/model-files 使用）"""
+        with self._lock:
+            return {
+                "node": self.node,
+                "models_dir": str(self.models_dir),
+                "version": self.version,
+                "ready": self._ready,
+                "files": {entry["path"]: {"size": entry["size"], "mtime": entry["mtime"], "sha256": entry["sha256"]}
+                          for entry in self._files.values()},
+            }
+
+    # ------------------------------------------------------------------
+    # 更新
+    # ------------------------------------------------------------------
+
+    def sweep(self) -> Dict[str, int]:
+        """遍历模型目录完整对账，指纹未变化的文件保留已有的sha256"""
+        seen: Dict[str, Tuple[str, Tuple[int, int, int]]] = {}
+        dir_exists = self.models_dir.is_dir()
+        if dir_exists:
+            self._walk(self.models_dir, "", seen)
+        result = {"added": 0, "updated": 0, "removed": 0}
+        with self._lock:
+            self._stats["sweeps"] += 1
+            for key in [key for key in self._files if key not in seen]:
+                self._remove(key)
+                result["removed"] += 1
+            for key, (relative_path, fingerprint) in seen.items():
+                if self._fingerprints.get(key) == fingerprint:
+                    continue
+                result["updated" if key in self._files else "added"] += 1
+                self._put(key, relative_path, fingerprint)
+            self._dir_exists = dir_exists
+            self._ready = True
+        if any(result.values()):
+            print(f"📦 模型文件索引已更新: 新增 {result['added']}，更新 {result['updated']}，"
+                  f"删除 {result['removed']}，共 {len(self._files)} 个")
+        self._hash_wake.set()
+        return result
+
+    def update_path(self, path: Path) -> bool:
+        """增量更新单个文件，返回索引是否变化"""
+        path = Path(path)
+        try:
+            relative_path = path.relative_to(self.models_dir).as_posix()
+        except ValueError:
+            return False
+        if path.suffix.lower() not in MODEL_FILE_SUFFIXES:
+            return False
+        key = _key(relative_path)
+        try:
+            st = path.stat()
+            fingerprint = (st.st_ino, st.st_size, st.st_mtime_ns) if path.is_file() else None
+        except OSError:
+            fingerprint = None
+        with self._lock:
+            if fingerprint is None:
+                if key not in self._files:
+                    return False
+                self._remove(key)
+                return True
+            if self._fingerprints.get(key) == fingerprint:
+                return False
+            self._put(key, relative_path, fingerprint)
+        self._hash_wake.set()
+        return True
+
+    def _walk(self, directory: Path, prefix: str, seen: Dict[str, Tuple[str, Tuple[int, int, int]]]):
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            self._walk(Path(entry.path), f"{prefix}{entry.name}/", seen)
+                        elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in MODEL_FILE_SUFFIXES:
+                            st = entry.stat()
+                            relative_path = f"{prefix}{entry.name}"
+                            seen[_key(relative_path)] = (relative_path, (st.st_ino, st.st_size, st.st_mtime_ns))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"⚠️ 扫描模型目录失败 {directory}: {e}")
+
+    def _put(self, key: str, relative_path: str, fingerprint: Tuple[int, int, int]):
+        self._files[key] = {"path": relative_path, "size": fingerprint[1], "mtime": fingerprint[2] / 1e9, "sha256": None}
+        self._fingerprints[key] = fingerprint
+        self.version += 1
+        self._dirty = True
+
+    def _remove(self, key: str):
+        del self._files[key]
+        del self._fingerprints[key]
+        self.version += 1
+        self._dirty = True
+
+    # ------------------------------------------------------------------
+    # sha256
+    # ------------------------------------------------------------------
+
+    def _next_unhashed(self) -> Optional[Tuple[str, str, Tuple[int, int, int]]]:
+        with self._lock:
+            for key, entry in self._files.items():
+                if entry["sha256"] is None and (key, self._fingerprints[key]) not in self._hash_failed:
+                    return key, entry["path"], self._fingerprints[key]
+        return None
+
+    def _hash_loop(self):
+        """逐个计算新增或变化文件的sha256（分块读取，停止时中断）"""
+        while not self._hash_stop.is_set():
+            item = self._next_unhashed()
+            if item is None:
+                self._hash_wake.wait()
+                self._hash_wake.clear()
+                continue
+            key, relative_path, fingerprint = item
+            digest = hashlib.sha256()
+            try:
+                with open(self.models_dir / relative_path, "rb") as f:
+                    while not self._hash_stop.is_set():
+                        chunk = f.read(HASH_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+            except OSError as e:
+                # 文件在计算过程中被删除或不可读：文件变化（新的指纹）后再计算
+                print(f"⚠️ 计算模型文件sha256失败 {relative_path}: {e}")
+                self._hash_failed.add((key, fingerprint))
+                continue
+            if self._hash_stop.is_set():
+                return
+            with self._lock:
+                # 计算期间文件被修改时丢弃结果，按新的指纹重新计算
+                if self._fingerprints.get(key) == fingerprint:
+                    self._files[key]["sha256"] = digest.hexdigest()
+                    self._stats["hashed"] += 1
+                    self._stats["hashed_bytes"] += fingerprint[1]
+                    self.version += 1
+                    self._dirty = True
+            self.save()
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 读取模型文件索引失败，重新扫描: {e}")
+            return
+        if data.get("version") != INDEX_VERSION or data.get("models_dir") != str(self.models_dir):
+            return
+        with self._lock:
+            for key, entry in data.get("files", {}).items():
+                self._files[key] = entry["file"]
+                self._fingerprints[key] = tuple(entry["fingerprint"])
+
+    def save(self):
+        """索引有变化时写入磁盘（先写临时文件再替换）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "version": INDEX_VERSION,
+                "models_dir": str(self.models_dir),
+                "files": {key: {"fingerprint": list(self._fingerprints[key]), "file": entry}
+                          for key, entry in self._files.items()},
+            }
+            self._dirty = False
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_name(
+                f".{self.index_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            self._dirty = True
+            print(f"⚠️ 写入模型文件索引失败: {e}")
+
+    # ------------------------------------------------------------------
+    # 后台线程
+    # ------------------------------------------------------------------
+
+    def start(self) -> bool:
+        """在后台建立索引并监听目录（无法监听时定期巡检），已启动时返回False"""
+        if not self._watcher.start():
+            return False
+        if self.hash_files:
+            self._hash_stop.clear()
+            self._hash_thread = threading.Thread(target=self._hash_loop, name="模型文件sha256", daemon=True)
+            self._hash_thread.start()
+        return True
+
+    def stop(self):
+        self._watcher.stop()
+        self._hash_stop.set()
+        self._hash_wake.set()
+        if self._hash_thread is not None:
+            self._hash_thread.join(timeout=10)
+            self._hash_thread = None
+        self.save()
+
+    def _on_watcher_scan(self):
+        if not self._ready and not self._files:
+            self._load()
+        self.sweep()
+        self.save()
+
+    def _on_watcher_paths(self, paths: Iterable[Path]):
+        for path in paths:
+            self.update_path(path)
+        self.save()
+
+    # ------------------------------------------------------------------
+    # 上报admin
+    # ------------------------------------------------------------------
+
+    def start_reporting(self) -> bool:
+        """定期向admin上报本节点的文件清单（索引变化后立即上报），已启动时返回False"""
+        if self._report_task is not None and not self._report_task.done():
+            return False
+        self._report_task = asyncio.create_task(self._report_loop())
+        return True
+
+    async def stop_reporting(self):
+        if self._report_task is None:
+            return
+        self._report_task.cancel()
+        try:
+            await self._report_task
+        except asyncio.CancelledError:
+            pass
+        self._report_task = None
+
+    async def _report_loop(self):
+        while True:
+            now = time.monotonic()
+            changed = self.version != self._reported_version
+            if self._ready and now >= self._retry_at and (changed or now - self._reported_at >= MODEL_FILE_REPORT_INTERVAL):
+                await self.report()
+            await asyncio.sleep(REPORT_CHECK_INTERVAL)
+
+    async def report(self) -> bool:
+        """上报文件清单（admin熔断时跳过），返回是否成功"""
+        payload = await asyncio.to_thread(self.snapshot)
+        url = f"{ADMIN_BACKEND_URL.rstrip('/')}{REPORT_PATH.format(node=self.node)}"
+        try:
+            with get_circuit_breaker("admin").guard() as attempt:
+                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+                    async with session.post(url, json=payload) as response:
+                        if response.status >= 500:
+                            attempt.fail()
+                        if response.status != 200:
+                            raise Exception(f"状态码: {response.status}")
+        except CircuitOpenError:
+            return False
+        except Exception as e:
+            self._stats["failed_reports"] += 1
+            print(f"⚠️ 上报模型文件清单失败: {e}")
+            # 失败后等待一个心跳周期再重试（admin熔断时由熔断器决定）
+            self._retry_at = time.monotonic() + MODEL_FILE_REPORT_INTERVAL
+            return False
+        self._stats["reports"] += 1
+        self._reported_version = payload["version"]
+        self._reported_at = time.monotonic()
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hashed = sum(1 for entry in self._files.values() if entry["sha256"])
+        return {
+            "node": self.node,
+            "models_dir": str(self.models_dir),
+            "ready": self._ready,
+            "count": len(self._files),
+            "hashed_files": hashed,
+            "mode": self._watcher.mode,
+            "events": self._watcher.events,
+            "version": self.version,
+            **self._stats
+        }
+
+
+# 全局模型文件索引
+_model_file_index: Optional[ModelFileIndex] = None
+
+
+def get_model_file_index() -> ModelFileIndex:
+    """获取全局模型文件索引实例"""
+    global _model_file_index
+    if _model_file_index is None:
+        _model_file_index = ModelFileIndex()
+    return _model_file_index
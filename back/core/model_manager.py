@@ -13,7 +13,9 @@ from pathlib import Path
 from typing import Dict, Any, List, Optional
 from enum import Enum
 
-from config.settings import COMFYUI_MAIN_OUTPUT_DIR, COMFYUI_MODELS_DIR, ADMIN_BACKEND_URL
+from config.settings import COMFYUI_MAIN_OUTPUT_DIR, ADMIN_BACKEND_URL
+from core.circuit_breaker import get_circuit_breaker
+from core.model_file_index import get_model_file_index, model_file_paths
 
 
 class ModelType(Enum):
@@ -50,44 +52,17 @@ class ModelConfig:
                 print(f"✅ API模型 {self.name} 可用")
                 return True
             
-            # 使用统一配置的模型目录路径
-            model_dir = COMFYUI_MODELS_DIR
+            # 模型文件索引（内存），不逐个stat模型卷上的文件
+            index = get_model_file_index()
             
             # 在Docker环境中，如果模型目录不存在，假设模型通过挂载可用
-            if not model_dir.exists():
-                print(f"⚠️ 模型目录不存在，假设模型 {self.name} 通过挂载可用: {model_dir}")
+            if not index.models_dir_exists():
+                print(f"⚠️ 模型目录不存在，假设模型 {self.name} 通过挂载可用: {index.models_dir}")
                 return True
             
-            # 根据模型类型确定文件路径
-            if self.model_type == ModelType.FLUX:
-                unet_path = model_dir / "checkpoints" / self.unet_file
-                clip_path = model_dir / "clip" / self.clip_file
-                vae_path = model_dir / "vae" / self.vae_file
-            elif self.model_type == ModelType.QWEN:
-                unet_path = model_dir / "diffusion_models" / self.unet_file
-                clip_path = model_dir / "text_encoders" / self.clip_file
-                vae_path = model_dir / "vae" / self.vae_file
-            elif self.model_type == ModelType.WAN: # Added WAN model type
-                unet_path = model_dir / "diffusion_models" / self.unet_file
-                clip_path = model_dir / "text_encoders" / self.clip_file
-                vae_path = model_dir / "vae" / self.vae_file
-            else:
-                # 默认使用checkpoints目录
-                unet_path = model_dir / "checkpoints" / self.unet_file
-                clip_path = model_dir / "clip" / self.clip_file
-                vae_path = model_dir / "vae" / self.vae_file
-            
-            unet_exists = unet_path.exists()
-            clip_exists = clip_path.exists()
-            vae_exists = vae_path.exists()
-            
-            # 调试信息（生产环境可注释掉）
-            # print(f"🔍 检查模型 {self.name} 文件:")
-            # print(f"  - UNet: {unet_path} - {'✅' if unet_exists else '❌'}")
-            # print(f"  - CLIP: {clip_path} - {'✅' if clip_exists else '❌'}")
-            # print(f"  - VAE: {vae_path} - {'✅' if vae_exists else '❌'}")
-            
-            return (unet_exists and clip_exists and vae_exists)
+            # 根据模型类型确定需要的文件
+            required = model_file_paths(self.model_type.value, self.unet_file, self.clip_file, self.vae_file)
+            return all(index.has_file(path) for path in required)
         except Exception:
             return False
     
@@ -244,9 +219,12 @@ class ModelManager:
         try:
             import requests
             
-            # 通过admin API获取模型配置
+            # 通过admin API获取模型配置（admin熔断时立即失败，不阻塞事件循环等待超时）
             admin_url = f"{ADMIN_BACKEND_URL}/api/admin/config-sync/models"
-            response = requests.get(admin_url, timeout=5)
+            with get_circuit_breaker("admin").guard() as attempt:
+                response = requests.get(admin_url, timeout=5)
+                if response.status_code >= 500:
+                    attempt.fail()
             
             if response.status_code != 200:
                 print(f"❌ admin API调用失败: {response.status_code}")
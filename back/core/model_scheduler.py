@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型亲和调度器
+ComfyUI切换UNet/CLIP/VAE需要卸载并重新加载数GB权重，交替提交不同模型的prompt时，
+换模型的时间往往超过生成本身。调度器限制同时提交到ComfyUI的prompt数量，
+空出槽位时优先放行与当前已加载模型相同的prompt，等待超过公平时限的prompt优先放行。
+标记为高优先级的prompt（如渐进式重绘的预览）排在所有普通请求之前。
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import COMFYUI_MAX_INFLIGHT_PROMPTS, MODEL_AFFINITY_MAX_DELAY
+
+# 加载权重的节点类型 -> 权重文件所在的输入字段
+# 字段值来自 ModelConfig.unet_file / clip_file / vae_file（工作流构建时写入）
+MODEL_LOADER_INPUTS = {
+    "UNETLoader": ("unet_name",),
+    "UnetLoaderGGUF": ("unet_name",),
+    "CheckpointLoaderSimple": ("ckpt_name",),
+    "CLIPLoader": ("clip_name",),
+    "DualCLIPLoader": ("clip_name1", "clip_name2"),
+    "VAELoader": ("vae_name",),
+}
+
+ModelKey = Tuple[str, ...]
+
+
+def workflow_model_key(workflow: Dict[str, Any]) -> ModelKey:
+    """提取工作流需要加载的权重文件集合
+
+    只调用外部API的工作流（如Gemini）返回空元组，不占用也不改变已加载的模型。
+    """
+    files = {class_type: set() for class_type in MODEL_LOADER_INPUTS}
+    for node in workflow.values():
+        if not isinstance(node, dict):
+            continue
+        class_type = node.get("class_type")
+        fields = MODEL_LOADER_INPUTS.get(class_type)
+        if not fields:
+            continue
+        inputs = node.get("inputs", {})
+        for field in fields:
+            value = inputs.get(field)
+            if isinstance(value, str) and value:
+                files[class_type].add(value)
+    # 按 UNet/Checkpoint -> CLIP -> VAE 的顺序排列，第一个文件即主模型
+    key = []
+    for class_type in MODEL_LOADER_INPUTS:
+        for value in sorted(files[class_type]):
+            if value not in key:
+                key.append(value)
+    return tuple(key)
+
+
+def describe_model_key(key: ModelKey) -> str:
+    """用于日志和统计的模型标识（主模型权重文件名）"""
+    return key[0] if key else "api"
+
+
+class _Waiter:
+    """等待提交槽位的prompt"""
+
+    __slots__ = ("owner", "key", "enqueued_at", "future", "priority")
+
+    def __init__(self, owner: str, key: ModelKey, future: asyncio.Future, priority: bool = False):
+        self.owner = owner
+        self.key = key
+        self.enqueued_at = time.monotonic()
+        self.future = future
+        self.priority = priority
+
+
+class SlotTicket:
+    """已放行的提交槽位，prompt结束后归还"""
+
+    __slots__ = ("owner", "key", "swap", "granted_at", "released")
+
+    def __init__(self, owner: str, key: ModelKey, swap: bool):
+        self.owner = owner
+        self.key = key
+        self.swap = swap
+        self.granted_at = time.monotonic()
+        self.released = False
+
+
+class ModelAffinityScheduler:
+    """按已加载模型放行prompt的提交槽位"""
+
+    def __init__(self, max_inflight: int = COMFYUI_MAX_INFLIGHT_PROMPTS,
+                 max_delay: float = MODEL_AFFINITY_MAX_DELAY):
+        """初始化调度器
+
+        Args:
+            max_inflight: 同时提交到ComfyUI的prompt上限（ComfyUI串行执行，保留1个排队即可保持GPU忙碌）
+            max_delay: 公平时限（秒），等待超过该时间的prompt不再被同模型prompt插队
+        """
+        self.max_inflight = max(1, max_inflight)
+        self.max_delay = max_delay
+        self._waiters: List[_Waiter] = []
+        self._inflight = 0
+        # ComfyUI按提交顺序执行，最后放行的权重集合即为接下来会加载的模型
+        self._loaded: Optional[ModelKey] = None
+        self._stats = {
+            "dispatched": 0,
+            "swaps": 0,
+            "affinity_hits": 0,
+            "reordered": 0,
+            "prioritized": 0,
+            "fairness_overrides": 0,
+            "withdrawn": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+        # 每个模型的执行耗时：换模型 / 未换模型，用于估算换模型带来的延迟
+        self._durations: Dict[str, Dict[str, List[float]]] = {}
+
+    async def acquire(self, owner: str, key: ModelKey, priority: bool = False) -> Optional[SlotTicket]:
+        """等待提交槽位
+
+        Args:
+            owner: 槽位所属任务ID
+            key: workflow_model_key 返回的权重集合
+            priority: 高优先级请求，先于所有普通请求放行
+
+        Returns:
+            放行的槽位；等待期间被 withdraw 撤回时返回None
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(_Waiter(owner, key, future, priority))
+        self._dispatch()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._remove_waiter(future)
+            if future.done() and not future.cancelled() and future.result() is not None:
+                self.release(future.result())
+            raise
+
+    def release(self, ticket: Optional[SlotTicket]):
+        """归还槽位并记录执行耗时（重复归还会被忽略）"""
+        if ticket is None or ticket.released:
+            return
+        ticket.released = True
+        self._inflight -= 1
+        if ticket.key:
+            elapsed = time.monotonic() - ticket.granted_at
+            bucket = self._durations.setdefault(describe_model_key(ticket.key), {"swap": [], "warm": []})
+            samples = bucket["swap" if ticket.swap else "warm"]
+            samples.append(elapsed)
+            if len(samples) > 200:
+                del samples[0]
+        self._dispatch()
+
+    def withdraw(self, owner: str) -> int:
+        """撤回某个任务所有仍在等待的请求（任务取消时调用）"""
+        withdrawn = 0
+        for waiter in list(self._waiters):
+            if waiter.owner == owner:
+                self._waiters.remove(waiter)
+                if not waiter.future.done():
+                    waiter.future.set_result(None)
+                withdrawn += 1
+        self._stats["withdrawn"] += withdrawn
+        return withdrawn
+
+    def _remove_waiter(self, future: asyncio.Future):
+        self._waiters = [waiter for waiter in self._waiters if waiter.future is not future]
+
+    def _pick(self) -> _Waiter:
+        """选择下一个放行的请求：高优先级请求 > 超时的最早请求 > 同模型请求 > 最早请求"""
+        oldest = self._waiters[0]
+        for waiter in self._waiters:
+            if waiter.priority:
+                if waiter is not oldest:
+                    self._stats["prioritized"] += 1
+                return waiter
+        now = time.monotonic()
+        if now - oldest.enqueued_at >= self.max_delay:
+            if self._loaded is not None and oldest.key and oldest.key != self._loaded and \
+                    any(waiter.key == self._loaded for waiter in self._waiters[1:]):
+                self._stats["fairness_overrides"] += 1
+            return oldest
+        if self._loaded is not None:
+            for waiter in self._waiters:
+                if not waiter.key or waiter.key == self._loaded:
+                    if waiter is not oldest:
+                        self._stats["reordered"] += 1
+                    return waiter
+        return oldest
+
+    def _dispatch(self):
+        """在有空闲槽位时放行等待中的请求"""
+        while self._inflight < self.max_inflight and self._waiters:
+            waiter = self._pick()
+            self._waiters.remove(waiter)
+            if waiter.future.done():
+                continue
+
+            swap = bool(waiter.key) and self._loaded is not None and waiter.key != self._loaded
+            if waiter.key:
+                if swap:
+                    self._stats["swaps"] += 1
+                    print(f"🔄 ComfyUI模型切换: {describe_model_key(self._loaded)} -> {describe_model_key(waiter.key)}")
+                elif self._loaded is not None:
+                    self._stats["affinity_hits"] += 1
+                self._loaded = waiter.key
+
+            waited = time.monotonic() - waiter.enqueued_at
+            self._stats["dispatched"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+
+            self._inflight += 1
+            waiter.future.set_result(SlotTicket(waiter.owner, waiter.key, swap))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """调度统计：换模型次数、亲和命中、等待时间以及换模型带来的额外耗时估算"""
+        models = {}
+        swap_penalty_total = 0.0
+        for name, bucket in self._durations.items():
+            swap_avg = sum(bucket["swap"]) / len(bucket["swap"]) if bucket["swap"] else None
+            warm_avg = sum(bucket["warm"]) / len(bucket["warm"]) if bucket["warm"] else None
+            penalty = max(0.0, swap_avg - warm_avg) if swap_avg is not None and warm_avg is not None else None
+            if penalty is not None:
+                swap_penalty_total += penalty * len(bucket["swap"])
+            models[name] = {
+                "swap_runs": len(bucket["swap"]),
+                "warm_runs": len(bucket["warm"]),
+                "avg_swap_seconds": round(swap_avg, 3) if swap_avg is not None else None,
+                "avg_warm_seconds": round(warm_avg, 3) if warm_avg is not None else None,
+                "swap_penalty_seconds": round(penalty, 3) if penalty is not None else None,
+            }
+
+        dispatched = self._stats["dispatched"]
+        return {
+            "max_inflight": self.max_inflight,
+            "max_delay_seconds": self.max_delay,
+            "inflight": self._inflight,
+            "waiting": len(self._waiters),
+            "loaded_model": describe_model_key(self._loaded) if self._loaded is not None else None,
+            "dispatched": dispatched,
+            "swaps": self._stats["swaps"],
+            "affinity_hits": self._stats["affinity_hits"],
+            "reordered": self._stats["reordered"],
+            "prioritized": self._stats["prioritized"],
+            "fairness_overrides": self._stats["fairness_overrides"],
+            "withdrawn": self._stats["withdrawn"],
+            "avg_wait_seconds": round(self._stats["wait_seconds_total"] / dispatched, 3) if dispatched else 0.0,
+            "max_wait_seconds": round(self._stats["wait_seconds_max"], 3),
+            "estimated_swap_seconds": round(swap_penalty_total, 3),
+            "models": models,
+        }
+
+
+# 全局调度器实例
+_model_scheduler: Optional[ModelAffinityScheduler] = None
+
+
+def get_model_scheduler() -> ModelAffinityScheduler:
+    """获取全局模型亲和调度器实例"""
+    global _model_scheduler
+    if _model_scheduler is None:
+        _model_scheduler = ModelAffinityScheduler()
+    return _model_scheduler
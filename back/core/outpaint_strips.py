@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分条扩图的切分与合成
+只对新增的边缘条带做扩散：每个扩展方向取原图边缘的一段作为上下文，单独外补并提交prompt。
+左右条带先并行生成，上下条带以合成后的画布为上下文生成（覆盖四个角），
+条带结果在与已生成区域重叠的上下文范围内线性过渡，最后贴回原图，原图像素保持不变。
+"""
+
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+from PIL import Image
+
+from core.upscale_tiles import linear_ramp
+
+Box = Tuple[int, int, int, int]
+Padding = Tuple[int, int, int, int]
+
+
+class OutpaintStrip:
+    """一个扩展方向的条带"""
+
+    __slots__ = ("edge", "phase", "source_box", "padding")
+
+    def __init__(self, edge: str, phase: int, source_box: Box, padding: Padding):
+        self.edge = edge
+        # 同一阶段的条带互不重叠，可并行提交；后一阶段以前一阶段的合成结果为上下文
+        self.phase = phase
+        # 作为工作流输入图像的画布区域（已有像素）
+        self.source_box = source_box
+        # 工作流外补画板在该条带上的 (left, top, right, bottom)
+        self.padding = padding
+
+    @property
+    def output_box(self) -> Box:
+        """外补后的条带在最终画布中的位置"""
+        left, top, right, bottom = self.source_box
+        pad_left, pad_top, pad_right, pad_bottom = self.padding
+        return left - pad_left, top - pad_top, right + pad_right, bottom + pad_bottom
+
+
+def plan_strips(image_size: Tuple[int, int], padding: Padding, context: int) -> List[OutpaintStrip]:
+    """切分方案
+
+    Args:
+        image_size: 原图尺寸
+        padding: 四个方向的扩展像素 (left, top, right, bottom)
+        context: 每个条带包含的原图（或已生成区域）上下文宽度
+
+    Returns:
+        按阶段排序的条带列表，坐标为最终画布坐标（原图位于 (left, top)）
+    """
+    width, height = image_size
+    left, top, right, bottom = padding
+    canvas_width = width + left + right
+    context_x, context_y = min(context, width), min(context, height)
+
+    strips = []
+    if left:
+        strips.append(OutpaintStrip("left", 0, (left, top, left + context_x, top + height), (left, 0, 0, 0)))
+    if right:
+        strips.append(OutpaintStrip("right", 0, (left + width - context_x, top, left + width, top + height),
+                                    (0, 0, right, 0)))
+    # 上下条带横跨整个画布宽度，左右已扩展时在其结果上生成，同时补齐四个角
+    phase = 1 if left or right else 0
+    if top:
+        strips.append(OutpaintStrip("top", phase, (0, top, canvas_width, top + context_y), (0, top, 0, 0)))
+    if bottom:
+        strips.append(OutpaintStrip("bottom", phase, (0, top + height - context_y, canvas_width, top + height),
+                                    (0, 0, 0, bottom)))
+    return strips
+
+
+def _strip_mask(strip: OutpaintStrip, size: Tuple[int, int]) -> Image.Image:
+    """条带粘贴遮罩：新增区域不透明，上下文区域从新增边界向内线性淡出"""
+    width, height = size
+    pad_left, pad_top, pad_right, pad_bottom = strip.padding
+    mask = Image.new("L", size, 255)
+    if strip.edge == "left":
+        length = width - pad_left
+        ramp = linear_ramp(length, (length, height), horizontal=True).transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+        mask.paste(ramp, (pad_left, 0))
+    elif strip.edge == "right":
+        length = width - pad_right
+        mask.paste(linear_ramp(length, (length, height), horizontal=True), (0, 0))
+    elif strip.edge == "top":
+        length = height - pad_top
+        ramp = linear_ramp(length, (width, length), horizontal=False).transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+        mask.paste(ramp, (0, pad_top))
+    else:
+        length = height - pad_bottom
+        mask.paste(linear_ramp(length, (width, length), horizontal=False), (0, 0))
+    return mask
+
+
+def composite_strips(canvas: Image.Image, strips: Sequence[Tuple[OutpaintStrip, Path]],
+                     original: Image.Image, origin: Tuple[int, int]):
+    """把一个阶段的条带结果合成到画布上，然后贴回原图
+
+    条带结果尺寸与外补后的条带不一致时（工作流按最长边缩放），先缩放回条带尺寸。
+
+    Args:
+        canvas: 最终尺寸的画布（原地修改）
+        strips: (条带, ComfyUI输出文件)
+        original: 原图（RGB）
+        origin: 原图在画布中的位置
+    """
+    for strip, output_path in strips:
+        box = strip.output_box
+        size = (box[2] - box[0], box[3] - box[1])
+        with Image.open(output_path) as result:
+            patch = result.convert("RGB")
+        if patch.size != size:
+            patch = patch.resize(size, Image.Resampling.LANCZOS)
+        canvas.paste(patch, (box[0], box[1]), _strip_mask(strip, size))
+    canvas.paste(original, origin)
@@ -15,6 +15,7 @@ from typing import Any, Dict, Optional
 
 from config.settings import COMFYUI_MAIN_OUTPUT_DIR, OUTPUT_DIR, COMFYUI_INPUT_DIR
 from core.database_manager import DatabaseManager
+from core.circuit_breaker import CircuitOpenError, get_circuit_breaker
 from core.comfyui_client import ComfyUIClient
 from core.workflow_template import WorkflowTemplate
 from core.model_manager import ModelConfig, ModelType
@@ -73,6 +74,11 @@ class ReverseManager:
             print(f"   描述类型: {caption_type}")
             print(f"   描述长度: {caption_length}")
             
+            # ComfyUI熔断中：不再处理图片、提交工作流，直接返回失败
+            breaker = get_circuit_breaker("comfyui")
+            if breaker.is_open:
+                raise CircuitOpenError(breaker.name, breaker.retry_after())
+            
             # 创建任务输出目录
             task_output_dir = self.output_dir / task_id
             task_output_dir.mkdir(parents=True, exist_ok=True)
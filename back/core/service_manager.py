@@ -14,6 +14,8 @@ from core.comfyui_client import ComfyUIClient
 from core.workflow_template import WorkflowTemplate
 from core.task_manager import TaskManager
 from core.upscale_manager import UpscaleManager
+from core.upscale_batch_manager import UpscaleBatchManager
+from core.warmup_manager import WarmupManager
 from config.settings import (
     COMFYUI_URL, OUTPUT_DIR, DB_PATH
 )
@@ -41,7 +43,9 @@ class ServiceManager:
             self._comfyui_client: Optional[ComfyUIClient] = None
             self._task_manager: Optional[TaskManager] = None
             self._upscale_manager: Optional[UpscaleManager] = None
+            self._upscale_batch_manager: Optional[UpscaleBatchManager] = None
             self._workflow_template: Optional[WorkflowTemplate] = None
+            self._warmup_manager: Optional[WarmupManager] = None
             ServiceManager._initialized = True
             print("✅ 服务管理器初始化完成")
     
@@ -94,11 +98,32 @@ class ServiceManager:
             self._upscale_manager = UpscaleManager(
                 self.comfyui_client,
                 OUTPUT_DIR,
-                self.db_manager
+                self.db_manager,
+                self.task_manager
             )
             print("✅ 放大管理器初始化完成")
         return self._upscale_manager
     
+    @property
+    def upscale_batch_manager(self) -> UpscaleBatchManager:
+        """获取批量放大管理器（懒加载）"""
+        if self._upscale_batch_manager is None:
+            self._upscale_batch_manager = UpscaleBatchManager(
+                self.upscale_manager,
+                self.db_manager
+            )
+        return self._upscale_batch_manager
+    
+    @property
+    def warmup_manager(self) -> WarmupManager:
+        """获取模型预热管理器（懒加载）"""
+        if self._warmup_manager is None:
+            self._warmup_manager = WarmupManager(
+                self.comfyui_client,
+                self.workflow_template
+            )
+        return self._warmup_manager
+    
     def reset(self):
         """重置所有服务（用于测试）"""
         print("🔄 重置服务管理器...")
@@ -106,7 +131,9 @@ class ServiceManager:
         self._comfyui_client = None
         self._task_manager = None
         self._upscale_manager = None
+        self._upscale_batch_manager = None
         self._workflow_template = None
+        self._warmup_manager = None
         print("✅ 服务管理器重置完成")
 
 
@@ -134,6 +161,16 @@ def get_upscale_manager() -> UpscaleManager:
     return service_manager.upscale_manager
 
 
+def get_upscale_batch_manager() -> UpscaleBatchManager:
+    """获取批量放大管理器"""
+    return service_manager.upscale_batch_manager
+
+
 def get_workflow_template() -> WorkflowTemplate:
     """获取工作流模板"""
     return service_manager.workflow_template
+
+
+def get_warmup_manager() -> WarmupManager:
+    """获取模型预热管理器"""
+    return service_manager.warmup_manager
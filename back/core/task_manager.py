@@ -7,18 +7,44 @@
 
 import asyncio
 import json
+import math
 import random
 import shutil
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Set
 
-from config.settings import MAX_WAIT_TIME, COMFYUI_MAIN_OUTPUT_DIR, OUTPUT_DIR
+from config.settings import (
+    MAX_WAIT_TIME, COMFYUI_MAIN_OUTPUT_DIR, OUTPUT_DIR, INPAINT_CROP_ENABLED,
+    INPAINT_PREVIEW_STEPS, INPAINT_PREVIEW_SIZE, UPLOAD_DIR, OUTPAINT_STRIPS_ENABLED, OUTPAINT_STRIP_CONTEXT,
+    OUTPAINT_STRIP_RETRIES
+)
 from core.database_manager import DatabaseManager
 from core.comfyui_client import ComfyUIClient
 from core.workflow_template import WorkflowTemplate
 from core.translation_client import get_translation_client
 from core.cache_manager import get_cache_manager
+from core.model_scheduler import get_model_scheduler, workflow_model_key
+from core.inpaint_crop import prepare_inpaint_crop, composite_inpaint_result
+from core.live_preview import get_live_preview_listener
+from core.outpaint_strips import plan_strips, composite_strips
+from core.workflows.qwen_outpainting_workflow import outpaint_padding
+
+# 已结束的任务状态，不能再取消
+FINAL_TASK_STATUSES = ("completed", "failed", "cancelled")
+
+# 渐进式局部重绘：保留的预览结果数量、事件流轮询间隔（秒）
+MAX_INPAINT_PREVIEWS = 256
+INPAINT_EVENT_POLL_INTERVAL = 0.5
+# 实时预览事件流检查任务状态和当前prompt的间隔（秒）
+LIVE_PREVIEW_POLL_INTERVAL = 1.0
+# 分条扩图的最小扩散边长，扩散边长取64的整数倍
+OUTPAINT_STRIP_MIN_SIZE = 512
+OUTPAINT_STRIP_SIZE_MULTIPLE = 64
+
+
+class TaskCancelledError(Exception):
+    """任务已被用户取消"""
 
 
 class TaskManager:
@@ -35,6 +61,15 @@ class TaskManager:
         self.db = db_manager
         self.comfyui = comfyui_client
         self.workflow_template = workflow_template
+        self.scheduler = get_model_scheduler()
+        # 正在执行的任务：task_id -> 取消标记、当前prompt_id、所属画布会话
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        # 渐进式局部重绘的预览结果：task_id -> 预览图路径
+        self._inpaint_previews: Dict[str, str] = {}
+        # 事件流订阅者数量：task_id -> 打开的事件流数
+        self._stream_subscribers: Dict[str, int] = {}
+        # 订阅者断开后发起的取消（事件循环只持有任务的弱引用）
+        self._abandon_cancels: Set[asyncio.Task] = set()
     
     async def create_task(self, reference_image_path: str, description: str, parameters: Dict[str, Any]) -> str:
         """创建新任务
@@ -52,6 +87,7 @@ class TaskManager:
         
         # 保存任务到数据库
         self.db.create_task(task_id, description, reference_image_path, parameters)
+        self._start_run(task_id, parameters)
         
         # 异步执行任务
         asyncio.create_task(self.execute_task(task_id, reference_image_path, description, parameters))
@@ -77,6 +113,7 @@ class TaskManager:
         
         # 保存任务到数据库（使用特殊的任务类型标识）
         self.db.create_task(task_id, description, image_paths_json, parameters)
+        self._start_run(task_id, parameters)
         
         # 异步执行多图融合任务
         asyncio.create_task(self.execute_fusion_task(task_id, reference_image_paths, description, parameters))
@@ -93,6 +130,9 @@ class TaskManager:
             parameters: 任务参数
         """
         try:
+            self._start_run(task_id, parameters)
+            self._raise_if_cancelled(task_id)
+            
             print(f"🚀 开始执行任务: {task_id}")
             print(f"   描述: {description}")
             print(f"   参数: {parameters}")
@@ -106,41 +146,6 @@ class TaskManager:
             if not model_name:
                 raise ValueError("模型名称是必需的参数")
             
-            # 根据模型类型决定是否翻译
-            translated_description = description
-            if model_name.startswith("flux"):
-                # Flux模型需要翻译中文为英文
-                if self._is_chinese_text(description):
-                    print(f"🌐 Flux模型检测到中文描述，开始翻译...")
-                    translation_client = get_translation_client()
-                    
-                    # 检查Ollama服务是否可用
-                    if await translation_client.check_ollama_health():
-                        if await translation_client.check_model_available():
-                            translated_description = await translation_client.translate_to_english(description)
-                            if translated_description:
-                                print(f"✅ 翻译成功: {description} -> {translated_description}")
-                            else:
-                                print(f"⚠️ 翻译失败，使用原描述: {description}")
-                        else:
-                            print(f"⚠️ qianwen模型不可用，使用原描述: {description}")
-                    else:
-                        print(f"⚠️ Ollama服务不可用，使用原描述: {description}")
-                else:
-                    print(f"✅ Flux模型描述已经是英文，无需翻译: {description}")
-            elif model_name.startswith("gemini"):
-                # Nano Banana模型支持中文，无需翻译
-                print(f"✅ Nano Banana模型支持中文，直接使用原描述: {description}")
-            elif model_name.startswith("qwen"):
-                # Qwen模型支持中文，无需翻译
-                print(f"✅ Qwen模型支持中文，直接使用原描述: {description}")
-            elif model_name.startswith("wan"):
-                # Wan模型支持中文，无需翻译
-                print(f"✅ Wan模型支持中文，直接使用原描述: {description}")
-            else:
-                # 其他模型默认支持中文
-                print(f"✅ {model_name}模型支持中文，直接使用原描述: {description}")
-            
             # 获取生成数量
             count = int(parameters.get("count", 1))
             
@@ -149,58 +154,82 @@ class TaskManager:
                 count = 1
                 print(f"🎬 Wan视频模型，设置count为1")
             
+            # 翻译和模型配置获取互不依赖，并行执行
+            translated_description, model_config = await asyncio.gather(
+                self._translate_description(model_name, description),
+                self.workflow_template.fetch_model_config(model_name),
+            )
+            self._raise_if_cancelled(task_id)
+            
+            def prepare_workflow(index: int) -> asyncio.Future:
+                """在后台准备第 index+1 张图片的工作流（模板实例化和参考图预处理在线程中执行）"""
+                # 为每次生成创建独立的参数副本
+                current_params = parameters.copy()
+                current_params["count"] = 1  # 每次只生成一张
+                
+                # 如果没有指定种子，为每张图片生成不同的随机种子
+                if not parameters.get("seed"):
+                    current_params["seed"] = random.randint(1, 2**31 - 1)  # 限制在int32范围内
+                    print(f"🎲 第 {index+1} 张图片使用随机种子: {current_params['seed']}")
+                
+                return asyncio.ensure_future(self.workflow_template.customize_workflow(
+                    reference_image_path, translated_description, current_params, model_name, model_config=model_config
+                ))
+            
             result_paths = []
             
             print(f"🎯 开始生成 {count} 张图片...")
             
-            # 循环生成每张图片
-            for i in range(count):
-                print(f"📸 正在生成第 {i+1}/{count} 张图片...")
-                
-                try:
-                    # 为每次生成创建独立的参数副本
-                    current_params = parameters.copy()
-                    current_params["count"] = 1  # 每次只生成一张
-                    
-                    # 如果没有指定种子，为每张图片生成不同的随机种子
-                    if not parameters.get("seed"):
-                        current_params["seed"] = random.randint(1, 2**31 - 1)  # 限制在int32范围内
-                        print(f"🎲 使用随机种子: {current_params['seed']}")
-                    
-                    # 准备工作流
-                    print(f"🔧 准备工作流...")
-                    workflow = await self.workflow_template.customize_workflow(
-                        reference_image_path, translated_description, current_params, model_name
-                    )
-                    print(f"✅ 工作流准备完成")
+            # 循环生成每张图片：第 i+1 张的工作流在第 i 张执行期间准备
+            print(f"🔧 准备工作流...")
+            next_workflow = prepare_workflow(0)
+            try:
+                for i in range(count):
+                    # 取消后不再提交剩余的生成
+                    self._raise_if_cancelled(task_id)
+                    print(f"📸 正在生成第 {i+1}/{count} 张图片...")
                     
-                    # 提交到ComfyUI
-                    print(f"📤 提交工作流到ComfyUI...")
-                    prompt_id = await self.comfyui.submit_workflow(workflow)
-                    print(f"✅ 已提交工作流，prompt_id: {prompt_id}")
+                    try:
+                        workflow = await next_workflow
+                        next_workflow = None
+                        print(f"✅ 工作流准备完成")
+                        
+                        # 提交到ComfyUI
+                        print(f"📤 提交工作流到ComfyUI...")
+                        prompt_id = await self._submit_prompt(task_id, workflow)
+                        print(f"✅ 已提交工作流，prompt_id: {prompt_id}")
+                        
+                        if i < count - 1:
+                            next_workflow = prepare_workflow(i + 1)
+                        
+                        # 等待完成
+                        print(f"⏳ 等待任务完成...")
+                        batch_result = await self.wait_for_completion(task_id, prompt_id)
+                        
+                        if batch_result:
+                            result_paths.extend(batch_result)
+                            print(f"✅ 第 {i+1} 张图片生成完成: {batch_result}")
+                        else:
+                            print(f"❌ 第 {i+1} 张图片生成失败")
+                            raise Exception(f"第 {i+1} 张图片生成失败，没有返回结果")
+                            
+                    except Exception as e:
+                        print(f"❌ 生成第 {i+1} 张图片时出错: {str(e)}")
+                        raise Exception(f"生成第 {i+1} 张图片失败: {str(e)}")
                     
-                    # 等待完成
-                    print(f"⏳ 等待任务完成...")
-                    batch_result = await self.wait_for_completion(task_id, prompt_id)
+                    # 更新进度
+                    progress = int((i + 1) / count * 100)
+                    self.db.update_task_progress(task_id, progress)
                     
-                    if batch_result:
-                        result_paths.extend(batch_result)
-                        print(f"✅ 第 {i+1} 张图片生成完成: {batch_result}")
-                    else:
-                        print(f"❌ 第 {i+1} 张图片生成失败")
-                        raise Exception(f"第 {i+1} 张图片生成失败，没有返回结果")
-                        
-                except Exception as e:
-                    print(f"❌ 生成第 {i+1} 张图片时出错: {str(e)}")
-                    raise Exception(f"生成第 {i+1} 张图片失败: {str(e)}")
-                
-                # 更新进度
-                progress = int((i + 1) / count * 100)
-                self.db.update_task_progress(task_id, progress)
-                
-                # 如果不是最后一张，稍微等待一下避免过快请求
-                if i < count - 1:
-                    await asyncio.sleep(1)
+                    # 如果不是最后一张，稍微等待一下避免过快请求
+                    if i < count - 1:
+                        await self._sleep_unless_cancelled(task_id, 1)
+            finally:
+                if next_workflow is not None:
+                    next_workflow.cancel()
+                    await asyncio.gather(next_workflow, return_exceptions=True)
+            
+            self._raise_if_cancelled(task_id)
             
             # 处理结果
             if result_paths:
@@ -224,7 +253,7 @@ class TaskManager:
                         cache_manager.invalidate_task_cache(task_id)
                     else:
                         print(f"❌ 未找到视频文件")
-                        self.db.update_task_status(task_id, "failed", error="No video generated")
+                        self._mark_failed(task_id, "No video generated")
                         # 清除相关缓存
                         cache_manager = get_cache_manager()
                         cache_manager.invalidate_history_cache()
@@ -251,7 +280,7 @@ class TaskManager:
             else:
                 error_msg = "No output generated"
                 print(f"❌ {error_msg}")
-                self.db.update_task_status(task_id, "failed", error=error_msg)
+                self._mark_failed(task_id, error_msg)
                 # 清除相关缓存
                 cache_manager = get_cache_manager()
                 cache_manager.invalidate_history_cache()
@@ -263,11 +292,55 @@ class TaskManager:
             import traceback
             print(f"详细错误信息:")
             print(traceback.format_exc())
-            self.db.update_task_status(task_id, "failed", error=error_msg)
+            self._mark_failed(task_id, error_msg)
             # 清除相关缓存
             cache_manager = get_cache_manager()
             cache_manager.invalidate_history_cache()
             cache_manager.invalidate_task_cache(task_id)
+        finally:
+            self._finish_run(task_id)
+    
+    async def _translate_description(self, model_name: str, description: str) -> str:
+        """根据模型类型决定是否翻译描述：Flux模型把中文描述翻译为英文，其他模型直接使用原描述"""
+        if model_name.startswith("flux"):
+            # Flux模型需要翻译中文为英文
+            if not self._is_chinese_text(description):
+                print(f"✅ Flux模型描述已经是英文，无需翻译: {description}")
+                return description
+            
+            print(f"🌐 Flux模型检测到中文描述，开始翻译...")
+            translation_client = get_translation_client()
+            
+            # 服务和模型检查并行执行
+            healthy, model_available = await asyncio.gather(
+                translation_client.check_ollama_health(),
+                translation_client.check_model_available(),
+            )
+            if not healthy:
+                print(f"⚠️ Ollama服务不可用，使用原描述: {description}")
+                return description
+            if not model_available:
+                print(f"⚠️ qianwen模型不可用，使用原描述: {description}")
+                return description
+            
+            translated_description = await translation_client.translate_to_english(description)
+            if translated_description:
+                print(f"✅ 翻译成功: {description} -> {translated_description}")
+                return translated_description
+            print(f"⚠️ 翻译失败，使用原描述: {description}")
+        elif model_name.startswith("gemini"):
+            # Nano Banana模型支持中文，无需翻译
+            print(f"✅ Nano Banana模型支持中文，直接使用原描述: {description}")
+        elif model_name.startswith("qwen"):
+            # Qwen模型支持中文，无需翻译
+            print(f"✅ Qwen模型支持中文，直接使用原描述: {description}")
+        elif model_name.startswith("wan"):
+            # Wan模型支持中文，无需翻译
+            print(f"✅ Wan模型支持中文，直接使用原描述: {description}")
+        else:
+            # 其他模型默认支持中文
+            print(f"✅ {model_name}模型支持中文，直接使用原描述: {description}")
+        return description
     
     async def execute_fusion_task(self, task_id: str, reference_image_paths: list, description: str, parameters: Dict[str, Any]):
         """执行多图融合任务
@@ -279,6 +352,9 @@ class TaskManager:
             parameters: 任务参数
         """
         try:
+            self._start_run(task_id, parameters)
+            self._raise_if_cancelled(task_id)
+            
             print(f"🚀 开始执行多图融合任务: {task_id}")
             print(f"   描述: {description}")
             print(f"   参数: {parameters}")
@@ -310,7 +386,7 @@ class TaskManager:
             
             # 提交到ComfyUI
             print(f"📤 提交多图融合工作流到ComfyUI...")
-            prompt_id = await self.comfyui.submit_workflow(workflow)
+            prompt_id = await self._submit_prompt(task_id, workflow)
             print(f"✅ 已提交多图融合工作流，prompt_id: {prompt_id}")
             
             # 等待完成
@@ -336,7 +412,7 @@ class TaskManager:
             else:
                 error_msg = "多图融合任务失败，没有生成结果"
                 print(f"❌ {error_msg}")
-                self.db.update_task_status(task_id, "failed", error=error_msg)
+                self._mark_failed(task_id, error_msg)
                 # 清除相关缓存
                 cache_manager = get_cache_manager()
                 cache_manager.invalidate_history_cache()
@@ -348,11 +424,13 @@ class TaskManager:
             import traceback
             print(f"详细错误信息:")
             print(traceback.format_exc())
-            self.db.update_task_status(task_id, "failed", error=error_msg)
+            self._mark_failed(task_id, error_msg)
             # 清除相关缓存
             cache_manager = get_cache_manager()
             cache_manager.invalidate_history_cache()
             cache_manager.invalidate_task_cache(task_id)
+        finally:
+            self._finish_run(task_id)
     
     async def execute_outpainting_task(self, task_id: str, image_path: str, prompt: str, parameters: Dict[str, Any]):
         """执行扩图任务
@@ -364,6 +442,9 @@ class TaskManager:
             parameters: 扩图参数
         """
         try:
+            self._start_run(task_id, parameters)
+            self._raise_if_cancelled(task_id)
+            
             print(f"🖼️ 开始执行扩图任务: {task_id}")
             print(f"   提示词: {prompt}")
             print(f"   参数: {parameters}")
@@ -377,6 +458,11 @@ class TaskManager:
             # 扩图不需要翻译提示词，直接使用原始提示词
             print(f"📝 使用原始提示词: {prompt}")
             
+            # 分条扩图：只对新增的边缘条带做扩散
+            if OUTPAINT_STRIPS_ENABLED and model_name == "qwen-outpainting":
+                if await self._execute_strip_outpainting(task_id, image_path, prompt, parameters, model_name):
+                    return
+            
             # 准备工作流
             print(f"🔧 准备扩图工作流...")
             workflow = await self.workflow_template.customize_workflow(
@@ -386,7 +472,7 @@ class TaskManager:
             
             # 提交到ComfyUI
             print(f"📤 提交扩图工作流到ComfyUI...")
-            prompt_id = await self.comfyui.submit_workflow(workflow)
+            prompt_id = await self._submit_prompt(task_id, workflow)
             print(f"✅ 已提交扩图工作流，prompt_id: {prompt_id}")
             
             # 等待完成
@@ -412,7 +498,7 @@ class TaskManager:
             else:
                 error_msg = "扩图任务失败，没有生成结果"
                 print(f"❌ {error_msg}")
-                self.db.update_task_status(task_id, "failed", error=error_msg)
+                self._mark_failed(task_id, error_msg)
                 # 清除相关缓存
                 cache_manager = get_cache_manager()
                 cache_manager.invalidate_history_cache()
@@ -424,14 +510,113 @@ class TaskManager:
             import traceback
             print(f"详细错误信息:")
             print(traceback.format_exc())
-            self.db.update_task_status(task_id, "failed", error=error_msg)
+            self._mark_failed(task_id, error_msg)
             # 清除相关缓存
             cache_manager = get_cache_manager()
             cache_manager.invalidate_history_cache()
             cache_manager.invalidate_task_cache(task_id)
-
+        finally:
+            self._finish_run(task_id)
+    
+    async def _execute_strip_outpainting(self, task_id: str, image_path: str, prompt: str,
+                                         parameters: Dict[str, Any], model_name: str) -> bool:
+        """分条扩图：每个扩展方向单独外补一条带（含原图边缘上下文），合成后贴回原图
+        
+        左右条带并行生成；上下条带横跨整个画布，以左右条带的合成结果为上下文，同时补齐四个角。
+        原图像素和分辨率保持不变，扩散分辨率按条带尺寸选择。
+        
+        Returns:
+            是否按分条方式执行（没有扩展方向时返回False，走整图流程）
+        """
+        from PIL import Image
+        
+        with Image.open(image_path) as source:
+            original = source.convert("RGB")
+        
+        # 前端的扩图区域按 original_width/height 计算，与实际图像尺寸不一致时按比例换算
+        scale_x = original.width / max(1, parameters.get("original_width") or original.width)
+        scale_y = original.height / max(1, parameters.get("original_height") or original.height)
+        left, top, right, bottom = outpaint_padding(parameters)
+        padding = (round(left * scale_x), round(top * scale_y), round(right * scale_x), round(bottom * scale_y))
+        strips = plan_strips(original.size, padding, OUTPAINT_STRIP_CONTEXT)
+        if not strips:
+            return False
+        
+        origin = (padding[0], padding[1])
+        canvas = Image.new("RGB", (original.width + padding[0] + padding[2], original.height + padding[1] + padding[3]))
+        canvas.paste(original, origin)
+        phases = sorted({strip.phase for strip in strips})
+        print(f"🧩 分条扩图 {task_id}: {original.width}x{original.height} -> {canvas.width}x{canvas.height}, "
+              f"{len(strips)} 个条带, {len(phases)} 个阶段")
+        
+        def collect(index: int, outputs: Dict[str, Any]) -> Optional[Path]:
+            for node_output in outputs.values():
+                for image_info in node_output.get("images", []):
+                    filename = image_info.get("filename")
+                    if not filename or image_info.get("type", "output") != "output":
+                        continue
+                    output_file = COMFYUI_MAIN_OUTPUT_DIR / image_info.get("subfolder", "") / filename
+                    if output_file.exists():
+                        return output_file
+                    print(f"❌ 条带输出文件不存在: {output_file}")
+            return None
+        
+        strip_paths: List[Path] = []
+        try:
+            submitted = 0
+            for phase_index, phase in enumerate(phases):
+                phase_strips = [strip for strip in strips if strip.phase == phase]
+                workflows = []
+                for strip in phase_strips:
+                    strip_path = Path(UPLOAD_DIR) / f"{task_id}_strip_{strip.edge}.png"
+                    canvas.crop(strip.source_box).save(strip_path, "PNG")
+                    strip_paths.append(strip_path)
+                    
+                    output_box = strip.output_box
+                    longest = max(output_box[2] - output_box[0], output_box[3] - output_box[1])
+                    diffusion_size = max(OUTPAINT_STRIP_MIN_SIZE,
+                                         math.ceil(longest / OUTPAINT_STRIP_SIZE_MULTIPLE) * OUTPAINT_STRIP_SIZE_MULTIPLE)
+                    strip_parameters = {**parameters, "padding": strip.padding, "diffusion_size": diffusion_size}
+                    workflows.append(await self.workflow_template.customize_workflow(
+                        str(strip_path), prompt, strip_parameters, model_name))
+                
+                progress_range = (phase_index * 100 // len(phases), (phase_index + 1) * 100 // len(phases))
+                outputs = await self._run_sub_prompts(task_id, workflows, collect, parameters, OUTPAINT_STRIP_RETRIES,
+                                                      first_index=submitted, progress_range=progress_range)
+                submitted += len(workflows)
+                await asyncio.to_thread(composite_strips, canvas, list(zip(phase_strips, outputs)), original, origin)
+            
+            OUTPUT_DIR.mkdir(exist_ok=True)
+            output_name = f"outpainting-{task_id[:8]}.png"
+            await asyncio.to_thread(canvas.save, OUTPUT_DIR / output_name, "PNG")
+            result_path = f"outputs/{output_name}"
+            print(f"💾 保存分条扩图结果: {result_path} ({canvas.width}x{canvas.height})")
+            self.db.update_task_status(task_id, "completed", result_path=result_path)
+            self.db.update_task_progress(task_id, 100)
+            get_cache_manager().invalidate_history_cache()
+            return True
+        finally:
+            for strip_path in strip_paths:
+                strip_path.unlink(missing_ok=True)
+    
     async def wait_for_completion(self, task_id: str, prompt_id: str, max_wait_time: int = MAX_WAIT_TIME) -> Optional[list]:
-        """等待任务完成
+        """等待任务完成，结束后归还调度槽位
+        
+        Args:
+            task_id: 任务ID
+            prompt_id: ComfyUI的prompt_id
+            max_wait_time: 最大等待时间（秒）
+            
+        Returns:
+            结果文件路径列表，如果失败返回None
+        """
+        try:
+            return await self._poll_completion(task_id, prompt_id, max_wait_time)
+        finally:
+            self._release_slot(task_id)
+    
+    async def _poll_completion(self, task_id: str, prompt_id: str, max_wait_time: int) -> Optional[list]:
+        """轮询ComfyUI直到任务完成
         
         Args:
             task_id: 任务ID
@@ -445,6 +630,9 @@ class TaskManager:
         print(f"⏰ 开始等待任务完成，最大等待时间: {max_wait_time}秒")
         
         while (datetime.now() - start_time).seconds < max_wait_time:
+            if self._is_cancelled(task_id):
+                print(f"🛑 任务已取消，停止等待: {task_id}")
+                return None
             try:
                 print(f"🔍 检查任务状态: {prompt_id}")
                 history = await self.comfyui.get_task_status(prompt_id)
@@ -710,15 +898,404 @@ class TaskManager:
                     print(f"❌ 任务不在队列中也不在历史中，可能失败了")
                     break
                 
-                await asyncio.sleep(2)  # 等待2秒后再检查
+                await self._sleep_unless_cancelled(task_id, 2)  # 等待2秒后再检查
                 
             except Exception as e:
                 print(f"❌ 检查任务状态时出错: {e}")
-                await asyncio.sleep(5)
+                await self._sleep_unless_cancelled(task_id, 5)
         
         print(f"⏰ 等待超时，任务可能失败")
         return None
     
+    async def wait_for_outputs(self, task_id: str, prompt_id: str, max_wait_time: int = MAX_WAIT_TIME) -> Optional[Dict[str, Any]]:
+        """等待prompt结束并返回ComfyUI history中的outputs（不处理输出文件），结束后归还调度槽位
+        
+        Args:
+            task_id: 任务ID
+            prompt_id: ComfyUI的prompt_id
+            max_wait_time: 最大等待时间（秒）
+            
+        Returns:
+            outputs字典；失败、超时或取消时返回None
+        """
+        try:
+            start_time = datetime.now()
+            while (datetime.now() - start_time).seconds < max_wait_time:
+                if self._is_cancelled(task_id):
+                    return None
+                try:
+                    history = await self.comfyui.get_task_status(prompt_id)
+                    if prompt_id not in history:
+                        queue_status = await self.comfyui.get_queue_status()
+                        queued = queue_status.get("queue_running", []) + queue_status.get("queue_pending", [])
+                        if not any(item[1] == prompt_id for item in queued):
+                            # 可能在两次查询之间刚执行完，再查一次历史
+                            history = await self.comfyui.get_task_status(prompt_id)
+                            if prompt_id not in history:
+                                print(f"❌ prompt不在队列中也不在历史中: {prompt_id}")
+                                return None
+                    
+                    if prompt_id in history:
+                        task_info = history[prompt_id]
+                        status = task_info.get("status", {})
+                        if status.get("status_str") == "error":
+                            print(f"❌ ComfyUI执行失败: {prompt_id} {status.get('messages', '')}")
+                            return None
+                        if "outputs" in task_info:
+                            return task_info["outputs"]
+                    
+                    await self._sleep_unless_cancelled(task_id, 2)
+                except Exception as e:
+                    print(f"❌ 检查任务状态时出错: {e}")
+                    await self._sleep_unless_cancelled(task_id, 5)
+            
+            print(f"⏰ 等待超时: {prompt_id}")
+            return None
+        finally:
+            self._release_slot(task_id)
+    
+    async def run_prompt_task(self, task_id: str, workflow: Dict[str, Any], ingest: Callable[[Dict[str, Any]], Optional[str]],
+                              parameters: Optional[Dict[str, Any]] = None, prompt_id: Optional[str] = None):
+        """执行已在数据库中登记的单prompt任务（如放大），与生成任务共用调度、取消和完成跟踪
+        
+        Args:
+            task_id: 任务ID
+            workflow: 要提交的工作流（传入prompt_id恢复跟踪时可为None）
+            ingest: 处理ComfyUI outputs的回调，返回写入数据库的result_path，未找到结果返回None
+            parameters: 任务参数（session_id等）
+            prompt_id: 已提交的prompt_id，服务重启后恢复跟踪时使用
+        """
+        self._start_run(task_id, parameters)
+        try:
+            if prompt_id is None:
+                prompt_id = await self._submit_prompt(task_id, workflow)
+            else:
+                self._runs[task_id]["prompt_id"] = prompt_id
+            
+            outputs = await self.wait_for_outputs(task_id, prompt_id)
+            self._raise_if_cancelled(task_id)
+            if outputs is None:
+                self._mark_failed(task_id, "ComfyUI任务执行失败")
+                return
+            
+            result_path = ingest(outputs)
+            if not result_path:
+                self._mark_failed(task_id, "没有找到输出文件")
+                return
+            
+            self.db.update_task_status(task_id, "completed", result_path=result_path)
+            self.db.update_task_progress(task_id, 100)
+            print(f"✅ 任务完成: {task_id} -> {result_path}")
+        except Exception as e:
+            print(f"❌ 任务执行失败 {task_id}: {e}")
+            self._mark_failed(task_id, f"任务执行失败: {str(e)}")
+        finally:
+            self._finish_run(task_id)
+            cache_manager = get_cache_manager()
+            cache_manager.invalidate_history_cache()
+            cache_manager.invalidate_task_cache(task_id)
+    
+    async def run_multi_prompt_task(self, task_id: str, workflows: List[Dict[str, Any]],
+                                    collect: Callable[[int, Dict[str, Any]], Any],
+                                    combine: Callable[[List[Any]], Optional[str]],
+                                    parameters: Optional[Dict[str, Any]] = None, retries: int = 2):
+        """执行由多个独立prompt组成的任务（如分块放大）
+        
+        各prompt同时交给调度器，按槽位并行提交；单个prompt失败或没有产出时只重试该prompt，
+        全部成功后在线程中合并结果。
+        
+        Args:
+            task_id: 任务ID
+            workflows: 各子prompt的工作流
+            collect: 处理单个子prompt的outputs，返回None表示没有找到结果（会重试）
+            combine: 合并全部子结果，返回写入数据库的result_path
+            parameters: 任务参数（session_id等）
+            retries: 每个子prompt的最大重试次数
+        """
+        self._start_run(task_id, parameters)
+        total = len(workflows)
+        try:
+            results = await self._run_sub_prompts(task_id, workflows, collect, parameters, retries)
+            result_path = await asyncio.to_thread(combine, results)
+            if not result_path:
+                self._mark_failed(task_id, "没有找到输出文件")
+                return
+            
+            self.db.update_task_status(task_id, "completed", result_path=result_path)
+            self.db.update_task_progress(task_id, 100)
+            print(f"✅ 任务完成: {task_id} ({total} 个子任务) -> {result_path}")
+        except Exception as e:
+            print(f"❌ 任务执行失败 {task_id}: {e}")
+            self._mark_failed(task_id, f"任务执行失败: {str(e)}")
+        finally:
+            self._finish_run(task_id)
+            cache_manager = get_cache_manager()
+            cache_manager.invalidate_history_cache()
+            cache_manager.invalidate_task_cache(task_id)
+    
+    async def _run_sub_prompts(self, task_id: str, workflows: List[Dict[str, Any]],
+                               collect: Callable[[int, Dict[str, Any]], Any],
+                               parameters: Optional[Dict[str, Any]] = None, retries: int = 2,
+                               first_index: int = 0, progress_range: tuple = (0, 100)) -> List[Any]:
+        """并行执行一组子prompt（子任务ID为 task_id#序号），返回按顺序排列的结果
+        
+        单个prompt失败或没有产出时只重试该prompt；任一子prompt最终失败时取消其余子prompt并抛出异常。
+        
+        Args:
+            task_id: 父任务ID（需已登记）
+            workflows: 各子prompt的工作流
+            collect: 处理单个子prompt的outputs，返回None表示没有找到结果（会重试）
+            parameters: 任务参数（session_id等）
+            retries: 每个子prompt的最大重试次数
+            first_index: 子任务序号起点（分阶段提交时避免子任务ID重复）
+            progress_range: 这组子prompt对应的父任务进度区间
+        """
+        total = len(workflows)
+        low, high = progress_range
+        finished = 0
+        
+        async def run_part(index: int, workflow: Dict[str, Any]) -> Any:
+            nonlocal finished
+            sub_id = f"{task_id}#{first_index + index}"
+            self._start_run(sub_id, parameters)["parent"] = task_id
+            try:
+                for attempt in range(retries + 1):
+                    self._raise_if_cancelled(task_id)
+                    if attempt:
+                        print(f"🔁 重试子任务 {sub_id} ({attempt}/{retries})")
+                    prompt_id = await self._submit_prompt(sub_id, workflow, persist=False)
+                    outputs = await self.wait_for_outputs(sub_id, prompt_id)
+                    self._raise_if_cancelled(task_id)
+                    result = collect(index, outputs) if outputs is not None else None
+                    if result is not None:
+                        finished += 1
+                        self.db.update_task_progress(task_id, min(99, low + finished * (high - low) // total))
+                        return result
+                raise Exception(f"子任务 {index + 1}/{total} 重试 {retries} 次后仍失败")
+            finally:
+                self._finish_run(sub_id)
+        
+        parts = [asyncio.ensure_future(run_part(index, workflow)) for index, workflow in enumerate(workflows)]
+        try:
+            return await asyncio.gather(*parts)
+        except BaseException:
+            for part in parts:
+                part.cancel()
+            await asyncio.gather(*parts, return_exceptions=True)
+            raise
+    
+    # =============================================================================
+    # 任务取消
+    # =============================================================================
+    
+    def _start_run(self, task_id: str, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """登记正在执行的任务（重复登记返回已有记录）"""
+        run = self._runs.get(task_id)
+        if run is None:
+            parameters = parameters or {}
+            run = {
+                "cancelled": False,
+                "event": asyncio.Event(),
+                "prompt_id": None,
+                "session_id": parameters.get("session_id"),
+                "ephemeral": bool(parameters.get("ephemeral")),
+                "slot": None,
+                # 子prompt所属的任务ID（run_multi_prompt_task），随父任务一起取消
+                "parent": None,
+                # 渐进式局部重绘：同一画布会话再次编辑时取消
+                "progressive": bool(parameters.get("progressive")),
+            }
+            self._runs[task_id] = run
+        return run
+    
+    def _finish_run(self, task_id: str):
+        """任务执行结束，移除登记并归还未归还的调度槽位"""
+        self._release_slot(task_id)
+        self.scheduler.withdraw(task_id)
+        self._runs.pop(task_id, None)
+    
+    def _release_slot(self, task_id: str):
+        run = self._runs.get(task_id)
+        if run is not None and run["slot"] is not None:
+            self.scheduler.release(run["slot"])
+            run["slot"] = None
+    
+    def _is_cancelled(self, task_id: str) -> bool:
+        run = self._runs.get(task_id)
+        return bool(run and run["cancelled"])
+    
+    def _raise_if_cancelled(self, task_id: str):
+        if self._is_cancelled(task_id):
+            raise TaskCancelledError(f"任务已取消: {task_id}")
+    
+    async def _sleep_unless_cancelled(self, task_id: str, seconds: float):
+        """等待指定时间，任务被取消时立即返回"""
+        run = self._runs.get(task_id)
+        if run is None:
+            await asyncio.sleep(seconds)
+            return
+        try:
+            await asyncio.wait_for(run["event"].wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+    
+    def _mark_failed(self, task_id: str, error: str = None):
+        """任务未产出结果时更新状态：被取消的任务记为cancelled，其余记为failed"""
+        if self._is_cancelled(task_id):
+            print(f"🛑 任务已取消: {task_id}")
+            self.db.update_task_status(task_id, "cancelled", error="任务已取消")
+        else:
+            self.db.update_task_status(task_id, "failed", error=error)
+    
+    async def _submit_prompt(self, task_id: str, workflow: Dict[str, Any], persist: bool = True,
+                             priority: bool = False) -> str:
+        """等待调度槽位后提交工作流并记录prompt_id，取消后不再提交
+        
+        槽位在 wait_for_completion 结束（或任务结束）时归还。
+        persist 为False时（子prompt）不把prompt_id写入数据库。
+        priority 为True时调度器优先放行，并插入ComfyUI队列最前面。
+        """
+        self._raise_if_cancelled(task_id)
+        run = self._start_run(task_id)
+        self._release_slot(task_id)
+        
+        run["slot"] = await self.scheduler.acquire(task_id, workflow_model_key(workflow), priority)
+        self._raise_if_cancelled(task_id)
+        try:
+            prompt_id = await self.comfyui.submit_workflow(workflow, front=priority)
+        except Exception:
+            self._release_slot(task_id)
+            raise
+        
+        run["prompt_id"] = prompt_id
+        if persist:
+            self.db.update_task_status(task_id, "processing", prompt_id=prompt_id)
+        
+        # 提交过程中被取消：立即撤回刚提交的prompt
+        if run["cancelled"]:
+            await self._cancel_prompt(prompt_id)
+            raise TaskCancelledError(f"任务已取消: {task_id}")
+        return prompt_id
+    
+    async def _cancel_prompt(self, prompt_id: str) -> str:
+        """在ComfyUI上取消prompt，失败时只记录日志"""
+        try:
+            action = await self.comfyui.cancel_prompt(prompt_id)
+            print(f"🛑 ComfyUI prompt {prompt_id}: {action}")
+            return action
+        except Exception as e:
+            print(f"⚠️ 取消ComfyUI prompt失败 {prompt_id}: {e}")
+            return "error"
+    
+    async def cancel_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """取消任务：删除排队中的prompt或中断执行中的prompt，停止剩余的生成
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            取消结果，任务不存在时返回None
+        """
+        task = self.db.get_task(task_id)
+        if not task:
+            return None
+        
+        if task["status"] in FINAL_TASK_STATUSES:
+            return {"task_id": task_id, "status": task["status"], "cancelled": False, "comfyui": None}
+        
+        run = self._runs.get(task_id)
+        if run is not None:
+            run["cancelled"] = True
+            run["event"].set()
+            self.scheduler.withdraw(task_id)
+            prompt_id = run["prompt_id"]
+        else:
+            # 服务重启后没有执行记录，使用数据库中的prompt_id
+            prompt_id = task.get("prompt_id")
+        
+        comfyui_action = await self._cancel_prompt(prompt_id) if prompt_id else None
+        
+        # 多prompt任务：取消所有子prompt
+        for sub_id, sub_run in list(self._runs.items()):
+            if sub_run["parent"] != task_id:
+                continue
+            sub_run["cancelled"] = True
+            sub_run["event"].set()
+            self.scheduler.withdraw(sub_id)
+            if sub_run["prompt_id"]:
+                comfyui_action = await self._cancel_prompt(sub_run["prompt_id"])
+        
+        self.db.update_task_status(task_id, "cancelled", error="任务已取消")
+        cache_manager = get_cache_manager()
+        cache_manager.invalidate_history_cache()
+        cache_manager.invalidate_task_cache(task_id)
+        print(f"🛑 任务已取消: {task_id} (prompt: {prompt_id}, {comfyui_action})")
+        
+        return {"task_id": task_id, "status": "cancelled", "cancelled": True, "comfyui": comfyui_action}
+    
+    async def cancel_tasks(self, task_ids: List[str]) -> List[Dict[str, Any]]:
+        """批量取消任务"""
+        results = await asyncio.gather(*(self.cancel_task(task_id) for task_id in task_ids))
+        return [
+            result if result else {"task_id": task_id, "status": "not_found", "cancelled": False, "comfyui": None}
+            for task_id, result in zip(task_ids, results)
+        ]
+    
+    async def cancel_session_tasks(self, session_id: str, ephemeral_only: bool = True) -> List[Dict[str, Any]]:
+        """取消画布会话中正在执行的任务
+        
+        Args:
+            session_id: 画布会话ID（生成请求中的session_id）
+            ephemeral_only: 只取消标记为临时（ephemeral）的任务
+        """
+        task_ids = [
+            task_id for task_id, run in list(self._runs.items())
+            if run["session_id"] == session_id and (run["ephemeral"] or not ephemeral_only)
+        ]
+        if not task_ids:
+            return []
+        print(f"🛑 画布会话 {session_id} 已断开，取消 {len(task_ids)} 个任务")
+        return await self.cancel_tasks(task_ids)
+    
+    async def cancel_superseded_edits(self, session_id: str, keep_task_id: str) -> List[Dict[str, Any]]:
+        """画布会话再次编辑时，取消该会话中仍在执行的渐进式局部重绘任务
+        
+        Args:
+            session_id: 画布会话ID
+            keep_task_id: 新提交的任务ID（不取消）
+        """
+        task_ids = [
+            task_id for task_id, run in list(self._runs.items())
+            if run["session_id"] == session_id and run["progressive"] and run["parent"] is None
+            and task_id != keep_task_id
+        ]
+        if not task_ids:
+            return []
+        print(f"🛑 画布会话 {session_id} 重新编辑，取消 {len(task_ids)} 个未完成的重绘任务")
+        return await self.cancel_tasks(task_ids)
+    
+    def _open_stream(self, task_id: str):
+        """登记任务的一个事件流订阅者"""
+        self._stream_subscribers[task_id] = self._stream_subscribers.get(task_id, 0) + 1
+    
+    def _close_stream(self, task_id: str, finished: bool):
+        """事件流关闭；客户端在任务结束前断开且没有其他订阅者时，取消临时（ephemeral）任务
+        
+        事件流因客户端断开被取消时，finally 中的 await 会再次被取消，所以取消放到单独的任务中执行。
+        """
+        remaining = self._stream_subscribers.get(task_id, 1) - 1
+        if remaining > 0:
+            self._stream_subscribers[task_id] = remaining
+            return
+        self._stream_subscribers.pop(task_id, None)
+        run = self._runs.get(task_id)
+        if finished or run is None or not run["ephemeral"] or run["cancelled"]:
+            return
+        print(f"🛑 临时任务 {task_id} 的订阅者已断开，取消任务")
+        cancel = asyncio.get_running_loop().create_task(self.cancel_task(task_id))
+        self._abandon_cancels.add(cancel)
+        cancel.add_done_callback(self._abandon_cancels.discard)
+    
     def _is_chinese_text(self, text: str) -> bool:
         """检测文本是否包含中文字符
         
@@ -748,9 +1325,39 @@ class TaskManager:
         """
         return self.db.get_task(task_id)
     
+    async def create_qwen_edit_task(self, task_id: str, image_path: str, mask_path: str, prompt: str,
+                                    negative_prompt: str, parameters: Dict[str, Any]) -> str:
+        """创建在后台执行的Qwen-Edit局部重绘任务（渐进式模式）
+        
+        同一画布会话中仍在执行的渐进式重绘任务会被取消，预览和最终结果通过
+        stream_qwen_edit_events 推送。
+        
+        Returns:
+            任务ID
+        """
+        self.db.create_task(task_id, prompt, image_path, parameters)
+        self._start_run(task_id, parameters)
+        
+        session_id = parameters.get("session_id")
+        if session_id:
+            await self.cancel_superseded_edits(session_id, task_id)
+        
+        asyncio.create_task(self._run_qwen_edit_task(task_id, image_path, mask_path, prompt, negative_prompt, parameters))
+        return task_id
+    
+    async def _run_qwen_edit_task(self, *args):
+        try:
+            await self.execute_qwen_edit_task(*args)
+        except Exception:
+            # 失败状态和日志已在 execute_qwen_edit_task 中记录
+            pass
+    
     async def execute_qwen_edit_task(self, task_id: str, image_path: str, mask_path: str, prompt: str, negative_prompt: str, parameters: Dict[str, Any]):
         """执行Qwen-Edit局部重绘任务
         
+        parameters["progressive"] 为True时先以高优先级提交低步数、低分辨率的预览prompt，
+        再提交完整质量的prompt，两个结果到达后分别推送给客户端。
+        
         Args:
             task_id: 任务ID
             image_path: 原始图像路径
@@ -759,11 +1366,17 @@ class TaskManager:
             negative_prompt: 负面提示词
             parameters: 生成参数
         """
+        crop = None
+        preview = None
         try:
+            self._start_run(task_id, parameters)
+            self._raise_if_cancelled(task_id)
+            
             print(f"🎨 开始执行Qwen-Edit局部重绘任务: {task_id}")
             
-            # 首先创建任务记录
-            self.db.create_task(task_id, prompt, image_path, parameters)
+            # 首先创建任务记录（后台执行的任务已在 create_qwen_edit_task 中创建）
+            if not self.db.get_task(task_id):
+                self.db.create_task(task_id, prompt, image_path, parameters)
             
             # 更新任务状态为处理中
             self.db.update_task_status(task_id, "processing")
@@ -787,10 +1400,27 @@ class TaskManager:
             workflow_params["mask_path"] = mask_path
             workflow_params["task_id"] = task_id  # 添加任务ID到参数中
             
+            # 只发送遮罩所在区域，扩散分辨率按裁剪区域大小选择
+            workflow_image_path = image_path
+            if INPAINT_CROP_ENABLED and parameters.get("crop_to_mask", True):
+                crop = await asyncio.to_thread(
+                    prepare_inpaint_crop, image_path, mask_path, parameters.get("target_size") or 1024, task_id)
+                if crop:
+                    workflow_image_path = str(crop.image_path)
+                    workflow_params["mask_path"] = str(crop.mask_path)
+                    workflow_params["target_size"] = crop.diffusion_size
+            
+            if parameters.get("progressive"):
+                # 预览和完整结果使用同一个种子，预览才能代表最终构图
+                if workflow_params.get("seed", -1) == -1:
+                    workflow_params["seed"] = random.randint(1, 2**31 - 1)
+                preview = await self._submit_inpaint_preview(
+                    task_id, qwen_edit_workflow, workflow_image_path, prompt, workflow_params, crop, image_path)
+            
             # 创建工作流
             print(f"🔧 创建Qwen-Edit工作流...")
             workflow = qwen_edit_workflow.create_workflow(
-                reference_image_path=image_path,
+                reference_image_path=workflow_image_path,
                 description=prompt,
                 parameters=workflow_params
             )
@@ -798,7 +1428,7 @@ class TaskManager:
             
             # 提交到ComfyUI
             print(f"📤 提交Qwen-Edit工作流到ComfyUI...")
-            prompt_id = await self.comfyui.submit_workflow(workflow)
+            prompt_id = await self._submit_prompt(task_id, workflow)
             print(f"✅ 已提交Qwen-Edit工作流，prompt_id: {prompt_id}")
             
             # 更新进度
@@ -808,6 +1438,11 @@ class TaskManager:
             print(f"⏳ 等待Qwen-Edit任务完成...")
             result = await self.wait_for_completion(task_id, prompt_id)
             
+            if result and crop:
+                # 重绘结果贴回原图，输出与原图同尺寸
+                for result_path in result:
+                    await asyncio.to_thread(composite_inpaint_result, crop, image_path, result_path)
+            
             if result:
                 print(f"✅ Qwen-Edit局部重绘完成: {task_id}")
                 # 更新任务状态为完成，并保存结果路径
@@ -817,13 +1452,182 @@ class TaskManager:
                 self.db.update_task_progress(task_id, 100)
             else:
                 print(f"❌ Qwen-Edit局部重绘失败: {task_id}")
-                self.db.update_task_status(task_id, "failed")
+                self._mark_failed(task_id)
                 raise Exception("Qwen-Edit任务执行失败，没有返回结果")
                 
         except Exception as e:
             print(f"❌ Qwen-Edit任务执行异常: {e}")
-            self.db.update_task_status(task_id, "failed")
+            self._mark_failed(task_id)
             raise Exception(f"Qwen-Edit任务执行失败: {str(e)}")
+        finally:
+            if preview and not preview.done():
+                preview.cancel()
+                await asyncio.gather(preview, return_exceptions=True)
+            if crop:
+                crop.cleanup()
+            self._finish_run(task_id)
+    
+    async def _submit_inpaint_preview(self, task_id: str, qwen_edit_workflow, image_path: str, prompt: str,
+                                      workflow_params: Dict[str, Any], crop, original_path: str) -> Optional[asyncio.Future]:
+        """以高优先级提交低步数、低分辨率的预览prompt，返回等待预览结果的后台任务
+        
+        预览失败不影响完整质量的生成，只记录日志。
+        """
+        preview_id = f"{task_id}#preview"
+        self._start_run(preview_id)["parent"] = task_id
+        preview_params = workflow_params.copy()
+        preview_params["steps"] = min(int(workflow_params.get("steps") or INPAINT_PREVIEW_STEPS), INPAINT_PREVIEW_STEPS)
+        preview_params["target_size"] = min(int(workflow_params.get("target_size") or 1024), INPAINT_PREVIEW_SIZE)
+        try:
+            workflow = qwen_edit_workflow.create_workflow(
+                reference_image_path=image_path,
+                description=prompt,
+                parameters=preview_params
+            )
+            prompt_id = await self._submit_prompt(preview_id, workflow, persist=False, priority=True)
+        except TaskCancelledError:
+            self._finish_run(preview_id)
+            raise
+        except Exception as e:
+            print(f"⚠️ 预览prompt提交失败，只生成完整结果: {e}")
+            self._finish_run(preview_id)
+            return None
+        
+        print(f"👀 已提交预览prompt: {prompt_id} (步数 {preview_params['steps']}, 边长 {preview_params['target_size']})")
+        return asyncio.ensure_future(self._finish_inpaint_preview(task_id, preview_id, prompt_id, crop, original_path))
+    
+    async def _finish_inpaint_preview(self, task_id: str, preview_id: str, prompt_id: str, crop, original_path: str):
+        """等待预览结果，贴回原图后登记为任务的预览"""
+        try:
+            result = await self.wait_for_completion(preview_id, prompt_id)
+            if not result or self._is_cancelled(task_id):
+                print(f"⚠️ 预览没有返回结果: {task_id}")
+                return
+            if crop:
+                await asyncio.to_thread(composite_inpaint_result, crop, original_path, result[0])
+            
+            self._inpaint_previews[task_id] = result[0]
+            while len(self._inpaint_previews) > MAX_INPAINT_PREVIEWS:
+                self._inpaint_previews.pop(next(iter(self._inpaint_previews)))
+            self.db.update_task_progress(task_id, 60)
+            print(f"👀 预览完成: {task_id} -> {result[0]}")
+        except asyncio.CancelledError:
+            # 完整结果已先返回（或任务失败），不再需要预览
+            await self._cancel_prompt(prompt_id)
+            raise
+        except Exception as e:
+            print(f"⚠️ 预览生成失败: {e}")
+        finally:
+            self._finish_run(preview_id)
+    
+    def get_inpaint_preview(self, task_id: str) -> Optional[str]:
+        """渐进式局部重绘的预览结果路径，预览尚未完成时返回None"""
+        return self._inpaint_previews.get(task_id)
+    
+    async def stream_qwen_edit_events(self, task_id: str):
+        """渐进式局部重绘事件流（text/event-stream）
+        
+        预览完成时发送preview事件，完整结果完成时发送result事件，
+        任务失败或被取消时发送done事件，随后关闭。
+        任务结束前客户端断开时，临时（ephemeral）任务被取消。
+        """
+        preview_sent = False
+        finished = False
+        self._open_stream(task_id)
+        try:
+            while True:
+                task = self.db.get_task(task_id)
+                if task is None:
+                    finished = True
+                    return
+                
+                if not preview_sent and self.get_inpaint_preview(task_id):
+                    preview_sent = True
+                    yield self._format_event("preview", {
+                        "task_id": task_id,
+                        "url": f"/api/qwen-edit/{task_id}/preview"
+                    })
+                
+                if task["status"] == "completed":
+                    finished = True
+                    result_paths = json.loads(task["result_path"] or "[]")
+                    yield self._format_event("result", {
+                        "task_id": task_id,
+                        "status": "completed",
+                        "image_urls": [f"/api/image/{task_id}/{index}" for index in range(len(result_paths))]
+                    })
+                    return
+                if task["status"] in FINAL_TASK_STATUSES:
+                    finished = True
+                    yield self._format_event("done", {"task_id": task_id, "status": task["status"], "error": task.get("error")})
+                    return
+                await asyncio.sleep(INPAINT_EVENT_POLL_INTERVAL)
+        finally:
+            self._close_stream(task_id, finished)
+    
+    def _active_prompt_ids(self, task_id: str) -> set:
+        """任务（及其子prompt）当前提交到ComfyUI的prompt_id"""
+        prompt_ids = set()
+        for run_id, run in list(self._runs.items()):
+            if (run_id == task_id or run["parent"] == task_id) and run["prompt_id"]:
+                prompt_ids.add(run["prompt_id"])
+        if not prompt_ids and task_id not in self._runs:
+            # 本进程没有执行记录（如服务重启后恢复跟踪的任务），使用数据库中的prompt_id
+            task = self.db.get_task(task_id)
+            if task and task.get("prompt_id"):
+                prompt_ids.add(task["prompt_id"])
+        return prompt_ids
+    
+    async def stream_live_previews(self, task_id: str):
+        """采样过程实时预览事件流（text/event-stream）
+        
+        推送任务当前prompt的预览帧（frame事件，图片为data URL），任务结束时发送done事件并关闭。
+        任务结束前客户端断开时，临时（ephemeral）任务被取消。
+        """
+        import base64
+        
+        listener = get_live_preview_listener()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        subscribed: set = set()
+        finished = False
+        self._open_stream(task_id)
+        try:
+            while True:
+                task = self.db.get_task(task_id)
+                if task is None:
+                    finished = True
+                    return
+                if task["status"] in FINAL_TASK_STATUSES:
+                    finished = True
+                    yield self._format_event("done", {"task_id": task_id, "status": task["status"]})
+                    return
+                
+                prompt_ids = self._active_prompt_ids(task_id)
+                for prompt_id in prompt_ids - subscribed:
+                    listener.subscribe(queue, prompt_id)
+                for prompt_id in subscribed - prompt_ids:
+                    listener.unsubscribe(queue, prompt_id)
+                subscribed = prompt_ids
+                
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=LIVE_PREVIEW_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    continue
+                yield self._format_event("frame", {
+                    "task_id": task_id,
+                    "prompt_id": frame["prompt_id"],
+                    "step": frame["step"],
+                    "steps": frame["steps"],
+                    "image": f"data:{frame['mime']};base64,{base64.b64encode(frame['data']).decode('ascii')}"
+                })
+        finally:
+            for prompt_id in subscribed:
+                listener.unsubscribe(queue, prompt_id)
+            self._close_stream(task_id, finished)
+    
+    @staticmethod
+    def _format_event(event: str, data: Dict[str, Any]) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
     
     def _find_actual_output_file(self, temp_filename: str, output_dir: Path, task_id: str = None) -> Optional[str]:
         """查找实际生成的文件（处理ComfyUI临时文件名问题）
@@ -12,6 +12,7 @@ import logging
 from typing import Optional, Dict, Any
 from datetime import datetime
 from config.settings import OLLAMA_URL
+from core.circuit_breaker import CircuitOpenError, get_circuit_breaker
 
 # 配置日志
 logging.basicConfig(
@@ -36,6 +37,9 @@ class TranslationClient:
         self.ollama_url = ollama_url or OLLAMA_URL or "http://localhost:11434"
         self.model_name = "qwen2.5:3b-instruct"  # 使用已安装的qwen2.5:3b-instruct模型
         self.timeout = 120  # 120秒超时，给长文本翻译更多时间
+        # Ollama不可用时翻译请求立即失败，不再逐个等待连接超时
+        self._breaker = get_circuit_breaker("ollama")
+        self._breaker.set_probe(self._probe_ollama)
         
         logger.info(f"🔧 翻译客户端初始化完成")
         logger.info(f"   Ollama URL: {self.ollama_url}")
@@ -218,30 +222,36 @@ class TranslationClient:
             logger.debug(f"   请求参数: {json.dumps(request_data, ensure_ascii=False, indent=2)}")
             
             # 发送请求
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                async with session.post(
-                    f"{self.ollama_url}/api/generate",
-                    json=request_data,
-                    headers={"Content-Type": "application/json"}
-                ) as response:
-                    
-                    logger.debug(f"   响应状态: {response.status}")
-                    
-                    if response.status == 200:
-                        result = await response.json()
-                        response_text = result.get("response", "")
+            with self._breaker.guard() as attempt:
+                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+                    async with session.post(
+                        f"{self.ollama_url}/api/generate",
+                        json=request_data,
+                        headers={"Content-Type": "application/json"}
+                    ) as response:
                         
-                        logger.debug(f"   原始响应: {response_text}")
-                        logger.info(f"✅ Ollama API调用成功")
+                        logger.debug(f"   响应状态: {response.status}")
                         
-                        return response_text
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"❌ Ollama API请求失败")
-                        logger.error(f"   状态码: {response.status}")
-                        logger.error(f"   错误信息: {error_text}")
-                        return None
+                        if response.status == 200:
+                            result = await response.json()
+                            response_text = result.get("response", "")
+                            
+                            logger.debug(f"   原始响应: {response_text}")
+                            logger.info(f"✅ Ollama API调用成功")
+                            
+                            return response_text
+                        else:
+                            if response.status >= 500:
+                                attempt.fail()
+                            error_text = await response.text()
+                            logger.error(f"❌ Ollama API请求失败")
+                            logger.error(f"   状态码: {response.status}")
+                            logger.error(f"   错误信息: {error_text}")
+                            return None
                         
+        except CircuitOpenError as e:
+            logger.warning(f"⚠️ 跳过Ollama调用: {e}")
+            return None
         except asyncio.TimeoutError:
             logger.error(f"❌ Ollama API请求超时")
             logger.error(f"   超时时间: {self.timeout}秒")
@@ -309,12 +319,18 @@ class TranslationClient:
         logger.info(f"🏥 开始检查Ollama服务健康状态")
         
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
-                async with session.get(f"{self.ollama_url}/api/tags") as response:
-                    is_healthy = response.status == 200
-                    logger.info(f"   Ollama服务状态: {'✅ 正常' if is_healthy else '❌ 异常'}")
-                    logger.info(f"   响应状态码: {response.status}")
-                    return is_healthy
+            with self._breaker.guard() as attempt:
+                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
+                    async with session.get(f"{self.ollama_url}/api/tags") as response:
+                        is_healthy = response.status == 200
+                        if response.status >= 500:
+                            attempt.fail()
+                        logger.info(f"   Ollama服务状态: {'✅ 正常' if is_healthy else '❌ 异常'}")
+                        logger.info(f"   响应状态码: {response.status}")
+                        return is_healthy
+        except CircuitOpenError as e:
+            logger.warning(f"⚠️ {e}")
+            return False
         except Exception as e:
             logger.error(f"❌ Ollama健康检查失败: {str(e)}")
             return False
@@ -329,32 +345,44 @@ class TranslationClient:
         logger.info(f"   目标模型: {self.model_name}")
         
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
-                async with session.get(f"{self.ollama_url}/api/tags") as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        models = result.get("models", [])
+            with self._breaker.guard() as attempt:
+                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
+                    async with session.get(f"{self.ollama_url}/api/tags") as response:
+                        if response.status == 200:
+                            result = await response.json()
+                            models = result.get("models", [])
                         
-                        logger.info(f"   可用模型列表:")
-                        for model in models:
-                            model_name = model.get("name", "")
-                            logger.info(f"     - {model_name}")
+                            logger.info(f"   可用模型列表:")
+                            for model in models:
+                                model_name = model.get("name", "")
+                                logger.info(f"     - {model_name}")
                         
-                        # 检查是否有qwen2.5:7b模型
-                        for model in models:
-                            if self.model_name in model.get("name", ""):
-                                logger.info(f"✅ 目标模型可用: {self.model_name}")
-                                return True
+                            # 检查是否有qwen2.5:7b模型
+                            for model in models:
+                                if self.model_name in model.get("name", ""):
+                                    logger.info(f"✅ 目标模型可用: {self.model_name}")
+                                    return True
                         
-                        logger.warning(f"⚠️ 目标模型不可用: {self.model_name}")
-                        return False
-                    else:
-                        logger.error(f"❌ 获取模型列表失败: {response.status}")
-                        return False
+                            logger.warning(f"⚠️ 目标模型不可用: {self.model_name}")
+                            return False
+                        else:
+                            if response.status >= 500:
+                                attempt.fail()
+                            logger.error(f"❌ 获取模型列表失败: {response.status}")
+                            return False
+        except CircuitOpenError as e:
+            logger.warning(f"⚠️ {e}")
+            return False
         except Exception as e:
             logger.error(f"❌ 检查模型可用性失败: {str(e)}")
             return False
 
+    async def _probe_ollama(self) -> bool:
+        """熔断器后台探测：不经过熔断器直接请求模型列表"""
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
+            async with session.get(f"{self.ollama_url}/api/tags") as response:
+                return response.status == 200
+
 
 # 全局翻译客户端实例
 translation_client: TranslationClient = None
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量放大管理器
+上传的图片逐块写入磁盘并登记为独立的upscale任务，按并发窗口依次提交到ComfyUI，
+批次进度通过轮询或事件流读取，已完成的结果可以流式打包为ZIP下载。
+"""
+
+import asyncio
+import io
+import json
+import re
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import aiofiles
+from fastapi import UploadFile
+
+from config.settings import UPLOAD_DIR, UPSCALE_BATCH_CONCURRENCY
+from core.upscale_manager import UpscaleManager, FINAL_UPSCALE_STATUSES
+
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+ZIP_CHUNK_SIZE = 1024 * 1024
+EVENT_POLL_INTERVAL = 1.0
+
+
+def _safe_filename(filename: str) -> str:
+    """去掉路径和特殊字符，保留扩展名"""
+    name = Path(filename or "image.png").name
+    return re.sub(r"[^\w.\-]", "_", name) or "image.png"
+
+
+class _ZipBuffer(io.RawIOBase):
+    """只写缓冲区：zipfile写入的数据暂存在这里，由生成器按块取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class UpscaleBatchManager:
+    """批量放大管理器"""
+
+    def __init__(self, upscale_manager: UpscaleManager, db_manager, concurrency: int = UPSCALE_BATCH_CONCURRENCY):
+        """初始化批量放大管理器
+
+        Args:
+            upscale_manager: 放大管理器（负责单张图片的准备、提交和结果写入）
+            db_manager: 数据库管理器实例
+            concurrency: 每个批次同时处理的图片数量
+        """
+        self.upscale_manager = upscale_manager
+        self.db_manager = db_manager
+        self.concurrency = max(1, concurrency)
+        self._runners: Dict[str, asyncio.Task] = {}
+
+    async def create_batch(self, files: List[UploadFile], scale_factor: int, algorithm: str,
+                           sharpen: bool = False, tiled: bool = False) -> Dict[str, Any]:
+        """保存上传的图片并创建批次，图片在后台按并发窗口放大
+
+        Args:
+            files: 上传的图片文件
+            scale_factor: 放大倍数
+            algorithm: 放大算法
+            sharpen: 插值放大后做一次USM锐化（仅本地算法）
+            tiled: 分块放大（仅ComfyUI算法）
+
+        Returns:
+            批次状态（含各条目的任务ID）以及被跳过的文件
+        """
+        batch_id = str(uuid.uuid4())
+        upload_dir = Path(UPLOAD_DIR)
+        upload_dir.mkdir(exist_ok=True)
+
+        item_ids = []
+        skipped = []
+        for index, upload in enumerate(files):
+            if not (upload.filename or "").lower().endswith(SUPPORTED_EXTENSIONS):
+                skipped.append({"index": index, "filename": upload.filename, "error": "不支持的图片格式"})
+                continue
+            # 文件名带批次和序号前缀，同名文件之间以及与其他批次之间都不会互相覆盖
+            image_path = upload_dir / f"batch_{batch_id[:8]}_{index:04d}_{_safe_filename(upload.filename)}"
+            try:
+                await self._save_upload(upload, image_path)
+                item_ids.append(self.upscale_manager.register_upscale(
+                    str(image_path), scale_factor, algorithm,
+                    {"batch_id": batch_id, "batch_index": index, "filename": upload.filename,
+                     "sharpen": sharpen, "tiled": tiled}
+                ))
+            except Exception as e:
+                print(f"❌ 批量放大条目保存失败: {upload.filename}, {e}")
+                skipped.append({"index": index, "filename": upload.filename, "error": str(e)})
+
+        self.db_manager.create_upscale_batch(batch_id, item_ids, scale_factor, algorithm)
+        if item_ids:
+            self._start_runner(batch_id, item_ids)
+        print(f"📦 批量放大已创建: {batch_id}, {len(item_ids)} 张图片, 并发 {self.concurrency}")
+
+        status = self.get_batch_status(batch_id)
+        status["skipped"] = skipped
+        return status
+
+    @staticmethod
+    async def _save_upload(upload: UploadFile, path: Path):
+        """分块写入上传文件，不把整张图片读入内存"""
+        try:
+            async with aiofiles.open(path, 'wb') as f:
+                while True:
+                    chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await f.write(chunk)
+        finally:
+            await upload.close()
+
+    def _start_runner(self, batch_id: str, item_ids: List[str]):
+        runner = asyncio.create_task(self._run_batch(batch_id, item_ids))
+        self._runners[batch_id] = runner
+        runner.add_done_callback(lambda _: self._runners.pop(batch_id, None))
+
+    async def _run_batch(self, batch_id: str, item_ids: List[str]):
+        """按并发窗口处理批次条目：一个条目结束后才提交下一个"""
+        window = asyncio.Semaphore(self.concurrency)
+
+        async def run_item(task_id: str):
+            async with window:
+                task = self.db_manager.get_task(task_id)
+                # 已取消或已由其他流程提交的条目不再处理
+                if not task or task["status"] != "pending" or task.get("prompt_id"):
+                    return
+                try:
+                    await self.upscale_manager.start_upscale(task_id)
+                except Exception as e:
+                    print(f"❌ 批量放大条目失败: {task_id}, {e}")
+
+        await asyncio.gather(*(run_item(task_id) for task_id in item_ids))
+        print(f"✅ 批量放大处理结束: {batch_id}")
+
+    def resume_unfinished(self) -> int:
+        """服务重启后继续处理批次中尚未提交的条目（已提交的由放大管理器继续跟踪）
+
+        Returns:
+            恢复处理的批次数量
+        """
+        batch_ids = []
+        for task in self.db_manager.get_unfinished_tasks("upscale"):
+            try:
+                parameters = json.loads(task.get("parameters") or "{}")
+            except (json.JSONDecodeError, TypeError):
+                continue
+            batch_id = parameters.get("batch_id")
+            if batch_id and not task.get("prompt_id") and batch_id not in batch_ids:
+                batch_ids.append(batch_id)
+
+        for batch_id in batch_ids:
+            batch = self.db_manager.get_upscale_batch(batch_id)
+            if batch and batch_id not in self._runners:
+                self._start_runner(batch_id, batch["item_ids"])
+
+        if batch_ids:
+            print(f"🔄 恢复处理 {len(batch_ids)} 个批量放大批次")
+        return len(batch_ids)
+
+    async def cancel_batch(self, batch_id: str, task_manager) -> Optional[Dict[str, Any]]:
+        """取消批次：停止提交剩余条目，取消未结束的条目
+
+        Returns:
+            取消结果，批次不存在时返回None
+        """
+        batch = self.db_manager.get_upscale_batch(batch_id)
+        if not batch:
+            return None
+        runner = self._runners.get(batch_id)
+        if runner is not None:
+            runner.cancel()
+
+        unfinished = [
+            task["id"] for task in self.db_manager.get_tasks_by_ids(batch["item_ids"])
+            if task["status"] not in FINAL_UPSCALE_STATUSES
+        ]
+        results = await task_manager.cancel_tasks(unfinished) if unfinished else []
+        cancelled = sum(1 for result in results if result["cancelled"])
+        print(f"🛑 批量放大已取消: {batch_id}, 取消 {cancelled} 个条目")
+        return {"batch_id": batch_id, "cancelled": cancelled}
+
+    def get_batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """读取批次状态和各条目的状态
+
+        Returns:
+            批次状态，批次不存在时返回None
+        """
+        batch = self.db_manager.get_upscale_batch(batch_id)
+        if not batch:
+            return None
+
+        items = [self._item_status(task) for task in self.db_manager.get_tasks_by_ids(batch["item_ids"])]
+        counts = {status: 0 for status in ("queued", "processing", "completed", "failed", "cancelled")}
+        for item in items:
+            counts[item["status"]] += 1
+
+        return {
+            "batch_id": batch_id,
+            "scale_factor": batch["scale_factor"],
+            "algorithm": batch["algorithm"],
+            "created_at": batch["created_at"],
+            "total": len(items),
+            "counts": counts,
+            "finished": all(item["status"] in FINAL_UPSCALE_STATUSES for item in items),
+            "items": items,
+        }
+
+    def _item_status(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """批次条目状态：尚未提交的条目为queued，其余沿用单张放大的状态"""
+        parameters = json.loads(task.get("parameters") or "{}")
+        if task["status"] == "pending" and not task.get("prompt_id"):
+            result = {"task_id": task["id"], "status": "queued", "progress": 0, "result": None, "error": None}
+        else:
+            result = self.upscale_manager.build_result(task)
+        result["index"] = parameters.get("batch_index")
+        result["filename"] = parameters.get("filename")
+        result["result_path"] = task.get("result_path") if result["status"] == "completed" else None
+        return result
+
+    async def stream_events(self, batch_id: str) -> AsyncIterator[str]:
+        """批次进度事件流（text/event-stream）
+
+        只推送状态发生变化的条目和计数，全部条目结束后发送done事件并关闭。
+        """
+        last_seen: Dict[str, str] = {}
+        last_counts: Optional[Dict[str, int]] = None
+        while True:
+            status = self.get_batch_status(batch_id)
+            if status is None:
+                return
+
+            for item in status["items"]:
+                if last_seen.get(item["task_id"]) != item["status"]:
+                    last_seen[item["task_id"]] = item["status"]
+                    yield self._format_event("item", {key: value for key, value in item.items() if key != "result_path"})
+
+            summary = {"batch_id": batch_id, "total": status["total"], "counts": status["counts"]}
+            if status["finished"]:
+                yield self._format_event("done", summary)
+                return
+            if status["counts"] != last_counts:
+                last_counts = status["counts"]
+                yield self._format_event("progress", summary)
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+    @staticmethod
+    def _format_event(event: str, data: Dict[str, Any]) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def iter_zip(self, batch_id: str) -> Iterator[bytes]:
+        """把批次中已完成条目的放大结果流式打包为ZIP（图片已压缩，使用STORED不再压缩）
+
+        边读文件边输出，不在内存或磁盘上生成完整的压缩包。
+        """
+        status = self.get_batch_status(batch_id)
+        if status is None:
+            return
+
+        buffer = _ZipBuffer()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+            for item in status["items"]:
+                result_path = item["result_path"] and Path(item["result_path"])
+                if not result_path or not result_path.exists():
+                    continue
+                stem = Path(item["filename"] or "image").stem
+                arcname = f"{item['index']:04d}_{stem}_x{status['scale_factor']}{result_path.suffix}"
+                with open(result_path, "rb") as source, \
+                        archive.open(zipfile.ZipInfo.from_file(result_path, arcname), "w") as target:
+                    while True:
+                        chunk = source.read(ZIP_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        yield buffer.take()
+                yield buffer.take()
+        yield buffer.take()
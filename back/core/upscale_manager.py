@@ -5,40 +5,58 @@
 基于ComfyUI工作流实现图像放大功能
 """
 
+import asyncio
 import json
 import uuid
 import shutil
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Set
+from core.cache_manager import get_cache_manager
 from core.comfyui_client import ComfyUIClient
+from core.local_upscale import is_local_algorithm, upscale_file, get_local_upscale_pool
+from core.upscale_tiles import plan_tiles, stitch_tiles
+from core.workflow_plan import clone_workflow
 from core.workflow_template import WorkflowTemplate
-from config.settings import COMFYUI_INPUT_DIR
+from config.settings import (
+    COMFYUI_INPUT_DIR, COMFYUI_MAIN_OUTPUT_DIR, UPSCALE_TASK_CACHE_SIZE,
+    UPSCALE_TILE_SIZE, UPSCALE_TILE_OVERLAP, UPSCALE_TILE_RETRIES
+)
+
+# 已结束的放大任务状态
+FINAL_UPSCALE_STATUSES = ("completed", "failed", "cancelled")
 
 
 class UpscaleManager:
     """图像高清放大管理器"""
     
-    def __init__(self, comfyui_client: ComfyUIClient, output_dir: Path, db_manager=None):
+    def __init__(self, comfyui_client: ComfyUIClient, output_dir: Path, db_manager=None, task_manager=None):
         """初始化放大管理器
         
         Args:
             comfyui_client: ComfyUI客户端实例
             output_dir: 输出目录
             db_manager: 数据库管理器实例
+            task_manager: 任务管理器实例（负责提交、调度和完成跟踪）
         """
         self.comfyui_client = comfyui_client
         self.output_dir = output_dir
         self.db_manager = db_manager
+        self.task_manager = task_manager
         # 使用UltimateSDUpscale工作流
         self.workflow_template = WorkflowTemplate("flux_upscale_workflow.json")
-        # 存储任务信息的内存字典 {task_id: {"prompt_id": str, "status": str}}
-        self.tasks = {}
+        # 已结束任务的状态缓存（LRU，以数据库为准）{task_id: 状态字典}
+        self.tasks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # 后台执行的放大任务（事件循环只持有任务的弱引用，调用方不等待结果时由这里持有）
+        self._running: Set[asyncio.Task] = set()
     
     async def upscale_image(
         self, 
         image_path: str, 
         scale_factor: int = 2,
-        algorithm: str = "realesrgan"
+        algorithm: str = "realesrgan",
+        sharpen: bool = False,
+        tiled: bool = False
     ) -> Dict[str, Any]:
         """放大单张图像
         
@@ -46,98 +64,20 @@ class UpscaleManager:
             image_path: 输入图像路径
             scale_factor: 放大倍数 (2, 3, 4)
             algorithm: 放大算法 (realesrgan, swinir, lanczos)
+            sharpen: 插值放大后做一次USM锐化（仅本地算法）
+            tiled: 分块放大，每个分块作为独立prompt提交（仅ComfyUI算法）
             
         Returns:
             包含任务ID和状态的字典
         """
         try:
-            # 验证输入图像
-            input_path = Path(image_path)
-            if not input_path.exists():
-                raise FileNotFoundError(f"输入图像不存在: {image_path}")
-            
-            # 生成任务ID
-            task_id = str(uuid.uuid4())
-            
-            # 准备输出目录
-            task_output_dir = self.output_dir / task_id
-            task_output_dir.mkdir(parents=True, exist_ok=True)
-            
-            # 检查环境，在Docker环境中直接使用本地文件
-            from config.settings import ENVIRONMENT
-            
-            if ENVIRONMENT == "production":
-                # Docker环境：直接使用本地文件路径
-                task_image_path = input_path
-                print(f"🐳 Docker环境：直接使用本地文件路径: {task_image_path}")
-            else:
-                # 本地环境：复制到ComfyUI输入目录
-                comfyui_input_path = COMFYUI_INPUT_DIR / input_path.name
-                print(f"📁 复制图片到ComfyUI输入目录: {input_path} -> {comfyui_input_path}")
-                shutil.copy2(input_path, comfyui_input_path)
-                
-                # 验证复制是否成功
-                if not comfyui_input_path.exists():
-                    raise FileNotFoundError(f"复制到ComfyUI输入目录失败: {comfyui_input_path}")
-                print(f"✅ 图片复制成功，大小: {comfyui_input_path.stat().st_size} 字节")
-                
-                # 也复制到任务目录作为备份
-                task_image_path = task_output_dir / input_path.name
-                print(f"📁 复制图片到任务目录: {input_path} -> {task_image_path}")
-                shutil.copy2(input_path, task_image_path)
-                
-                # 验证任务目录复制是否成功
-                if not task_image_path.exists():
-                    raise FileNotFoundError(f"复制到任务目录失败: {task_image_path}")
-                print(f"✅ 任务目录复制成功，大小: {task_image_path.stat().st_size} 字节")
-            
-            # 自定义工作流
-            workflow = self._customize_upscale_workflow(
-                str(task_image_path), 
-                scale_factor, 
-                algorithm
-            )
-            
-            # 提交到ComfyUI
-            prompt_id = await self.comfyui_client.submit_workflow(workflow)
-            
-            # 存储任务信息到内存
-            self.tasks[task_id] = {
-                "prompt_id": prompt_id,
-                "status": "processing",
-                "input_path": str(task_image_path),
-                "scale_factor": scale_factor,
-                "algorithm": algorithm
-            }
-            
-            # 保存到数据库
-            if self.db_manager:
-                description = f"图像放大 - {scale_factor}倍 ({algorithm})"
-                parameters = {
-                    "scale_factor": scale_factor,
-                    "algorithm": algorithm,
-                    "input_image": str(task_image_path)
-                }
-                
-                try:
-                    self.db_manager.create_task(
-                        task_id=task_id,
-                        description=description,
-                        reference_image_path=None,
-                        parameters=parameters,
-                        task_type="upscale"
-                    )
-                except Exception as e:
-                    print(f"❌ upscale任务保存失败: {task_id}, 错误: {e}")
-                    raise Exception(f"数据库保存失败: {str(e)}")
-            else:
-                raise Exception("数据库管理器未初始化")
+            task_id = self.register_upscale(image_path, scale_factor, algorithm, {"sharpen": sharpen, "tiled": tiled})
+            self.start_upscale(task_id)
             
             return {
                 "task_id": task_id,
-                "prompt_id": prompt_id,
                 "status": "processing",
-                "input_path": str(task_image_path),
+                "input_path": image_path,
                 "scale_factor": scale_factor,
                 "algorithm": algorithm
             }
@@ -148,6 +88,181 @@ class UpscaleManager:
             print(f"❌ 详细错误信息: {traceback.format_exc()}")
             raise Exception(f"放大任务创建失败: {str(e)}")
     
+    def register_upscale(self, image_path: str, scale_factor: int, algorithm: str,
+                         extra_parameters: Optional[Dict[str, Any]] = None) -> str:
+        """登记放大任务（状态为pending，尚未提交到ComfyUI）
+        
+        Args:
+            image_path: 输入图像路径
+            scale_factor: 放大倍数
+            algorithm: 放大算法
+            extra_parameters: 额外写入任务参数的字段（如batch_id）
+            
+        Returns:
+            任务ID
+        """
+        if not Path(image_path).exists():
+            raise FileNotFoundError(f"输入图像不存在: {image_path}")
+        if not self.db_manager or not self.task_manager:
+            raise Exception("数据库管理器未初始化")
+        
+        task_id = str(uuid.uuid4())
+        parameters = {
+            "scale_factor": scale_factor,
+            "algorithm": algorithm,
+            "input_image": str(image_path),
+            **(extra_parameters or {})
+        }
+        try:
+            self.db_manager.create_task(
+                task_id=task_id,
+                description=f"图像放大 - {scale_factor}倍 ({algorithm})",
+                reference_image_path=None,
+                parameters=parameters,
+                task_type="upscale"
+            )
+        except Exception as e:
+            print(f"❌ upscale任务保存失败: {task_id}, 错误: {e}")
+            raise Exception(f"数据库保存失败: {str(e)}")
+        return task_id
+    
+    def start_upscale(self, task_id: str) -> asyncio.Future:
+        """准备输入图像和工作流，在后台提交并跟踪已登记的放大任务
+        
+        Args:
+            task_id: register_upscale 返回的任务ID
+            
+        Returns:
+            后台任务，结束时结果已写入数据库
+        """
+        task = self.db_manager.get_task(task_id)
+        parameters = json.loads(task.get("parameters") or "{}")
+        
+        # 插值算法不需要GPU，直接在本地进程池中执行
+        if is_local_algorithm(parameters.get("algorithm")):
+            return self._keep(asyncio.create_task(self._run_local(task_id, parameters)))
+        if parameters.get("tiled"):
+            return self._keep(asyncio.create_task(self._run_tiled(task_id, parameters)))
+        
+        try:
+            workflow = self._prepare_upscale(task_id, parameters)
+        except Exception as e:
+            print(f"❌ 放大任务准备失败: {task_id}, {e}")
+            self.db_manager.update_task_status(task_id, "failed", error=f"放大任务准备失败: {str(e)}")
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(None)
+            return future
+        return self._track(task_id, workflow, parameters)
+    
+    async def _run_local(self, task_id: str, parameters: Dict[str, Any]):
+        """在本地进程池中执行插值放大，结果与ComfyUI放大一样写入数据库"""
+        scale_factor = parameters.get("scale_factor", 2)
+        algorithm = parameters["algorithm"]
+        task_output_dir = self.output_dir / task_id
+        task_output_dir.mkdir(parents=True, exist_ok=True)
+        output_path = task_output_dir / f"task_{task_id}_{algorithm}_upscaled_{scale_factor}x.png"
+        
+        self.db_manager.update_task_status(task_id, "processing")
+        try:
+            loop = asyncio.get_running_loop()
+            info = await loop.run_in_executor(
+                get_local_upscale_pool(), upscale_file,
+                parameters["input_image"], str(output_path), scale_factor, algorithm,
+                bool(parameters.get("sharpen"))
+            )
+            # 执行期间任务可能已被取消
+            task = self.db_manager.get_task(task_id)
+            if task and task["status"] == "cancelled":
+                output_path.unlink(missing_ok=True)
+                return
+            self.db_manager.update_task_status(task_id, "completed", result_path=str(output_path))
+            self.db_manager.update_task_progress(task_id, 100)
+            print(f"✅ 本地放大完成: {task_id} ({algorithm} {scale_factor}x, {info['width']}x{info['height']})")
+        except Exception as e:
+            print(f"❌ 本地放大失败 {task_id}: {e}")
+            self.db_manager.update_task_status(task_id, "failed", error=f"本地放大失败: {str(e)}")
+        finally:
+            cache_manager = get_cache_manager()
+            cache_manager.invalidate_history_cache()
+            cache_manager.invalidate_task_cache(task_id)
+    
+    async def _run_tiled(self, task_id: str, parameters: Dict[str, Any]):
+        """分块放大：切分输入图像，每个分块作为独立prompt提交，全部完成后羽化拼接"""
+        from PIL import Image
+        
+        scale_factor = parameters.get("scale_factor", 2)
+        tile_paths: List[Path] = []
+        try:
+            with Image.open(parameters["input_image"]) as source:
+                image = source.convert("RGB")
+            boxes = plan_tiles(image.width, image.height, UPSCALE_TILE_SIZE, UPSCALE_TILE_OVERLAP)
+            
+            COMFYUI_INPUT_DIR.mkdir(parents=True, exist_ok=True)
+            workflows = []
+            for index, box in enumerate(boxes):
+                tile_path = COMFYUI_INPUT_DIR / f"upscale_tile_{task_id[:8]}_{index:03d}.png"
+                image.crop(box).save(tile_path, "PNG")
+                tile_paths.append(tile_path)
+                workflows.append(self._customize_upscale_workflow(
+                    str(tile_path), scale_factor, parameters.get("algorithm", "ultimate")))
+            source_size = image.size
+            del image
+            print(f"🧩 分块放大 {task_id}: {len(boxes)} 个分块")
+        except Exception as e:
+            print(f"❌ 分块放大准备失败: {task_id}, {e}")
+            self.db_manager.update_task_status(task_id, "failed", error=f"分块放大准备失败: {str(e)}")
+            return
+        
+        output_path = self.output_dir / task_id / f"task_{task_id}_tiled_upscaled_{scale_factor}x.png"
+        
+        def collect(index: int, outputs: Dict[str, Any]) -> Optional[Path]:
+            return self._find_upscaled_output(outputs)
+        
+        def combine(tile_outputs: List[Path]) -> str:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            stitch_tiles(list(zip(boxes, tile_outputs)), source_size, scale_factor, output_path)
+            return str(output_path)
+        
+        try:
+            await self.task_manager.run_multi_prompt_task(
+                task_id, workflows, collect, combine, parameters, retries=UPSCALE_TILE_RETRIES)
+        finally:
+            for tile_path in tile_paths:
+                tile_path.unlink(missing_ok=True)
+    
+    def _prepare_upscale(self, task_id: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """复制输入图像到任务目录和ComfyUI输入目录，返回放大工作流"""
+        input_path = Path(parameters["input_image"])
+        if not input_path.exists():
+            raise FileNotFoundError(f"输入图像不存在: {input_path}")
+        
+        # 准备输出目录
+        task_output_dir = self.output_dir / task_id
+        task_output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # 检查环境，在Docker环境中直接使用本地文件
+        from config.settings import ENVIRONMENT
+        
+        if ENVIRONMENT == "production":
+            # Docker环境：直接使用本地文件路径
+            task_image_path = input_path
+            print(f"🐳 Docker环境：直接使用本地文件路径: {task_image_path}")
+        else:
+            # 本地环境：复制到ComfyUI输入目录
+            comfyui_input_path = COMFYUI_INPUT_DIR / input_path.name
+            print(f"📁 复制图片到ComfyUI输入目录: {input_path} -> {comfyui_input_path}")
+            shutil.copy2(input_path, comfyui_input_path)
+            
+            # 也复制到任务目录作为备份
+            task_image_path = task_output_dir / input_path.name
+            shutil.copy2(input_path, task_image_path)
+        
+        return self._customize_upscale_workflow(
+            str(task_image_path), 
+            parameters.get("scale_factor", 2), 
+            parameters.get("algorithm", "ultimate")
+        )
+    
     def _customize_upscale_workflow(
         self, 
         image_path: str, 
@@ -165,7 +280,7 @@ class UpscaleManager:
             自定义后的工作流字典
         """
         # 加载工作流模板
-        workflow = self.workflow_template.template.copy()
+        workflow = clone_workflow(self.workflow_template.template)
         
         # 检查环境，在Docker环境中使用完整路径
         from config.settings import ENVIRONMENT
@@ -248,227 +363,150 @@ class UpscaleManager:
         print(f"✅ 放大工作流配置完成")
         return workflow
     
-    async def get_upscale_result(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """获取放大结果
+    def _track(self, task_id: str, workflow: Optional[Dict[str, Any]], parameters: Dict[str, Any],
+               prompt_id: Optional[str] = None) -> asyncio.Task:
+        """在后台提交并跟踪放大prompt，完成后结果写入数据库"""
+        return self._keep(asyncio.create_task(self.task_manager.run_prompt_task(
+            task_id, workflow, lambda outputs: self._ingest_outputs(task_id, outputs),
+            parameters, prompt_id=prompt_id
+        )))
+    
+    def _keep(self, task: asyncio.Task) -> asyncio.Task:
+        """持有后台任务直到结束"""
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        return task
+    
+    def _ingest_outputs(self, task_id: str, outputs: Dict[str, Any]) -> Optional[str]:
+        """把ComfyUI输出的放大图片复制到任务目录（每个任务只执行一次）
         
         Args:
             task_id: 任务ID
+            outputs: ComfyUI history中的outputs
             
         Returns:
-            放大结果信息，如果未完成则返回None
+            任务目录中的放大图片路径，未找到时返回None
         """
+        source_file = self._find_upscaled_output(outputs)
+        if source_file is None:
+            print(f"❌ 放大任务 {task_id} 的输出中没有找到放大文件")
+            return None
+        
         task_output_dir = self.output_dir / task_id
+        task_output_dir.mkdir(parents=True, exist_ok=True)
+        task_upscaled_file = task_output_dir / f"task_{task_id}_{source_file.name}"
+        shutil.copy2(source_file, task_upscaled_file)
+        print(f"📁 复制放大文件到任务目录: {source_file} -> {task_upscaled_file}")
+        return str(task_upscaled_file)
+    
+    @staticmethod
+    def _find_upscaled_output(outputs: Dict[str, Any]) -> Optional[Path]:
+        """在ComfyUI outputs中查找放大结果文件"""
+        for node_output in outputs.values():
+            for image_info in node_output.get("images", []):
+                filename = image_info.get("filename")
+                if not filename or image_info.get("type", "output") != "output":
+                    continue
+                if "upscaled" not in filename.lower():
+                    continue
+                
+                source_file = COMFYUI_MAIN_OUTPUT_DIR / image_info.get("subfolder", "") / filename
+                if source_file.exists():
+                    return source_file
+                print(f"❌ 放大文件不存在: {source_file}")
+        return None
+    
+    def resume_unfinished(self) -> int:
+        """服务重启后恢复未结束的放大任务：已提交的继续跟踪，未提交的重新提交
         
-        if not task_output_dir.exists():
-            return None
+        Returns:
+            恢复跟踪的任务数量
+        """
+        if not self.db_manager or not self.task_manager:
+            return 0
         
-        # 首先检查ComfyUI的输出目录
-        from config.settings import COMFYUI_MAIN_OUTPUT_DIR
-        comfyui_output_dir = COMFYUI_MAIN_OUTPUT_DIR
-        
-        print(f"🔍 检查ComfyUI输出目录: {comfyui_output_dir}")
-        
-        # 获取任务信息以确定放大倍数
-        scale_factor = 2  # 默认值
-        if task_id in self.tasks:
-            scale_factor = self.tasks[task_id].get("scale_factor", 2)
-        elif self.db_manager:
-            # 从数据库中获取任务信息
-            task_info = self.db_manager.get_task(task_id)
-            if task_info and task_info.get('parameters'):
-                import json
-                try:
-                    parameters = json.loads(task_info['parameters'])
-                    scale_factor = parameters.get('scale_factor', 2)
-                except (json.JSONDecodeError, KeyError):
-                    scale_factor = 2
-        
-        # 先检查是否有对应的prompt_id，通过ComfyUI历史API获取真正的输出文件
-        latest_file = None
-        
-        if task_id in self.tasks:
-            task_info = self.tasks[task_id]
-            prompt_id = task_info.get("prompt_id")
-            
+        resumed = 0
+        for task in self.db_manager.get_unfinished_tasks("upscale"):
+            task_id = task["id"]
+            prompt_id = task.get("prompt_id")
+            try:
+                parameters = json.loads(task.get("parameters") or "{}")
+            except (json.JSONDecodeError, TypeError):
+                parameters = {}
             if prompt_id:
-                try:
-                    print(f"🔍 通过prompt_id查询ComfyUI历史: {prompt_id}")
-                    comfyui_history = await self.comfyui_client.get_task_status(prompt_id)
-                    
-                    # 从ComfyUI历史中提取输出文件
-                    if prompt_id in comfyui_history and comfyui_history[prompt_id].get("status", {}).get("completed", False):
-                        outputs = comfyui_history[prompt_id].get("outputs", {})
-                        print(f"📋 ComfyUI任务输出: {outputs}")
-                        
-                        # 查找图片输出节点的结果
-                        found_file = False
-                        for node_id, node_output in outputs.items():
-                            if "images" in node_output:
-                                for image_info in node_output["images"]:
-                                    filename = image_info.get("filename")
-                                    if filename and "upscaled" in filename.lower():
-                                        # 找到放大后的文件
-                                        latest_file = comfyui_output_dir / filename
-                                        print(f"✅ 通过prompt_id找到放大文件: {latest_file}")
-                                        
-                                        if latest_file.exists():
-                                            found_file = True
-                                            break
-                            if found_file:
-                                break
-                        
-                        if not found_file:
-                            print(f"❌ 在prompt_id {prompt_id} 的输出中没有找到放大文件")
-                            return None
-                            
-                    else:
-                        print(f"⏳ prompt_id {prompt_id} 的任务还没有完成")
-                        return None
-                        
-                except Exception as e:
-                    print(f"⚠️ 查询ComfyUI历史失败: {e}")
-                    # 如果ComfyUI历史查询失败，回退到文件系统查找（但更加谨慎）
-                    print(f"🔄 回退到文件系统查找...")
-                    
-                    # 查找最近几分钟内创建的放大文件，避免获取太旧的文件
-                    import time
-                    current_time = time.time()
-                    recent_threshold = current_time - 300  # 5分钟内
-                    
-                    upscaled_files = list(comfyui_output_dir.glob(f"ultimate_upscaled_{scale_factor}x_*.png"))
-                    recent_files = [f for f in upscaled_files if f.stat().st_mtime > recent_threshold]
-                    
-                    print(f"📁 找到最近5分钟内的{scale_factor}倍放大文件: {recent_files}")
-                    
-                    if recent_files:
-                        # 按修改时间排序，获取最新的文件
-                        recent_files.sort(key=lambda f: f.stat().st_mtime, reverse=True)
-                        latest_file = recent_files[0]
-                        print(f"✅ 使用最新的放大文件: {latest_file.name} (时间: {latest_file.stat().st_mtime})")
-                    else:
-                        print(f"❌ 没有找到最近的放大文件")
-                        return None
+                self._track(task_id, None, parameters, prompt_id=prompt_id)
+            elif parameters.get("batch_id"):
+                # 批量放大中尚未提交的条目由批量管理器按并发窗口重新提交；
+                # 没有prompt_id却处于processing的条目（本地算法、分块放大）重启后已中断，放回队列
+                if task["status"] == "processing":
+                    self.db_manager.update_task_status(task_id, "pending")
+                continue
             else:
-                print(f"❌ 任务 {task_id} 没有prompt_id")
-                return None
-        else:
-            # 任务不在内存中，尝试从数据库获取
-            print(f"⚠️ 任务 {task_id} 不在内存中，尝试从数据库获取...")
-            if self.db_manager:
-                db_task_info = self.db_manager.get_task(task_id)
-                if db_task_info and db_task_info.get('status') == 'completed':
-                    # 如果数据库中显示已完成，直接返回结果
-                    result_path = db_task_info.get('result_path')
-                    if result_path and Path(result_path).exists():
-                        print(f"✅ 从数据库找到已完成的放大任务: {result_path}")
-                        return {
-                            "task_id": task_id,
-                            "status": "completed", 
-                            "original_image": str(task_output_dir / "input_image.png"),
-                            "upscaled_images": [f"/api/upscale/image/{task_id}/{Path(result_path).name}"],
-                            "output_dir": str(task_output_dir)
-                        }
-                        
-            print(f"❌ 任务 {task_id} 不在内存中且数据库中无有效结果")
-            return None
+                # 提交前服务已重启，按登记的参数重新提交
+                self.start_upscale(task_id)
+            resumed += 1
         
-        if latest_file and latest_file.exists():
-            
-            # 找到放大文件，任务完成
-            if task_id in self.tasks:
-                self.tasks[task_id]["status"] = "completed"
-            
-            # 将最新的放大文件复制到任务目录，使用任务ID作为文件名前缀
-            task_upscaled_filename = f"task_{task_id}_{latest_file.name}"
-            task_upscaled_file = task_output_dir / task_upscaled_filename
-            shutil.copy2(latest_file, task_upscaled_file)
-            print(f"📁 复制放大文件到任务目录: {latest_file} -> {task_upscaled_file}")
-            
-            # 更新数据库状态
-            if self.db_manager:
-                self.db_manager.update_task_status(
-                    task_id=task_id,
-                    status="completed",
-                    result_path=str(task_upscaled_file)
-                )
-                # 更新进度为100%
-                self.db_manager.update_task_progress(task_id, 100)
+        if resumed:
+            print(f"🔄 恢复跟踪 {resumed} 个放大任务")
+        return resumed
+    
+    def get_upscale_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """读取放大任务状态（只读，结果由后台跟踪写入数据库）
+        
+        Args:
+            task_id: 任务ID
             
+        Returns:
+            状态字典（status/progress/result/error），任务不存在时返回None
+        """
+        cached = self.tasks.get(task_id)
+        if cached is not None:
+            self.tasks.move_to_end(task_id)
+            return cached
+        
+        task = self.db_manager.get_task(task_id) if self.db_manager else None
+        if not task or task.get("task_type") != "upscale":
+            return None
+        
+        result = self.build_result(task)
+        if result["status"] in FINAL_UPSCALE_STATUSES:
+            self.tasks[task_id] = result
+            while len(self.tasks) > UPSCALE_TASK_CACHE_SIZE:
+                self.tasks.popitem(last=False)
+        return result
+    
+    def build_result(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """把数据库中的任务记录转换为放大状态"""
+        task_id = task["id"]
+        status = task["status"]
+        
+        if status == "completed" and task.get("result_path"):
             return {
                 "task_id": task_id,
                 "status": "completed",
-                "original_image": str(task_output_dir / "input_image.png"),
-                "upscaled_images": [f"/api/upscale/image/{task_id}/{task_upscaled_filename}"],
-                "output_dir": str(task_output_dir)
+                "progress": 100,
+                "result": {
+                    "original_image": f"/api/upscale/image/{task_id}/original",
+                    "upscaled_images": [f"/api/upscale/image/{task_id}/{Path(task['result_path']).name}"],
+                    "output_dir": str(self.output_dir / task_id)
+                },
+                "error": None
             }
-        
-        # 如果没有找到放大后的文件，检查ComfyUI任务状态
-        if task_id in self.tasks:
-            task_info = self.tasks[task_id]
-            prompt_id = task_info.get("prompt_id")
-            
-            if prompt_id:
-                try:
-                    print(f"🔍 检查ComfyUI任务状态: {prompt_id}")
-                    # 检查ComfyUI任务状态
-                    comfyui_status = await self.comfyui_client.get_task_status(prompt_id)
-                    print(f"📊 ComfyUI状态: {comfyui_status}")
-                    
-                    # 如果ComfyUI任务失败，更新状态
-                    if comfyui_status.get("status") == "failed":
-                        print(f"❌ ComfyUI任务失败: {comfyui_status}")
-                        self.tasks[task_id]["status"] = "failed"
-                        
-                        # 更新数据库状态
-                        if self.db_manager:
-                            self.db_manager.update_task_status(
-                                task_id=task_id,
-                                status="failed",
-                                error="ComfyUI任务执行失败"
-                            )
-                        
-                        return {
-                            "task_id": task_id,
-                            "status": "failed",
-                            "error": "ComfyUI任务执行失败"
-                        }
-                    
-                    # 如果ComfyUI任务完成但文件还没生成，等待一下
-                    if comfyui_status.get("status") == "completed":
-                        print(f"✅ ComfyUI任务完成，检查输出文件...")
-                        # 再次检查文件
-                        upscaled_files = list(comfyui_output_dir.glob(f"ultimate_upscaled_{scale_factor}x_*.png"))
-                        print(f"📁 找到的放大文件: {upscaled_files}")
-                        if upscaled_files:
-                            # 按修改时间排序，获取最新的文件
-                            upscaled_files.sort(key=lambda f: f.stat().st_mtime, reverse=True)
-                            latest_file = upscaled_files[0]
-                            
-                            # 将最新的放大文件复制到任务目录，使用任务ID作为文件名前缀
-                            task_upscaled_filename = f"task_{task_id}_{latest_file.name}"
-                            task_upscaled_file = task_output_dir / task_upscaled_filename
-                            shutil.copy2(latest_file, task_upscaled_file)
-                            
-                            self.tasks[task_id]["status"] = "completed"
-                            return {
-                                "task_id": task_id,
-                                "status": "completed",
-                                "original_image": str(task_output_dir / "input_image.png"),
-                                "upscaled_images": [f"/api/upscale/image/{task_id}/{task_upscaled_filename}"],
-                                "output_dir": str(task_output_dir)
-                            }
-                        else:
-                            print(f"⚠️ ComfyUI任务完成但未找到输出文件")
-                
-                except Exception as e:
-                    print(f"❌ 检查ComfyUI任务状态失败: {e}")
-                    import traceback
-                    print(f"详细错误: {traceback.format_exc()}")
-        else:
-            print(f"⚠️ 任务 {task_id} 不在任务列表中")
-        
-        # 任务仍在处理中
-        return None
+        if status in ("failed", "cancelled") or status == "completed":
+            return {
+                "task_id": task_id,
+                "status": "failed" if status == "completed" else status,
+                "progress": 0,
+                "result": None,
+                "error": task.get("error") or "放大任务执行失败"
+            }
+        return {
+            "task_id": task_id,
+            "status": "processing",
+            "progress": 50,
+            "result": None,
+            "error": None
+        }
     
     async def cleanup_task(self, task_id: str) -> bool:
         """清理任务文件
@@ -483,6 +521,7 @@ class UpscaleManager:
             task_output_dir = self.output_dir / task_id
             if task_output_dir.exists():
                 shutil.rmtree(task_output_dir)
+            self.tasks.pop(task_id, None)
             return True
         except Exception as e:
             print(f"清理任务失败: {e}")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分块放大的切分与拼接
+大图按带重叠的分块切开，每个分块作为独立的ComfyUI prompt放大，
+拼接时在重叠区域做线性羽化过渡，避免分块接缝。
+"""
+
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+from PIL import Image, ImageChops
+
+Box = Tuple[int, int, int, int]
+
+
+def _axis_starts(length: int, tile: int, overlap: int) -> List[int]:
+    """单个方向上各分块的起点，最后一块与边缘对齐"""
+    if length <= tile:
+        return [0]
+    step = max(1, tile - overlap)
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+
+def plan_tiles(width: int, height: int, tile: int, overlap: int) -> List[Box]:
+    """切分方案：按行优先返回各分块在源图中的 (left, top, right, bottom)
+
+    Args:
+        width: 源图宽度
+        height: 源图高度
+        tile: 分块边长（像素）
+        overlap: 相邻分块的重叠宽度（像素）
+    """
+    boxes = []
+    for top in _axis_starts(height, tile, overlap):
+        for left in _axis_starts(width, tile, overlap):
+            boxes.append((left, top, min(width, left + tile), min(height, top + tile)))
+    return boxes
+
+
+def linear_ramp(length: int, size: Tuple[int, int], horizontal: bool) -> Image.Image:
+    """0 -> 255 的线性渐变遮罩"""
+    values = bytes(int(255 * (i + 0.5) / length) for i in range(length))
+    if horizontal:
+        return Image.frombytes("L", (length, 1), values).resize(size, Image.Resampling.NEAREST)
+    return Image.frombytes("L", (1, length), values).resize(size, Image.Resampling.NEAREST)
+
+
+def _feather_mask(size: Tuple[int, int], left: int, top: int) -> Image.Image:
+    """分块的粘贴遮罩：与已粘贴区域重叠的左侧/上侧做线性过渡，其余不透明"""
+    width, height = size
+    mask = Image.new("L", size, 255)
+    if left > 0:
+        mask.paste(linear_ramp(left, (left, height), horizontal=True), (0, 0))
+    if top > 0:
+        top_mask = Image.new("L", size, 255)
+        top_mask.paste(linear_ramp(top, (width, top), horizontal=False), (0, 0))
+        mask = ImageChops.multiply(mask, top_mask)
+    return mask
+
+
+def stitch_tiles(tiles: Sequence[Tuple[Box, Path]], source_size: Tuple[int, int], scale_factor: int,
+                 output_path: Path) -> Path:
+    """拼接放大后的分块
+
+    分块按 plan_tiles 的顺序粘贴，每块在与左侧、上侧已粘贴内容重叠的区域内线性过渡。
+    放大结果尺寸与预期不一致时（如模型输出取整），先缩放到预期尺寸。
+
+    Args:
+        tiles: (源图中的分块位置, 放大后的分块文件)
+        source_size: 源图尺寸
+        scale_factor: 放大倍数
+        output_path: 输出文件路径
+    """
+    canvas = Image.new("RGB", (source_size[0] * scale_factor, source_size[1] * scale_factor))
+    placed: List[Box] = []
+
+    for box, tile_path in tiles:
+        left, top, right, bottom = (value * scale_factor for value in box)
+        size = (right - left, bottom - top)
+        with Image.open(tile_path) as tile_image:
+            tile = tile_image.convert("RGB")
+        if tile.size != size:
+            tile = tile.resize(size, Image.Resampling.LANCZOS)
+
+        # 与已粘贴分块的重叠宽度（左侧取同一行、上侧取上一行）
+        overlap_left = max([other[2] - left for other in placed
+                            if other[0] < left and other[1] < bottom and other[3] > top] + [0])
+        overlap_top = max([other[3] - top for other in placed
+                           if other[1] < top and other[0] < right and other[2] > left] + [0])
+        overlap_left, overlap_top = min(overlap_left, size[0]), min(overlap_top, size[1])
+
+        canvas.paste(tile, (left, top), _feather_mask(size, overlap_left, overlap_top))
+        placed.append((left, top, right, bottom))
+
+    canvas.save(output_path, "PNG")
+    return output_path
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型预热管理器
+服务部署或ComfyUI重启后，每个模型的第一个用户请求需要承担完整的权重加载时间。
+预热在ComfyUI健康后于后台为每个已启用模型提交一个低步数、小尺寸的prompt。
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config.settings import (
+    WARMUP_ENABLED, WARMUP_MODELS, WARMUP_INTERVAL, WARMUP_STEPS,
+    WARMUP_SIZE, WARMUP_TIMEOUT, WARMUP_HEALTH_TIMEOUT
+)
+from core.comfyui_client import ComfyUIClient
+from core.model_scheduler import get_model_scheduler, workflow_model_key
+from core.workflow_template import WorkflowTemplate
+
+# 不需要加载本地权重的模型类型
+API_MODEL_TYPES = ("gemini", "joycaption", "seedream4")
+
+WARMUP_DESCRIPTION = "warm up"
+
+
+class WarmupManager:
+    """后台模型预热"""
+
+    def __init__(self, comfyui_client: ComfyUIClient, workflow_template: WorkflowTemplate):
+        """初始化预热管理器
+
+        Args:
+            comfyui_client: ComfyUI客户端
+            workflow_template: 工作流模板
+        """
+        self.comfyui = comfyui_client
+        self.workflow_template = workflow_template
+        self.scheduler = get_model_scheduler()
+        self._task: Optional[asyncio.Task] = None
+        self._cancelled = False
+        self._current_prompt_id: Optional[str] = None
+        self._status = "disabled" if not WARMUP_ENABLED else "pending"
+        self._started_at: Optional[str] = None
+        self._finished_at: Optional[str] = None
+        self._models: Dict[str, Dict[str, Any]] = {}
+
+    def start(self, force: bool = False) -> bool:
+        """在后台启动预热
+
+        Args:
+            force: 未开启 WARMUP_ENABLED 时也启动（手动触发）
+
+        Returns:
+            True表示已启动，已在运行或未开启时返回False
+        """
+        if not WARMUP_ENABLED and not force:
+            return False
+        if self.is_running():
+            return False
+        self._cancelled = False
+        self._models = {}
+        self._started_at = datetime.now().isoformat()
+        self._finished_at = None
+        self._status = "waiting_for_comfyui"
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def cancel(self) -> bool:
+        """取消预热：撤回排队中的预热请求并取消ComfyUI上的预热prompt"""
+        if not self.is_running():
+            return False
+        self._cancelled = True
+        for name in self._models:
+            self.scheduler.withdraw(self._owner(name))
+        prompt_id = self._current_prompt_id
+        if prompt_id:
+            try:
+                await self.comfyui.cancel_prompt(prompt_id)
+            except Exception as e:
+                print(f"⚠️ 取消预热prompt失败 {prompt_id}: {e}")
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._status = "cancelled"
+        self._finished_at = datetime.now().isoformat()
+        print("🛑 模型预热已取消")
+        return True
+
+    def get_status(self) -> Dict[str, Any]:
+        """预热状态（用于 /api/health）"""
+        return {
+            "enabled": WARMUP_ENABLED,
+            "status": self._status,
+            "started_at": self._started_at,
+            "finished_at": self._finished_at,
+            "models": self._models,
+        }
+
+    @staticmethod
+    def _owner(model_name: str) -> str:
+        return f"warmup:{model_name}"
+
+    async def _run(self):
+        """预热主流程：等待ComfyUI健康 -> 按模型依次提交预热prompt（限速）"""
+        try:
+            if not await self._wait_for_comfyui():
+                self._status = "failed"
+                print(f"❌ 等待ComfyUI超时（{WARMUP_HEALTH_TIMEOUT}秒），跳过模型预热")
+                return
+
+            models = await self._get_warmup_models()
+            self._models = {name: {"status": "pending"} for name in models}
+            self._status = "running"
+            print(f"🔥 开始模型预热: {models}")
+
+            for index, model_name in enumerate(models):
+                if self._cancelled:
+                    break
+                if index > 0:
+                    await asyncio.sleep(WARMUP_INTERVAL)
+                await self._warm_model(model_name)
+
+            self._status = "completed"
+            print("✅ 模型预热完成")
+        except asyncio.CancelledError:
+            self._status = "cancelled"
+            raise
+        except Exception as e:
+            self._status = "failed"
+            print(f"❌ 模型预热失败: {e}")
+        finally:
+            self._current_prompt_id = None
+            self._finished_at = datetime.now().isoformat()
+
+    async def _wait_for_comfyui(self) -> bool:
+        """等待ComfyUI健康检查通过"""
+        deadline = time.monotonic() + WARMUP_HEALTH_TIMEOUT
+        while time.monotonic() < deadline:
+            if await self.comfyui.check_health():
+                return True
+            await asyncio.sleep(5)
+        return False
+
+    async def _get_warmup_models(self) -> List[str]:
+        """需要预热的模型：配置中可用的本地模型，WARMUP_MODELS 非空时只取其中的模型"""
+        from core.model_manager import model_manager
+
+        models = await model_manager.get_available_models_from_config()
+        names = []
+        for model in models:
+            name = model.get("code") or model.get("name")
+            if not name or model.get("model_type") in API_MODEL_TYPES:
+                continue
+            if WARMUP_MODELS and name not in WARMUP_MODELS:
+                continue
+            if name not in names:
+                names.append(name)
+        return names
+
+    async def _build_workflow(self, model_name: str) -> Dict[str, Any]:
+        """构建预热工作流：最少步数、小尺寸，SaveImage 换成 PreviewImage 避免写入输出目录"""
+        parameters = {"steps": WARMUP_STEPS, "count": 1, "seed": 1, "size": WARMUP_SIZE}
+        workflow = await self.workflow_template.customize_workflow("", WARMUP_DESCRIPTION, parameters, model_name)
+        for node in workflow.values():
+            if isinstance(node, dict) and node.get("class_type") == "SaveImage":
+                node["class_type"] = "PreviewImage"
+                node["inputs"] = {"images": node["inputs"].get("images")}
+        return workflow
+
+    async def _warm_model(self, model_name: str):
+        """预热单个模型，失败只记录不中断整个预热"""
+        state = self._models[model_name]
+        started = time.monotonic()
+        try:
+            workflow = await self._build_workflow(model_name)
+            key = workflow_model_key(workflow)
+            if not key:
+                state["status"] = "skipped"
+                return
+            state["status"] = "queued"
+
+            ticket = await self.scheduler.acquire(self._owner(model_name), key)
+            if ticket is None:
+                state["status"] = "cancelled"
+                return
+            try:
+                if self._cancelled:
+                    state["status"] = "cancelled"
+                    return
+                state["status"] = "running"
+                self._current_prompt_id = await self.comfyui.submit_workflow(workflow)
+                completed = await self._wait_for_prompt(self._current_prompt_id)
+            finally:
+                self.scheduler.release(ticket)
+                self._current_prompt_id = None
+
+            state["status"] = "warm" if completed else "failed"
+            state["seconds"] = round(time.monotonic() - started, 2)
+            print(f"🔥 模型预热{'完成' if completed else '失败'}: {model_name} ({state['seconds']}s)")
+        except asyncio.CancelledError:
+            state["status"] = "cancelled"
+            raise
+        except Exception as e:
+            state["status"] = "failed"
+            state["error"] = str(e)
+            print(f"❌ 模型预热失败 {model_name}: {e}")
+
+    async def _wait_for_prompt(self, prompt_id: str) -> bool:
+        """等待预热prompt结束（不处理输出文件）"""
+        deadline = time.monotonic() + WARMUP_TIMEOUT
+        while time.monotonic() < deadline:
+            history = await self.comfyui.get_task_status(prompt_id)
+            if prompt_id in history:
+                status = history[prompt_id].get("status", {})
+                return status.get("status_str", "success") == "success"
+            await asyncio.sleep(1)
+        return False
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作流注入计划
+把工作流模板按版本编译一次：记录节点类型索引、参数注入点（node_id, input_key, 参数来源）、
+模板变量位置和LoRA堆栈拼接点。构建工作流时只做结构化克隆和 O(#参数) 次赋值，
+不再每次遍历整张图匹配 class_type。
+"""
+
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+# 参数注入点：(节点ID, 输入字段, 参数来源)
+Assignment = Tuple[str, str, str]
+# 编译规则：给定节点ID和节点，返回该节点的 (输入字段, 参数来源) 列表
+AssignmentRule = Callable[[str, Dict[str, Any]], List[Tuple[str, str]]]
+
+# 模板变量名，对应 {{name}} 占位符
+TEMPLATE_VARIABLES = ("description", "seed", "width", "height", "reference_image")
+
+# LoRA堆栈节点类型（rgthree）
+LORA_STACK_CLASS_TYPES = ("Lora Loader Stack (rgthree)",)
+
+_IMMUTABLE_TYPES = (str, int, float, bool, type(None))
+
+MAX_CACHED_PLANS = 64
+
+
+def _clone_value(value: Any) -> Any:
+    """复制输入值：不可变叶子直接共享，列表（节点连线）和其他容器复制"""
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return value
+    if type(value) is list:
+        return [item if isinstance(item, _IMMUTABLE_TYPES) else _clone_value(item) for item in value]
+    return copy.deepcopy(value)
+
+
+def clone_workflow(template: Dict[str, Any]) -> Dict[str, Any]:
+    """结构化克隆工作流
+
+    复制所有节点、inputs、_meta 和连线列表，共享不可变的字符串/数字。
+    结果可以任意修改，不会影响模板或其他请求。
+    """
+    workflow = {}
+    for node_id, node in template.items():
+        if type(node) is not dict:
+            workflow[node_id] = _clone_value(node)
+            continue
+
+        new_node = dict(node)
+        inputs = node.get("inputs")
+        if type(inputs) is dict:
+            new_node["inputs"] = {key: _clone_value(value) for key, value in inputs.items()}
+        meta = node.get("_meta")
+        if type(meta) is dict:
+            new_node["_meta"] = dict(meta)
+        workflow[node_id] = new_node
+    return workflow
+
+
+class InjectionPlan:
+    """编译后的工作流模板
+
+    模板在编译时被克隆一份并视为只读；instantiate() 返回可修改的副本。
+    """
+
+    def __init__(self, template: Dict[str, Any], version: str):
+        self.template = clone_workflow(template)
+        self.version = version
+        # 由字典编译的计划保留源对象引用
+        self.source: Optional[Dict[str, Any]] = None
+        self.nodes_by_class: Dict[str, List[str]] = {}
+        # 模板变量位置：(节点ID, 输入字段, 变量名元组)
+        self.placeholders: List[Tuple[str, str, Tuple[str, ...]]] = []
+        # LoRA堆栈拼接点
+        self.lora_stacks: List[str] = []
+        self._assignments: Dict[str, List[Assignment]] = {}
+        self._lock = threading.Lock()
+        self._compile()
+
+    def _compile(self):
+        """建立节点类型索引、模板变量位置和LoRA拼接点"""
+        for node_id, node in self.template.items():
+            if not isinstance(node, dict):
+                continue
+
+            class_type = node.get("class_type", "")
+            self.nodes_by_class.setdefault(class_type, []).append(node_id)
+
+            inputs = node.get("inputs", {})
+            if class_type in LORA_STACK_CLASS_TYPES or "lora_01" in inputs:
+                self.lora_stacks.append(node_id)
+
+            for key, value in inputs.items():
+                if isinstance(value, str) and "{" in value:
+                    names = tuple(name for name in TEMPLATE_VARIABLES if f"{{{{{name}}}}}" in value)
+                    if names or "{lora_" in value or "{strength_" in value:
+                        self.placeholders.append((node_id, key, names))
+
+    def nodes_of(self, *class_types: str) -> List[str]:
+        """按模板中的顺序返回指定类型的节点ID"""
+        if len(class_types) == 1:
+            return list(self.nodes_by_class.get(class_types[0], []))
+        return [node_id for node_id, node in self.template.items()
+                if isinstance(node, dict) and node.get("class_type") in class_types]
+
+    def assignments(self, rules_name: str, rules: AssignmentRule) -> List[Assignment]:
+        """按规则编译参数注入点，每个规则集只编译一次"""
+        compiled = self._assignments.get(rules_name)
+        if compiled is not None:
+            return compiled
+
+        with self._lock:
+            compiled = self._assignments.get(rules_name)
+            if compiled is None:
+                compiled = []
+                for node_id, node in self.template.items():
+                    if not isinstance(node, dict):
+                        continue
+                    for input_key, source in rules(node_id, node):
+                        compiled.append((node_id, input_key, source))
+                self._assignments[rules_name] = compiled
+        return compiled
+
+    def instantiate(self) -> Dict[str, Any]:
+        """返回模板的可修改副本"""
+        return clone_workflow(self.template)
+
+    def build(self, values: Dict[str, Any], rules_name: str, rules: AssignmentRule) -> Dict[str, Any]:
+        """克隆模板并按注入计划赋值，值为 None 的参数保持模板原值"""
+        workflow = clone_workflow(self.template)
+        for node_id, input_key, source in self.assignments(rules_name, rules):
+            value = values.get(source)
+            if value is not None:
+                workflow[node_id]["inputs"][input_key] = value
+        return workflow
+
+
+# =============================================================================
+# 计划缓存
+# =============================================================================
+
+_plan_cache: "OrderedDict[Any, InjectionPlan]" = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+
+def _cache_get(key: Any) -> Optional[InjectionPlan]:
+    with _plan_cache_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+        return plan
+
+
+def _cache_put(key: Any, plan: InjectionPlan) -> InjectionPlan:
+    with _plan_cache_lock:
+        _plan_cache[key] = plan
+        _plan_cache.move_to_end(key)
+        while len(_plan_cache) > MAX_CACHED_PLANS:
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+def get_injection_plan(workflow_json: Union[str, Dict[str, Any]]) -> InjectionPlan:
+    """获取工作流模板的注入计划
+
+    Args:
+        workflow_json: admin 返回的 workflow_json，JSON字符串或已解析的字典
+
+    字符串按内容缓存；字典按对象缓存（配置客户端刷新时会换成新对象）。
+    """
+    if isinstance(workflow_json, str):
+        key = ("json", workflow_json)
+        plan = _cache_get(key)
+        if plan is None:
+            version = hashlib.sha1(workflow_json.encode("utf-8")).hexdigest()[:12]
+            plan = _cache_put(key, InjectionPlan(json.loads(workflow_json), version))
+        return plan
+
+    if not isinstance(workflow_json, dict):
+        raise ValueError(f"不支持的工作流模板类型: {type(workflow_json).__name__}")
+
+    key = ("object", id(workflow_json))
+    plan = _cache_get(key)
+    # 计划持有源对象引用，id 在其存活期间不会被复用
+    if plan is None or plan.source is not workflow_json:
+        plan = InjectionPlan(workflow_json, f"obj-{id(workflow_json):x}")
+        plan.source = workflow_json
+        _cache_put(key, plan)
+    return plan
+
+
+def get_file_injection_plan(template_path: Union[str, Path]) -> InjectionPlan:
+    """获取本地工作流文件的注入计划，文件修改后自动重新编译"""
+    template_path = Path(template_path)
+    stat = template_path.stat()
+    key = ("file", str(template_path), stat.st_mtime_ns, stat.st_size)
+    plan = _cache_get(key)
+    if plan is None:
+        with open(template_path, "r", encoding="utf-8") as f:
+            template = json.load(f)
+        plan = _cache_put(key, InjectionPlan(template, f"{template_path.name}@{stat.st_mtime_ns}"))
+    return plan
+
+
+def clear_injection_plans():
+    """清空计划缓存（配置刷新或测试时使用）"""
+    with _plan_cache_lock:
+        _plan_cache.clear()
@@ -11,6 +11,11 @@ from typing import Dict, List, Any, Optional, Tuple
 import logging
 
 from core.model_manager import get_model_config, ModelType
+from core.workflow_plan import get_injection_plan
+
+# 用户参数注入的节点类型
+SAMPLER_NODE_TYPES = ("KSampler", "KSamplerAdvanced", "SamplerCustom")
+SIZE_NODE_TYPES = ("EmptyLatentImage", "EmptySD3LatentImage", "LatentUpscale")
 
 logger = logging.getLogger(__name__)
 
@@ -361,25 +366,25 @@ class WorkflowSelector:
     
     def _apply_user_parameters(self, workflow_template: Dict[str, Any], 
                              user_parameters: Dict[str, Any]) -> Dict[str, Any]:
-        """将用户参数应用到工作流模板"""
-        # 这里可以根据具体的工作流结构来应用参数
-        # 目前先返回原始模板，后续可以根据需要扩展
-        customized_workflow = workflow_template.copy()
-        
-        # 应用基本参数
-        if "width" in user_parameters:
-            # 这里需要根据具体的工作流结构来设置宽度
-            pass
-        
-        if "height" in user_parameters:
-            # 这里需要根据具体的工作流结构来设置高度
-            pass
-        
-        if "steps" in user_parameters:
-            # 这里需要根据具体的工作流结构来设置步数
-            pass
-        
-        return customized_workflow
+        """将用户参数应用到工作流模板
+
+        使用编译后的注入计划：结构化克隆模板后只对尺寸/采样节点赋值，
+        不会修改模板本身，也不会在请求之间共享嵌套字典。
+        """
+        plan = get_injection_plan(workflow_template)
+        values = {key: user_parameters.get(key) for key in ("width", "height", "steps", "seed")}
+        return plan.build(values, "workflow_selector", _user_parameter_rules)
+
+
+def _user_parameter_rules(node_id: str, node: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """编译用户参数的注入点：尺寸节点的 width/height，采样节点的 steps/seed"""
+    class_type = node.get("class_type", "")
+    inputs = node.get("inputs", {})
+    if class_type in SIZE_NODE_TYPES:
+        return [(key, key) for key in ("width", "height") if key in inputs]
+    if class_type in SAMPLER_NODE_TYPES:
+        return [(key, key) for key in ("steps", "seed") if key in inputs]
+    return []
 
 
 # 全局工作流选择器实例
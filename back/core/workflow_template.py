@@ -17,6 +17,41 @@ from core.workflows import WanWorkflow
 from core.workflows.seedream4_workflow import Seedream4Workflow
 from core.workflows.joycaption_workflow import JoyCaptionWorkflow
 from core.workflows.qwen_outpainting_workflow import QwenOutpaintingWorkflow
+from core.workflow_plan import clone_workflow, get_injection_plan
+
+
+# 参数注入规则对应的节点类型
+TEXT_NODE_TYPES = ("CLIPTextEncode", "CLIPTextEncodeAdvanced")
+SAMPLER_NODE_TYPES = ("KSampler", "KSamplerAdvanced", "SamplerCustom", "ModelSamplingAuraFlow")
+SIZE_NODE_TYPES = ("EmptyLatentImage", "LatentUpscale", "LatentFromBatch")
+
+
+def _workflow_template_rules(node_id: str, node: Dict[str, Any]) -> List[tuple]:
+    """编译 _apply_parameters_to_workflow 的注入点：返回 (输入字段, 参数来源) 列表"""
+    class_type = node.get("class_type", "")
+    inputs = node.get("inputs", {})
+    
+    # 文本节点，以及其他带text字段的节点
+    if "text" in inputs:
+        return [("text", "description")]
+    if class_type in TEXT_NODE_TYPES:
+        return []
+    
+    if class_type in SAMPLER_NODE_TYPES:
+        return [(key, key) for key in ("steps", "seed") if key in inputs]
+    
+    if class_type in SIZE_NODE_TYPES:
+        return [(key, key) for key in ("width", "height") if key in inputs]
+    
+    # Google-Gemini节点可能有不同的参数结构
+    if class_type == "Google-Gemini":
+        rules = []
+        if "prompt" in inputs:
+            rules.append(("prompt", "description"))
+        rules.extend((key, key) for key in ("seed", "steps") if key in inputs)
+        return rules
+    
+    return []
 
 
 class WorkflowTemplate:
@@ -47,23 +82,28 @@ class WorkflowTemplate:
             print(f"❌ 加载模板文件失败: {e}")
             return {}
     
-    async def customize_workflow(self, reference_image_path: str, description: str, parameters: Dict[str, Any], model_name: str):
+    async def customize_workflow(self, reference_image_path: str, description: str, parameters: Dict[str, Any], model_name: str,
+                                 model_config: Optional[Dict[str, Any]] = None):
         """自定义工作流参数 - 支持多种模型
         
+        工作流创建（模板实例化、参考图预处理）在线程中执行，不阻塞事件循环。
+        
         Args:
             reference_image_path: 参考图像路径
             description: 图像描述
             parameters: 生成参数
             model_name: 模型名称（必填）
+            model_config: 已获取的模型配置（fetch_model_config），为None时从配置客户端获取
         """
         # 特殊处理：qwen-outpainting 直接使用内置工作流，不需要配置
         if model_name == "qwen-outpainting":
             print(f"🎯 使用内置Qwen扩图工作流")
             workflow_creator = QwenOutpaintingWorkflow()
-            return workflow_creator.create_workflow(reference_image_path, description, parameters)
+            return await asyncio.to_thread(workflow_creator.create_workflow, reference_image_path, description, parameters)
         
         # 获取模型配置 - 使用配置客户端
-        model_config = await self._get_model_config_from_client(model_name)
+        if model_config is None:
+            model_config = await self._get_model_config_from_client(model_name)
         if not model_config:
             raise ValueError(f"模型 {model_name} 不可用或未配置")
         
@@ -108,9 +148,10 @@ class WorkflowTemplate:
         reference_image_paths = parameters.get("reference_image_paths", [])
         if model_type == ModelType.QWEN and len(reference_image_paths) >= 2:
             # 多图融合工作流需要特殊处理
-            return self.customize_fusion_workflow(reference_image_path, description, parameters, model_name)
+            return await asyncio.to_thread(
+                self.customize_fusion_workflow, reference_image_path, description, parameters, model_name)
         else:
-            return workflow_creator.create_workflow(reference_image_path, description, parameters)
+            return await asyncio.to_thread(workflow_creator.create_workflow, reference_image_path, description, parameters)
     
     def customize_fusion_workflow(self, reference_image_path: str, description: str, parameters: Dict[str, Any], model_name: str = "qwen-fusion"):
         """自定义多图融合工作流参数
@@ -159,6 +200,12 @@ class WorkflowTemplate:
             # 如果配置客户端不可用，返回None
             return None
     
+    async def fetch_model_config(self, model_name: str) -> Optional[Dict[str, Any]]:
+        """获取模型配置，供调用方与其他准备步骤并行获取后传给 customize_workflow"""
+        if model_name == "qwen-outpainting":
+            return None
+        return await self._get_model_config_from_client(model_name)
+    
     async def _get_model_config_from_client(self, model_name: str) -> Optional[Dict[str, Any]]:
         """从配置客户端获取模型配置"""
         try:
@@ -295,16 +342,16 @@ class WorkflowTemplate:
             raise
     
     def _apply_parameters_to_workflow(self, workflow_template: Dict[str, Any], parameters: Dict[str, Any]) -> Dict[str, Any]:
-        """将参数应用到工作流模板"""
+        """将参数应用到工作流模板
+
+        模板按版本编译成注入计划，这里只做结构化克隆和按计划赋值。
+        """
         try:
-            workflow = workflow_template.copy()
-            
             # 获取参数
             description = parameters.get("description", "")
             size = parameters.get("size", "1024x1024")
             steps = parameters.get("steps", 20)
             seed = parameters.get("seed")
-            model_name = parameters.get("model", "")
             
             # 解析尺寸
             if "x" in size:
@@ -314,78 +361,22 @@ class WorkflowTemplate:
             
             print(f"🔧 应用参数到工作流: 描述={description[:50]}..., 尺寸={width}x{height}, 步数={steps}, 种子={seed}")
             
-            # 先显示所有节点类型
-            print(f"🔍 工作流节点类型:")
-            for node_id, node in workflow.items():
-                if isinstance(node, dict):
-                    class_type = node.get("class_type", "unknown")
-                    print(f"  节点 {node_id}: {class_type}")
-            
-            # 遍历工作流节点，应用参数
-            for node_id, node in workflow.items():
-                if not isinstance(node, dict):
-                    continue
-                    
-                class_type = node.get("class_type", "")
-                inputs = node.get("inputs", {})
-                
-                # 更新文本节点 - 支持更多节点类型
-                if class_type in ["CLIPTextEncode", "CLIPTextEncodeAdvanced"]:
-                    if "text" in inputs:
-                        old_text = inputs["text"]
-                        inputs["text"] = description
-                        print(f"✅ 更新文本节点 {node_id}: '{old_text[:30]}...' -> '{description[:30]}...'")
-                    else:
-                        print(f"⚠️ 文本节点 {node_id} 没有text字段")
-                elif "text" in inputs:
-                    # 检查其他可能包含文本的节点
-                    old_text = inputs["text"]
-                    inputs["text"] = description
-                    print(f"✅ 更新其他文本节点 {node_id} ({class_type}): '{old_text[:30]}...' -> '{description[:30]}...'")
-                
-                # 更新采样器节点 - 支持更多节点类型
-                elif class_type in ["KSampler", "KSamplerAdvanced", "SamplerCustom", "ModelSamplingAuraFlow"]:
-                    if "steps" in inputs:
-                        inputs["steps"] = steps
-                    if "seed" in inputs and seed is not None:
-                        inputs["seed"] = seed
-                    print(f"✅ 更新采样器节点 {node_id}: 步数={steps}, 种子={seed}")
-                
-                # 更新尺寸节点
-                elif class_type in ["EmptyLatentImage", "LatentUpscale", "LatentFromBatch"]:
-                    if "width" in inputs:
-                        inputs["width"] = width
-                    if "height" in inputs:
-                        inputs["height"] = height
-                    print(f"✅ 更新尺寸节点 {node_id}: {width}x{height}")
-                
-                # 更新模型加载器节点
-                elif class_type in ["CheckpointLoaderSimple", "UNETLoader", "CLIPLoader", "VAELoader", "DualCLIPLoader"]:
-                    # 这里可以根据模型名称更新模型文件
-                    print(f"✅ 保持模型节点 {node_id} 不变")
-                
-                # 特殊处理：Google-Gemini节点
-                elif class_type == "Google-Gemini":
-                    # Gemini节点可能有不同的参数结构
-                    if "prompt" in inputs:
-                        inputs["prompt"] = description
-                        print(f"✅ 更新Gemini节点 {node_id} prompt: '{description[:30]}...'")
-                    elif "text" in inputs:
-                        inputs["text"] = description
-                        print(f"✅ 更新Gemini节点 {node_id} text: '{description[:30]}...'")
-                    if "seed" in inputs and seed is not None:
-                        inputs["seed"] = seed
-                        print(f"✅ 更新Gemini节点 {node_id} seed: {seed}")
-                    if "steps" in inputs:
-                        inputs["steps"] = steps
-                        print(f"✅ 更新Gemini节点 {node_id} steps: {steps}")
+            plan = get_injection_plan(workflow_template)
+            values = {
+                "description": description,
+                "steps": steps,
+                "seed": seed,
+                "width": width,
+                "height": height,
+            }
+            workflow = plan.build(values, "workflow_template", _workflow_template_rules)
             
-            print(f"✅ 参数应用完成")
+            print(f"✅ 参数应用完成: 模板版本 {plan.version}, {len(plan.assignments('workflow_template', _workflow_template_rules))} 处注入")
             return workflow
             
         except Exception as e:
             print(f"❌ 应用参数失败: {e}")
-            return workflow_template.copy()
+            return clone_workflow(workflow_template) if isinstance(workflow_template, dict) else workflow_template
     
     async def customize_workflow_from_config(self, reference_image_path: str, description: str, 
                                            parameters: Dict[str, Any], model_name: str,
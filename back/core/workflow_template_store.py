@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作流模板本地缓存
+按admin的工作流清单（code、版本、sha256）增量同步模板：模板按内容sha256存放在本地磁盘，
+只有sha256变化的模板才会下载（gzip）和解析；启动时未变化的模板直接从磁盘加载。
+admin不可用时使用磁盘上的最后一份清单；admin不支持清单接口时退回到完整的工作流列表。
+请求经过admin熔断器（与配置客户端共享），admin熔断时不等待超时，直接使用本地清单。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from config.settings import ADMIN_BACKEND_URL, WORKFLOW_TEMPLATE_CACHE_DIR, WORKFLOW_MANIFEST_TTL
+from core.circuit_breaker import get_circuit_breaker
+
+MANIFEST_PATH = "/api/admin/config-sync/workflows/manifest"
+TEMPLATE_PATH = "/api/admin/config-sync/workflows/{code}/template"
+LEGACY_WORKFLOWS_PATH = "/api/admin/config-sync/workflows"
+REQUEST_TIMEOUT = 5
+
+
+class WorkflowTemplateStore:
+    """工作流模板存储：清单条件请求 + 按sha256寻址的磁盘缓存 + 已解析模板的内存缓存"""
+
+    def __init__(self, base_url: str = ADMIN_BACKEND_URL, cache_dir: Path = WORKFLOW_TEMPLATE_CACHE_DIR,
+                 manifest_ttl: float = WORKFLOW_MANIFEST_TTL):
+        self.base_url = base_url.rstrip("/")
+        self.cache_dir = Path(cache_dir)
+        self.manifest_ttl = manifest_ttl
+        # _lock 只保护清单和已解析模板的替换；网络请求和磁盘读写不持有该锁
+        self._lock = threading.Lock()
+        # 同一时间只有一个线程向admin确认清单
+        self._refresh_lock = threading.Lock()
+        # code -> 清单条目（工作流元数据 + version/sha256/size）
+        self._manifest: Optional[Dict[str, Dict[str, Any]]] = None
+        self._manifest_etag: Optional[str] = None
+        self._manifest_checked_at = 0.0
+        # sha256 -> 已解析的模板；同一内容始终返回同一对象，注入计划可以复用
+        self._templates: Dict[str, Any] = {}
+        self._admin_available = True
+        self._breaker = get_circuit_breaker("admin")
+        self._stats = {"manifest_requests": 0, "manifest_not_modified": 0,
+                       "downloads": 0, "disk_loads": 0, "legacy_loads": 0}
+
+    # ------------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------------
+
+    def load(self, code: str) -> Optional[Any]:
+        """获取工作流模板（workflow_json），工作流不存在时返回None"""
+        manifest = self._ensure_manifest()
+        if manifest is None:
+            return self._load_legacy(code)
+        entry = manifest.get(code)
+        if entry is None:
+            return None
+        return self._load_template(entry)
+
+    def load_workflows(self, refresh: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """清单中的全部工作流（附带 workflow_json），格式与 /config-sync/workflows 一致
+
+        Args:
+            refresh: 忽略清单的有效期，立即向admin确认
+
+        Returns:
+            无法向admin确认清单（admin不可达，或不支持清单接口）时返回None
+        """
+        manifest = self._ensure_manifest(force=refresh)
+        if manifest is None or not self._admin_available:
+            return None
+        return [{**entry, "workflow_json": self._load_template(entry)} for entry in manifest.values()]
+
+    def invalidate(self):
+        """下次访问时重新确认清单（配置变化通知到达时调用）"""
+        self._manifest_checked_at = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "manifest_entries": len(self._manifest) if self._manifest is not None else None,
+            "parsed_templates": len(self._templates),
+            "admin_available": self._admin_available,
+            **self._stats
+        }
+
+    # ------------------------------------------------------------------
+    # 清单
+    # ------------------------------------------------------------------
+
+    def _manifest_fresh(self) -> bool:
+        return self._manifest is not None and time.monotonic() - self._manifest_checked_at < self.manifest_ttl
+
+    def _ensure_manifest(self, force: bool = False) -> Optional[Dict[str, Dict[str, Any]]]:
+        if not force and self._manifest_fresh():
+            return self._manifest
+        # 其他线程正在确认清单时：已有清单就直接使用，不等待网络请求
+        if not self._refresh_lock.acquire(blocking=force or self._manifest is None):
+            return self._manifest
+        try:
+            if not force and self._manifest_fresh():
+                return self._manifest
+            try:
+                self._refresh_manifest()
+                if not self._admin_available:
+                    print("✅ admin工作流清单已恢复")
+                self._admin_available = True
+            except Exception as e:
+                if self._admin_available:
+                    print(f"⚠️ 获取工作流清单失败，使用本地缓存: {e}")
+                self._admin_available = False
+                # 失败后同样等待一个有效期再重试，避免每次构建都等待超时
+                self._manifest_checked_at = time.monotonic()
+                if self._manifest is None:
+                    self._load_disk_manifest()
+            return self._manifest
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh_manifest(self):
+        headers = {"If-None-Match": self._manifest_etag} if self._manifest_etag and self._manifest is not None else {}
+        self._stats["manifest_requests"] += 1
+        response = self._get(f"{self.base_url}{MANIFEST_PATH}", headers=headers)
+        if response.status_code == 304:
+            self._stats["manifest_not_modified"] += 1
+            self._manifest_checked_at = time.monotonic()
+            return
+        if response.status_code != 200:
+            raise Exception(f"状态码: {response.status_code}")
+
+        payload = response.json()
+        workflows = payload.get("workflows")
+        if not isinstance(workflows, list):
+            raise Exception("清单格式不正确")
+        with self._lock:
+            self._set_manifest(workflows, response.headers.get("ETag"))
+            self._manifest_checked_at = time.monotonic()
+        self._write_atomic(self.cache_dir / "manifest.json",
+                           json.dumps({"etag": self._manifest_etag, "workflows": workflows},
+                                      ensure_ascii=False).encode("utf-8"))
+        self._prune_disk()
+
+    def _set_manifest(self, workflows: List[Dict[str, Any]], etag: Optional[str]):
+        """替换清单（调用方持有 _lock）"""
+        self._manifest = {item["code"]: item for item in workflows if item.get("code") and item.get("sha256")}
+        self._manifest_etag = etag
+        # 只保留清单中仍在使用的已解析模板
+        in_use = {entry["sha256"] for entry in self._manifest.values()}
+        self._templates = {sha256: template for sha256, template in self._templates.items() if sha256 in in_use}
+
+    def _load_disk_manifest(self):
+        """admin不可达时使用磁盘上的最后一份清单（冷启动）"""
+        try:
+            with open(self.cache_dir / "manifest.json", "r", encoding="utf-8") as f:
+                data = json.load(f)
+            with self._lock:
+                self._set_manifest(data["workflows"], data.get("etag"))
+            print(f"📂 使用本地工作流清单: {len(self._manifest)} 个工作流")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ 本地工作流清单损坏: {e}")
+
+    # ------------------------------------------------------------------
+    # 模板
+    # ------------------------------------------------------------------
+
+    def _load_template(self, entry: Dict[str, Any]) -> Any:
+        """内存 -> 磁盘 -> admin，按sha256寻址（读取和下载不持有锁）"""
+        sha256 = entry["sha256"]
+        template = self._templates.get(sha256)
+        if template is not None:
+            return template
+
+        path = self.cache_dir / f"{sha256}.json"
+        body = self._read_verified(path, sha256)
+        if body is not None:
+            self._stats["disk_loads"] += 1
+        else:
+            body = self._download_template(entry["code"], sha256)
+            self._write_atomic(path, body)
+
+        template = json.loads(body)
+        with self._lock:
+            # 并发加载同一模板时保留先写入的对象
+            return self._templates.setdefault(sha256, template)
+
+    def _download_template(self, code: str, sha256: str) -> bytes:
+        url = f"{self.base_url}{TEMPLATE_PATH.format(code=code)}"
+        response = self._get(url, headers={"Accept-Encoding": "gzip"})
+        if response.status_code != 200:
+            raise Exception(f"下载工作流模板失败: {code}, 状态码: {response.status_code}")
+        body = response.content
+        if hashlib.sha256(body).hexdigest() != sha256:
+            # 下载期间模板被修改，下次确认清单后重新下载
+            self.invalidate()
+            raise Exception(f"工作流模板内容与清单不一致: {code}")
+        self._stats["downloads"] += 1
+        print(f"⬇️ 已下载工作流模板: {code} ({len(body)} 字节)")
+        return body
+
+    @staticmethod
+    def _read_verified(path: Path, sha256: str) -> Optional[bytes]:
+        try:
+            body = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        return body if hashlib.sha256(body).hexdigest() == sha256 else None
+
+    def _load_legacy(self, code: str) -> Optional[Any]:
+        """admin不支持清单接口且没有本地清单时，从完整的工作流列表中查找"""
+        response = self._get(f"{self.base_url}{LEGACY_WORKFLOWS_PATH}")
+        if response.status_code != 200:
+            raise Exception(f"admin API调用失败: {response.status_code}")
+        self._stats["legacy_loads"] += 1
+        for workflow in response.json().get("workflows", []):
+            if workflow.get("code") == code:
+                return workflow.get("workflow_json")
+        return None
+
+    def _get(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """经过admin熔断器的GET请求；熔断时抛出 CircuitOpenError"""
+        with self._breaker.guard() as attempt:
+            response = requests.get(url, headers=headers or {}, timeout=REQUEST_TIMEOUT)
+            if response.status_code >= 500:
+                attempt.fail()
+            return response
+
+    # ------------------------------------------------------------------
+    # 磁盘
+    # ------------------------------------------------------------------
+
+    def _write_atomic(self, path: Path, body: bytes):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 写入工作流模板缓存失败: {e}")
+
+    def _prune_disk(self):
+        """删除清单中已不再引用的模板文件"""
+        in_use = {f"{entry['sha256']}.json" for entry in self._manifest.values()}
+        try:
+            for path in self.cache_dir.glob("*.json"):
+                if path.name != "manifest.json" and path.name not in in_use:
+                    path.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+
+# 全局工作流模板存储
+_workflow_template_store: Optional[WorkflowTemplateStore] = None
+
+
+def get_workflow_template_store() -> WorkflowTemplateStore:
+    """获取全局工作流模板存储实例"""
+    global _workflow_template_store
+    if _workflow_template_store is None:
+        _workflow_template_store = WorkflowTemplateStore()
+    return _workflow_template_store
@@ -6,7 +6,9 @@
 """
 
 import json
+import os
 import random
+import threading
 from abc import ABC, abstractmethod
 from pathlib import Path
 from typing import Any, Dict, List, Optional
@@ -27,7 +29,61 @@ class BaseWorkflow(ABC):
             model_config: 模型配置对象
         """
         self.model_config = model_config
-    
+        self._template_plan = None
+
+    def _instantiate_template(self, workflow_json) -> Dict[str, Any]:
+        """按注入计划克隆工作流模板
+
+        模板按版本只解析/编译一次，返回的副本不与缓存或其他请求共享嵌套字典。
+
+        Args:
+            workflow_json: admin 返回的 workflow_json（字符串或字典）
+
+        Returns:
+            可修改的工作流字典
+        """
+        from core.workflow_plan import get_injection_plan
+
+        self._template_plan = get_injection_plan(workflow_json)
+        return self._template_plan.instantiate()
+
+    def _load_admin_template(self, code: str) -> Optional[Dict[str, Any]]:
+        """按 code 加载admin工作流模板并克隆，工作流不存在时返回None
+
+        模板来自本地按sha256寻址的缓存，只有admin上变化的模板才会重新下载。
+        """
+        from core.workflow_template_store import get_workflow_template_store
+
+        workflow_json = get_workflow_template_store().load(code)
+        if not workflow_json:
+            return None
+        return self._instantiate_template(workflow_json)
+
+    def _instantiate_file_template(self, template_path) -> Dict[str, Any]:
+        """按注入计划克隆本地工作流文件"""
+        from core.workflow_plan import get_file_injection_plan
+
+        self._template_plan = get_file_injection_plan(template_path)
+        return self._template_plan.instantiate()
+
+    def _plan_for(self, workflow: Dict[str, Any]):
+        """当前工作流的注入计划；工作流不是由模板克隆的（没有计划）时按当前内容临时编译，不进入缓存"""
+        if self._template_plan is not None:
+            return self._template_plan
+        from core.workflow_plan import InjectionPlan
+
+        return InjectionPlan(workflow, "adhoc")
+
+    def _find_nodes(self, workflow: Dict[str, Any], class_type: str) -> List[str]:
+        """查找指定类型的节点ID
+
+        有注入计划时直接使用编译好的索引（仅包含模板中的节点），否则遍历工作流。
+        """
+        if self._template_plan is not None:
+            return [node_id for node_id in self._template_plan.nodes_of(class_type) if node_id in workflow]
+        return [node_id for node_id, node in workflow.items()
+                if isinstance(node, dict) and node.get("class_type") == class_type]
+
     @abstractmethod
     def create_workflow(self, reference_image_path: str, description: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """创建工作流
@@ -169,6 +225,12 @@ class BaseWorkflow(ABC):
             width = target_width if target_width is not None else TARGET_IMAGE_WIDTH
             height = target_height if target_height is not None else TARGET_IMAGE_HEIGHT
             
+            # 同一任务的多次生成共用预处理结果：已是最新且尺寸一致时不再重写
+            # （前一张图片可能正在被ComfyUI读取）
+            if self._is_processed_reference_current(source_file, dest_file, width, height):
+                print(f"♻️ 复用已处理的参考图: {dest_file}")
+                return f"{source_file.name} [output]"
+            
             # 压缩图像到目标尺寸
             with Image.open(source_file) as img:
                 if img.mode != 'RGB':
@@ -179,7 +241,10 @@ class BaseWorkflow(ABC):
                 background = Image.new('RGB', (width, height), (255, 255, 255))
                 offset = ((width - img.width) // 2, (height - img.height) // 2)
                 background.paste(img, offset)
-                background.save(dest_file, 'PNG')
+                # 先写临时文件再替换，避免ComfyUI读到写了一半的文件
+                temp_file = dest_file.with_name(f".{dest_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                background.save(temp_file, 'PNG')
+                os.replace(temp_file, dest_file)
             
             print(f"✅ 参考图压缩到{width}x{height}并保存成功: {source_file} -> {dest_file}")
             return f"{source_file.name} [output]"
@@ -188,6 +253,18 @@ class BaseWorkflow(ABC):
             print(f"❌ 参考图处理失败: {e}")
             return None
     
+    @staticmethod
+    def _is_processed_reference_current(source_file: Path, dest_file: Path, width: int, height: int) -> bool:
+        """预处理结果是否存在、不早于原图且为目标尺寸"""
+        try:
+            if dest_file.stat().st_mtime_ns < source_file.stat().st_mtime_ns:
+                return False
+            from PIL import Image
+            with Image.open(dest_file) as img:
+                return img.size == (width, height)
+        except (OSError, ValueError):
+            return False
+    
     def _get_image_dimensions(self, parameters: Dict[str, Any]) -> tuple:
         """获取图像尺寸
         
@@ -10,7 +10,7 @@ from typing import Any, Dict
 
 from config.settings import (
     TARGET_IMAGE_WIDTH, TARGET_IMAGE_HEIGHT, 
-    DEFAULT_STEPS, DEFAULT_COUNT, ADMIN_BACKEND_URL
+    DEFAULT_STEPS, DEFAULT_COUNT
 )
 
 from .base_workflow import BaseWorkflow
@@ -138,27 +138,10 @@ class FluxWorkflow(BaseWorkflow):
                 - "flux_image_to_image_workflow": 图生图工作流
         """
         try:
-            import requests
-            import json
-            
-            # 通过admin API获取工作流配置
-            admin_url = f"{ADMIN_BACKEND_URL}/api/admin/config-sync/workflows"
-            response = requests.get(admin_url, timeout=5)
-            
-            if response.status_code != 200:
-                raise Exception(f"admin API调用失败: {response.status_code}")
-            
-            data = response.json()
-            workflows = data.get("workflows", [])
-            
-            # 查找指定类型的flux工作流
-            for workflow_data in workflows:
-                if workflow_data.get("code") == workflow_type:
-                    workflow_json = workflow_data.get("workflow_json")
-                    if workflow_json:
-                        workflow = json.loads(workflow_json) if isinstance(workflow_json, str) else workflow_json
-                        print(f"✅ 通过admin API加载Flux工作流模板: {workflow_type}")
-                        return workflow
+            workflow = self._load_admin_template(workflow_type)
+            if workflow is not None:
+                print(f"✅ 通过admin API加载Flux工作流模板: {workflow_type}")
+                return workflow
             
             raise ValueError(f"admin API中未找到Flux工作流: {workflow_type}")
             
@@ -193,90 +176,67 @@ class FluxWorkflow(BaseWorkflow):
             
             print(f"🎨 配置LoRA {i+1}: {lora['name']} (强度: {lora['strength_model']})")
         
-        # 更新工作流中的LoRA堆栈节点
-        if "74" in workflow:
-            workflow["74"]["inputs"].update(lora_config)
-            print(f"✅ LoRA堆栈配置完成")
+        # 更新工作流中的LoRA堆栈节点（默认节点74，否则使用注入计划中的拼接点）
+        lora_node_id = "74" if "74" in workflow else next(iter(self._plan_for(workflow).lora_stacks), None)
+        if lora_node_id in workflow:
+            workflow[lora_node_id]["inputs"].update(lora_config)
+            print(f"✅ LoRA堆栈配置完成: 节点{lora_node_id}")
         
         return workflow
     
     def _process_template_variables(self, workflow: Dict[str, Any], description: str, parameters: Dict[str, Any], width: int, height: int, processed_image_path: str = None) -> Dict[str, Any]:
-        """处理模板变量替换"""
+        """处理模板变量替换
+
+        只访问注入计划中预先编译的模板变量位置和LoadImage节点，不再遍历整张图。
+        """
         # 获取种子
         seed = parameters.get("seed", random.randint(1, 2**31 - 1))
         
-        # 遍历工作流节点，处理模板变量
-        for node_id, node in workflow.items():
-            if not isinstance(node, dict):
+        # 参考图像文件名（不包含路径，移除 [output] 后缀）
+        filename = None
+        if processed_image_path:
+            # 处理processed_image_path可能是列表的情况
+            image_path = processed_image_path[0] if isinstance(processed_image_path, list) else processed_image_path
+            filename = image_path.split('/')[-1] if '/' in image_path else image_path.split('\\')[-1]
+            if filename.endswith(' [output]'):
+                filename = filename[:-9]  # 移除 " [output]"
+        
+        replacements = {
+            "description": description,
+            "seed": str(seed),
+            "width": str(width),
+            "height": str(height),
+        }
+        if filename:
+            replacements["reference_image"] = filename
+        
+        plan = self._plan_for(workflow)
+        for node_id, key, names in plan.placeholders:
+            inputs = workflow[node_id]["inputs"]
+            value = inputs.get(key)
+            # LoRA堆栈可能已经覆盖了占位符
+            if not isinstance(value, str):
                 continue
-                
-            inputs = node.get("inputs", {})
             
-            # 处理文本字段中的模板变量
-            for key, value in inputs.items():
-                if isinstance(value, str):
-                    # 替换描述
-                    if "{{description}}" in value:
-                        inputs[key] = value.replace("{{description}}", description)
-                        print(f"✅ 替换描述: {node_id}.{key}")
-                    
-                    # 替换种子
-                    if "{{seed}}" in value:
-                        inputs[key] = value.replace("{{seed}}", str(seed))
-                        print(f"✅ 替换种子: {node_id}.{key} = {seed}")
-                    
-                    # 替换尺寸
-                    if "{{width}}" in value:
-                        inputs[key] = value.replace("{{width}}", str(width))
-                        print(f"✅ 替换宽度: {node_id}.{key} = {width}")
-                    
-                    if "{{height}}" in value:
-                        inputs[key] = value.replace("{{height}}", str(height))
-                        print(f"✅ 替换高度: {node_id}.{key} = {height}")
-                    
-                    # 替换参考图像路径
-                    if "{{reference_image}}" in value and processed_image_path:
-                        # 处理processed_image_path可能是列表的情况
-                        if isinstance(processed_image_path, list):
-                            # 如果是列表，取第一个元素
-                            image_path = processed_image_path[0]
-                        else:
-                            image_path = processed_image_path
-                        
-                        # 获取文件名（不包含路径）
-                        filename = image_path.split('/')[-1] if '/' in image_path else image_path.split('\\')[-1]
-                        # 移除 [output] 后缀
-                        if filename.endswith(' [output]'):
-                            filename = filename[:-9]  # 移除 " [output]"
-                        inputs[key] = value.replace("{{reference_image}}", filename)
-                        print(f"✅ 替换参考图像: {node_id}.{key} = {filename}")
-                    
-                    # 处理LoadImage节点的硬编码图像路径
-                    if processed_image_path and node.get("class_type") == "LoadImage" and key == "image":
-                        # 处理processed_image_path可能是列表的情况
-                        if isinstance(processed_image_path, list):
-                            # 如果是列表，取第一个元素
-                            image_path = processed_image_path[0]
-                        else:
-                            image_path = processed_image_path
-                        
-                        # 获取文件名（不包含路径）
-                        filename = image_path.split('/')[-1] if '/' in image_path else image_path.split('\\')[-1]
-                        # 移除 [output] 后缀
-                        if filename.endswith(' [output]'):
-                            filename = filename[:-9]  # 移除 " [output]"
-                        inputs[key] = filename
-                        print(f"✅ 更新LoadImage节点图像路径: {node_id}.{key} = {filename}")
-                    
-                    # 替换LoRA配置
-                    for i in range(1, 5):
-                        lora_key = f"{{lora_{i:02d}}}"
-                        strength_key = f"{{strength_{i:02d}}}"
-                        
-                        if lora_key in value:
-                            inputs[key] = value.replace(lora_key, "None")
-                        if strength_key in value:
-                            inputs[key] = value.replace(strength_key, "1.0")
+            for name in names:
+                if name in replacements:
+                    value = value.replace(f"{{{{{name}}}}}", replacements[name])
+                    print(f"✅ 替换{name}: {node_id}.{key}")
+            
+            # 替换LoRA配置
+            for i in range(1, 5):
+                value = value.replace(f"{{lora_{i:02d}}}", "None")
+                value = value.replace(f"{{strength_{i:02d}}}", "1.0")
+            
+            inputs[key] = value
+        
+        # 处理LoadImage节点的硬编码图像路径
+        if filename:
+            for node_id in plan.nodes_of("LoadImage"):
+                inputs = workflow[node_id]["inputs"]
+                if isinstance(inputs.get("image"), str):
+                    inputs["image"] = filename
+                    print(f"✅ 更新LoadImage节点图像路径: {node_id}.image = {filename}")
         
         return workflow
     
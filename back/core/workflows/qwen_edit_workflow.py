@@ -5,13 +5,11 @@ Qwen-Edit局部重绘工作流实现
 专门处理Qwen-Edit模型的局部重绘功能
 """
 
-import json
 import os
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from .base_workflow import BaseWorkflow
-from config.settings import ADMIN_BACKEND_URL
 
 
 class QwenEditWorkflow(BaseWorkflow):
@@ -65,6 +63,9 @@ class QwenEditWorkflow(BaseWorkflow):
         # 更新采样参数
         workflow = self._update_sampling_parameters(workflow, parameters)
         
+        # 更新扩散分辨率
+        workflow = self._update_target_size(workflow, parameters)
+        
         # 更新保存路径
         workflow = self._update_save_path(workflow, task_id)
         
@@ -89,29 +90,12 @@ class QwenEditWorkflow(BaseWorkflow):
     def _load_qwen_edit_template(self) -> Dict[str, Any]:
         """通过admin API加载Qwen-Edit工作流模板"""
         try:
-            import requests
-            import json
-            
             print(f"🔍 通过admin API加载Qwen-Edit工作流模板")
             
-            # 通过admin API获取工作流配置
-            admin_url = f"{ADMIN_BACKEND_URL}/api/admin/config-sync/workflows"
-            response = requests.get(admin_url, timeout=5)
-            
-            if response.status_code != 200:
-                raise Exception(f"admin API调用失败: {response.status_code}")
-            
-            data = response.json()
-            workflows = data.get("workflows", [])
-            
-            # 查找Qwen-Edit工作流
-            for workflow_data in workflows:
-                if workflow_data.get("code") == "qwen_edit_inpainting":
-                    workflow_json = workflow_data.get("workflow_json")
-                    if workflow_json:
-                        workflow = json.loads(workflow_json) if isinstance(workflow_json, str) else workflow_json
-                        print(f"✅ 通过admin API加载Qwen-Edit工作流模板")
-                        return workflow
+            workflow = self._load_admin_template("qwen_edit_inpainting")
+            if workflow is not None:
+                print(f"✅ 通过admin API加载Qwen-Edit工作流模板")
+                return workflow
             
             # 如果admin API中没有找到，使用本地模板
             print(f"⚠️ admin API中未找到Qwen-Edit工作流，使用本地模板")
@@ -131,8 +115,7 @@ class QwenEditWorkflow(BaseWorkflow):
             workflow_file = Path(__file__).parent.parent.parent / "workflows" / "cgmi_qwen_inpainting_workflow.json"
             if workflow_file.exists():
                 print(f"✅ 找到CG迷工作流模板: {workflow_file}")
-                with open(workflow_file, 'r', encoding='utf-8') as f:
-                    workflow = json.load(f)
+                workflow = self._instantiate_file_template(workflow_file)
                 print(f"✅ 成功加载CG迷工作流模板")
                 return workflow
             else:
@@ -386,28 +369,36 @@ class QwenEditWorkflow(BaseWorkflow):
     
     
     
+    def _update_target_size(self, workflow: Dict[str, Any], parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """更新扩散分辨率（节点74按最长边缩放图像和遮罩）"""
+        target_size = parameters.get("target_size")
+        if "74" in workflow and target_size:
+            workflow["74"]["inputs"]["scale_to_length"] = int(target_size)
+            print(f"✅ 更新扩散边长 (节点74): {target_size}")
+        return workflow
+    
     def _update_save_path(self, workflow: Dict[str, Any], task_id: str = None) -> Dict[str, Any]:
         """更新保存路径"""
         print(f"🔧 开始更新保存路径，任务ID: {task_id}")
         
         # 查找保存节点并更新路径
         save_image_found = False
-        for node_id, node_data in workflow.items():
-            if node_data.get("class_type") == "SaveImage":
-                save_image_found = True
-                print(f"📁 找到SaveImage节点: {node_id}")
-                print(f"📋 当前filename_prefix: {node_data.get('inputs', {}).get('filename_prefix', '未设置')}")
-                
-                if task_id:
-                    # 使用任务ID作为文件名前缀，确保唯一性
-                    filename_prefix = f"qwen-edit-{task_id[:8]}"  # 使用任务ID的前8位
-                    node_data["inputs"]["filename_prefix"] = filename_prefix
-                    print(f"✅ 更新保存路径为: {filename_prefix}")
-                else:
-                    # 如果没有任务ID，使用默认前缀
-                    node_data["inputs"]["filename_prefix"] = "pl-qwen-edit"
-                    print(f"✅ 更新保存路径为: pl-qwen-edit")
-                break
+        for node_id in self._find_nodes(workflow, "SaveImage"):
+            node_data = workflow[node_id]
+            save_image_found = True
+            print(f"📁 找到SaveImage节点: {node_id}")
+            print(f"📋 当前filename_prefix: {node_data.get('inputs', {}).get('filename_prefix', '未设置')}")
+            
+            if task_id:
+                # 使用任务ID作为文件名前缀，确保唯一性
+                filename_prefix = f"qwen-edit-{task_id[:8]}"  # 使用任务ID的前8位
+                node_data["inputs"]["filename_prefix"] = filename_prefix
+                print(f"✅ 更新保存路径为: {filename_prefix}")
+            else:
+                # 如果没有任务ID，使用默认前缀
+                node_data["inputs"]["filename_prefix"] = "pl-qwen-edit"
+                print(f"✅ 更新保存路径为: pl-qwen-edit")
+            break
         
         if not save_image_found:
             print(f"⚠️ 未找到SaveImage节点")
@@ -5,13 +5,11 @@ Qwen多图融合工作流实现
 专门处理Qwen模型的多图融合功能
 """
 
-import json
 import os
 from pathlib import Path
 from typing import Any, Dict, List
 
 from .base_workflow import BaseWorkflow
-from config.settings import ADMIN_BACKEND_URL
 
 
 class QwenFusionWorkflow(BaseWorkflow):
@@ -86,9 +84,6 @@ class QwenFusionWorkflow(BaseWorkflow):
     def _load_fusion_template(self, image_count: int) -> Dict[str, Any]:
         """通过admin API加载对应的工作流模板"""
         try:
-            import requests
-            import json
-            
             # 根据图片数量选择对应的工作流名称
             if image_count == 2:
                 workflow_name = "qwen_fusion_2image_fusion"
@@ -99,24 +94,10 @@ class QwenFusionWorkflow(BaseWorkflow):
             
             print(f"🔍 通过admin API加载工作流模板: {workflow_name}")
             
-            # 通过admin API获取工作流配置
-            admin_url = f"{ADMIN_BACKEND_URL}/api/admin/config-sync/workflows"
-            response = requests.get(admin_url, timeout=5)
-            
-            if response.status_code != 200:
-                raise Exception(f"admin API调用失败: {response.status_code}")
-            
-            data = response.json()
-            workflows = data.get("workflows", [])
-            
-            # 查找对应的工作流
-            for workflow_data in workflows:
-                if workflow_data.get("code") == workflow_name:
-                    workflow_json = workflow_data.get("workflow_json")
-                    if workflow_json:
-                        workflow = json.loads(workflow_json) if isinstance(workflow_json, str) else workflow_json
-                        print(f"✅ 通过admin API加载Qwen多图融合工作流模板: {workflow_name} (支持{image_count}张图片)")
-                        return workflow
+            workflow = self._load_admin_template(workflow_name)
+            if workflow is not None:
+                print(f"✅ 通过admin API加载Qwen多图融合工作流模板: {workflow_name} (支持{image_count}张图片)")
+                return workflow
             
             raise ValueError(f"admin API中未找到工作流: {workflow_name}")
             
@@ -138,10 +119,7 @@ class QwenFusionWorkflow(BaseWorkflow):
         print(f"📸 为Qwen多图融合工作流更新 {len(image_paths)} 张图像路径")
         
         # 动态查找LoadImage节点
-        load_image_nodes = []
-        for node_id, node_data in workflow.items():
-            if node_data.get("class_type") == "LoadImage":
-                load_image_nodes.append(node_id)
+        load_image_nodes = self._find_nodes(workflow, "LoadImage")
         
         # 按节点ID排序，确保顺序一致
         load_image_nodes.sort()
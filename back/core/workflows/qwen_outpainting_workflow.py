@@ -5,16 +5,35 @@ Qwen扩图工作流实现
 专门处理Qwen模型的扩图功能
 """
 
-import json
 import os
 import shutil
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from .base_workflow import BaseWorkflow
+from core.workflow_plan import get_file_injection_plan
 from config.settings import ADMIN_BACKEND_URL
 
 
+def outpaint_padding(parameters: Dict[str, Any]) -> Tuple[int, int, int, int]:
+    """根据扩图区域计算四个方向的扩展像素 (left, top, right, bottom)
+    
+    expansion_x, expansion_y 是扩图区域相对于原图的位置，为负数时向左/上扩图
+    """
+    original_width = parameters.get("original_width", 512)
+    original_height = parameters.get("original_height", 512)
+    expansion_width = parameters.get("expansion_width", 1024)
+    expansion_height = parameters.get("expansion_height", 1024)
+    expansion_x = parameters.get("expansion_x", 0)
+    expansion_y = parameters.get("expansion_y", 0)
+    
+    left = max(0, -expansion_x)  # 向左扩图：expansion_x为负数时
+    top = max(0, -expansion_y)   # 向上扩图：expansion_y为负数时
+    right = max(0, expansion_x + expansion_width - original_width)   # 向右扩图
+    bottom = max(0, expansion_y + expansion_height - original_height) # 向下扩图
+    return left, top, right, bottom
+
+
 class QwenOutpaintingWorkflow:
     """Qwen扩图工作流创建器 - 直接使用内置工作流文件"""
     
@@ -61,6 +80,9 @@ class QwenOutpaintingWorkflow:
         # 更新扩图参数
         workflow = self._update_outpainting_parameters(workflow, parameters)
         
+        # 更新扩散分辨率（分条扩图按条带尺寸选择）
+        workflow = self._update_diffusion_size(workflow, parameters)
+        
         # 更新保存路径
         workflow = self._update_save_path(workflow)
         
@@ -87,8 +109,8 @@ class QwenOutpaintingWorkflow:
             template_path = Path(__file__).parent.parent.parent / "workflows" / "qwen_outpainting_workflow.json"
             
             if template_path.exists():
-                with open(template_path, 'r', encoding='utf-8') as f:
-                    workflow = json.load(f)
+                # 模板按文件版本编译一次，每次返回独立副本
+                workflow = get_file_injection_plan(template_path).instantiate()
                 print(f"✅ 加载扩图工作流模板成功: {template_path}")
                 return workflow
             else:
@@ -148,31 +170,19 @@ class QwenOutpaintingWorkflow:
     def _update_outpainting_parameters(self, workflow: Dict[str, Any], parameters: Dict[str, Any]) -> Dict[str, Any]:
         """更新扩图参数"""
         try:
-            # 获取扩图参数
-            original_width = parameters.get("original_width", 512)
-            original_height = parameters.get("original_height", 512)
-            expansion_width = parameters.get("expansion_width", 1024)
-            expansion_height = parameters.get("expansion_height", 1024)
-            expansion_x = parameters.get("expansion_x", 0)
-            expansion_y = parameters.get("expansion_y", 0)
-            
-            print(f"🔧 扩图参数: 原图({original_width}x{original_height}), 扩图区域({expansion_width}x{expansion_height}), 位置({expansion_x},{expansion_y})")
+            # 分条扩图直接传入条带的扩展像素，否则按扩图区域计算
+            if parameters.get("padding"):
+                left, top, right, bottom = parameters["padding"]
+                print(f"🔧 条带扩图参数: left={left}, top={top}, right={right}, bottom={bottom}")
+            else:
+                print(f"🔧 扩图参数: 原图({parameters.get('original_width', 512)}x{parameters.get('original_height', 512)}), "
+                      f"扩图区域({parameters.get('expansion_width', 1024)}x{parameters.get('expansion_height', 1024)}), "
+                      f"位置({parameters.get('expansion_x', 0)},{parameters.get('expansion_y', 0)})")
+                left, top, right, bottom = outpaint_padding(parameters)
             
             # 更新外补画板节点12（ImagePadForOutpaint）
             if "12" in workflow:
-                # 计算扩图区域的边界
-                # expansion_x, expansion_y 是扩图区域相对于原图的位置
-                # 需要计算left, top, right, bottom
-                
-                # 直接计算ImagePadForOutpaint的四个边界参数
                 # 这些参数表示在图像的四个方向添加多少像素
-                
-                # 计算四个方向的扩图像素数
-                left = max(0, -expansion_x)  # 向左扩图：expansion_x为负数时
-                top = max(0, -expansion_y)   # 向上扩图：expansion_y为负数时
-                right = max(0, expansion_x + expansion_width - original_width)   # 向右扩图
-                bottom = max(0, expansion_y + expansion_height - original_height) # 向下扩图
-                
                 # 更新外补画板参数
                 workflow["12"]["inputs"]["left"] = left
                 workflow["12"]["inputs"]["top"] = top
@@ -183,14 +193,24 @@ class QwenOutpaintingWorkflow:
             else:
                 print(f"⚠️ 未找到外补画板节点12")
             
-            # 图像缩放节点31使用工作流默认配置，不需要动态修改
-            
             return workflow
             
         except Exception as e:
             print(f"❌ 更新扩图参数失败: {e}")
             raise
     
+    def _update_diffusion_size(self, workflow: Dict[str, Any], parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """更新扩散分辨率（节点31按最长边缩放外补后的图像）
+        
+        未指定时使用工作流默认配置；指定值不超过模板默认边长
+        """
+        diffusion_size = parameters.get("diffusion_size")
+        if "31" in workflow and diffusion_size:
+            diffusion_size = min(int(diffusion_size), workflow["31"]["inputs"]["scale_to_length"])
+            workflow["31"]["inputs"]["scale_to_length"] = diffusion_size
+            print(f"✅ 更新扩散边长 (节点31): {diffusion_size}")
+        return workflow
+    
     def _update_save_path(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
         """更新保存路径"""
         try:
@@ -5,11 +5,9 @@ Qwen工作流实现
 专门处理Qwen模型的工作流创建
 """
 
-import json
 from typing import Any, Dict
 
 from .base_workflow import BaseWorkflow
-from config.settings import ADMIN_BACKEND_URL
 
 
 class QwenWorkflow(BaseWorkflow):
@@ -139,27 +137,10 @@ class QwenWorkflow(BaseWorkflow):
     def _load_workflow_template(self) -> Dict[str, Any]:
         """通过admin API加载工作流模板"""
         try:
-            import requests
-            import json
-            
-            # 通过admin API获取工作流配置
-            admin_url = f"{ADMIN_BACKEND_URL}/api/admin/config-sync/workflows"
-            response = requests.get(admin_url, timeout=5)
-            
-            if response.status_code != 200:
-                raise Exception(f"admin API调用失败: {response.status_code}")
-            
-            data = response.json()
-            workflows = data.get("workflows", [])
-            
-            # 查找Qwen工作流
-            for workflow_data in workflows:
-                if workflow_data.get("code") == "qwen_image_generation_workflow":
-                    workflow_json = workflow_data.get("workflow_json")
-                    if workflow_json:
-                        workflow = json.loads(workflow_json) if isinstance(workflow_json, str) else workflow_json
-                        print(f"✅ 通过admin API加载Qwen工作流模板: qwen_image_generation_workflow")
-                        return workflow
+            workflow = self._load_admin_template("qwen_image_generation_workflow")
+            if workflow is not None:
+                print(f"✅ 通过admin API加载Qwen工作流模板: qwen_image_generation_workflow")
+                return workflow
             
             raise ValueError(f"admin API中未找到Qwen工作流: qwen_image_generation_workflow")
             
@@ -5,12 +5,10 @@ Seedream4 Volcano Engine工作流实现
 专门处理Seedream4模型的图像融合工作流创建
 """
 
-import json
 import random
 from typing import Any, Dict, List, Optional
 
 from .base_workflow import BaseWorkflow
-from config.settings import ADMIN_BACKEND_URL
 
 
 class Seedream4Workflow(BaseWorkflow):
@@ -104,42 +102,12 @@ class Seedream4Workflow(BaseWorkflow):
     def _load_workflow_template(self) -> Dict[str, Any]:
         """从admin数据库加载Seedream4工作流模板"""
         try:
-            # 尝试从配置客户端获取工作流模板
-            from core.config_client import get_config_client
-            config_client = get_config_client()
-            if config_client:
-                # 检查缓存中是否有工作流配置
-                if hasattr(config_client, '_cache') and 'workflows' in config_client._cache:
-                    config = config_client._cache['workflows']
-                    print("✅ 从配置客户端缓存加载工作流模板")
-                else:
-                    # 如果没有缓存，尝试直接调用admin API
-                    print("⚠️ 配置客户端无缓存，直接调用admin API...")
-                    try:
-                        import requests
-                        admin_url = f"{ADMIN_BACKEND_URL}/api/admin/config-sync/workflows"
-                        response = requests.get(admin_url, timeout=5)
-                        if response.status_code == 200:
-                            config = response.json()
-                            print("✅ 直接调用admin API成功")
-                        else:
-                            raise Exception(f"admin API调用失败: {response.status_code}")
-                    except Exception as api_error:
-                        print(f"⚠️ admin API调用异常: {api_error}")
-                        raise
-                
-                workflows = config.get("workflows", [])
-                print(f"📋 找到 {len(workflows)} 个工作流配置")
-                
-                # 查找Seedream4工作流
-                for workflow in workflows:
-                    if workflow.get("code") == "seedream4_volcano_engine":
-                        workflow_json = workflow.get("workflow_json")
-                        if workflow_json:
-                            print(f"✅ 通过admin API加载Seedream4工作流模板: seedream4_volcano_engine")
-                            return json.loads(workflow_json) if isinstance(workflow_json, str) else workflow_json
-                
-                raise ValueError(f"admin API中未找到Seedream4工作流: seedream4_volcano_engine")
+            workflow = self._load_admin_template("seedream4_volcano_engine")
+            if workflow is not None:
+                print(f"✅ 通过admin API加载Seedream4工作流模板: seedream4_volcano_engine")
+                return workflow
+            
+            raise ValueError(f"admin API中未找到Seedream4工作流: seedream4_volcano_engine")
         except Exception as e:
             print(f"❌ 从admin数据库加载工作流模板失败: {e}")
             raise
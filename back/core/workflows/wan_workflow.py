@@ -5,13 +5,12 @@ Wan2.2视频工作流创建器
 基于Wan2.2模型实现图像到视频的生成
 """
 
-import json
 import random
 from pathlib import Path
 from typing import Any, Dict, List
 
 from .base_workflow import BaseWorkflow
-from config.settings import TARGET_IMAGE_WIDTH, TARGET_IMAGE_HEIGHT, ADMIN_BACKEND_URL
+from config.settings import TARGET_IMAGE_WIDTH, TARGET_IMAGE_HEIGHT
 
 
 class WanWorkflow(BaseWorkflow):
@@ -68,27 +67,10 @@ class WanWorkflow(BaseWorkflow):
     def _load_workflow_template(self) -> Dict[str, Any]:
         """通过admin API加载工作流模板"""
         try:
-            import requests
-            import json
-            
-            # 通过admin API获取工作流配置
-            admin_url = f"{ADMIN_BACKEND_URL}/api/admin/config-sync/workflows"
-            response = requests.get(admin_url, timeout=5)
-            
-            if response.status_code != 200:
-                raise Exception(f"admin API调用失败: {response.status_code}")
-            
-            data = response.json()
-            workflows = data.get("workflows", [])
-            
-            # 查找WAN工作流
-            for workflow_data in workflows:
-                if workflow_data.get("code") == "wan2.2_video_generation_workflow":
-                    workflow_json = workflow_data.get("workflow_json")
-                    if workflow_json:
-                        workflow = json.loads(workflow_json) if isinstance(workflow_json, str) else workflow_json
-                        print(f"✅ 通过admin API加载WAN工作流模板: wan2.2_video_generation_workflow")
-                        return workflow
+            workflow = self._load_admin_template("wan2.2_video_generation_workflow")
+            if workflow is not None:
+                print(f"✅ 通过admin API加载WAN工作流模板: wan2.2_video_generation_workflow")
+                return workflow
             
             raise ValueError(f"admin API中未找到WAN工作流: wan2.2_video_generation_workflow")
             
@@ -5,6 +5,7 @@ YeePay AI图像生成服务 - 后端主程序
 支持Flux Kontext模型，提供图像生成、历史管理、收藏等功能
 """
 
+import asyncio
 import json
 import os
 import uuid
@@ -15,26 +16,32 @@ from typing import Any, Dict, Optional, List
 import aiofiles
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 # 导入配置和模型
 from config.settings import (
     COMFYUI_URL, UPLOAD_DIR, OUTPUT_DIR, DB_PATH, 
-    DEFAULT_COUNT, DEFAULT_IMAGE_SIZE, DEFAULT_STEPS, MIN_FILE_SIZE
+    DEFAULT_COUNT, DEFAULT_IMAGE_SIZE, DEFAULT_STEPS, MIN_FILE_SIZE, LIVE_PREVIEW_ENABLED
 )
 from models.schemas import (
     TaskResponse, TaskStatusResponse, HistoryResponse, 
-    FavoriteResponse, DeleteResponse, HealthResponse, GenerateFusionRequest
+    FavoriteResponse, DeleteResponse, HealthResponse, GenerateFusionRequest,
+    CancelTasksRequest, CancelTaskResponse
 )
 
 # 导入统一服务管理器
 from core.service_manager import (
-    get_db_manager, get_task_manager, get_comfyui_client
+    get_db_manager, get_task_manager, get_comfyui_client, get_warmup_manager,
+    get_upscale_manager, get_upscale_batch_manager
 )
 
+from core.circuit_breaker import get_circuit_stats
+from core.model_file_index import get_model_file_index
 # 导入缓存管理器
 from core.cache_manager import get_cache_manager
+from core.local_upscale import shutdown_local_upscale_pool
+from core.live_preview import get_live_preview_listener
 
 # 导入缩略图管理器
 from core.thumbnail_manager import get_thumbnail_manager
@@ -72,6 +79,92 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def resume_upscale_tasks():
+    """恢复跟踪重启前已提交的放大任务，继续处理未完成的批量放大"""
+    get_upscale_manager().resume_unfinished()
+    get_upscale_batch_manager().resume_unfinished()
+
+
+@app.on_event("startup")
+async def start_model_warmup():
+    """启动后台模型预热（WARMUP_ENABLED=true时）"""
+    if get_warmup_manager().start():
+        print("🔥 已启动后台模型预热")
+
+
+@app.on_event("shutdown")
+async def stop_model_warmup():
+    """服务关闭时取消未完成的预热"""
+    await get_warmup_manager().cancel()
+
+
+@app.on_event("startup")
+async def start_live_preview():
+    """连接ComfyUI事件流，转发采样过程中的预览帧（LIVE_PREVIEW_ENABLED=true时）"""
+    if LIVE_PREVIEW_ENABLED:
+        get_live_preview_listener().start()
+
+
+@app.on_event("shutdown")
+async def stop_live_preview():
+    """服务关闭时断开ComfyUI事件流"""
+    await get_live_preview_listener().stop()
+
+
+@app.on_event("startup")
+async def start_config_watch():
+    """与admin保持配置变化监听，配置更新后立即刷新内存中的配置（CONFIG_WATCH_ENABLED=true时）"""
+    from core.config_client import get_config_client
+    if get_config_client().start_watch():
+        print("📡 已启动配置变化监听")
+
+
+@app.on_event("shutdown")
+async def stop_config_watch():
+    """服务关闭时停止配置变化监听"""
+    from core.config_client import get_config_client
+    await get_config_client().stop_watch()
+
+
+@app.on_event("startup")
+async def start_lora_catalog():
+    """加载本地LoRA目录索引并监听目录变化（不可用时轮询）"""
+    from core.lora_catalog import get_lora_catalog
+    if get_lora_catalog().start():
+        print(f"🗂️ 已启动LoRA目录索引: {get_lora_catalog().get_stats()['mode']}")
+
+
+@app.on_event("shutdown")
+async def stop_lora_catalog():
+    """服务关闭时停止LoRA目录监听并保存索引"""
+    from core.lora_catalog import get_lora_catalog
+    await asyncio.to_thread(get_lora_catalog().stop)
+
+
+@app.on_event("startup")
+async def start_model_file_index():
+    """在后台建立模型文件索引并监听模型目录，索引变化后上报admin"""
+    index = get_model_file_index()
+    if index.start():
+        index.start_reporting()
+        print(f"📦 已启动模型文件索引: {index.models_dir} ({index.get_stats()['mode']})")
+
+
+@app.on_event("shutdown")
+async def stop_model_file_index():
+    """服务关闭时停止模型目录监听并保存索引"""
+    index = get_model_file_index()
+    await index.stop_reporting()
+    await asyncio.to_thread(index.stop)
+
+
+@app.on_event("shutdown")
+async def stop_local_upscale_pool():
+    """服务关闭时停止本地放大进程池"""
+    shutdown_local_upscale_pool()
+
+
 # 挂载静态文件
 app.mount("/static", StaticFiles(directory="."), name="static")
 
@@ -296,6 +389,9 @@ async def upload_lora(file: UploadFile = File(...)):
             await f.write(content)
         
         print(f"✅ LoRA文件上传成功: {file_path}")
+        # 立即写入LoRA目录索引，不等待目录监听事件
+        from core.lora_catalog import get_lora_catalog
+        await asyncio.to_thread(get_lora_catalog().update_path, file_path)
         
         return {
             "message": "LoRA文件上传成功",
@@ -368,7 +464,9 @@ async def generate_video(
     fps: int = Form(16),
     duration: int = Form(5),  # 秒
     model: str = Form("wan2.2-video"),
-    loras: Optional[str] = Form(None)  # JSON字符串格式的LoRA配置
+    loras: Optional[str] = Form(None),  # JSON字符串格式的LoRA配置
+    session_id: Optional[str] = Form(None),  # 画布会话ID
+    ephemeral: bool = Form(False)  # 会话断开时自动取消
 ):
     """生成视频API"""
     try:
@@ -438,6 +536,9 @@ async def generate_video(
             "model": model,
             "loras": lora_configs
         }
+        if session_id:
+            parameters["session_id"] = session_id
+            parameters["ephemeral"] = ephemeral
         
         print(f"🎬 接收到视频生成请求: description='{description[:50]}...', fps={fps}, duration={duration}")
         print(f"📊 参数详情: {parameters}")
@@ -478,7 +579,9 @@ async def generate_image(
     model: str = Form(...),  # 模型选择参数（必填）
     loras: Optional[str] = Form(None),  # JSON字符串格式的LoRA配置
     duration: Optional[int] = Form(None),  # 视频时长（秒）
-    fps: Optional[int] = Form(None)  # 视频帧率
+    fps: Optional[int] = Form(None),  # 视频帧率
+    session_id: Optional[str] = Form(None),  # 画布会话ID
+    ephemeral: bool = Form(False)  # 会话断开时自动取消
 ):
     """生成图像API"""
     try:
@@ -629,6 +732,9 @@ async def generate_image(
             "model": model,  # 添加模型参数
             "loras": lora_configs
         }
+        if session_id:
+            parameters["session_id"] = session_id
+            parameters["ephemeral"] = ephemeral
         
         # 如果是视频模型，添加视频参数
         if model == "wan2.2-video" and duration is not None and fps is not None:
@@ -844,7 +950,7 @@ async def get_task_status(task_id: str):
         progress = 50
     elif task["status"] == "completed":
         progress = 100
-    elif task["status"] == "failed":
+    elif task["status"] in ("failed", "cancelled"):
         progress = 0
     
     # 准备结果
@@ -899,6 +1005,19 @@ async def get_task_status(task_id: str):
         error=task.get("error")
     )
 
+@app.get("/api/task/{task_id}/live-preview")
+async def stream_live_preview(task_id: str):
+    """采样过程实时预览（Server-Sent Events）：frame -> done"""
+    if not LIVE_PREVIEW_ENABLED:
+        raise HTTPException(status_code=404, detail="实时预览未启用")
+    if not task_manager.get_task_status(task_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return StreamingResponse(
+        task_manager.stream_live_previews(task_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/image/{task_id}/{image_index}")
 async def get_generated_image_by_index(task_id: str, image_index: int):
     """根据索引获取生成的图像"""
@@ -1279,6 +1398,39 @@ async def get_favorite_videos():
         raise HTTPException(status_code=500, detail=f"获取收藏视频列表失败: {str(e)}")
 
 
+@app.delete("/api/task/{task_id}/run", response_model=CancelTaskResponse)
+async def cancel_task_run(task_id: str):
+    """取消正在执行的任务（保留任务记录）"""
+    try:
+        result = await task_manager.cancel_task(task_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        return CancelTaskResponse(**result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"取消任务失败: {e}")
+        raise HTTPException(status_code=500, detail=f"取消任务失败: {str(e)}")
+
+
+@app.post("/api/tasks/cancel", response_model=List[CancelTaskResponse])
+async def cancel_tasks(request: CancelTasksRequest):
+    """批量取消任务
+    
+    传入session_id时取消该画布会话中标记为临时（ephemeral）的任务，
+    前端可在页面关闭时通过 navigator.sendBeacon 调用。
+    """
+    try:
+        results = []
+        if request.task_ids:
+            results.extend(await task_manager.cancel_tasks(request.task_ids))
+        if request.session_id:
+            results.extend(await task_manager.cancel_session_tasks(request.session_id))
+        return [CancelTaskResponse(**result) for result in results]
+    except Exception as e:
+        print(f"批量取消任务失败: {e}")
+        raise HTTPException(status_code=500, detail=f"批量取消任务失败: {str(e)}")
+
 @app.delete("/api/task/{task_id}")
 async def delete_task(task_id: str):
     """删除任务"""
@@ -1566,10 +1718,52 @@ async def health_check():
         "database_connected": db_healthy,
         "comfyui_connected": comfyui_status,
         "redis_cache": cache_stats,
+        "warmup": get_warmup_manager().get_status(),
+        "circuits": get_circuit_stats(),
         "timestamp": datetime.now().isoformat()
     }
 
 
+@app.get("/api/model-files")
+async def get_model_files(path: Optional[str] = Query(None, description="只返回指定文件（相对模型目录的路径）")):
+    """本节点模型文件索引（大小、修改时间、sha256）"""
+    index = get_model_file_index()
+    if path is not None:
+        entry = index.get(path)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"模型文件不存在: {path}")
+        return {"node": index.node, **entry}
+    return {**index.snapshot(), "stats": index.get_stats()}
+
+
+@app.post("/api/warmup")
+async def start_warmup():
+    """手动触发模型预热（例如ComfyUI重启后）"""
+    started = get_warmup_manager().start(force=True)
+    return {"started": started, **get_warmup_manager().get_status()}
+
+
+@app.post("/api/warmup/cancel")
+async def cancel_warmup():
+    """取消正在进行的模型预热"""
+    cancelled = await get_warmup_manager().cancel()
+    return {"cancelled": cancelled, **get_warmup_manager().get_status()}
+
+
+@app.get("/api/scheduler/stats")
+async def scheduler_stats():
+    """模型亲和调度统计：换模型次数、等待时间和换模型带来的额外耗时"""
+    from core.model_scheduler import get_model_scheduler
+    
+    return get_model_scheduler().get_stats()
+
+
+@app.get("/api/live-preview/stats")
+async def live_preview_stats():
+    """实时预览统计：ComfyUI事件流连接状态、收到/推送/丢弃的预览帧数"""
+    return get_live_preview_listener().get_stats()
+
+
 @app.get("/api/config/status")
 async def config_status():
     """配置状态检查"""
@@ -1671,9 +1865,17 @@ async def execute_qwen_edit(
     denoise: float = Form(1.0),
     target_size: int = Form(1024),
     lora_strength: float = Form(1.0),
-    seed: int = Form(-1)
+    seed: int = Form(-1),
+    crop_to_mask: bool = Form(True),
+    progressive: bool = Form(False),  # 先返回低步数预览，再返回完整质量结果
+    session_id: Optional[str] = Form(None),  # 画布会话ID，再次编辑时取消未完成的渐进式重绘
+    ephemeral: bool = Form(False)  # 会话断开时自动取消
 ):
-    """执行Qwen-Edit局部重绘"""
+    """执行Qwen-Edit局部重绘
+    
+    progressive 为True时任务在后台执行，立即返回任务ID，
+    预览和最终结果通过 /api/qwen-edit/{task_id}/events 推送。
+    """
     try:
         print(f"🎨 开始执行Qwen-Edit局部重绘任务")
         
@@ -1715,21 +1917,30 @@ async def execute_qwen_edit(
             "target_size": target_size,
             "lora_strength": lora_strength,
             "seed": seed,
-            "mask_path": str(mask_path)
+            "mask_path": str(mask_path),
+            "crop_to_mask": crop_to_mask
         }
+        if session_id:
+            parameters["session_id"] = session_id
+            parameters["ephemeral"] = ephemeral
         
         print(f"🔧 Qwen-Edit参数: {parameters}")
         
-        # 创建任务管理器实例
-        from core.task_manager import TaskManager
-        from core.comfyui_client import ComfyUIClient
-        from core.workflow_template import WorkflowTemplate
-        from core.database_manager import DatabaseManager
-        
-        db_manager = DatabaseManager(DB_PATH)
-        comfyui_client = ComfyUIClient(COMFYUI_URL)
-        workflow_template = WorkflowTemplate()
-        task_manager = TaskManager(db_manager, comfyui_client, workflow_template)
+        if progressive:
+            parameters["progressive"] = True
+            await task_manager.create_qwen_edit_task(
+                task_id=task_id,
+                image_path=str(image_path),
+                mask_path=str(mask_path),
+                prompt=prompt,
+                negative_prompt=negative_prompt,
+                parameters=parameters
+            )
+            return TaskResponse(
+                task_id=task_id,
+                status="pending",
+                message="渐进式局部重绘任务已提交，预览和结果通过事件流推送"
+            )
         
         # 执行Qwen-Edit任务
         await task_manager.execute_qwen_edit_task(
@@ -1749,11 +1960,39 @@ async def execute_qwen_edit(
             message="Qwen-Edit局部重绘任务已提交"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ 创建Qwen-Edit任务失败: {e}")
         raise HTTPException(status_code=500, detail=f"创建Qwen-Edit任务失败: {str(e)}")
 
 
+@app.get("/api/qwen-edit/{task_id}/events")
+async def stream_qwen_edit_events(task_id: str):
+    """渐进式局部重绘事件流（Server-Sent Events）：preview -> result / done"""
+    if not task_manager.get_task_status(task_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return StreamingResponse(
+        task_manager.stream_qwen_edit_events(task_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/qwen-edit/{task_id}/preview")
+async def get_qwen_edit_preview(task_id: str):
+    """获取渐进式局部重绘的预览图"""
+    preview_path = task_manager.get_inpaint_preview(task_id)
+    if not preview_path:
+        raise HTTPException(status_code=404, detail="预览尚未生成")
+    path = Path(preview_path)
+    if not path.is_absolute():
+        path = OUTPUT_DIR / (preview_path[8:] if preview_path.startswith("outputs/") else preview_path)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="预览文件不存在")
+    return FileResponse(str(path))
+
+
 @app.post("/api/outpainting", response_model=TaskResponse)
 async def execute_outpainting(
     image: UploadFile = File(...),
@@ -26,6 +26,20 @@ class TaskStatusResponse(BaseModel):
     error: Optional[str] = Field(None, description="错误信息")
 
 
+class CancelTasksRequest(BaseModel):
+    """批量取消任务请求"""
+    task_ids: List[str] = Field(default_factory=list, description="要取消的任务ID列表")
+    session_id: Optional[str] = Field(None, description="画布会话ID，取消该会话中的临时任务")
+
+
+class CancelTaskResponse(BaseModel):
+    """任务取消响应"""
+    task_id: str = Field(..., description="任务ID")
+    status: str = Field(..., description="任务当前状态")
+    cancelled: bool = Field(..., description="本次请求是否取消了任务")
+    comfyui: Optional[str] = Field(None, description="ComfyUI侧的处理：deleted/interrupted/not_found")
+
+
 class HistoryResponse(BaseModel):
     """历史记录响应"""
     tasks: List[Dict[str, Any]] = Field(..., description="任务列表")
@@ -53,6 +67,7 @@ class HealthResponse(BaseModel):
     database_connected: bool = Field(..., description="数据库连接状态")
     comfyui_connected: bool = Field(..., description="ComfyUI连接状态")
     redis_cache: Optional[Dict[str, Any]] = Field(None, description="Redis缓存状态")
+    warmup: Optional[Dict[str, Any]] = Field(None, description="模型预热状态")
     timestamp: str = Field(..., description="检查时间戳")
 
 
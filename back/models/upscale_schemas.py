@@ -31,6 +31,7 @@ class UpscaleStatusResponse(BaseModel):
     status: str = Field(..., description="任务状态")
     progress: int = Field(..., description="任务进度百分比")
     result: Optional[Dict[str, Any]] = Field(None, description="任务结果")
+    error: Optional[str] = Field(None, description="错误信息")
 
 
 class UpscaleResult(BaseModel):
@@ -59,6 +60,30 @@ class BatchUpscaleResponse(BaseModel):
     algorithm: str = Field(..., description="使用的算法")
 
 
+class UpscaleBatchItem(BaseModel):
+    """批量放大条目状态"""
+    task_id: str = Field(..., description="任务ID")
+    index: Optional[int] = Field(None, description="上传顺序")
+    filename: Optional[str] = Field(None, description="原始文件名")
+    status: str = Field(..., description="条目状态（queued/processing/completed/failed/cancelled）")
+    progress: int = Field(..., description="进度百分比")
+    result: Optional[Dict[str, Any]] = Field(None, description="放大结果")
+    error: Optional[str] = Field(None, description="错误信息")
+
+
+class UpscaleBatchStatusResponse(BaseModel):
+    """批量放大状态响应"""
+    batch_id: str = Field(..., description="批次ID")
+    scale_factor: int = Field(..., description="放大倍数")
+    algorithm: str = Field(..., description="使用的算法")
+    created_at: Optional[str] = Field(None, description="创建时间")
+    total: int = Field(..., description="条目数量")
+    counts: Dict[str, int] = Field(..., description="各状态的条目数量")
+    finished: bool = Field(..., description="全部条目是否已结束")
+    items: List[UpscaleBatchItem] = Field(..., description="各条目状态")
+    skipped: List[Dict[str, Any]] = Field(default_factory=list, description="未能加入批次的文件")
+
+
 class AlgorithmInfo(BaseModel):
     """算法信息"""
     name: str = Field(..., description="算法名称")
@@ -82,7 +107,7 @@ AVAILABLE_ALGORITHMS = {
     "lanczos": AlgorithmInfo(
         name="lanczos",
         display_name="Lanczos",
-        description="传统的高质量插值算法",
+        description="传统的高质量插值算法，在本地CPU执行，无需等待GPU队列",
         supported_formats=["png", "jpg", "jpeg", "webp"],
         max_scale_factor=4,
         quality="medium"
@@ -90,7 +115,7 @@ AVAILABLE_ALGORITHMS = {
     "bicubic": AlgorithmInfo(
         name="bicubic",
         display_name="Bicubic",
-        description="双三次插值算法",
+        description="双三次插值算法，在本地CPU执行",
         supported_formats=["png", "jpg", "jpeg", "webp"],
         max_scale_factor=4,
         quality="medium"
@@ -98,7 +123,7 @@ AVAILABLE_ALGORITHMS = {
     "nearest": AlgorithmInfo(
         name="nearest",
         display_name="Nearest Neighbor",
-        description="最近邻插值算法，速度快但质量较低",
+        description="最近邻插值算法，在本地CPU执行，速度快但质量较低",
         supported_formats=["png", "jpg", "jpeg", "webp"],
         max_scale_factor=4,
         quality="low"
@@ -294,6 +294,16 @@ export const executeQwenEdit = async (imageFile, maskFile, prompt, parameters, A
     formData.append('target_size', parameters.target_size || 1024)
     formData.append('lora_strength', parameters.lora_strength || 1.0)
     formData.append('seed', parameters.seed || -1)
+    if (parameters.progressive) {
+      // 渐进式模式：先推送低步数预览，再推送完整质量结果；同一会话再次编辑时后端取消未完成的任务
+      formData.append('progressive', 'true')
+      if (parameters.session_id) {
+        formData.append('session_id', parameters.session_id)
+      }
+      if (parameters.ephemeral) {
+        formData.append('ephemeral', 'true')
+      }
+    }
     
     console.log('📤 提交Qwen-Edit任务到后端')
     
@@ -313,6 +323,22 @@ export const executeQwenEdit = async (imageFile, maskFile, prompt, parameters, A
         callbacks.onTaskCreated(taskId)
       }
       
+      // 订阅预览事件，最终结果仍由轮询获取
+      let events = null
+      if (parameters.progressive && typeof EventSource !== 'undefined') {
+        events = new EventSource(`${API_BASE}/api/qwen-edit/${taskId}/events`)
+        events.addEventListener('preview', (event) => {
+          const data = JSON.parse(event.data)
+          console.log('👀 收到局部重绘预览:', data.url)
+          if (callbacks.onPreview) {
+            callbacks.onPreview(`${API_BASE}${data.url}`)
+          }
+        })
+        events.addEventListener('result', () => events.close())
+        events.addEventListener('done', () => events.close())
+        events.onerror = () => events.close()
+      }
+      
       // 开始轮询任务状态
       await pollTaskStatus(taskId, API_BASE, {
         onProgress: (progress) => {
@@ -331,6 +357,9 @@ export const executeQwenEdit = async (imageFile, maskFile, prompt, parameters, A
           }
         }
       })
+      if (events) {
+        events.close()
+      }
     } else {
       const errorData = await response.json()
       throw new Error(errorData.detail || '提交Qwen-Edit任务失败')
@@ -52,10 +52,10 @@ export const pollUpscaleStatus = async (taskId, API_BASE, callbacks) => {
           await callbacks.onSuccess(status)
         }
         return
-      } else if (status.status === 'failed') {
+      } else if (status.status === 'failed' || status.status === 'cancelled') {
         console.log('❌ 任务失败')
         if (callbacks.onError) {
-          callbacks.onError('图片放大失败')
+          callbacks.onError(status.error || '图片放大失败')
         }
         return
       }
@@ -135,6 +135,12 @@ export const pollVideoStatus = async (taskId, API_BASE, callbacks) => {
           await callbacks.onSuccess(status)
         }
         return
+      } else if (status.status === 'cancelled') {
+        console.log('🛑 视频生成已取消')
+        if (callbacks.onError) {
+          callbacks.onError('视频生成已取消')
+        }
+        return
       } else if (status.status === 'failed') {
         console.log('❌ 视频生成失败')
         if (callbacks.onError) {
@@ -221,7 +227,7 @@ export const pollTaskStatus = async (taskId, API_BASE, callbacks) => {
           await callbacks.onSuccess(status)
         }
         return
-      } else if (status.status === 'failed') {
+      } else if (status.status === 'failed' || status.status === 'cancelled') {
         if (callbacks.onError) {
           callbacks.onError(status.error || '任务失败')
         }